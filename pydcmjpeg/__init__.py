@@ -1,3 +1,5 @@
 
 
-from pydcmjpeg.fileio import jpgread, jpgwrite
+from pydcmjpeg.fileio import (
+    decode_frames, jpginfo, jpgmap, jpgparse, jpgread, jpgwrite
+)
@@ -7,6 +7,7 @@ from struct import unpack
 
 from pydcmjpeg import jpgread
 from pydcmjpeg._markers import MARKERS
+from pydcmjpeg.fileio import _read_segment
 
 
 def setup_argparse():
@@ -44,7 +45,7 @@ if __name__ == "__main__":
                         length = unpack('>H', fp.read(2))[0] - 2
                         fp.seek(length, 1)
                     else:
-                        info[name] = handler(fp)
+                        info[name] = handler(_read_segment(fp))
                 else:
                     # SOS - start of scan
                     name, description, handler = MARKERS[_marker]
@@ -52,7 +53,7 @@ if __name__ == "__main__":
                         "{0} @ offset {1} : {2} : {3}"
                         .format(hex(_marker), fp.tell() - 2, name, description)
                     )
-                    handler(fp)
+                    handler(_read_segment(fp))
                     print('Decoding ECS...')
                     break
                     # decode ecs
@@ -0,0 +1,133 @@
+"""Functions for decoding with the QM-coder arithmetic decoder."""
+
+from pydcmjpeg._tables import NEXT_LPS, NEXT_MPS, QE, SWITCH_MPS
+
+
+# The probability estimation state machine in compact form, indexed by the
+#   state (0 to 112). The LPS transition has the MPS switch in bit 7 so the
+#   new statistics bin value is a single XOR. State 113 is the fixed
+#   probability estimate (Qe = 0x5A1D) used for the signs of AC coefficients
+#   and the bits of refinement scans, it never changes state
+_QE = QE + (0x5A1D, )
+_NEXT_MPS = NEXT_MPS + (113, )
+_NEXT_LPS = tuple(
+    lps | (switch << 7) for lps, switch in zip(NEXT_LPS, SWITCH_MPS)
+) + (113, )
+
+# The statistics bin state for the fixed probability estimate
+FIXED_STATE = 113
+
+# The default conditioning when there's no DAC for a table, as the DAC Cs
+#   value for each table class: L = 0 and U = 1 for DC and lossless tables
+#   (Cs = U << 4 | L) and Kx = 5 for AC tables
+DEFAULT_CONDITIONING = {0 : 0x10, 1 : 5}
+
+
+class ArithmeticDecoder(object):
+    """Decode binary decisions from a single segment of arithmetic coded
+    data.
+
+    Each statistics bin is a byte holding the index of its state in the
+    probability estimation state machine in the low 7 bits and the sense
+    of the MPS in bit 7, so the bins for a table are a ``bytearray`` that
+    starts as all zeros. The data should have any byte stuffing removed and
+    reading past the end of the data returns 0 bytes, which is how the
+    encoder's final bytes are reconstructed.
+
+    References
+    ----------
+    ISO/IEC 10918-1, Annex D
+    """
+    __slots__ = ('a', 'c', 'ct', 'pos', '_data', '_length')
+
+    def __init__(self, data):
+        """Initialise a new ArithmeticDecoder.
+
+        Parameters
+        ----------
+        data : bytes-like
+            The arithmetic coded data, without byte stuffing.
+        """
+        self._data = bytes(data)
+        self._length = len(data)
+        # The probability interval and the code register, with the first
+        #   two bytes read by the renormalisation of the first decision
+        #   (Section D.2.7)
+        self.a = 0
+        self.c = 0
+        # The number of bits in `c` below the 16 bits aligned with `a`,
+        #   negative until the first two bytes have been read
+        self.ct = -16
+        # The offset of the next byte of data
+        self.pos = 0
+
+    def decode(self, stats, index):
+        """Return the next decision decoded with a statistics bin.
+
+        Parameters
+        ----------
+        stats : bytearray
+            The statistics bins, the bin is updated in place.
+        index : int
+            The index of the bin in `stats`.
+
+        Returns
+        -------
+        int
+            The decoded decision, 0 or 1.
+
+        References
+        ----------
+        ISO/IEC 10918-1, Sections D.2.4 to D.2.6
+        """
+        a = self.a
+        if a < 0x8000:
+            # Renormalisation and data input, deferred from the previous
+            #   decision so each decision needs at most one test of `a`
+            c, ct = self.c, self.ct
+            data, length = self._data, self._length
+            while a < 0x8000:
+                ct -= 1
+                if ct < 0:
+                    pos = self.pos
+                    c = (c << 8) | (data[pos] if pos < length else 0)
+                    self.pos = pos + 1
+                    ct += 8
+                    if ct < 0:
+                        # Reading the first two bytes
+                        ct += 1
+                        if not ct:
+                            a = 0x8000
+
+                a <<= 1
+
+            self.c, self.ct = c, ct
+
+        sv = stats[index]
+        state = sv & 0x7F
+        qe = _QE[state]
+        a -= qe
+        temp = a << self.ct
+        if self.c >= temp:
+            # The upper sub-interval, the LPS unless they're exchanged
+            self.c -= temp
+            if a < qe:
+                stats[index] = (sv & 0x80) | _NEXT_MPS[state]
+                decision = sv >> 7
+            else:
+                stats[index] = (sv & 0x80) ^ _NEXT_LPS[state]
+                decision = (sv >> 7) ^ 1
+
+            a = qe
+        else:
+            decision = sv >> 7
+            if a < 0x8000:
+                # The lower sub-interval, the MPS unless they're exchanged
+                if a < qe:
+                    stats[index] = (sv & 0x80) ^ _NEXT_LPS[state]
+                    decision ^= 1
+                else:
+                    stats[index] = (sv & 0x80) | _NEXT_MPS[state]
+
+        self.a = a
+        return decision
@@ -0,0 +1,15 @@
+"""Benchmarks for pydcmjpeg, run using airspeed velocity (asv).
+
+From the repository root::
+
+    $ asv run
+    $ asv continuous master HEAD
+
+Or to run against the current environment without building::
+
+    $ asv run --python=same --quick
+
+The benchmarks use the files in ``pydcmjpeg/data/compliance`` and
+``pydcmjpeg/data/images`` as well as images generated by ``_common``.
+Benchmarks for features that aren't supported yet are skipped.
+"""
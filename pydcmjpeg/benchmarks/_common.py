@@ -0,0 +1,567 @@
+"""Common data and functions for use in the benchmarks."""
+
+import os
+import struct
+from tempfile import NamedTemporaryFile
+
+import numpy as np
+
+from pydcmjpeg._tables import ZIGZAG
+
+
+COMPL_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '../', 'data', 'compliance')
+)
+
+CPROCESS01 = os.path.join(COMPL_DIR, '10918', 'process_01')
+CPROCESS02 = os.path.join(COMPL_DIR, '10918', 'process_02')
+CPROCESS04 = os.path.join(COMPL_DIR, '10918', 'process_04')
+CPROCESS14 = os.path.join(COMPL_DIR, '10918', 'process_14')
+
+COMPLIANCE_10918 = {
+    'p01_A1' : os.path.join(CPROCESS01, 'A1.JPG'),
+    'p01_B2' : os.path.join(CPROCESS01, 'B2.JPG'),
+    'p02_C1' : os.path.join(CPROCESS02, 'C1.JPG'),
+    'p02_C2' : os.path.join(CPROCESS02, 'C2.JPG'),
+    'p04_E1' : os.path.join(CPROCESS04, 'E1.JPG'),
+    'p04_E2' : os.path.join(CPROCESS04, 'E2.JPG'),
+    'p14_O1' : os.path.join(CPROCESS14, 'O1.JPG'),
+    'p14_O2' : os.path.join(CPROCESS14, 'O2.JPG'),
+}
+
+C14495 = os.path.join(COMPL_DIR, '14495', 'jlsimgV100')
+
+COMPLIANCE_14495 = {
+    'T8C0E0' : os.path.join(C14495, 'T8C0E0.JLS'),
+    'T8C1E0' : os.path.join(C14495, 'T8C1E0.JLS'),
+    'T8C2E0' : os.path.join(C14495, 'T8C2E0.JLS'),
+    'T8NDE3' : os.path.join(C14495, 'T8NDE3.JLS'),
+    'T8SSE0' : os.path.join(C14495, 'T8SSE0.JLS'),
+    'T16E0' : os.path.join(C14495, 'T16E0.JLS'),
+}
+
+C15444 = os.path.join(COMPL_DIR, '15444', 'J2KP4files')
+
+COMPLIANCE_15444 = {
+    'p0_01' : os.path.join(C15444, 'codestreams_profile0', 'p0_01.j2k'),
+    'p0_09' : os.path.join(C15444, 'codestreams_profile0', 'p0_09.j2k'),
+    'p0_16' : os.path.join(C15444, 'codestreams_profile0', 'p0_16.j2k'),
+    'p1_01' : os.path.join(C15444, 'codestreams_profile1', 'p1_01.j2k'),
+}
+
+DATA_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '../', 'data', 'images')
+)
+
+DPROCESS01 = os.path.join(DATA_DIR, '10918', 'process_01')
+DPROCESS02 = os.path.join(DATA_DIR, '10918', 'process_02')
+DPROCESS03 = os.path.join(DATA_DIR, '10918', 'process_03')
+DPROCESS04 = os.path.join(DATA_DIR, '10918', 'process_04')
+DPROCESS10 = os.path.join(DATA_DIR, '10918', 'process_10')
+DPROCESS11 = os.path.join(DATA_DIR, '10918', 'process_11')
+DPROCESS14SV1 = os.path.join(DATA_DIR, '10918', 'process_14_sv1')
+DPROCESS15 = os.path.join(DATA_DIR, '10918', 'process_15')
+
+IMAGES_10918 = {
+    'p01_rgb' : os.path.join(DPROCESS01, 'SC_rgb_jpeg_dcmtk.jpg'),
+    'p01_422' : os.path.join(
+        DPROCESS01, 'color3d_jpeg_baseline_422_frame1.jpg'
+    ),
+    'p02_rgb' : os.path.join(DPROCESS02, 'rgb_8_444.jpg'),
+    'p03_422' : os.path.join(DPROCESS03, 'color3d_arith_422.jpg'),
+    'p04_grey' : os.path.join(DPROCESS04, 'grey_12.jpg'),
+    'p04_lossy' : os.path.join(DPROCESS04, 'JPEG-lossy.jpg'),
+    'p10_422' : os.path.join(
+        DPROCESS10, 'color3d_pillow_progressive_422.jpg'
+    ),
+    'p11_422' : os.path.join(
+        DPROCESS11, 'color3d_arith_progressive_422.jpg'
+    ),
+    'p14_sv1_rgb' : os.path.join(DPROCESS14SV1, 'SC_rgb_jpeg_gdcm.jpg'),
+    'p15_O1' : os.path.join(DPROCESS15, 'O1_arith.jpg'),
+}
+
+IMAGES_14495 = {
+    'mr' : os.path.join(DATA_DIR, '14495', 'MR_small_jpeg_ls_lossless.jpg'),
+    'emri' : os.path.join(
+        DATA_DIR, '14495', 'emri_small_jpeg_ls_lossless_frame1.jpg'
+    ),
+}
+
+IMAGES_15444 = {
+    'mr' : os.path.join(DATA_DIR, '15444', 'MR_small_jp2klossless.jpg'),
+    'emri' : os.path.join(
+        DATA_DIR, '15444', 'emri_small_jpeg_2k_lossless_frame1.jpg'
+    ),
+}
+
+
+def read_file(fpath):
+    """Return the contents of the file at `fpath` as bytes."""
+    with open(fpath, 'rb') as fp:
+        return fp.read()
+
+
+def generate_jpeg(size, samples=1, restart_interval=0):
+    """Return a generated `size` x `size` Process 1 JPEG.
+
+    Parameters
+    ----------
+    size : int
+        The number of rows and columns in the image.
+    samples : int, optional
+        The number of components.
+    restart_interval : int, optional
+        If non-zero then insert an RSTn marker every `restart_interval`
+        MCUs.
+
+    Returns
+    -------
+    bytes
+        The encoded JPEG.
+    """
+    return encode_baseline(
+        generate_image(size, size, samples=samples), restart_interval
+    )
+
+
+def write_large_jpeg(rows, columns, samples=1, strip=64):
+    """Write a large generated Process 1 JPEG to a temporary file.
+
+    Encoding a very large image is too slow, so a `strip` rows high image
+    is encoded with a restart interval every MCU row and its MCU rows are
+    then repeated to fill the image.
+
+    Parameters
+    ----------
+    rows : int
+        The number of rows in the image.
+    columns : int
+        The number of columns in the image.
+    samples : int, optional
+        The number of components.
+    strip : int, optional
+        The number of rows in the encoded strip, must be a multiple of 8.
+
+    Returns
+    -------
+    tempfile.NamedTemporaryFile
+        The file containing the JPEG, will be deleted when closed.
+    """
+    data = encode_baseline(
+        generate_image(strip, columns, samples=samples),
+        restart_interval=-(-columns // 8)
+    )
+
+    # Split the encoded strip into the headers and the MCU rows
+    start = data.index(b'\xFF\xDA')
+    start += 2 + struct.unpack('>H', data[start + 2:start + 4])[0]
+    header = bytearray(data[:start])
+    # SOF0 Y
+    offset = header.index(b'\xFF\xC0') + 5
+    header[offset:offset + 2] = struct.pack('>H', rows)
+
+    # Split on the RSTn markers, which are the only 0xFF 0xD0 to 0xD7 in
+    #   the byte stuffed data
+    scan = data[start:-2]
+    for ii in range(1, 8):
+        scan = scan.replace(bytes([0xFF, 0xD0 + ii]), b'\xFF\xD0')
+
+    segments = scan.split(b'\xFF\xD0')
+
+    tfile = NamedTemporaryFile(suffix='.jpg')
+    tfile.write(header)
+    for ii in range(-(-rows // 8)):
+        if ii:
+            tfile.write(bytes([0xFF, 0xD0 + (ii - 1) % 8]))
+
+        tfile.write(segments[ii % len(segments)])
+
+    tfile.write(b'\xFF\xD9')
+    tfile.flush()
+
+    return tfile
+
+
+def write_synthetic_scan(nr_bytes, restart=None, seed=0):
+    """Write a JPEG file with a single scan of random entropy-coded data.
+
+    Only the SOI, SOS and EOI markers are included, so the file is only
+    useful for benchmarking the parsing of the entropy-coded data.
+
+    Parameters
+    ----------
+    nr_bytes : int
+        The number of bytes of entropy-coded data prior to byte stuffing.
+    restart : int, optional
+        If used then insert an RSTn marker every `restart` bytes.
+    seed : int, optional
+        The seed for the random number generator.
+
+    Returns
+    -------
+    tempfile.NamedTemporaryFile
+        The file containing the JPEG, will be deleted when closed.
+    """
+    rng = np.random.RandomState(seed)
+    data = rng.randint(0, 256, nr_bytes, dtype='uint8').tobytes()
+
+    segments = []
+    restart = restart or nr_bytes
+    for ii, offset in enumerate(range(0, nr_bytes, restart)):
+        if ii:
+            segments.append(bytes([0xFF, 0xD0 + (ii - 1) % 8]))
+
+        segments.append(
+            data[offset:offset + restart].replace(b'\xff', b'\xff\x00')
+        )
+
+    tfile = NamedTemporaryFile(suffix='.jpg')
+    tfile.write(b'\xFF\xD8')
+    # SOS: Ls=8, Ns=1, Cs=1, Td/Ta=0, Ss=0, Se=63, Ah/Al=0
+    tfile.write(b'\xFF\xDA\x00\x08\x01\x01\x00\x00\x3F\x00')
+    for segment in segments:
+        tfile.write(segment)
+    tfile.write(b'\xFF\xD9')
+    tfile.flush()
+
+    return tfile
+
+
+# Table K.1: luminance quantisation table, in zigzag order
+_QTABLE = [
+    16, 11, 12, 14, 12, 10, 16, 14, 13, 14, 18, 17, 16, 19, 24, 40,
+    26, 24, 22, 22, 24, 49, 35, 37, 29, 40, 58, 51, 61, 60, 57, 51,
+    56, 55, 64, 72, 92, 78, 64, 68, 87, 69, 55, 56, 80, 109, 81, 87,
+    95, 98, 103, 104, 103, 62, 77, 113, 121, 112, 100, 120, 92, 101, 103, 99,
+]
+# Table K.3: luminance DC differences
+_DC_BITS = [0, 1, 5, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0]
+_DC_HUFFVAL = list(range(12))
+# Table K.5: luminance AC coefficients
+_AC_BITS = [0, 2, 1, 3, 3, 2, 4, 3, 5, 5, 4, 4, 0, 0, 1, 125]
+_AC_HUFFVAL = list(bytes.fromhex(
+    '01020300041105122131410613516107227114328191a1082342b1c11552d1f0'
+    '2433627282090a161718191a25262728292a3435363738393a43444546474849'
+    '4a535455565758595a636465666768696a737475767778797a83848586878889'
+    '8a92939495969798999aa2a3a4a5a6a7a8a9aab2b3b4b5b6b7b8b9bac2c3c4c5'
+    'c6c7c8c9cad2d3d4d5d6d7d8d9dae1e2e3e4e5e6e7e8e9eaf1f2f3f4f5f6f7f8'
+    'f9fa'
+))
+
+# Lossless differences, SSSS 0 to 16, the same as table 0 of compliance
+#   data stream O2
+_LL_BITS = [0, 1, 5, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 0]
+_LL_HUFFVAL = list(range(17))
+
+
+def _huffman_codes(bits, huffval):
+    """Return {value : (code, length)} for the Huffman table."""
+    codes = {}
+    code = 0
+    index = 0
+    for length, nr_codes in enumerate(bits, 1):
+        for ii in range(nr_codes):
+            codes[huffval[index]] = (code, length)
+            code += 1
+            index += 1
+
+        code <<= 1
+
+    return codes
+
+
+def _segment(marker, payload):
+    """Return a marker segment as bytes."""
+    length = struct.pack('>H', len(payload) + 2)
+
+    return bytes([0xFF, marker]) + length + payload
+
+
+def encode_baseline(arr, restart_interval=0):
+    """Return `arr` encoded as a Process 1 JPEG.
+
+    A simple encoder using the Annex K luminance tables for every
+    component, intended only for generating benchmark data.
+
+    Parameters
+    ----------
+    arr : numpy.ndarray
+        The uint8 image data to encode, with shape (rows, columns) or
+        (rows, columns, samples). Each component is sampled with H = V = 1
+        and multiple components are interleaved.
+    restart_interval : int, optional
+        If non-zero then insert an RSTn marker every `restart_interval`
+        MCUs.
+
+    Returns
+    -------
+    bytes
+        The encoded JPEG.
+    """
+    if arr.ndim == 2:
+        arr = arr[..., None]
+
+    rows, columns, samples = arr.shape
+    blocks_y, blocks_x = -(-rows // 8), -(-columns // 8)
+
+    # Extend the edges to whole blocks
+    arr = np.pad(
+        arr,
+        ((0, blocks_y * 8 - rows), (0, blocks_x * 8 - columns), (0, 0)),
+        mode='edge'
+    )
+    # (blocks_y * blocks_x, samples, 8, 8)
+    blocks = arr.reshape(blocks_y, 8, blocks_x, 8, samples)
+    blocks = blocks.transpose(0, 2, 4, 1, 3).reshape(-1, samples, 8, 8)
+
+    uu = np.arange(8).reshape(8, 1)
+    xx = np.arange(8).reshape(1, 8)
+    matrix = np.cos((2 * xx + 1) * uu * np.pi / 16) / 2
+    matrix[0, :] /= np.sqrt(2)
+    coefficients = matrix @ (blocks - 128.0) @ matrix.T
+
+    # Quantise and reorder to zigzag
+    zigzag = np.argsort(ZIGZAG)
+    coefficients = coefficients.reshape(-1, samples, 64)[..., zigzag]
+    coefficients = np.rint(coefficients / _QTABLE).astype(np.int32)
+
+    dc_codes = _huffman_codes(_DC_BITS, _DC_HUFFVAL)
+    ac_codes = _huffman_codes(_AC_BITS, _AC_HUFFVAL)
+
+    segments = []
+    data = bytearray()
+    bits, nbits = 0, 0
+    predictions = [0] * samples
+    nr_mcus = len(coefficients)
+    for mcu in range(nr_mcus):
+        for ii, block in enumerate(coefficients[mcu].tolist()):
+            symbols = []
+            diff = block[0] - predictions[ii]
+            predictions[ii] = block[0]
+            size = abs(diff).bit_length()
+            symbols.append(dc_codes[size])
+            if size:
+                symbols.append((diff if diff > 0 else diff - 1, size))
+
+            run = 0
+            for value in block[1:]:
+                if not value:
+                    run += 1
+                    continue
+
+                while run > 15:
+                    symbols.append(ac_codes[0xF0])
+                    run -= 16
+
+                size = abs(value).bit_length()
+                symbols.append(ac_codes[(run << 4) | size])
+                symbols.append((value if value > 0 else value - 1, size))
+                run = 0
+
+            if run:
+                symbols.append(ac_codes[0x00])
+
+            for code, length in symbols:
+                bits = (bits << length) | (code & ((1 << length) - 1))
+                nbits += length
+
+            if nbits >= 32:
+                nr_bytes = nbits // 8
+                nbits -= nr_bytes * 8
+                data += (bits >> nbits).to_bytes(nr_bytes, 'big')
+                bits &= (1 << nbits) - 1
+
+        end_of_interval = (
+            restart_interval and (mcu + 1) % restart_interval == 0
+        )
+        if end_of_interval or mcu == nr_mcus - 1:
+            # Pad to a whole byte with 1s
+            padding = -nbits % 8
+            bits = (bits << padding) | ((1 << padding) - 1)
+            nbits += padding
+            data += bits.to_bytes(nbits // 8, 'big')
+            bits, nbits = 0, 0
+            segments.append(bytes(data).replace(b'\xff', b'\xff\x00'))
+            data = bytearray()
+            predictions = [0] * samples
+
+    out = bytearray(b'\xFF\xD8')
+    out += _segment(0xDB, b'\x00' + bytes(_QTABLE))
+    out += _segment(
+        0xC0,
+        struct.pack('>BHHB', 8, rows, columns, samples)
+        + b''.join(bytes([ii + 1, 0x11, 0]) for ii in range(samples))
+    )
+    out += _segment(0xC4, b'\x00' + bytes(_DC_BITS) + bytes(_DC_HUFFVAL))
+    out += _segment(0xC4, b'\x10' + bytes(_AC_BITS) + bytes(_AC_HUFFVAL))
+    if restart_interval:
+        out += _segment(0xDD, struct.pack('>H', restart_interval))
+
+    out += _segment(
+        0xDA,
+        bytes([samples])
+        + b''.join(bytes([ii + 1, 0x00]) for ii in range(samples))
+        + b'\x00\x3F\x00'
+    )
+    for ii, segment in enumerate(segments):
+        if ii:
+            out += bytes([0xFF, 0xD0 + (ii - 1) % 8])
+
+        out += segment
+
+    out += b'\xFF\xD9'
+
+    return bytes(out)
+
+
+def encode_lossless(arr, predictor=1, precision=8, restart_interval=0):
+    """Return `arr` encoded as a Process 14 JPEG.
+
+    A simple encoder using a single Huffman table for every component,
+    intended only for generating benchmark data.
+
+    Parameters
+    ----------
+    arr : numpy.ndarray
+        The unsigned image data to encode, with shape (rows, columns) or
+        (rows, columns, samples). Each component is sampled with H = V = 1
+        and multiple components are interleaved.
+    predictor : int, optional
+        The predictor selection value, 1 (default) to 7.
+    precision : int, optional
+        The sample precision, 2 to 16, default 8.
+    restart_interval : int, optional
+        If non-zero then insert an RSTn marker every `restart_interval`
+        MCUs.
+
+    Returns
+    -------
+    bytes
+        The encoded JPEG.
+    """
+    if arr.ndim == 2:
+        arr = arr[..., None]
+
+    rows, columns, samples = arr.shape
+    samples_ = arr.astype(np.int64).transpose(2, 0, 1)
+
+    # Table H.1: the prediction for each sample, with the rest of the row
+    #   at the start of the image and of each restart interval predicted
+    #   from the left
+    ra = np.roll(samples_, 1, axis=2)
+    rb = np.roll(samples_, 1, axis=1)
+    rc = np.roll(rb, 1, axis=2)
+    prediction = {
+        1 : ra,
+        2 : rb,
+        3 : rc,
+        4 : ra + rb - rc,
+        5 : ra + ((rb - rc) >> 1),
+        6 : rb + ((ra - rc) >> 1),
+        7 : (ra + rb) >> 1,
+    }[predictor]
+    prediction[..., 0] = rb[..., 0]
+    for start in range(0, rows * columns, restart_interval or rows * columns):
+        row, column = divmod(start, columns)
+        prediction[:, row, column + 1:] = ra[:, row, column + 1:]
+        prediction[:, row, column] = 1 << (precision - 1)
+
+    # H.1.2.1: differences modulo 2**16 in the range -32767 to 32768
+    differences = (samples_ - prediction) & 0xFFFF
+    differences[differences > 32768] -= 65536
+    # Interleave the components
+    differences = differences.transpose(1, 2, 0).ravel().tolist()
+
+    codes = _huffman_codes(_LL_BITS, _LL_HUFFVAL)
+    segments = []
+    data = bytearray()
+    bits, nbits = 0, 0
+    interval = (restart_interval or rows * columns) * samples
+    for start in range(0, len(differences), interval):
+        for diff in differences[start:start + interval]:
+            size = abs(diff).bit_length()
+            code, length = codes[size]
+            bits = (bits << length) | code
+            nbits += length
+            if 0 < size < 16:
+                value = diff if diff > 0 else diff - 1
+                bits = (bits << size) | (value & ((1 << size) - 1))
+                nbits += size
+
+            if nbits >= 32:
+                nr_bytes = nbits // 8
+                nbits -= nr_bytes * 8
+                data += (bits >> nbits).to_bytes(nr_bytes, 'big')
+                bits &= (1 << nbits) - 1
+
+        # Pad to a whole byte with 1s
+        padding = -nbits % 8
+        bits = (bits << padding) | ((1 << padding) - 1)
+        nbits += padding
+        data += bits.to_bytes(nbits // 8, 'big')
+        bits, nbits = 0, 0
+        segments.append(bytes(data).replace(b'\xff', b'\xff\x00'))
+        data = bytearray()
+
+    out = bytearray(b'\xFF\xD8')
+    out += _segment(
+        0xC3,
+        struct.pack('>BHHB', precision, rows, columns, samples)
+        + b''.join(bytes([ii + 1, 0x11, 0]) for ii in range(samples))
+    )
+    out += _segment(0xC4, b'\x00' + bytes(_LL_BITS) + bytes(_LL_HUFFVAL))
+    if restart_interval:
+        out += _segment(0xDD, struct.pack('>H', restart_interval))
+
+    out += _segment(
+        0xDA,
+        bytes([samples])
+        + b''.join(bytes([ii + 1, 0x00]) for ii in range(samples))
+        + bytes([predictor, 0x00, 0x00])
+    )
+    for ii, segment in enumerate(segments):
+        if ii:
+            out += bytes([0xFF, 0xD0 + (ii - 1) % 8])
+
+        out += segment
+
+    out += b'\xFF\xD9'
+
+    return bytes(out)
+
+
+def generate_image(rows, columns, samples=1, seed=0):
+    """Return a smooth uint8 test image with some noise.
+
+    Parameters
+    ----------
+    rows : int
+        The number of rows in the image.
+    columns : int
+        The number of columns in the image.
+    samples : int, optional
+        The number of components.
+    seed : int, optional
+        The seed for the random number generator.
+
+    Returns
+    -------
+    numpy.ndarray
+        The image with shape (rows, columns) if `samples` is 1 or
+        (rows, columns, samples) otherwise.
+    """
+    rng = np.random.RandomState(seed)
+    yy, xx = np.mgrid[:rows, :columns]
+    planes = []
+    for ii in range(samples):
+        plane = (
+            128 + 60 * np.sin(xx / (17.0 + ii)) * np.cos(yy / (23.0 - ii))
+            + rng.normal(0, 4, (rows, columns))
+        )
+        planes.append(plane.clip(0, 255).astype(np.uint8))
+
+    if samples == 1:
+        return planes[0]
+
+    return np.stack(planes, axis=-1)
@@ -0,0 +1,488 @@
+"""Benchmarks for the pydcmjpeg.decoders package."""
+
+from tempfile import NamedTemporaryFile
+from timeit import default_timer
+
+import numpy as np
+
+from pydcmjpeg.cache import ARRAY_CACHE, TABLE_CACHE
+from pydcmjpeg.decoders.colour import upsample_planes, ycbcr_to_rgb
+from pydcmjpeg.decoders.jpeg_decoders import (
+    _decode_coefficients, _decode_planes, _get_huffman_table,
+    _get_quantisation_table, _idct_blocks
+)
+from pydcmjpeg.decoders.progressive import _decode_progressive_coefficients
+from pydcmjpeg.fileio import jpgmap, jpgparse, jpgread
+
+from ._common import (
+    COMPLIANCE_10918, IMAGES_10918, encode_baseline, encode_lossless,
+    generate_image, generate_jpeg, read_file, write_large_jpeg
+)
+
+
+# The files used for the end-to-end decoding benchmarks, by process
+DECODE_FILES = {
+    'p01_A1' : COMPLIANCE_10918['p01_A1'],
+    'p01_rgb' : IMAGES_10918['p01_rgb'],
+    'p01_422' : IMAGES_10918['p01_422'],
+    'p02_C1' : COMPLIANCE_10918['p02_C1'],
+    'p02_rgb' : IMAGES_10918['p02_rgb'],
+    'p03_422' : IMAGES_10918['p03_422'],
+    'p04_E1' : COMPLIANCE_10918['p04_E1'],
+    'p04_grey' : IMAGES_10918['p04_grey'],
+    'p10_422' : IMAGES_10918['p10_422'],
+    'p11_422' : IMAGES_10918['p11_422'],
+    'p14_O1' : COMPLIANCE_10918['p14_O1'],
+    'p14_sv1_rgb' : IMAGES_10918['p14_sv1_rgb'],
+    'p15_O1' : IMAGES_10918['p15_O1'],
+}
+
+
+def _best_time(func, repeat=3):
+    """Return the shortest time taken to run `func` in seconds."""
+    times = []
+    for ii in range(repeat):
+        start = default_timer()
+        func()
+        times.append(default_timer() - start)
+
+    return min(times)
+
+
+def _scan_length(jpg):
+    """Return the total length of the entropy-coded data in `jpg`."""
+    length = 0
+    for key in jpg.get_keys('SOS'):
+        scan = jpg.info[key][2]
+        length += sum(len(scan[kk]) for kk in scan if kk.startswith('ENC'))
+
+    return length
+
+
+class TimeIDCT(object):
+    """Time the dequantisation and IDCT of blocks of coefficients.
+
+    4096 blocks is a 512 x 512 greyscale image.
+    """
+    params = [4096, 65536]
+    param_names = ['nr_blocks']
+
+    def setup(self, nr_blocks):
+        rng = np.random.RandomState(0)
+        self.coefficients = rng.randint(
+            -64, 64, size=(nr_blocks, 64)
+        ).astype(np.int16)
+        self.qtable = np.arange(1, 65, dtype=np.float32)
+
+    def time_idct(self, nr_blocks):
+        """Time _idct_blocks()."""
+        _idct_blocks(self.coefficients, self.qtable, 8)
+
+    def track_blocks_per_second(self, nr_blocks):
+        """Track the IDCT throughput."""
+        elapsed = _best_time(
+            lambda: _idct_blocks(self.coefficients, self.qtable, 8)
+        )
+
+        return nr_blocks / elapsed
+
+    track_blocks_per_second.unit = 'blocks/s'
+
+
+class TimeDecodeProcess1(object):
+    """Time decoding the process 1 compliance data."""
+    params = ['p01_A1']
+    param_names = ['fname']
+
+    def setup(self, fname):
+        self.jpg = jpgread(COMPLIANCE_10918[fname])
+
+    def time_entropy_decode(self, fname):
+        """Time decoding the quantised coefficients."""
+        _decode_coefficients(self.jpg)
+
+    def time_decode(self, fname):
+        """Time decoding the component samples."""
+        _decode_planes(self.jpg)
+
+
+class TimeDecodeProgressive(object):
+    """Time decoding a progressive JPEG.
+
+    The 480 x 640 4:2:2 image has 10 scans using spectral selection and
+    successive approximation, with Huffman (p10) or arithmetic (p11)
+    coding.
+    """
+    params = ['p10_422', 'p11_422']
+    param_names = ['fname']
+
+    def setup(self, fname):
+        self.jpg = jpgread(IMAGES_10918[fname])
+
+    def time_entropy_decode(self, fname):
+        """Time decoding the quantised coefficients of every scan."""
+        _decode_progressive_coefficients(self.jpg)
+
+    def peakmem_entropy_decode(self, fname):
+        """Peak memory of decoding the quantised coefficients."""
+        _decode_progressive_coefficients(self.jpg)
+
+    def time_iter_progressive(self, fname):
+        """Time decoding an image after every scan."""
+        for arr in self.jpg.iter_progressive(as_rgb=True):
+            pass
+
+    def time_iter_progressive_preview(self, fname):
+        """Time decoding a 1/8 scale preview after every scan."""
+        for arr in self.jpg.iter_progressive(as_rgb=True, scale=0.125):
+            pass
+
+
+class TimeDecodeWorkers(object):
+    """Time decoding restart intervals in parallel.
+
+    The image is 2048 x 2048 greyscale with a restart interval every MCU
+    row. The process pool is started by the first decode and then reused,
+    so only the first repeat includes the cost of starting it.
+    """
+    params = [None, 2, 4, 8]
+    param_names = ['workers']
+    timeout = 120
+
+    def setup(self, workers):
+        arr = generate_image(2048, 2048)
+        self.tfile = NamedTemporaryFile(suffix='.jpg')
+        self.tfile.write(encode_baseline(arr, restart_interval=256))
+        self.tfile.flush()
+        self.jpg = jpgread(self.tfile.name)
+
+    def teardown(self, workers):
+        self.tfile.close()
+
+    def time_decode(self, workers):
+        """Time JPEG.decode()."""
+        # The decoded image is cached independently of `workers`
+        self.jpg.clear_cache()
+        self.jpg.decode(workers=workers)
+
+
+class TimeEntropyDecode(object):
+    """Time Huffman decoding the entropy-coded data of generated images.
+
+    The images are 1024 x 1024 with either 1 or 3 components.
+    """
+    params = [1, 3]
+    param_names = ['samples']
+    timeout = 120
+
+    def setup(self, samples):
+        # The raw data is decoded, so destuffing is included in the time
+        self.jpg = jpgparse(generate_jpeg(1024, samples), copy=False)
+        self.length = _scan_length(self.jpg)
+
+    def time_entropy_decode(self, samples):
+        """Time decoding the quantised coefficients."""
+        _decode_coefficients(self.jpg)
+
+    def track_mb_per_second(self, samples):
+        """Track the entropy decoding throughput."""
+        elapsed = _best_time(lambda: _decode_coefficients(self.jpg))
+
+        return self.length / elapsed / 1e6
+
+    track_mb_per_second.unit = 'MB/s'
+
+
+class TimeDecode(object):
+    """Time decoding the compliance and image files of each process.
+
+    Files that can't be decoded yet are skipped.
+    """
+    params = sorted(DECODE_FILES)
+    param_names = ['fname']
+    timeout = 120
+
+    def setup(self, fname):
+        self.data = read_file(DECODE_FILES[fname])
+        try:
+            jpgparse(self.data).decode()
+        except NotImplementedError:
+            # Skip the benchmark
+            raise NotImplementedError(
+                "Decoding {} isn't supported".format(fname)
+            )
+
+    def time_decode(self, fname):
+        """Time parsing and decoding the file."""
+        jpgparse(self.data, copy=False).decode()
+
+
+class TimeDecodeGenerated(object):
+    """Time decoding generated Process 1 images.
+
+    The images are generated once and are either greyscale or 3 component,
+    1024 x 1024 or 4096 x 4096.
+    """
+    params = ([1024, 4096], [1, 3])
+    param_names = ['size', 'samples']
+    timeout = 600
+
+    def setup_cache(self):
+        return {
+            (size, samples) : generate_jpeg(size, samples)
+            for size in self.params[0] for samples in self.params[1]
+        }
+
+    def time_decode(self, frames, size, samples):
+        """Time parsing and decoding the image."""
+        jpgparse(frames[(size, samples)], copy=False).decode()
+
+    def peakmem_decode(self, frames, size, samples):
+        """Track the peak memory used when decoding the image."""
+        jpgparse(frames[(size, samples)], copy=False).decode()
+
+
+class TimeDecodeCached(object):
+    """Time repeatedly decoding the same 1024 x 1024 frame.
+
+    As when scrubbing through a series in a viewer, each decode uses a new
+    JPEG object parsed from the frame, with the process-wide array cache
+    either disabled or enabled.
+    """
+    params = [0, 64 * 1024**2]
+    param_names = ['cache_size']
+
+    def setup(self, cache_size):
+        self.frame = generate_jpeg(1024, 3)
+        ARRAY_CACHE.resize(cache_size)
+        jpgparse(self.frame, copy=False).decode()
+
+    def teardown(self, cache_size):
+        ARRAY_CACHE.clear()
+        ARRAY_CACHE.resize(0)
+
+    def time_decode(self, cache_size):
+        """Time parsing and decoding the frame."""
+        jpgparse(self.frame, copy=False).decode()
+
+
+class TimeDecodeOut(object):
+    """Time decoding a 1024 x 1024 RGB frame into a slice of a volume."""
+    params = [False, True]
+    param_names = ['planar']
+
+    def setup(self, planar):
+        self.frame = generate_jpeg(1024, 3)
+        shape = (3, 1024, 1024) if planar else (1024, 1024, 3)
+        self.volume = np.empty((4, ) + shape, dtype=np.uint8)
+
+    def time_decode(self, planar):
+        """Time decoding to a new array."""
+        jpgparse(self.frame, copy=False).decode(planar=planar)
+
+    def time_decode_out(self, planar):
+        """Time decoding to the volume."""
+        jpgparse(self.frame, copy=False).decode(
+            planar=planar, out=self.volume[1]
+        )
+
+    def peakmem_decode_out(self, planar):
+        """Track the peak memory used when decoding to the volume."""
+        jpgparse(self.frame, copy=False).decode(
+            planar=planar, out=self.volume[1]
+        )
+
+
+class TimeDecodeScaled(object):
+    """Time decoding a 2048 x 2048 RGB frame at reduced sizes.
+
+    For comparison with ``time_decode_resize``, which decodes at full size
+    then averages each `1 / scale` x `1 / scale` block of samples.
+    """
+    params = [1, 1 / 2, 1 / 4, 1 / 8]
+    param_names = ['scale']
+    timeout = 120
+
+    def setup(self, scale):
+        self.frame = generate_jpeg(2048, 3)
+
+    def time_decode(self, scale):
+        """Time decoding at the reduced size."""
+        jpgparse(self.frame, copy=False).decode(scale=scale)
+
+    def time_decode_resize(self, scale):
+        """Time decoding at full size then resizing."""
+        arr = jpgparse(self.frame, copy=False).decode()
+        nn = int(1 / scale)
+        arr.reshape(2048 // nn, nn, 2048 // nn, nn, 3).mean(axis=(1, 3))
+
+
+class TimeDecodeRegion(object):
+    """Time decoding a 256 x 256 region of a 2048 x 2048 RGB frame.
+
+    The frame either has no restart intervals or one every MCU row.
+    """
+    params = ([0, 256], [False, True])
+    param_names = ['restart_interval', 'region']
+    timeout = 120
+
+    def setup(self, restart_interval, region):
+        self.frame = encode_baseline(
+            generate_image(2048, 2048, samples=3), restart_interval
+        )
+        self.region = (896, 896, 256, 256) if region else None
+
+    def time_decode(self, restart_interval, region):
+        """Time decoding the region or the whole image."""
+        jpgparse(self.frame, copy=False).decode(region=self.region)
+
+
+class TimeDecodeLossless(object):
+    """Time decoding a 512 x 512 16-bit greyscale lossless frame.
+
+    The frame is a CT sized slice with 12 bits of content, either without
+    restart intervals, with one every 8 rows or with one every 1000 MCUs,
+    so most intervals start part way along a row. ``track_decode_target``
+    fails if decoding takes longer than the target of 100 ms needed to
+    scroll through a CT series interactively.
+    """
+    params = ([1, 2, 3, 4, 5, 6, 7], [0, 4096, 1000])
+    param_names = ['predictor', 'restart_interval']
+    # The target decoding time in seconds
+    target = 0.1
+
+    def setup(self, predictor, restart_interval):
+        arr = generate_image(512, 512).astype(np.uint16) << 4
+        self.frame = encode_lossless(
+            arr, predictor, precision=16, restart_interval=restart_interval
+        )
+
+    def time_decode(self, predictor, restart_interval):
+        """Time JPEG.decode()."""
+        jpgparse(self.frame, copy=False).decode()
+
+    def track_decode_target(self, predictor, restart_interval):
+        """Track the best decoding time, failing if it misses the target."""
+        elapsed = _best_time(
+            lambda: jpgparse(self.frame, copy=False).decode()
+        )
+        if elapsed > self.target:
+            raise AssertionError(
+                "Decoding took {:.0f} ms, the target is {:.0f} ms".format(
+                    elapsed * 1000, self.target * 1000
+                )
+            )
+
+        return elapsed * 1000
+
+    track_decode_target.unit = 'ms'
+
+
+class TimeIterRows(object):
+    """Time decoding a large greyscale image in bands of MCU rows.
+
+    For comparison with ``peakmem_decode``, which decodes the whole image
+    at once. The images are memory mapped and have a restart interval
+    every MCU row.
+    """
+    params = [4096]
+    param_names = ['size']
+    timeout = 300
+
+    def setup(self, size):
+        self.tfile = write_large_jpeg(size, size)
+
+    def teardown(self, size):
+        self.tfile.close()
+
+    def time_iter_rows(self, size):
+        """Time decoding the image in bands of 8 MCU rows."""
+        for arr in jpgmap(self.tfile.name).iter_rows(band=8):
+            pass
+
+    def peakmem_iter_rows(self, size):
+        """Track the peak memory used when decoding in bands."""
+        for arr in jpgmap(self.tfile.name).iter_rows(band=8):
+            pass
+
+    def peakmem_decode(self, size):
+        """Track the peak memory used when decoding the whole image."""
+        jpgmap(self.tfile.name).decode()
+
+
+class TimeIterRowsLarge(object):
+    """Track the peak memory used when decoding a 30000 x 30000 image.
+
+    The decoded image would be 900 MB, but decoding in bands only keeps a
+    few MCU rows in memory at a time.
+    """
+    timeout = 1200
+
+    def setup(self):
+        self.tfile = write_large_jpeg(30000, 30000)
+
+    def teardown(self):
+        self.tfile.close()
+
+    def peakmem_iter_rows(self):
+        """Track the peak memory used when decoding in bands."""
+        for arr in jpgmap(self.tfile.name).iter_rows(band=8):
+            pass
+
+
+class TimeTables(object):
+    """Time getting the decoding tables for a frame.
+
+    Either the tables are built for every frame or they're reused from the
+    process-wide table cache.
+    """
+    params = [False, True]
+    param_names = ['cached']
+
+    def setup(self, cached):
+        jpg = jpgread(IMAGES_10918['p01_rgb'])
+        self.segments = [
+            jpg.info[key][2] for key in jpg._keys
+            if key.split('@')[0] in ('DHT', 'DQT')
+        ]
+        TABLE_CACHE.clear()
+
+    def time_get_tables(self, cached):
+        """Time getting the Huffman and quantisation tables."""
+        tables = TABLE_CACHE if cached else {}
+        for info in self.segments:
+            if 'Qk' in info:
+                for qk in info['Qk']:
+                    _get_quantisation_table(qk, tables)
+            else:
+                for li, vij in zip(info['Li'], info['Vij']):
+                    _get_huffman_table(li, vij, tables)
+
+
+class TimeColour(object):
+    """Time upsampling and converting the planes of a 2048 x 2048 image.
+
+    The chroma planes are subsampled as either 4:2:2 (h2v1) or 4:2:0 (h2v2).
+    """
+    params = (['422', '420'], ['fancy', 'nearest'])
+    param_names = ['subsampling', 'method']
+
+    def setup(self, subsampling, method):
+        vi = 2 if subsampling == '420' else 1
+        self.frame = {
+            'X' : 2048, 'Y' : 2048, 'Hi' : [2, 1, 1], 'Vi' : [vi, 1, 1]
+        }
+        rng = np.random.RandomState(0)
+        self.planes = [
+            rng.randint(0, 256, size=shape).astype(np.uint8)
+            for shape in [(2048, 2048)] + [(2048 // vi, 1024)] * 2
+        ]
+        self.upsampled = upsample_planes(self.planes, self.frame, method)
+
+    def time_upsample(self, subsampling, method):
+        """Time upsampling the chroma planes."""
+        upsample_planes(self.planes, self.frame, method)
+
+    def time_ycbcr_to_rgb(self, subsampling, method):
+        """Time converting the full size planes from YCbCr to RGB."""
+        ycbcr_to_rgb(self.upsampled)
@@ -0,0 +1,249 @@
+"""Benchmarks for the pydcmjpeg.fileio module."""
+
+import io
+import os
+from tempfile import TemporaryDirectory
+
+import numpy as np
+
+from pydcmjpeg.fileio import (
+    decode_frames, jpgread, parse_buffer, parse_jpg, _find_scan_end,
+    _split_scan
+)
+
+from ._common import (
+    COMPLIANCE_10918, COMPLIANCE_14495, COMPLIANCE_15444, IMAGES_10918,
+    IMAGES_14495, IMAGES_15444, encode_baseline, generate_image,
+    generate_jpeg, read_file, write_synthetic_scan
+)
+
+
+# The files used for parsing benchmarks, as {'standard_name' : fpath}
+PARSE_FILES = {}
+for _prefix, _files in [
+    ('10918', COMPLIANCE_10918), ('10918', IMAGES_10918),
+    ('14495', COMPLIANCE_14495), ('14495', IMAGES_14495),
+    ('15444', COMPLIANCE_15444), ('15444', IMAGES_15444),
+]:
+    PARSE_FILES.update(
+        {'{}_{}'.format(_prefix, kk) : vv for kk, vv in _files.items()}
+    )
+
+
+def _legacy_read_scan(fp):
+    """Return the entropy-coded data using the original byte-wise loop.
+
+    Kept as a reference for the bulk scanner in ``fileio._find_scan_end()``.
+    """
+    entries = []
+    encoded_data = bytearray()
+    _enc_start = fp.tell()
+    while True:
+        prev_byte = fp.read(1)
+        if prev_byte != b'\xFF':
+            encoded_data.extend(prev_byte)
+            continue
+
+        next_byte = fp.read(1)
+        if next_byte == b'\x00':
+            encoded_data.extend(prev_byte)
+            continue
+
+        entries.append(('ENC@{}'.format(_enc_start - 2), encoded_data))
+        encoded_data = bytearray()
+
+        _fill_bytes = 0
+        while next_byte == b'\xFF':
+            _fill_bytes += 1
+            next_byte = fp.read(1)
+
+        if next_byte in [b'\xD0', b'\xD1', b'\xD2', b'\xD3',
+                         b'\xD4', b'\xD5', b'\xD6', b'\xD7']:
+            entries.append(
+                ('RST{}@{}'.format(next_byte[0] - 0xD0, fp.tell() - 2), None)
+            )
+            _enc_start = fp.tell()
+            continue
+
+        fp.seek(-2 - _fill_bytes, 1)
+        break
+
+    return entries
+
+
+def _read_scan(fp):
+    """Return the entropy-coded data using the bulk scanner."""
+    offset = fp.tell()
+    data = fp.read()
+    end, restarts, _ = _find_scan_end(data, 0)
+    fp.seek(offset + end)
+
+    return _split_scan(data, 0, end, restarts, offset)
+
+
+def _scan_offsets(fpath):
+    """Return the offsets of the entropy-coded data of each scan in `fpath`."""
+    with open(fpath, 'rb') as fp:
+        info = parse_jpg(fp)
+
+    offsets = []
+    for key in info:
+        if key.startswith('SOS'):
+            enc_keys = [kk for kk in info[key][2] if kk.startswith('ENC')]
+            offsets.append(int(enc_keys[0].split('@')[1]) + 2)
+
+    return offsets
+
+
+class TimeParse(object):
+    """Time parsing the compliance and image files."""
+    params = (sorted(PARSE_FILES), ['buffer', 'jpgread'])
+    param_names = ['fname', 'method']
+
+    def setup(self, fname, method):
+        self.fpath = PARSE_FILES[fname]
+        self.data = read_file(self.fpath)
+
+    def time_parse(self, fname, method):
+        """Time parsing the file."""
+        if method == 'buffer':
+            parse_buffer(self.data, copy=False)
+        else:
+            jpgread(self.fpath)
+
+    def time_parse_headers(self, fname, method):
+        """Time parsing the file's headers."""
+        if method == 'buffer':
+            parse_buffer(self.data, copy=False, headers_only=True)
+        else:
+            jpgread(self.fpath, headers_only=True)
+
+
+class TimeParseGenerated(object):
+    """Time parsing generated 4096 x 4096 greyscale images.
+
+    The images are generated once and have either no restart intervals or
+    an interval every MCU row.
+    """
+    params = ([0, 512], [True, False])
+    param_names = ['restart', 'copy']
+    timeout = 300
+
+    def setup_cache(self):
+        return {
+            restart : generate_jpeg(4096, restart_interval=restart)
+            for restart in self.params[0]
+        }
+
+    def time_parse(self, frames, restart, copy):
+        """Time parse_buffer()."""
+        parse_buffer(frames[restart], copy=copy)
+
+    def time_parse_headers(self, frames, restart, copy):
+        """Time parse_buffer() when only parsing the headers."""
+        parse_buffer(frames[restart], copy=copy, headers_only=True)
+
+
+class TimeReadScanCompliance(object):
+    """Time reading the scan data of the 10918 compliance files."""
+    params = (sorted(COMPLIANCE_10918), ['bulk', 'legacy'])
+    param_names = ['fname', 'method']
+
+    def setup(self, fname, method):
+        with open(COMPLIANCE_10918[fname], 'rb') as fp:
+            self.data = fp.read()
+
+        self.offsets = _scan_offsets(COMPLIANCE_10918[fname])
+        self.func = _read_scan if method == 'bulk' else _legacy_read_scan
+
+    def time_read_scans(self, fname, method):
+        """Time reading the scan data."""
+        fp = io.BytesIO(self.data)
+        for offset in self.offsets:
+            fp.seek(offset)
+            self.func(fp)
+
+
+class TimeReadScanSynthetic(object):
+    """Time reading the scan data of a 50 MB synthetic image."""
+    params = (['bulk', 'legacy'], [None, 4096])
+    param_names = ['method', 'restart']
+    timeout = 600
+
+    def setup(self, method, restart):
+        self.tfile = write_synthetic_scan(50 * 1024 * 1024, restart)
+        self.func = _read_scan if method == 'bulk' else _legacy_read_scan
+
+    def teardown(self, method, restart):
+        self.tfile.close()
+
+    def time_read_scan(self, method, restart):
+        """Time reading the scan data."""
+        with open(self.tfile.name, 'rb') as fp:
+            # Skip SOI and the SOS marker segment
+            fp.seek(12)
+            self.func(fp)
+
+
+class TimeParseFrame(object):
+    """Time parsing a single in-memory frame.
+
+    Compares parsing the frame directly with parse_buffer() against
+    wrapping it in a BytesIO for parse_jpg().
+    """
+    params = (['p01_A1', 'synthetic'], ['buffer', 'bytesio'])
+    param_names = ['frame', 'method']
+
+    def setup(self, frame, method):
+        if frame == 'synthetic':
+            # 512 x 512 RGB with a restart interval every MCU row
+            arr = generate_image(512, 512, samples=3)
+            self.frame = encode_baseline(arr, restart_interval=64)
+        else:
+            with open(COMPLIANCE_10918[frame], 'rb') as fp:
+                self.frame = fp.read()
+
+    def time_parse(self, frame, method):
+        """Time parsing the frame."""
+        if method == 'buffer':
+            parse_buffer(self.frame, copy=False)
+        else:
+            parse_jpg(io.BytesIO(self.frame))
+
+
+class TimeDecodeFrames(object):
+    """Time decoding a series of 256 x 256 greyscale frames.
+
+    Compares decode_frames() with reading each frame from file and stacking
+    the decoded arrays.
+    """
+    params = [10, 50]
+    param_names = ['nr_frames']
+    timeout = 300
+
+    def setup(self, nr_frames):
+        self.frames = [
+            encode_baseline(generate_image(256, 256, seed=ii))
+            for ii in range(nr_frames)
+        ]
+        self.tdir = TemporaryDirectory()
+        self.fpaths = []
+        for ii, frame in enumerate(self.frames):
+            fpath = os.path.join(self.tdir.name, '{}.jpg'.format(ii))
+            with open(fpath, 'wb') as f:
+                f.write(frame)
+
+            self.fpaths.append(fpath)
+
+        self.out = np.empty((nr_frames, 256, 256), dtype='uint8')
+
+    def teardown(self, nr_frames):
+        self.tdir.cleanup()
+
+    def time_decode_frames(self, nr_frames):
+        """Time decode_frames() with a preallocated output."""
+        decode_frames(self.frames, out=self.out)
+
+    def time_jpgread_stack(self, nr_frames):
+        """Time jpgread() then decode each frame and stack the results."""
+        np.stack([jpgread(fpath).decode() for fpath in self.fpaths])
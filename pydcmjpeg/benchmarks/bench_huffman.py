@@ -0,0 +1,66 @@
+"""Benchmarks for the pydcmjpeg.huffman module."""
+
+import random
+
+from pydcmjpeg.huffman import BitReader, HuffmanTable
+
+
+# Table K.5: luminance AC coefficients
+AC_BITS = [0, 2, 1, 3, 3, 2, 4, 3, 5, 5, 4, 4, 0, 0, 1, 125]
+AC_HUFFVAL = bytes.fromhex(
+    '01020300041105122131410613516107227114328191a1082342b1c11552d1f0'
+    '2433627282090a161718191a25262728292a3435363738393a43444546474849'
+    '4a535455565758595a636465666768696a737475767778797a83848586878889'
+    '8a92939495969798999aa2a3a4a5a6a7a8a9aab2b3b4b5b6b7b8b9bac2c3c4c5'
+    'c6c7c8c9cad2d3d4d5d6d7d8d9dae1e2e3e4e5e6e7e8e9eaf1f2f3f4f5f6f7f8'
+    'f9fa'
+)
+
+
+def _split_huffval(bits, huffval):
+    """Return `huffval` split into the DHT Vij list."""
+    vij = []
+    start = 0
+    for nr_codes in bits:
+        vij.append(tuple(huffval[start:start + nr_codes]) or None)
+        start += nr_codes
+
+    return vij
+
+
+def _encode(table, nr_symbols, seed=0):
+    """Return bytes of `nr_symbols` random codes from `table`."""
+    rng = random.Random(seed)
+    # Weight the symbols towards the shorter codes, as in real data
+    weights = [2.0 ** -size for size in table.huffsize]
+    symbols = rng.choices(range(len(table.huffval)), weights, k=nr_symbols)
+    codes = ''.join(
+        format(table.huffcode[ii], '0{}b'.format(table.huffsize[ii]))
+        for ii in symbols
+    )
+    codes += '1' * (-len(codes) % 8)
+
+    return int(codes, 2).to_bytes(len(codes) // 8, 'big')
+
+
+class TimeHuffmanDecode(object):
+    """Time decoding Huffman coded symbols with the Table K.5 codes."""
+    params = [10000, 100000]
+    param_names = ['nr_symbols']
+
+    def setup(self, nr_symbols):
+        self.table = HuffmanTable(
+            AC_BITS, _split_huffval(AC_BITS, AC_HUFFVAL)
+        )
+        self.data = _encode(self.table, nr_symbols)
+
+    def time_decode(self, nr_symbols):
+        """Time BitReader.decode()."""
+        decode = BitReader(self.data).decode
+        table = self.table
+        for ii in range(nr_symbols):
+            decode(table)
+
+    def time_build_table(self, nr_symbols):
+        """Time creating the HuffmanTable."""
+        HuffmanTable(AC_BITS, _split_huffval(AC_BITS, AC_HUFFVAL))
@@ -0,0 +1,43 @@
+"""Benchmarks for the pydcmjpeg.jpeg module."""
+
+from pydcmjpeg.fileio import jpgread
+
+from ._common import COMPLIANCE_10918
+
+
+class TimeJPEGProperties(object):
+    """Time accessing the JPEG properties.
+
+    The per-property cost should be independent of the number of markers,
+    p01_A1 has 9 markers while p01_B2 has 263.
+    """
+    params = ['p01_A1', 'p01_B2', 'p14_O2']
+    param_names = ['fname']
+
+    def setup(self, fname):
+        self.jpg = jpgread(COMPLIANCE_10918[fname])
+
+    def time_columns(self, fname):
+        """Time JPEG.columns."""
+        for ii in range(1000):
+            self.jpg.columns
+
+    def time_samples(self, fname):
+        """Time JPEG.samples."""
+        for ii in range(1000):
+            self.jpg.samples
+
+    def time_is_process1(self, fname):
+        """Time JPEG.is_process1."""
+        for ii in range(1000):
+            self.jpg.is_process1
+
+    def time_uid(self, fname):
+        """Time JPEG.uid."""
+        for ii in range(1000):
+            self.jpg.uid
+
+    def time_get_keys(self, fname):
+        """Time JPEG.get_keys()."""
+        for ii in range(1000):
+            self.jpg.get_keys('SOF')
@@ -0,0 +1,77 @@
+"""Benchmarks for the pydcmjpeg.readers module."""
+
+from pydcmjpeg._markers import MARKERS
+from pydcmjpeg.fileio import parse_buffer
+
+from ._common import (
+    COMPLIANCE_10918, COMPLIANCE_14495, COMPLIANCE_15444, IMAGES_10918,
+    read_file
+)
+
+
+# The file to take the first segment of each marker from
+SEGMENTS = {
+    'APP0' : IMAGES_10918['p01_rgb'],
+    'COM' : COMPLIANCE_10918['p01_A1'],
+    'DHT' : COMPLIANCE_10918['p01_A1'],
+    'DQT' : COMPLIANCE_10918['p01_A1'],
+    'DQT16' : COMPLIANCE_10918['p04_E1'],
+    'DRI' : COMPLIANCE_10918['p01_A1'],
+    'SOF0' : COMPLIANCE_10918['p01_A1'],
+    'SOS' : COMPLIANCE_10918['p01_A1'],
+    'SOF55' : COMPLIANCE_14495['T8C1E0'],
+    'LSE' : COMPLIANCE_14495['T8NDE3'],
+    'SIZ' : COMPLIANCE_15444['p0_01'],
+    'COD' : COMPLIANCE_15444['p0_01'],
+    'QCD' : COMPLIANCE_15444['p0_01'],
+    'SOT' : COMPLIANCE_15444['p0_01'],
+}
+
+
+def _get_segment(fpath, name):
+    """Return the reader and data for the first `name` segment in `fpath`.
+
+    Parameters
+    ----------
+    fpath : str
+        The path to the JPEG file.
+    name : str
+        The name of the marker, or 'DQT16' for a DQT segment with 16-bit
+        table elements.
+
+    Returns
+    -------
+    callable, memoryview
+        The marker's reader and the segment data, starting at the length
+        parameter.
+    """
+    buf = memoryview(read_file(fpath))
+    info = parse_buffer(buf, copy=False)
+    for key, (marker, fill, segment) in info.items():
+        if key.split('@')[0] != name[:3 if name == 'DQT16' else None]:
+            continue
+
+        if name == 'DQT16' and 1 not in segment['Pq']:
+            continue
+
+        offset = int(key.split('@')[1]) + 2
+        length = (buf[offset] << 8) | buf[offset + 1]
+
+        return MARKERS[marker][2], buf[offset:offset + length]
+
+    raise ValueError("No {} marker found in {}".format(name, fpath))
+
+
+class TimeReaders(object):
+    """Time reading a single marker segment with each reader."""
+    params = sorted(SEGMENTS)
+    param_names = ['marker']
+
+    def setup(self, marker):
+        self.reader, self.data = _get_segment(SEGMENTS[marker], marker)
+        # LSE also takes the parsed JPEG
+        self.args = ({}, ) if marker == 'LSE' else ()
+
+    def time_read(self, marker):
+        """Time the reader."""
+        self.reader(self.data, *self.args)
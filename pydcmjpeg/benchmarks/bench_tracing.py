@@ -0,0 +1,55 @@
+"""Benchmarks for the pydcmjpeg.tracing module."""
+
+import logging
+
+from pydcmjpeg import tracing
+from pydcmjpeg.fileio import jpgparse, parse_buffer
+
+from ._common import COMPLIANCE_10918, encode_baseline, generate_image
+
+
+def _null_hook(event, fields):
+    """A trace hook that discards the events."""
+    pass
+
+
+class TimeTrace(object):
+    """Time parsing and decoding with tracing disabled and enabled.
+
+    With tracing disabled the times should be the same as before tracing
+    was added. 'hook' is the cost of creating the events and 'logging' the
+    cost of logging them to a handler that discards the records.
+    """
+    params = ['disabled', 'hook', 'logging']
+    param_names = ['trace']
+
+    def setup(self, trace):
+        with open(COMPLIANCE_10918['p01_A1'], 'rb') as fp:
+            self.frame = fp.read()
+
+        # 512 x 512 RGB with a restart interval every MCU row
+        self.rgb = encode_baseline(
+            generate_image(512, 512, samples=3), restart_interval=64
+        )
+
+        self.handler = logging.NullHandler()
+        self.level = tracing.LOGGER.level
+        if trace == 'hook':
+            tracing.enable_trace(_null_hook)
+        elif trace == 'logging':
+            tracing.LOGGER.addHandler(self.handler)
+            tracing.LOGGER.setLevel(logging.DEBUG)
+            tracing.enable_trace()
+
+    def teardown(self, trace):
+        tracing.disable_trace()
+        tracing.LOGGER.removeHandler(self.handler)
+        tracing.LOGGER.setLevel(self.level)
+
+    def time_parse(self, trace):
+        """Time parsing a frame."""
+        parse_buffer(self.frame, copy=False)
+
+    def time_decode(self, trace):
+        """Time parsing and decoding a 512 x 512 RGB frame."""
+        jpgparse(self.rgb, copy=False).decode()
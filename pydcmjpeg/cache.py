@@ -0,0 +1,138 @@
+"""Process-wide caches shared between JPEG objects.
+
+ARRAY_CACHE
+    The decoded image data, keyed by the JPEG's source and the decoding
+    parameters and bounded by the total number of bytes of the cached
+    arrays. Disabled by default, enable it by setting its size, e.g.
+    ``ARRAY_CACHE.resize(512 * 1024**2)``. Intended for callers that
+    repeatedly decode the same frames, such as a viewer scrubbing through
+    a series.
+TABLE_CACHE
+    The Huffman and quantisation tables built for decoding, keyed by the
+    contents of the DHT and DQT segments they were built from and bounded
+    by the number of tables. Used by default so tables are only built once
+    for images with identical DHT and DQT segments, such as the frames of
+    a multi-frame series.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+
+
+# Sentinel for values that aren't in the cache
+_MISSING = object()
+
+
+class LRUCache(object):
+    """A thread-safe least recently used cache.
+
+    The size of the cache is the sum of the sizes of its values, when the
+    size exceeds `maxsize` the least recently used items are discarded.
+    """
+    def __init__(self, maxsize, getsize=None):
+        """Initialise a new cache.
+
+        Parameters
+        ----------
+        maxsize : int
+            The maximum size of the cache, 0 to disable the cache.
+        getsize : callable, optional
+            The function used to return the size of a value, as
+            ``getsize(value)``. If not used then each value has a size of 1
+            and `maxsize` is the maximum number of items.
+        """
+        self._getsize = getsize or (lambda value: 1)
+        self._items = OrderedDict()
+        self._lock = Lock()
+        self.maxsize = maxsize
+        self.size = 0
+
+    def __contains__(self, key):
+        """Return True if `key` is in the cache."""
+        with self._lock:
+            return key in self._items
+
+    def __getitem__(self, key):
+        """Return the value for `key`.
+
+        Raises
+        ------
+        KeyError
+            If `key` isn't in the cache.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+
+        return value
+
+    def __len__(self):
+        """Return the number of items in the cache."""
+        with self._lock:
+            return len(self._items)
+
+    def clear(self):
+        """Remove all the items from the cache."""
+        with self._lock:
+            self._items.clear()
+            self.size = 0
+
+    def _evict(self):
+        """Discard least recently used items until the cache fits."""
+        items = self._items
+        while items and self.size > self.maxsize:
+            _, (_, size) = items.popitem(last=False)
+            self.size -= size
+
+    def get(self, key, default=None):
+        """Return the value for `key`, or `default` if not in the cache."""
+        with self._lock:
+            try:
+                value, _ = self._items[key]
+            except KeyError:
+                return default
+
+            self._items.move_to_end(key)
+
+        return value
+
+    def pop(self, key, default=None):
+        """Remove `key` and return its value, or `default` if not found."""
+        with self._lock:
+            try:
+                value, size = self._items.pop(key)
+            except KeyError:
+                return default
+
+            self.size -= size
+
+        return value
+
+    def put(self, key, value):
+        """Add `value` to the cache as `key`.
+
+        Values larger than the maximum size of the cache aren't added.
+        """
+        size = self._getsize(value)
+        with self._lock:
+            if size > self.maxsize:
+                return
+
+            if key in self._items:
+                self.size -= self._items.pop(key)[1]
+
+            self._items[key] = (value, size)
+            self.size += size
+            self._evict()
+
+    __setitem__ = put
+
+    def resize(self, maxsize):
+        """Set the maximum size of the cache, 0 to disable the cache."""
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+
+ARRAY_CACHE = LRUCache(0, getsize=lambda arr: arr.nbytes)
+TABLE_CACHE = LRUCache(256)
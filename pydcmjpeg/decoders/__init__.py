@@ -1,3 +1,3 @@
-
-
-from .jpeg_decoders import decode_baseline
+from .jpeg_decoders import decode_baseline, get_output, iter_baseline
+from .lossless import decode_lossless
+from .progressive import decode_progressive, iter_progressive
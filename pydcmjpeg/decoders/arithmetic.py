@@ -0,0 +1,604 @@
+"""Decoding of arithmetic coded 10918-1 scans."""
+
+import numpy as np
+
+from pydcmjpeg.arithmetic import (
+    ArithmeticDecoder, DEFAULT_CONDITIONING, FIXED_STATE
+)
+from pydcmjpeg.decoders.jpeg_decoders import (
+    _get_scan_data, _get_scan_spec, _get_segments
+)
+
+
+# The number of statistics bins for each DC, AC and lossless table
+DC_BINS = 64
+AC_BINS = 256
+LOSSLESS_BINS = 158
+
+
+def _get_bounds(cs):
+    """Return the DC or lossless conditioning bounds for the DAC `cs`.
+
+    Parameters
+    ----------
+    cs : int
+        The DAC Cs value for a DC or lossless table, as U << 4 | L.
+
+    Returns
+    -------
+    int, int
+        The magnitudes below which a difference is classified as zero and
+        above which it's classified as large, in the same form as the
+        magnitude decoded from the X bins.
+
+    Raises
+    ------
+    ValueError
+        If L is greater than U.
+
+    References
+    ----------
+    ISO/IEC 10918-1, Sections B.2.4.3 and F.1.4.4.1.2
+    """
+    lower, upper = cs & 0x0F, cs >> 4
+    if lower > upper:
+        raise ValueError(
+            "Invalid arithmetic coding conditioning for a DC or lossless "
+            "table: L {} is greater than U {}".format(lower, upper)
+        )
+
+    return (1 << lower) >> 1, (1 << upper) >> 1
+
+
+def _get_units(scan, spec, conditioning):
+    """Return the arithmetic decoding specification for each component.
+
+    Parameters
+    ----------
+    scan : dict
+        The SOS marker segment info.
+    spec : list of tuple
+        The MCU layout of each component in the scan, as returned by
+        ``jpeg_decoders._get_scan_spec()``.
+    conditioning : dict
+        The current arithmetic coding conditioning as {Tc : {Tb : Cs}}.
+
+    Returns
+    -------
+    list of tuple
+        The (row step, column step, block offsets, DC table, zero bound,
+        large bound, AC table, Kx) for each component in the scan.
+    """
+    units = []
+    for (row_step, col_step, offsets, _, _), td, ta in zip(
+        spec, scan['Tdj'], scan['Taj']
+    ):
+        lower, upper = _get_bounds(
+            conditioning[0].get(td, DEFAULT_CONDITIONING[0])
+        )
+        kx = conditioning[1].get(ta, DEFAULT_CONDITIONING[1])
+        units.append((row_step, col_step, offsets, td, lower, upper, ta, kx))
+
+    return units
+
+
+def _decode_arithmetic_scan(scan, components, conditioning, restart_interval,
+                            progressive=False):
+    """Decode an arithmetic coded DCT scan into the component coefficients.
+
+    Sequential scans contain the DC and AC coefficients of every block and
+    are decoded the same way as a progressive scan that's the first scan of
+    both the DC and the AC bands.
+
+    Parameters
+    ----------
+    scan : dict
+        The SOS marker segment info, including the ENC entries.
+    components : collections.OrderedDict
+        The component geometry and coefficient arrays, updated in place.
+    conditioning : dict
+        The current arithmetic coding conditioning as {Tc : {Tb : Cs}}.
+    restart_interval : int
+        The number of MCUs in each restart interval, 0 if restart intervals
+        aren't used.
+    progressive : bool, optional
+        If True then the scan is part of a progressive JPEG and uses the
+        scan's Ss, Se, Ah and Al values, otherwise (default) the scan
+        contains all 64 coefficients.
+
+    Raises
+    ------
+    ValueError
+        If the encoded data is invalid.
+
+    References
+    ----------
+    ISO/IEC 10918-1, Sections F.2.4 and G.1.3
+    """
+    ss, se, ah, al = 0, 63, 0, 0
+    if progressive:
+        ss, se, ah, al = scan['Ss'], scan['Se'], scan['Ah'], scan['Al']
+
+    mcus_x, nr_mcus, spec = _get_scan_spec(
+        scan, components, None, dc=False, ac=False
+    )
+    units = _get_units(scan, spec, conditioning)
+    coefficients = [
+        components[cs]['coefficients'].reshape(-1) for cs in scan['Csj']
+    ]
+
+    results = [([], []) for _ in spec]
+    segments = _get_segments(scan, restart_interval, nr_mcus)
+    for data, first_mcu, length in segments:
+        # The statistics and DC predictions are reset by each interval
+        decoder = ArithmeticDecoder(_get_scan_data(data))
+        if ah == 0:
+            _decode_first(
+                decoder, units, first_mcu, length, mcus_x, ss, se, al,
+                results
+            )
+        elif ss == 0:
+            _decode_dc_refine(
+                decoder, units, first_mcu, length, mcus_x, al, results
+            )
+        else:
+            _decode_ac_refine(
+                decoder, units[0], first_mcu, length, mcus_x, ss, se, al,
+                coefficients[0].reshape(-1, 64), results[0]
+            )
+
+    for arr, (pos, val) in zip(coefficients, results):
+        arr[np.asarray(pos, dtype=np.intp)] += np.asarray(val, dtype=np.int16)
+
+
+def _decode_first(decoder, units, first_mcu, nr_mcus, mcus_x, ss, se, al,
+                  results):
+    """Decode the coefficients of a sequential scan or a first scan.
+
+    Parameters
+    ----------
+    decoder : arithmetic.ArithmeticDecoder
+        The decoder for the interval's arithmetic coded data.
+    units : list of tuple
+        The arithmetic decoding specification for each component in the
+        scan, as returned by ``_get_units()``.
+    first_mcu : int
+        The index of the first MCU in the interval.
+    nr_mcus : int
+        The number of MCUs in the interval.
+    mcus_x : int
+        The number of MCUs per line in the scan.
+    ss, se : int
+        The start and end of the spectral band, in zigzag order. If `ss`
+        is 0 then the DC coefficients are decoded and if `se` is greater
+        than 0 then the AC coefficients from max(`ss`, 1) to `se` are.
+    al : int
+        The successive approximation bit position low, the point
+        transform applied to the coefficients.
+    results : list of (list of int, list of int)
+        For each component in the scan, the (positions, values) of the
+        non-zero coefficients, updated in place.
+
+    Raises
+    ------
+    ValueError
+        If the encoded data is invalid.
+
+    References
+    ----------
+    ISO/IEC 10918-1, Sections F.2.4.1, F.2.4.2, G.1.3.1 and G.1.3.2
+    """
+    decode = decoder.decode
+    fixed = bytearray([FIXED_STATE])
+    dc_stats, ac_stats = {}, {}
+    components = []
+    for ii, (unit, (pos, val)) in enumerate(zip(units, results)):
+        row_step, col_step, offsets, td, lower, upper, ta, kx = unit
+        components.append((
+            ii, row_step, col_step, offsets,
+            dc_stats.setdefault(td, bytearray(DC_BINS)), lower, upper,
+            ac_stats.setdefault(ta, bytearray(AC_BINS)), kx,
+            pos.append, val.append
+        ))
+
+    first_ac = max(ss, 1)
+    predictions = [0] * len(units)
+    # The index of the S0 bin for each component's next DC difference
+    contexts = [0] * len(units)
+    for mcu in range(first_mcu, first_mcu + nr_mcus):
+        mcu_y, mcu_x = divmod(mcu, mcus_x)
+        for (ii, row_step, col_step, offsets, st, lower, upper, ac, kx,
+             add_position, add_value) in components:
+            start = mcu_y * row_step + mcu_x * col_step
+            for offset in offsets:
+                block = (start + offset) << 6
+                if not ss:
+                    # Figure F.19: the DC difference
+                    context = contexts[ii]
+                    if decode(st, context):
+                        sign = decode(st, context + 1)
+                        magnitude, value = _decode_magnitude(
+                            decode, st, context + 2 + sign, 20
+                        )
+                        # Section F.1.4.4.1.2: the next difference's context
+                        if magnitude < lower:
+                            contexts[ii] = 0
+                        elif magnitude > upper:
+                            contexts[ii] = 12 + (sign << 2)
+                        else:
+                            contexts[ii] = 4 + (sign << 2)
+
+                        predictions[ii] += -value - 1 if sign else value + 1
+                    else:
+                        contexts[ii] = 0
+
+                    if predictions[ii]:
+                        add_position(block)
+                        add_value(predictions[ii] << al)
+
+                kk = first_ac
+                while kk <= se:
+                    # Figure F.20: the SE bin, end of block
+                    index = 3 * (kk - 1)
+                    if decode(ac, index):
+                        break
+
+                    # The S0 bins, zero coefficients
+                    while not decode(ac, index + 1):
+                        index += 3
+                        kk += 1
+                        if kk > se:
+                            raise ValueError(
+                                "Invalid run length in the encoded data"
+                            )
+
+                    sign = decode(fixed, 0)
+                    index += 2
+                    magnitude = decode(ac, index)
+                    if magnitude and decode(ac, index):
+                        # The X2, X3, ... bins
+                        magnitude <<= 1
+                        index = 189 if kk <= kx else 217
+                        while decode(ac, index):
+                            magnitude <<= 1
+                            if magnitude == 0x8000:
+                                raise ValueError(
+                                    "Invalid AC coefficient in the encoded "
+                                    "data"
+                                )
+
+                            index += 1
+
+                    value = magnitude
+                    index += 14
+                    magnitude >>= 1
+                    while magnitude:
+                        if decode(ac, index):
+                            value |= magnitude
+
+                        magnitude >>= 1
+
+                    add_position(block + kk)
+                    add_value((-value - 1 if sign else value + 1) << al)
+                    kk += 1
+
+
+def _decode_magnitude(decode, st, index, x_index):
+    """Return the magnitude of an arithmetic coded DC or lossless difference.
+
+    Parameters
+    ----------
+    decode : callable
+        The ``decode()`` method of the interval's
+        ``arithmetic.ArithmeticDecoder``.
+    st : bytearray
+        The statistics bins of the DC or lossless table.
+    index : int
+        The index of the bin for the first magnitude decision, S0 + 2 +
+        the sign of the difference.
+    x_index : int
+        The index of the X1 bin, the X2, X3, ... bins follow it and the
+        corresponding M bins are 14 bins later.
+
+    Returns
+    -------
+    int, int
+        The magnitude category as a power of 2, or 0 if the magnitude is
+        0, which is used to classify the difference, and the magnitude of
+        the difference less 1.
+
+    Raises
+    ------
+    ValueError
+        If the encoded data is invalid.
+
+    References
+    ----------
+    ISO/IEC 10918-1, Sections F.1.4.4.1.2, F.2.4.2 and H.1.4.3
+    """
+    magnitude = decode(st, index)
+    if magnitude:
+        # The X1, X2, ... bins
+        index = x_index
+        while decode(st, index):
+            magnitude <<= 1
+            if magnitude == 0x8000:
+                raise ValueError("Invalid difference in the encoded data")
+
+            index += 1
+
+    # The magnitude bits, from the M bins
+    value = magnitude
+    index += 14
+    bit = magnitude >> 1
+    while bit:
+        if decode(st, index):
+            value |= bit
+
+        bit >>= 1
+
+    return magnitude, value
+
+
+def _decode_dc_refine(decoder, units, first_mcu, nr_mcus, mcus_x, al,
+                      results):
+    """Decode the next bit of the DC coefficients in a refinement scan.
+
+    Parameters
+    ----------
+    decoder : arithmetic.ArithmeticDecoder
+        The decoder for the interval's arithmetic coded data.
+    units : list of tuple
+        The arithmetic decoding specification for each component in the
+        scan.
+    first_mcu : int
+        The index of the first MCU in the interval.
+    nr_mcus : int
+        The number of MCUs in the interval.
+    mcus_x : int
+        The number of MCUs per line in the scan.
+    al : int
+        The position of the bit being refined.
+    results : list of (list of int, list of int)
+        For each component in the scan, the (positions, values) of the
+        coefficients with the bit set, updated in place.
+
+    References
+    ----------
+    ISO/IEC 10918-1, Section G.1.3.1
+    """
+    decode = decoder.decode
+    fixed = bytearray([FIXED_STATE])
+    bit = 1 << al
+    components = [
+        (row_step, col_step, offsets, pos.append, val.append)
+        for (row_step, col_step, offsets, _, _, _, _, _), (pos, val)
+        in zip(units, results)
+    ]
+
+    for mcu in range(first_mcu, first_mcu + nr_mcus):
+        mcu_y, mcu_x = divmod(mcu, mcus_x)
+        for row_step, col_step, offsets, add_position, add_value in components:
+            start = mcu_y * row_step + mcu_x * col_step
+            for offset in offsets:
+                if decode(fixed, 0):
+                    add_position((start + offset) << 6)
+                    add_value(bit)
+
+
+def _decode_ac_refine(decoder, unit, first_mcu, nr_mcus, mcus_x, ss, se, al,
+                      coefficients, results):
+    """Decode the next bit of the AC coefficients in a refinement scan.
+
+    Parameters
+    ----------
+    decoder : arithmetic.ArithmeticDecoder
+        The decoder for the interval's arithmetic coded data.
+    unit : tuple
+        The arithmetic decoding specification for the scan's single
+        component.
+    first_mcu : int
+        The index of the first MCU in the interval.
+    nr_mcus : int
+        The number of MCUs in the interval.
+    mcus_x : int
+        The number of MCUs per line in the scan.
+    ss, se : int
+        The start and end of the spectral band, in zigzag order.
+    al : int
+        The position of the bit being refined.
+    coefficients : numpy.ndarray
+        The coefficients of the component with shape (blocks, 64), as
+        decoded by the previous scans.
+    results : (list of int, list of int)
+        The (positions, values) to add to the flattened coefficients,
+        updated in place.
+
+    Raises
+    ------
+    ValueError
+        If the encoded data is invalid.
+
+    References
+    ----------
+    ISO/IEC 10918-1, Section G.1.3.3
+    """
+    decode = decoder.decode
+    fixed = bytearray([FIXED_STATE])
+    ac = bytearray(AC_BINS)
+    row_step = unit[0]
+    add_position, add_value = results[0].append, results[1].append
+    positive, negative = 1 << al, -1 << al
+
+    row = None
+    for mcu in range(first_mcu, first_mcu + nr_mcus):
+        mcu_y, mcu_x = divmod(mcu, mcus_x)
+        if mcu_y != row:
+            # The coefficients from the previous scans for a row of blocks
+            row = mcu_y
+            first = row * row_step
+            blocks = coefficients[first:first + mcus_x, :se + 1].tolist()
+
+        block = (mcu_y * row_step + mcu_x) << 6
+        band = blocks[mcu_x]
+        # EOBx, the end of block in the previous scans
+        eob = se
+        while eob and not band[eob]:
+            eob -= 1
+
+        kk = ss
+        while kk <= se:
+            index = 3 * (kk - 1)
+            if kk > eob and decode(ac, index):
+                break
+
+            while True:
+                coefficient = band[kk]
+                if coefficient:
+                    # Correction bit for a previously non-zero coefficient
+                    if decode(ac, index + 2):
+                        add_position(block + kk)
+                        add_value(negative if coefficient < 0 else positive)
+
+                    break
+
+                if decode(ac, index + 1):
+                    # A newly non-zero coefficient
+                    add_position(block + kk)
+                    add_value(negative if decode(fixed, 0) else positive)
+                    break
+
+                index += 3
+                kk += 1
+                if kk > se:
+                    raise ValueError("Invalid run length in the encoded data")
+
+            kk += 1
+
+
+def _get_lossless_units(scan, sampling, conditioning):
+    """Return the arithmetic decoding specification for each sample in an
+    MCU of a lossless scan.
+
+    Parameters
+    ----------
+    scan : dict
+        The SOS marker segment info.
+    sampling : list of (int, int)
+        The (horizontal, vertical) number of samples of each component in
+        an MCU.
+    conditioning : dict
+        The current arithmetic coding conditioning as {Tc : {Tb : Cs}}.
+
+    Returns
+    -------
+    list of tuple
+        The (component index, row offset, column offset, samples per
+        component row in an MCU, lossless table, zero bound, large bound)
+        for each sample in an MCU, in the order they're encoded.
+    """
+    units = []
+    for ii, ((hi, vi), td) in enumerate(zip(sampling, scan['Tdj'])):
+        lower, upper = _get_bounds(
+            conditioning[0].get(td, DEFAULT_CONDITIONING[0])
+        )
+        for row in range(vi):
+            for column in range(hi):
+                units.append((ii, row, column, hi, td, lower, upper))
+
+    return units
+
+
+def _decode_lossless_differences(data, units, nr_mcus, mcus_x, first=0):
+    """Return the differences arithmetic decoded from a restart interval.
+
+    Each difference is decoded using the categories of the differences of
+    the samples to the left of and above it in the same component, which
+    are taken as zero for the first column of the image and for samples
+    that aren't in the interval.
+
+    Parameters
+    ----------
+    data : bytes-like
+        The entropy-coded data for the interval, without byte stuffing.
+    units : list of tuple
+        The arithmetic decoding specification for each sample in an MCU, as
+        returned by ``_get_lossless_units()``.
+    nr_mcus : int
+        The number of MCUs in the interval.
+    mcus_x : int
+        The number of MCUs per line in the scan.
+    first : int, optional
+        The column of the first MCU in the interval, default 0.
+
+    Returns
+    -------
+    numpy.ndarray
+        The int32 differences of the samples in the interval, in the order
+        they were encoded.
+
+    Raises
+    ------
+    ValueError
+        If the encoded data is invalid.
+
+    References
+    ----------
+    ISO/IEC 10918-1, Section H.1.4.3
+    """
+    decode = ArithmeticDecoder(data).decode
+    stats = {}
+    # For each component, the categories of the differences of the last
+    #   line of the previous MCU row followed by those of each line in the
+    #   current MCU row
+    lines = {}
+    samples = []
+    for ii, row, column, hi, td, lower, upper in units:
+        component = lines.setdefault(ii, [[0] * (mcus_x * hi)])
+        if not column:
+            component.append([0] * (mcus_x * hi))
+
+        samples.append((
+            component, row, column, hi,
+            stats.setdefault(td, bytearray(LOSSLESS_BINS)), lower, upper
+        ))
+
+    differences = []
+    add_difference = differences.append
+    for mcu in range(first, first + nr_mcus):
+        mcu_y, mcu_x = divmod(mcu, mcus_x)
+        if mcu_y and not mcu_x:
+            for component in lines.values():
+                component[0] = component[-1]
+                component[1:] = [
+                    [0] * len(line) for line in component[1:]
+                ]
+
+        for component, row, column, hi, st, lower, upper in samples:
+            x = mcu_x * hi + column
+            cats = component[row + 1]
+            # The categories of Da and Db, the differences to the left and
+            #   above
+            ca = cats[x - 1] if x else 0
+            cb = component[row][x]
+            # Table H.3: the S0 bin
+            context = 20 * ca + 4 * cb
+            if decode(st, context):
+                sign = decode(st, context + 1)
+                # The X1, X2, ... bins are conditioned on Db being large
+                magnitude, value = _decode_magnitude(
+                    decode, st, context + 2 + sign, 100 if cb < 3 else 129
+                )
+                if magnitude < lower:
+                    cats[x] = 0
+                elif magnitude > upper:
+                    cats[x] = 3 + sign
+                else:
+                    cats[x] = 1 + sign
+
+                add_difference(-value - 1 if sign else value + 1)
+            else:
+                cats[x] = 0
+                add_difference(0)
+
+    return np.asarray(differences, dtype=np.int32)
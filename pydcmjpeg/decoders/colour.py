@@ -0,0 +1,237 @@
+"""Upsampling and colour space conversion of decoded component planes."""
+
+import numpy as np
+
+
+# YCbCr to RGB conversion coefficients as 16-bit fixed-point, the same as
+#   used by libjpeg: FIX(1.402), FIX(0.34414), FIX(0.71414) and FIX(1.772)
+_SCALEBITS = 16
+_ONE_HALF = 1 << (_SCALEBITS - 1)
+_CR_R = 91881
+_CB_G = -22554
+_CR_G = -46802
+_CB_B = 116130
+
+
+def upsample(plane, shape, vi, v_max, hi, h_max, method='fancy'):
+    """Return the component `plane` upsampled to `shape`.
+
+    Parameters
+    ----------
+    plane : numpy.ndarray
+        The 2D samples of the component.
+    shape : tuple of int
+        The (rows, columns) of the upsampled plane.
+    vi, v_max : int
+        The vertical sampling factor of the component and the maximum
+        vertical sampling factor of all the components in the frame.
+    hi, h_max : int
+        The horizontal sampling factor of the component and the maximum
+        horizontal sampling factor of all the components in the frame.
+    method : str, optional
+        The upsampling method, one of:
+
+        * ``'fancy'`` (default): triangle (linear) interpolation between
+          the nearest samples, the same as libjpeg's fancy upsampling.
+        * ``'nearest'``: replicate the nearest sample.
+
+    Returns
+    -------
+    numpy.ndarray
+        The upsampled plane, with the same dtype as `plane`.
+
+    Raises
+    ------
+    ValueError
+        If `method` is not a known upsampling method.
+    """
+    if method == 'nearest':
+        plane = _nearest(plane, shape[0], vi, v_max, axis=0)
+        return _nearest(plane, shape[1], hi, h_max, axis=1)
+
+    if method != 'fancy':
+        raise ValueError(
+            "Unknown upsampling method '{}'".format(method)
+        )
+
+    if (vi, hi) == (v_max, h_max):
+        return plane[:shape[0], :shape[1]]
+
+    # Interpolate using integer weights then round once at the end
+    dtype = plane.dtype
+    samples = plane.astype(np.int32)
+    scale = 1
+    if vi != v_max:
+        samples = _triangle(samples, shape[0], vi, v_max, axis=0)
+        scale *= 2 * v_max
+    else:
+        samples = samples[:shape[0]]
+
+    if hi != h_max:
+        samples = _triangle(samples, shape[1], hi, h_max, axis=1)
+        scale *= 2 * h_max
+    else:
+        samples = samples[:, :shape[1]]
+
+    samples += scale // 2
+    samples //= scale
+
+    return samples.astype(dtype)
+
+
+def _nearest(plane, length, sampling, max_sampling, axis):
+    """Return `plane` upsampled along `axis` by sample replication."""
+    if sampling == max_sampling:
+        return plane.take(np.arange(length), axis=axis)
+
+    if max_sampling % sampling == 0:
+        plane = np.repeat(plane, max_sampling // sampling, axis=axis)
+        return plane.take(np.arange(length), axis=axis)
+
+    # Non-integer ratio
+    index = np.arange(length) * sampling // max_sampling
+    index = np.minimum(index, plane.shape[axis] - 1)
+
+    return plane.take(index, axis=axis)
+
+
+def _triangle(samples, length, sampling, max_sampling, axis):
+    """Return `samples` upsampled along `axis` by linear interpolation.
+
+    Output sample j is centred at (j + 1/2) * sampling / max_sampling - 1/2
+    in the input, and is interpolated from the two nearest input samples,
+    with the samples at the edges replicated. The result is scaled by
+    2 * `max_sampling`.
+
+    Parameters
+    ----------
+    samples : numpy.ndarray
+        The int32 samples to upsample.
+    length : int
+        The number of samples along `axis` after upsampling.
+    sampling : int
+        The component's sampling factor along `axis`.
+    max_sampling : int
+        The maximum sampling factor along `axis`.
+    axis : int
+        The axis to upsample along.
+
+    Returns
+    -------
+    numpy.ndarray
+        The upsampled samples as int32, multiplied by 2 * `max_sampling`.
+    """
+    jj = np.arange(length)
+    # The position of each output sample in the input as a multiple of
+    #   1 / (2 * max_sampling), split into an index and a weight
+    position = (2 * jj + 1) * sampling - max_sampling
+    index = position // (2 * max_sampling)
+    weight = position - index * 2 * max_sampling
+
+    last = samples.shape[axis] - 1
+    before = samples.take(np.clip(index, 0, last), axis=axis)
+    after = samples.take(np.clip(index + 1, 0, last), axis=axis)
+
+    shape = [1, 1]
+    shape[axis] = length
+    weight = weight.astype(np.int32).reshape(shape)
+
+    before *= 2 * max_sampling - weight
+    after *= weight
+    before += after
+
+    return before
+
+
+def upsample_planes(planes, frame, method='fancy'):
+    """Return the component `planes` upsampled to the full image size.
+
+    Parameters
+    ----------
+    planes : list of numpy.ndarray
+        The 2D samples of each component in the frame.
+    frame : dict
+        The SOFn marker segment info.
+    method : str, optional
+        The upsampling method, see ``upsample()``.
+
+    Returns
+    -------
+    list of numpy.ndarray
+        The upsampled planes, each with shape (rows, columns).
+    """
+    h_max, v_max = max(frame['Hi']), max(frame['Vi'])
+    shape = (frame['Y'], frame['X'])
+
+    return [
+        upsample(plane, shape, vi, v_max, hi, h_max, method)
+        for plane, hi, vi in zip(planes, frame['Hi'], frame['Vi'])
+    ]
+
+
+def ycbcr_to_rgb(planes, precision=8):
+    """Return the YCbCr component `planes` converted to RGB.
+
+    The conversion uses the full range JFIF equations with 16-bit
+    fixed-point coefficients and is applied to the whole of each plane.
+    Samples with a precision greater than 12 bits are converted using
+    64-bit intermediates so the fixed-point products can't overflow.
+
+    Parameters
+    ----------
+    planes : list of numpy.ndarray
+        The Y, Cb and Cr planes, all with the same shape.
+    precision : int, optional
+        The sample precision in bits, default 8.
+
+    Returns
+    -------
+    list of numpy.ndarray
+        The R, G and B planes, with the same dtype as the input planes.
+
+    Raises
+    ------
+    ValueError
+        If there aren't 3 planes.
+
+    References
+    ----------
+    JPEG File Interchange Format, Version 1.02
+    """
+    if len(planes) != 3:
+        raise ValueError(
+            "Conversion from YCbCr to RGB requires 3 components"
+        )
+
+    dtype = planes[0].dtype
+    center = 1 << (precision - 1)
+    maximum = (1 << precision) - 1
+    # 116130 * 2**15 overflows int32, so wider samples need int64
+    working = np.int64 if precision > 12 else np.int32
+
+    y = planes[0].astype(working)
+    cb = planes[1].astype(working)
+    cb -= center
+    cr = planes[2].astype(working)
+    cr -= center
+
+    red = _CR_R * cr
+    red += _ONE_HALF
+    red >>= _SCALEBITS
+    red += y
+
+    green = _CB_G * cb
+    green += _CR_G * cr
+    green += _ONE_HALF
+    green >>= _SCALEBITS
+    green += y
+
+    blue = _CB_B * cb
+    blue += _ONE_HALF
+    blue >>= _SCALEBITS
+    blue += y
+
+    return [
+        np.clip(arr, 0, maximum, out=arr).astype(dtype)
+        for arr in (red, green, blue)
+    ]
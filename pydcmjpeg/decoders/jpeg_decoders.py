@@ -1,159 +1,1813 @@
-"""Decoders for 10918-1 Baseline DCT JPEGs."""
+"""Decoders for 10918-1 DCT-based JPEGs."""
 
-from pydcmjpeg.config import ZIGZAG
-from pydcmjpeg.huffman import _get_huffman
+import atexit
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import reduce
+from math import gcd, pi
+from time import perf_counter
 
+import numpy as np
 
-# Temporary to aid in debugging
-def _debug_sos(offset, marker, name, info):
-    print(
-        "{0:<7}{1:<4}({2}) Ls={3} Ns={4}"
-        .format(offset, name, marker, info['Ls'], info['Ns'])
+from pydcmjpeg import tracing as _tracing
+from pydcmjpeg._tables import ZIGZAG as _ZIGZAG
+from pydcmjpeg.cache import TABLE_CACHE
+from pydcmjpeg.decoders.colour import upsample_planes, ycbcr_to_rgb
+from pydcmjpeg.huffman import BitReader, get_huffman_table
+from pydcmjpeg.tracing import trace
+
+
+# For de-zigzagging (N, 64) coefficients with fancy indexing:
+#   coefficients[:, ZIGZAG_INDEX] is in natural (row-major) order
+ZIGZAG_INDEX = np.asarray(_ZIGZAG, dtype=np.intp)
+
+
+def _idct_matrix(size=8):
+    """Return the `size` x `size` DCT basis matrix, C, as float32.
+
+    The 2D IDCT of an 8x8 block of coefficients, F, is then C.T @ F @ C.
+
+    References
+    ----------
+    ISO/IEC 10918-1, Section A.3.3
+    """
+    uu = np.arange(size, dtype=np.float64).reshape(size, 1)
+    xx = np.arange(size, dtype=np.float64).reshape(1, size)
+    matrix = np.cos((2 * xx + 1) * uu * pi / (2 * size)) / 2
+    matrix[0, :] /= np.sqrt(2)
+
+    return matrix.astype(np.float32)
+
+
+def _reduced_idct_matrix(size):
+    """Return the matrix for the IDCT of an 8x8 block reduced to `size`.
+
+    For a `size` of 1, 2 or 4 each output sample is the average of the
+    samples of the full size IDCT it replaces, the same as libjpeg. For
+    other sizes the `size` point IDCT of the lowest `size` frequencies is
+    used instead.
+
+    Parameters
+    ----------
+    size : int
+        The number of output samples, 1 to 7.
+
+    Returns
+    -------
+    numpy.ndarray
+        The indices of the frequencies that contribute to the output, as
+        intp.
+    numpy.ndarray
+        The matrix, R, with shape (frequencies, `size`) as float32. The
+        reduced IDCT of F is then R.T @ F @ R, using the rows and columns
+        of F for the contributing frequencies.
+    """
+    if 8 % size:
+        return np.arange(size), _idct_matrix(size)
+
+    # Average each group of 8 / size columns of the full IDCT
+    matrix = _idct_matrix().astype(np.float64)
+    matrix = matrix.reshape(8, size, 8 // size).mean(axis=2)
+    # Some frequencies average to zero and can be skipped
+    index = np.flatnonzero(np.abs(matrix).max(axis=1) > 1e-6)
+
+    return index, matrix[index].astype(np.float32)
+
+
+IDCT_MATRIX = _idct_matrix()
+IDCT_MATRIX_T = np.ascontiguousarray(IDCT_MATRIX.T)
+# The frequencies and matrices for the reduced size IDCTs
+REDUCED_IDCT = {size : _reduced_idct_matrix(size) for size in range(1, 8)}
+
+# The process pool used to decode restart intervals in parallel, as
+#   {workers : ProcessPoolExecutor}, kept so the worker processes are only
+#   started by the first decode that uses them. Only the pool for the most
+#   recently used number of workers is kept, and it's shut down at exit
+_EXECUTORS = {}
+
+
+def decode_baseline(jpg, workers=None, tables=None, release=False,
+                    as_rgb=False, upsample='fancy', planar=False, out=None,
+                    dtype=None, scale=1, region=None):
+    """Return the decoded image data for a sequential DCT Huffman JPEG.
+
+    Used for Process 1 (baseline) and Processes 2 and 4 (extended) JPEGs.
+    The extended processes only differ in allowing up to 4 DC and 4 AC
+    Huffman tables, 16-bit quantisation tables and 12-bit samples, so
+    they're decoded in the same way.
+
+    Parameters
+    ----------
+    jpg : jpeg.JPEG
+        The Process 1, 2 or 4 JPEG to decode.
+    workers : int, optional
+        If greater than 1 then entropy decode the restart intervals of each
+        scan in parallel using a pool of `workers` processes. The pool is
+        started by the first decode that uses it and then reused. Has no
+        effect if the JPEG doesn't use restart intervals.
+    tables : dict, optional
+        A cache of decoding tables to use and update instead of the
+        process-wide ``cache.TABLE_CACHE``.
+    release : bool, optional
+        If True then remove the ENC entries of each scan from `jpg` once
+        the scan has been decoded. Default False.
+    as_rgb : bool, optional
+        If True then convert the image data from YCbCr to RGB, which
+        requires 3 components. If False (default) then no colour space
+        conversion is performed.
+    upsample : str, optional
+        The method used to upsample subsampled components to the full
+        image size, ``'fancy'`` (default) for triangle interpolation or
+        ``'nearest'`` for sample replication.
+    planar : bool, optional
+        If True then return multiple component image data with shape
+        (samples, rows, columns), otherwise (default) return it with shape
+        (rows, columns, samples).
+    out : numpy.ndarray or buffer, optional
+        If used then write the image data to `out` instead of a new array.
+        `out` must be writable and either an ndarray with the same shape as
+        the image data or an object supporting the buffer protocol with the
+        same size in bytes.
+    dtype : numpy.dtype, optional
+        The dtype of the returned image data, default uint8 if the sample
+        precision is 8 bits or uint16 if it's 12 bits. If `out` is an
+        ndarray then defaults to the dtype of `out`.
+    scale : float, optional
+        Decode the image data reduced by `scale`, one of 1/8, 2/8, ..., 1
+        (default), using reduced size IDCTs. The scaled image has
+        ``ceil(rows * scale)`` rows and ``ceil(columns * scale)`` columns.
+    region : tuple of int, optional
+        If used then only decode the region (y0, x0, height, width) of the
+        (scaled) image. Only the blocks that overlap the region are
+        dequantised and inverse transformed, and restart intervals that
+        don't overlap it aren't entropy decoded.
+
+    Returns
+    -------
+    numpy.ndarray
+        The decoded image data with shape (rows, columns) if there's a
+        single component or (rows, columns, samples) otherwise. If `out`
+        is used then the returned array uses the memory of `out`.
+
+    Raises
+    ------
+    ValueError
+        If the JPEG contains no scans or the encoded data is invalid, if
+        `as_rgb` is True and there aren't 3 components, if `out` isn't
+        suitable, if `scale` isn't valid or if `region` isn't within the
+        image.
+    """
+    tracing = _tracing.TRACE
+    if tracing:
+        start_time = perf_counter()
+
+    frame, sizes = _scale_frame(jpg._index.frame, scale)
+    window = None
+    if region is not None:
+        window, frame, crop = _get_window(
+            jpg._index.frame, frame, region, scale
+        )
+
+    if out is not None:
+        out = _check_output(jpg, frame, region, planar, out, dtype)
+
+    planes = _decode_planes(jpg, workers, tables, release, sizes, window)
+    planes = _convert_planes(planes, frame, as_rgb=as_rgb, upsample=upsample)
+    if region is not None:
+        planes = [plane[crop] for plane in planes]
+
+    arr = _planes_to_image(planes, planar=planar, out=out, dtype=dtype)
+    if tracing:
+        process = 1 if jpg.is_baseline else (2 if jpg.precision == 8 else 4)
+        trace('decode', process=process, elapsed=perf_counter() - start_time)
+
+    return arr
+
+
+def iter_baseline(jpg, band=1, tables=None, as_rgb=False, upsample='fancy',
+                  scale=1):
+    """Yield the decoded image data for a sequential DCT JPEG in bands.
+
+    Used for Process 1, 2 and 4 JPEGs.
+
+    If the JPEG has a single scan containing all the components then the
+    image data is decoded one MCU row at a time, and only the coefficients
+    and samples for the current band and one MCU row either side of it are
+    kept, so the memory used is bounded by the image width rather than the
+    image size. Otherwise the whole image is decoded first and then
+    yielded in bands.
+
+    Parameters
+    ----------
+    jpg : jpeg.JPEG
+        The JPEG to decode.
+    band : int, optional
+        The number of MCU rows in each band, default 1.
+    tables : dict, optional
+        A cache of decoding tables to use and update.
+    as_rgb : bool, optional
+        If True then convert the image data from YCbCr to RGB. Default
+        False.
+    upsample : str, optional
+        The method used to upsample subsampled components, ``'fancy'``
+        (default) or ``'nearest'``.
+    scale : float, optional
+        Decode the image data reduced by `scale`, one of 1/8, 2/8, ..., 1
+        (default).
+
+    Yields
+    ------
+    numpy.ndarray
+        The decoded image data for each band, from the top of the image,
+        with shape (rows, columns) if there's a single component or
+        (rows, columns, samples) otherwise. Every band has the same number
+        of rows except for the last, which may have fewer.
+
+    Raises
+    ------
+    ValueError
+        If `band` isn't a positive integer, if `as_rgb` is True and there
+        aren't 3 components, if `upsample` or `scale` isn't valid, all of
+        which are raised when called, or if the JPEG contains no scans or
+        the encoded data is invalid, which are raised while iterating.
+    """
+    if int(band) != band or band < 1:
+        raise ValueError(
+            "Invalid 'band' value {}, must be a positive integer"
+            .format(band)
+        )
+
+    frame = jpg._index.frame
+    _check_conversion(frame['Nf'], as_rgb, upsample)
+    frame_s, sizes = _scale_frame(frame, scale)
+
+    return _iter_baseline(
+        jpg, band, tables, as_rgb, upsample, scale, frame_s, sizes
     )
 
-    for csk, td, ta in zip(info['Csj'], info['Tdj'], info['Taj']):
-        print(
-            '             Csk={0:>3} Td={1} Ta={2}'
-            .format(csk, td, ta)
+
+def _iter_baseline(jpg, band, tables, as_rgb, upsample, scale, frame_s,
+                   sizes):
+    """Yield the decoded image data for a sequential DCT JPEG in bands.
+
+    Parameters
+    ----------
+    jpg : jpeg.JPEG
+        The JPEG to decode.
+    band : int
+        The number of MCU rows in each band.
+    tables : dict or None
+        A cache of decoding tables to use and update.
+    as_rgb : bool
+        If True then convert the image data from YCbCr to RGB.
+    upsample : str
+        The method used to upsample subsampled components.
+    scale : float
+        The scaling factor for the image data.
+    frame_s : dict
+        The SOFn marker segment info for the scaled image.
+    sizes : list of tuple of int
+        The (rows, columns) of samples output by the IDCT of each block
+        for each component.
+
+    Yields
+    ------
+    numpy.ndarray
+        The decoded image data for each band, from the top of the image.
+    """
+    frame = jpg._index.frame
+    # The number of rows of samples in each MCU row of the scaled image
+    mcu_rows = int(8 * scale) * (max(frame['Vi']) if frame['Nf'] > 1 else 1)
+
+    scans = jpg.get_keys('SOS')
+    if len(scans) != 1 or jpg.info[scans[0]][2]['Ns'] != frame['Nf']:
+        arr = decode_baseline(
+            jpg, tables=tables, as_rgb=as_rgb, upsample=upsample, scale=scale
         )
+        rows = band * mcu_rows
+        for y0 in range(0, arr.shape[0], rows):
+            yield arr[y0:y0 + rows]
+
+        return
+
+    mcus_y = -(-frame_s['Y'] // mcu_rows)
+    # One MCU row of context on each side of a band for upsampling
+    context = 1 if len(set(zip(frame_s['Hi'], frame_s['Vi']))) > 1 else 0
+    rows = _iter_mcu_rows(jpg, tables, sizes)
+    buffer = []
+    first = 0
+    b0 = 0
+    for row, planes in enumerate(rows):
+        buffer.append(planes)
+        # Emit the bands whose rows and context have all been decoded
+        while b0 < mcus_y and row + 1 >= min(b0 + band + context, mcus_y):
+            b1 = min(b0 + band, mcus_y)
+            r0, r1 = max(b0 - context, 0), min(b1 + context, mcus_y)
+            samples = [
+                np.concatenate(
+                    [buffer[rr - first][ii] for rr in range(r0, r1)]
+                )
+                for ii in range(frame['Nf'])
+            ]
+            top = r0 * mcu_rows
+            samples = _convert_planes(
+                samples,
+                dict(frame_s, Y=min(r1 * mcu_rows, frame_s['Y']) - top),
+                as_rgb=as_rgb,
+                upsample=upsample
+            )
+            y0 = b0 * mcu_rows - top
+            y1 = min(b1 * mcu_rows, frame_s['Y']) - top
+            yield _planes_to_image([plane[y0:y1] for plane in samples])
+
+            # Keep only the rows needed as context for the next band
+            del buffer[:max(b1 - context - first, 0)]
+            first = max(b1 - context, first)
+            b0 = b1
+
 
-    print(
-        '             Ss={} Se={} Ah={} Al={}'
-        .format(info['Ss'], info['Se'], info['Ah'], info['Al'])
+def _iter_mcu_rows(jpg, tables, sizes):
+    """Yield the decoded samples of a single scan JPEG by MCU row.
+
+    Parameters
+    ----------
+    jpg : jpeg.JPEG
+        The JPEG to decode, which must have a single scan containing all
+        the components.
+    tables : dict or None
+        A cache of decoding tables to use and update.
+    sizes : list of tuple of int
+        The (rows, columns) of samples output by the IDCT of each block
+        for each component, as returned by ``_scale_frame()``.
+
+    Yields
+    ------
+    list of numpy.ndarray
+        The 2D samples of each component in the MCU row, in frame order.
+
+    Raises
+    ------
+    ValueError
+        If the encoded data is invalid.
+    """
+    frame = jpg._index.frame
+    h_max, v_max = max(frame['Hi']), max(frame['Vi'])
+    components = _get_components(frame)
+    for component in components.values():
+        component['Qk'] = None
+
+    _, scan, h_tables, restart_interval = next(
+        _iter_scans(jpg, components, tables)
     )
+    mcus_x, nr_mcus, spec = _get_scan_spec(scan, components, h_tables)
+    # Put the scan components in frame order
+    order = [scan['Csj'].index(ci) for ci in components]
+    segments = (
+        _get_scan_data(data) for key, data in scan.items()
+        if key.startswith('ENC')
+    )
+    interval = restart_interval or nr_mcus
+    remaining = 0
+    for row in range(nr_mcus // mcus_x):
+        results = [([], []) for _ in spec]
+        mcu, end = row * mcus_x, (row + 1) * mcus_x
+        while mcu < end:
+            if not remaining:
+                # The start of a new restart interval
+                data = next(segments, None)
+                if data is None:
+                    raise ValueError(
+                        "The scan is missing entropy-coded data for one or "
+                        "more restart intervals"
+                    )
+
+                reader = BitReader(data)
+                predictions = [0] * len(spec)
+                remaining = min(interval, nr_mcus - mcu)
 
-    # Write RST and encoded data lengths
-    remove = ['Ls', 'Ns', 'Csj', 'Tdj', 'Taj', 'Ss', 'Se', 'Ah', 'Al']
-    keys = [kk for kk in info if kk not in remove]
-    keys = sorted(keys, key=lambda x: int(x.split('@')[1]))
-    for key in keys:
-        if key.split('@')[0] == 'ENC':
-            print(
-                '       {} bytes of entropy-coded data'
-                .format(len(info[key]))
+            nr_decoded = min(remaining, end - mcu)
+            _decode_mcus(
+                reader, predictions, spec, mcu, nr_decoded, mcus_x, results
             )
-        else:
-            (name, offset) = key.split('@')
-            print(
-                '{:<7}{}({})'.format(offset, name, 'ffd{}'.format(name[-1]))
+            mcu += nr_decoded
+            remaining -= nr_decoded
+            if not remaining and reader.is_exhausted:
+                raise ValueError(
+                    "The encoded data ended before all the MCUs were decoded"
+                )
+
+        planes = []
+        for ii, size in zip(order, sizes):
+            cs = scan['Csj'][ii]
+            component = components[cs]
+            row_step = spec[ii][0]
+            vi, hi = component['Vi'], component['Hi']
+            block_rows = 1 if scan['Ns'] == 1 else vi
+            positions, values = results[ii]
+            coefficients = np.zeros(
+                (block_rows, component['padded_x'], 64), dtype=np.int16
             )
+            positions = np.asarray(positions, dtype=np.intp)
+            positions -= (row * row_step) << 6
+            coefficients.reshape(-1)[positions] = values
 
-def _debug_dht(offset, marker, name, info):
-    print(
-        "{0:<7}{1:<4}({2}) Lq={3}"
-        .format(offset, name, marker, info['Lh'])
+            blocks = _idct_blocks(
+                coefficients, component['Qk'], jpg.precision, size
+            )
+            # The component dimensions with the scaling applied
+            height = -(-frame['Y'] * vi * size[0] // (v_max * 8))
+            width = -(-frame['X'] * hi * size[1] // (h_max * 8))
+            y0 = row * block_rows * size[0]
+            planes.append(_blocks_to_plane(blocks, height - y0, width))
+
+        yield planes
+
+
+def _blocks_to_plane(blocks, height, width):
+    """Return the blocks of samples as a 2D component plane.
+
+    Parameters
+    ----------
+    blocks : numpy.ndarray
+        The blocks of samples as shape (blocks_y, blocks_x, rows, columns),
+        where (rows, columns) is usually (8, 8) but is smaller for scaled
+        decoding.
+    height : int
+        The number of rows of samples in the component.
+    width : int
+        The number of columns of samples in the component.
+
+    Returns
+    -------
+    numpy.ndarray
+        The samples with shape (`height`, `width`).
+    """
+    blocks_y, blocks_x, rows, columns = blocks.shape
+    plane = blocks.transpose(0, 2, 1, 3).reshape(
+        blocks_y * rows, blocks_x * columns
     )
-    for tc, th, li, vij in zip(info['Tc'], info['Th'], info['Li'], info['Vij']):
-        if tc == 0:
-            print('Lossless/DC Huffman table {}'.format(th))
-        elif tc == 1:
-            print('AC Huffman table {}'.format(th))
-        else:
-            raise NotImplementedError
-
-        print(':(  1  2  3  4  5  6  7  8  9 10 11 12 13 14 15 16   code lengths       )\n')
-        nr_values = ' '.join(['{:>02x}'.format(val) for val in li])
-        print('   {} :(values/length (hex))'.format(nr_values))
-
-        for ii, values in enumerate(vij):
-            if values is not None:
-                for jj in range(0, len(values), 16):
-                    val = ' '.join(['{:>02x}'.format(vv) for vv in values[jj:jj+16]])
-                    print(
-                        '   {:<47} :(hex values, L={:>2})'
-                        .format(val, ii + 1)
+
+    return plane[:height, :width]
+
+
+def _check_conversion(nr_components, as_rgb, upsample):
+    """Check the colour conversion and upsampling parameters.
+
+    Parameters
+    ----------
+    nr_components : int
+        The number of components in the image.
+    as_rgb : bool
+        If True then the components are to be converted from YCbCr to RGB.
+    upsample : str
+        The upsampling method.
+
+    Raises
+    ------
+    ValueError
+        If `as_rgb` is True and there aren't 3 components, or if
+        `upsample` is not a known upsampling method.
+    """
+    if upsample not in ('fancy', 'nearest'):
+        raise ValueError(
+            "Unknown upsampling method '{}'".format(upsample)
+        )
+
+    if as_rgb and nr_components != 3:
+        raise ValueError(
+            "Unable to convert the image data to RGB as the JPEG has {} "
+            "components".format(nr_components)
+        )
+
+
+def _convert_planes(planes, frame, as_rgb=False, upsample='fancy'):
+    """Return the decoded component planes upsampled and colour converted.
+
+    Parameters
+    ----------
+    planes : list of numpy.ndarray
+        The 2D samples for each component, in frame order.
+    frame : dict
+        The SOFn marker segment info.
+    as_rgb : bool, optional
+        If True then convert the planes from YCbCr to RGB. Default False.
+    upsample : str, optional
+        The upsampling method, ``'fancy'`` (default) or ``'nearest'``.
+
+    Returns
+    -------
+    list of numpy.ndarray
+        The 2D samples for each component, all with shape (rows, columns).
+
+    Raises
+    ------
+    ValueError
+        If `as_rgb` is True and there aren't 3 components, or if
+        `upsample` is not a known upsampling method.
+    """
+    _check_conversion(len(planes), as_rgb, upsample)
+
+    tracing = _tracing.TRACE
+    # Only if the components are subsampled
+    if len(set(zip(frame['Hi'], frame['Vi']))) > 1:
+        if tracing:
+            start_time = perf_counter()
+
+        planes = upsample_planes(planes, frame, upsample)
+        if tracing:
+            trace(
+                'upsample', method=upsample,
+                elapsed=perf_counter() - start_time
+            )
+
+    if as_rgb:
+        if tracing:
+            start_time = perf_counter()
+
+        planes = ycbcr_to_rgb(planes, frame['P'])
+        if tracing:
+            trace('colour', elapsed=perf_counter() - start_time)
+
+    return planes
+
+
+def _decode_coefficients(jpg, workers=None, tables=None, release=False,
+                         window=None):
+    """Return the quantised DCT coefficients for a sequential Huffman JPEG.
+
+    Marker segments are processed in the order they occur so that DHT, DQT
+    and DRI segments between scans apply to the following scans.
+
+    Parameters
+    ----------
+    jpg : jpeg.JPEG
+        The JPEG to decode.
+    workers : int, optional
+        If greater than 1 then decode restart intervals in parallel using
+        the shared pool of `workers` processes from ``_get_executor()``.
+    tables : dict, optional
+        A cache of decoding tables to use and update.
+    release : bool, optional
+        If True then remove the ENC entries of each scan once decoded.
+    window : tuple of int, optional
+        If used then the (first row, end row, first column, end column) of
+        the MCUs that are needed, as returned by ``_get_window()``. Restart
+        intervals that don't contain any of the MCUs are skipped and the
+        coefficients of their blocks are left as zero.
+
+    Returns
+    -------
+    collections.OrderedDict
+        The component geometry as returned by ``_get_components()`` with
+        two additional items for each component: ``'coefficients'``, an
+        int16 ndarray with shape (padded_y, padded_x, 64) containing the
+        quantised coefficients of each block in zigzag order, and ``'Qk'``,
+        the quantisation table in natural order as a float32 ndarray.
+
+    Raises
+    ------
+    ValueError
+        If the JPEG contains no scans or the encoded data is invalid.
+    """
+    components = _get_components(jpg._index.frame)
+    for component in components.values():
+        component['coefficients'] = np.zeros(
+            (component['padded_y'], component['padded_x'], 64),
+            dtype=np.int16
+        )
+        component['Qk'] = None
+
+    # Restart intervals are independent so can be decoded in parallel
+    executor = None
+    if workers and workers > 1 and 'DRI' in jpg._index:
+        executor = _get_executor(workers)
+
+    try:
+        nr_scans = _decode_scans(
+            jpg, components, executor, workers, tables, release, window
+        )
+    except BrokenProcessPool:
+        # Start a new pool next time
+        _shutdown_executors(wait=False)
+        raise
+
+    if not nr_scans:
+        raise ValueError(
+            "Unable to decode the JPEG file as it contains no 'SOS' markers"
+        )
+
+    return components
+
+
+def _get_executor(workers):
+    """Return the process pool with `workers` processes.
+
+    The pool is created the first time it's needed and then reused. Any
+    pool with a different number of workers is shut down first, so at most
+    one pool is kept.
+
+    Parameters
+    ----------
+    workers : int
+        The number of worker processes.
+
+    Returns
+    -------
+    concurrent.futures.ProcessPoolExecutor
+        The process pool.
+    """
+    executor = _EXECUTORS.get(workers)
+    if executor is None:
+        _shutdown_executors()
+        executor = ProcessPoolExecutor(max_workers=workers)
+        _EXECUTORS[workers] = executor
+
+    return executor
+
+
+def _shutdown_executors(wait=True):
+    """Shut down and remove the process pools in ``_EXECUTORS``.
+
+    Parameters
+    ----------
+    wait : bool, optional
+        If True (default) then wait for the worker processes to exit.
+    """
+    while _EXECUTORS:
+        _, executor = _EXECUTORS.popitem()
+        executor.shutdown(wait=wait)
+
+
+atexit.register(_shutdown_executors)
+
+
+def _decode_scans(jpg, components, executor=None, workers=None,
+                  tables=None, release=False, window=None):
+    """Decode the scans of a sequential Huffman JPEG in place.
+
+    Parameters
+    ----------
+    jpg : jpeg.JPEG
+        The JPEG to decode.
+    components : collections.OrderedDict
+        The component geometry and coefficient arrays, updated in place.
+    executor : concurrent.futures.Executor, optional
+        If used then the executor to decode restart intervals with.
+    workers : int, optional
+        The number of workers used by `executor`.
+    tables : dict, optional
+        A cache of decoding tables to use and update, if not used then the
+        process-wide ``cache.TABLE_CACHE`` is used.
+    release : bool, optional
+        If True then remove the ENC entries of each scan once decoded.
+    window : tuple of int, optional
+        If used then only decode the restart intervals containing the MCUs
+        in the window.
+
+    Returns
+    -------
+    int
+        The number of decoded scans.
+    """
+    tracing = _tracing.TRACE
+    nr_scans = 0
+    for key, info, h_tables, restart_interval in _iter_scans(
+        jpg, components, tables
+    ):
+        nr_scans += 1
+        if tracing:
+            start_time = perf_counter()
+
+        _decode_scan(
+            info, components, h_tables, restart_interval, executor,
+            workers, window
+        )
+        if tracing:
+            trace(
+                'decode_scan', key=key, components=len(info['Csj']),
+                elapsed=perf_counter() - start_time
+            )
+
+        if release:
+            _release_scan(info)
+
+    return nr_scans
+
+
+def _iter_scans(jpg, components, tables=None, conditioning=None):
+    """Yield the scans of a DCT-based JPEG and their tables.
+
+    Marker segments are processed in the order they occur so that DHT, DQT,
+    DAC and DRI segments between scans apply to the following scans.
+
+    Parameters
+    ----------
+    jpg : jpeg.JPEG
+        The JPEG to decode.
+    components : collections.OrderedDict
+        The component geometry, the 'Qk' of the components in each scan
+        are set to the quantisation table in use at the start of the
+        component's first scan.
+    tables : dict, optional
+        A cache of decoding tables to use and update, if not used then the
+        process-wide ``cache.TABLE_CACHE`` is used.
+    conditioning : dict, optional
+        If used then the arithmetic coding conditioning of each DAC segment
+        is added to `conditioning` as {Tc : {Tb : Cs}}, which should start
+        as ``{0 : {}, 1 : {}}``.
+
+    Yields
+    ------
+    str, dict, dict, int
+        The SOS marker key, the SOS marker segment info, the current
+        Huffman tables as {Tc : {Th : HuffmanTable}} and the restart
+        interval.
+
+    Raises
+    ------
+    ValueError
+        If a scan's component uses a quantisation table that hasn't been
+        defined.
+    """
+    if tables is None:
+        tables = TABLE_CACHE
+
+    q_tables = {}
+    h_tables = {0 : {}, 1 : {}}
+    restart_interval = 0
+    for key in jpg._keys:
+        name = key.split('@')[0]
+        info = jpg.info[key][2]
+        if name == 'DQT':
+            for tq, qk in zip(info['Tq'], info['Qk']):
+                q_tables[tq] = _get_quantisation_table(qk, tables)
+        elif name == 'DHT':
+            for tc, th, li, vij in zip(
+                info['Tc'], info['Th'], info['Li'], info['Vij']
+            ):
+                h_tables[tc][th] = _get_huffman_table(li, vij, tables)
+        elif name == 'DAC' and conditioning is not None:
+            for tc, tb, cs in zip(info['Tc'], info['Tb'], info['Cs']):
+                conditioning[tc][tb] = cs
+        elif name == 'DRI':
+            restart_interval = info['Ri']
+        elif name == 'SOS':
+            for cs in info['Csj']:
+                component = components[cs]
+                # The table in use at the start of the component's first scan
+                if component['Qk'] is not None:
+                    continue
+
+                try:
+                    component['Qk'] = q_tables[component['Tqi']]
+                except KeyError:
+                    raise ValueError(
+                        "The frame uses a quantisation table that hasn't "
+                        "been defined"
                     )
 
-def _debug_dqt(offset, marker, name, info):
-    print(
-        "{0:<7}{1:<4}({2}) Lq={3}"
-        .format(offset, name, marker, info['Lq'])
+            yield key, info, h_tables, restart_interval
+
+
+def _decode_huffman_segment(data, spec, first_mcu, nr_mcus, mcus_x):
+    """Return the non-zero coefficients decoded from a restart interval.
+
+    Parameters
+    ----------
+    data : bytes-like
+        The entropy-coded data for the interval, without byte stuffing.
+    spec : list of tuple
+        For each component in the scan, the (row_step, col_step, offsets,
+        dc_table, ac_table) used to locate the component's blocks in each
+        MCU and to decode them.
+    first_mcu : int
+        The index of the first MCU in the interval.
+    nr_mcus : int
+        The number of MCUs in the interval.
+    mcus_x : int
+        The number of MCUs per line in the scan.
+
+    Returns
+    -------
+    list of (list of int, list of int)
+        For each component in the scan, the (positions, values) of the
+        non-zero quantised coefficients, where the positions are indices
+        into the component's flattened coefficient array.
+
+    Raises
+    ------
+    ValueError
+        If the encoded data is invalid.
+
+    References
+    ----------
+    ISO/IEC 10918-1, Section F.2.2
+    """
+    reader = BitReader(data)
+    results = [([], []) for _ in spec]
+    # DC predictions are reset at the start of each restart interval
+    predictions = [0] * len(spec)
+    _decode_mcus(
+        reader, predictions, spec, first_mcu, nr_mcus, mcus_x, results
+    )
+
+    if reader.is_exhausted:
+        raise ValueError(
+            "The encoded data ended before all the MCUs were decoded"
+        )
+
+    return results
+
+
+def _decode_mcus(reader, predictions, spec, first_mcu, nr_mcus, mcus_x,
+                 results):
+    """Decode MCUs from part of a restart interval.
+
+    Parameters
+    ----------
+    reader : huffman.BitReader
+        The reader for the interval's entropy-coded data, positioned at
+        the start of the first MCU.
+    predictions : list of int
+        The DC prediction for each component in the scan, updated in
+        place.
+    spec : list of tuple
+        The decoding specification for each component in the scan, as
+        used by ``_decode_huffman_segment()``.
+    first_mcu : int
+        The index of the first MCU to decode.
+    nr_mcus : int
+        The number of MCUs to decode.
+    mcus_x : int
+        The number of MCUs per line in the scan.
+    results : list of (list of int, list of int)
+        For each component in the scan, the (positions, values) of the
+        non-zero quantised coefficients, updated in place.
+
+    Raises
+    ------
+    ValueError
+        If the encoded data is invalid.
+    """
+    decode = reader.decode
+    receive_extend = reader.receive_extend
+    components = [
+        (ii, row_step, col_step, offsets, dc_table, ac_table, pos.append,
+         val.append)
+        for ii, ((row_step, col_step, offsets, dc_table, ac_table),
+                 (pos, val))
+        in enumerate(zip(spec, results))
+    ]
+
+    for mcu in range(first_mcu, first_mcu + nr_mcus):
+        mcu_y, mcu_x = divmod(mcu, mcus_x)
+        for (ii, row_step, col_step, offsets, dc_table, ac_table,
+             add_position, add_value) in components:
+            start = mcu_y * row_step + mcu_x * col_step
+            for offset in offsets:
+                block = (start + offset) << 6
+
+                # F.2.2.1: the DC coefficient
+                size = decode(dc_table)
+                if size:
+                    predictions[ii] += receive_extend(size)
+
+                if predictions[ii]:
+                    add_position(block)
+                    add_value(predictions[ii])
+
+                # F.2.2.2: the AC coefficients
+                kk = 1
+                while kk < 64:
+                    rs = decode(ac_table)
+                    size = rs & 0x0F
+                    if size:
+                        kk += rs >> 4
+                        if kk > 63:
+                            raise ValueError(
+                                "Invalid run length in the encoded data"
+                            )
+
+                        add_position(block + kk)
+                        add_value(receive_extend(size))
+                        kk += 1
+                    elif rs == 0xF0:
+                        # ZRL: a run of 16 zeroes
+                        kk += 16
+                    else:
+                        # EOB
+                        break
+
+
+def _decode_huffman_segments(segments, spec, mcus_x):
+    """Return the non-zero coefficients decoded from restart intervals.
+
+    Parameters
+    ----------
+    segments : list of (bytes-like, int, int)
+        The (data, first_mcu, nr_mcus) for each restart interval, as used
+        by ``_decode_huffman_segment()``.
+    spec : list of tuple
+        The decoding specification for each component in the scan.
+    mcus_x : int
+        The number of MCUs per line in the scan.
+
+    Returns
+    -------
+    list of (numpy.ndarray, numpy.ndarray)
+        For each component in the scan, the (positions, values) of the
+        non-zero quantised coefficients.
+    """
+    positions = [[] for _ in spec]
+    values = [[] for _ in spec]
+    for data, first_mcu, nr_mcus in segments:
+        results = _decode_huffman_segment(
+            data, spec, first_mcu, nr_mcus, mcus_x
+        )
+        for ii, (pos, val) in enumerate(results):
+            positions[ii].extend(pos)
+            values[ii].extend(val)
+
+    return [
+        (np.asarray(pos, dtype=np.intp), np.asarray(val, dtype=np.int32))
+        for pos, val in zip(positions, values)
+    ]
+
+
+def _decode_scan(scan, components, h_tables, restart_interval,
+                 executor=None, workers=None, window=None):
+    """Decode a sequential Huffman scan into the component coefficients.
+
+    Parameters
+    ----------
+    scan : dict
+        The SOS marker segment info, including the ENC entries.
+    components : collections.OrderedDict
+        The component geometry and coefficient arrays, updated in place.
+    h_tables : dict
+        The current Huffman tables as {Tc : {Th : HuffmanTable}}.
+    restart_interval : int
+        The number of MCUs in each restart interval, 0 if restart intervals
+        aren't used.
+    executor : concurrent.futures.Executor, optional
+        If used then decode the restart intervals in parallel with
+        `executor`.
+    workers : int, optional
+        The number of workers used by `executor`.
+    window : tuple of int, optional
+        If used then the (first row, end row, first column, end column) of
+        the frame's MCUs that are needed. Only the restart intervals that
+        contain the MCUs are decoded, up to the last MCU that's needed.
+    """
+    mcus_x, nr_mcus, spec = _get_scan_spec(scan, components, h_tables)
+    coefficients = [
+        components[cs]['coefficients'].reshape(-1) for cs in scan['Csj']
+    ]
+
+    rect = None
+    if window is not None:
+        rect = window
+        if scan['Ns'] == 1:
+            # Each MCU is a single block of the component
+            component = components[scan['Csj'][0]]
+            vi, hi = component['Vi'], component['Hi']
+            rect = (
+                window[0] * vi, window[1] * vi, window[2] * hi, window[3] * hi
+            )
+
+        last_mcu = (min(rect[1], -(-nr_mcus // mcus_x)) - 1) * mcus_x
+        last_mcu += min(rect[3], mcus_x) - 1
+
+    intervals = _get_segments(scan, restart_interval, nr_mcus)
+    segments = []
+    for data, first_mcu, length in intervals:
+        if rect is not None:
+            if not _in_window(first_mcu, length, mcus_x, rect):
+                continue
+
+            # Stop decoding after the last MCU that's needed
+            length = min(length, last_mcu - first_mcu + 1)
+
+        segments.append((_get_scan_data(data), first_mcu, length))
+
+    if executor is None or len(segments) < 2:
+        batches = [_decode_huffman_segments(segments, spec, mcus_x)]
+    else:
+        # Send consecutive intervals in batches to reduce the overhead of
+        #   passing the Huffman tables to the workers
+        size = -(-len(segments) // (4 * (workers or 1)))
+        batches = [
+            executor.submit(
+                _decode_huffman_segments,
+                segments[ii:ii + size],
+                spec,
+                mcus_x
+            )
+            for ii in range(0, len(segments), size)
+        ]
+        batches = (future.result() for future in batches)
+
+    for results in batches:
+        for arr, (positions, values) in zip(coefficients, results):
+            arr[positions] = values
+
+
+def _in_window(first_mcu, nr_mcus, mcus_x, rect):
+    """Return True if a restart interval contains any MCUs in `rect`.
+
+    Parameters
+    ----------
+    first_mcu : int
+        The index of the first MCU in the interval.
+    nr_mcus : int
+        The number of MCUs in the interval.
+    mcus_x : int
+        The number of MCUs per line in the scan.
+    rect : tuple of int
+        The (first row, end row, first column, end column) of the MCUs.
+
+    Returns
+    -------
+    bool
+        True if the interval contains one or more of the MCUs.
+    """
+    row_first, column_first = divmod(first_mcu, mcus_x)
+    row_last, column_last = divmod(first_mcu + nr_mcus - 1, mcus_x)
+    row_start, row_end, column_start, column_end = rect
+    if row_last < row_start or row_first >= row_end:
+        return False
+
+    # Rows in between the first and last are complete
+    if row_last - row_first > 1:
+        if max(row_first + 1, row_start) < min(row_last, row_end):
+            return True
+
+    # The MCU columns in the first and last rows
+    lines = [(row_first, column_first, mcus_x - 1), (row_last, 0, column_last)]
+    if row_first == row_last:
+        lines = [(row_first, column_first, column_last)]
+
+    return any(
+        row_start <= row < row_end
+        and start < column_end
+        and end >= column_start
+        for row, start, end in lines
     )
-    for pq, tq, qk in zip(info['Pq'], info['Tq'], info['Qk']):
-        _prec = '2' if pq else '1'
-        if pq:
-            print(
-                'Qtable {0},  Precision = {1} bytes.  Source must be > 8 bits.'
-                .format(tq, _prec)
+
+
+def _decode_planes(jpg, workers=None, tables=None, release=False,
+                   sizes=None, window=None):
+    """Return the decoded samples for each component of a DCT-based JPEG.
+
+    Parameters
+    ----------
+    jpg : jpeg.JPEG
+        The JPEG to decode.
+    workers : int, optional
+        If greater than 1 then decode restart intervals in parallel using
+        the shared pool of `workers` processes from ``_get_executor()``.
+    tables : dict, optional
+        A cache of decoding tables to use and update.
+    release : bool, optional
+        If True then remove the ENC entries of each scan once decoded.
+    sizes : list of tuple of int, optional
+        The (rows, columns) of samples output by the IDCT of each block
+        for each component, as returned by ``_scale_frame()``. Default
+        (8, 8) for all components.
+    window : tuple of int, optional
+        If used then only decode the blocks in the (first row, end row,
+        first column, end column) of MCUs, as returned by ``_get_window()``.
+
+    Returns
+    -------
+    list of numpy.ndarray
+        The 2D samples for each component, in frame order. If `window` is
+        used then only the samples for the MCUs in the window.
+    """
+    components = _decode_coefficients(
+        jpg, workers, tables, release, window
+    )
+
+    return _get_planes(jpg, components, sizes, window)
+
+
+def _get_planes(jpg, components, sizes=None, window=None):
+    """Return the samples for each component from its DCT coefficients.
+
+    Parameters
+    ----------
+    jpg : jpeg.JPEG
+        The JPEG being decoded.
+    components : collections.OrderedDict
+        The component geometry, quantised coefficients and quantisation
+        tables, as returned by ``_decode_coefficients()``.
+    sizes : list of tuple of int, optional
+        The (rows, columns) of samples output by the IDCT of each block
+        for each component, default (8, 8) for all components.
+    window : tuple of int, optional
+        If used then only the blocks in the (first row, end row, first
+        column, end column) of MCUs are inverse transformed.
+
+    Returns
+    -------
+    list of numpy.ndarray
+        The 2D samples for each component, in frame order. If `window` is
+        used then only the samples for the MCUs in the window.
+    """
+    precision = jpg.precision
+    frame = jpg._index.frame
+    columns, rows = frame['X'], frame['Y']
+    h_max, v_max = max(frame['Hi']), max(frame['Vi'])
+    sizes = sizes or [(8, 8)] * len(components)
+    mcu_y0, mcu_y1, mcu_x0, mcu_x1 = window or (0, None, 0, None)
+
+    tracing = _tracing.TRACE
+    planes = []
+    for (ci, component), size in zip(components.items(), sizes):
+        if tracing:
+            start_time = perf_counter()
+
+        # The blocks with samples in the window
+        vi, hi = component['Vi'], component['Hi']
+        block_y0, block_x0 = mcu_y0 * vi, mcu_x0 * hi
+        block_y1, block_x1 = component['blocks_y'], component['blocks_x']
+        if window:
+            block_y1 = min(mcu_y1 * vi, block_y1)
+            block_x1 = min(mcu_x1 * hi, block_x1)
+
+        coefficients = component['coefficients']
+        blocks = _idct_blocks(
+            coefficients[block_y0:block_y1, block_x0:block_x1],
+            component['Qk'],
+            precision,
+            size
+        )
+        if tracing:
+            trace(
+                'idct', component=ci, blocks=blocks.shape[0] * blocks.shape[1],
+                elapsed=perf_counter() - start_time
             )
-        else:
-            print(
-                'Qtable {0},  Precision = {1} byte.'.format(tq, _prec)
+
+        # The component dimensions with the scaling applied
+        height = -(-rows * vi * size[0] // (v_max * 8))
+        width = -(-columns * hi * size[1] // (h_max * 8))
+        planes.append(
+            _blocks_to_plane(
+                blocks, height - block_y0 * size[0], width - block_x0 * size[1]
             )
+        )
 
-        new_qk = []
-        for index in ZIGZAG:
-            new_qk.append(qk[index])
+    return planes
 
-        for ii in range(0, 64, 8):
-            if not pq:
-                _line = '   '.join(['{:>2}'.format(qq) for qq in new_qk[ii:ii + 8]])
-            else:
-                _line = '    '.join(['{:>3}'.format(qq) for qq in new_qk[ii:ii + 8]])
-            print('             {}'.format(_line))
 
+def _scale_frame(frame, scale=1):
+    """Return the frame geometry and IDCT sizes for scaled decoding.
 
-def decode_baseline(jpg):
+    Subsampled components use a larger IDCT than the other components
+    where possible so that their planes are already at the scaled image
+    size and don't need upsampling. For example, with 4:2:0 at a `scale`
+    of 1/2 the luminance blocks are reduced to 4 x 4 samples while the
+    chrominance blocks keep all 8 x 8 samples.
+
+    Parameters
+    ----------
+    frame : dict
+        The SOFn marker segment info.
+    scale : float, optional
+        The scaling factor, one of 1/8, 2/8, ..., 1 (default).
+
+    Returns
+    -------
+    dict
+        A copy of `frame` with the 'X' and 'Y' of the scaled image and
+        'Hi' and 'Vi' replaced by the sampling factors of the scaled
+        component planes relative to each other.
+    list of tuple of int
+        The (rows, columns) of samples output by the IDCT of each block
+        for each component.
+
+    Raises
+    ------
+    ValueError
+        If `scale` isn't valid.
     """
+    size = 8 * scale
+    if size != int(size) or not 1 <= size <= 8:
+        raise ValueError(
+            "Invalid 'scale' value {}, must be N/8 with N from 1 to 8"
+            .format(scale)
+        )
+
+    size = int(size)
+    if size == 8:
+        return frame, [(8, 8)] * len(frame['Ci'])
+
+    def _idct_size(sampling, max_sampling):
+        """Return the IDCT size along one dimension."""
+        if (size * max_sampling) % sampling:
+            return size
+
+        larger = size * max_sampling // sampling
+        return larger if larger <= 8 else size
+
+    h_max, v_max = max(frame['Hi']), max(frame['Vi'])
+    sizes = [
+        (_idct_size(vi, v_max), _idct_size(hi, h_max))
+        for hi, vi in zip(frame['Hi'], frame['Vi'])
+    ]
+
+    # The relative size of each component plane
+    hi = [hi * nn for hi, (_, nn) in zip(frame['Hi'], sizes)]
+    vi = [vi * nn for vi, (nn, _) in zip(frame['Vi'], sizes)]
+    h_gcd, v_gcd = reduce(gcd, hi), reduce(gcd, vi)
+
+    frame = dict(frame)
+    frame['X'] = -(-frame['X'] * size // 8)
+    frame['Y'] = -(-frame['Y'] * size // 8)
+    frame['Hi'] = [ii // h_gcd for ii in hi]
+    frame['Vi'] = [ii // v_gcd for ii in vi]
 
+    return frame, sizes
+
+
+def _get_window(frame, scaled, region, scale=1):
+    """Return the MCUs to decode for a region of the image.
+
+    The window of MCUs includes an extra MCU on each side if the component
+    planes need upsampling, so the upsampled samples in the region are the
+    same as when decoding the whole image.
+
+    Parameters
+    ----------
+    frame : dict
+        The SOFn marker segment info.
+    scaled : dict
+        The frame info for the scaled image, as returned by
+        ``_scale_frame()``.
+    region : tuple of int
+        The (y0, x0, height, width) of the region in the scaled image.
+    scale : float, optional
+        The scaling factor, default 1.
+
+    Returns
+    -------
+    tuple of int
+        The (first row, end row, first column, end column) of the MCUs in
+        the window.
+    dict
+        A copy of `scaled` with 'X' and 'Y' the size of the window in the
+        scaled image.
+    tuple of slice
+        The (rows, columns) of the region in the window.
+
+    Raises
+    ------
+    ValueError
+        If `region` isn't within the image.
     """
+    _check_region(scaled, region)
+    y0, x0, height, width = region
 
-    # For each SOS in the file
-    #   For each component, j, in the scan
-    #       Determine the quantization table, Cs(j)
-    #       Determine the DC table, Td(j)
-    #       Determine the AC table, Ta(j)
+    # The size of an MCU in the scaled image
+    mcu_rows = 8 * max(frame['Vi']) * int(8 * scale) // 8
+    mcu_columns = 8 * max(frame['Hi']) * int(8 * scale) // 8
+    mcus_y = -(-scaled['Y'] // mcu_rows)
+    mcus_x = -(-scaled['X'] // mcu_columns)
 
-    # Quantisation tables
-    q_tables = {}
-    for key in jpg.get_keys('DQT'):
-        (marker, fill_bytes, dqt) = jpg.info[key]
-        #_debug_dqt(key.split('@')[1], marker, 'DQT', dqt)
-        for table_id, quantisation_table in zip(dqt['Tq'], dqt['Qk']):
-            q_tables[table_id] = quantisation_table
-
-    # Huffman tables: up to 2 AC and 2 DC
-    h_tables = {
-        0 : {},  # DC or lossless
-        1 : {}  # AC
-    }
-    for key in jpg.get_keys('DHT'):
-        (marker, fill_bytes, dht) = jpg.info[key]
-        _debug_dht(key.split('@')[1], marker, 'DHT', dht)
-        for _id, _type, bits, huffval in zip(dht['Tc'], dht['Th'], dht['Li'], dht['Vij']):
-            h_tables[_type][_id] = (bits, huffval)
-
-    huff_tables = _get_huffman(h_tables)
-
-    sos_keys = jpg.get_keys('SOS')
-    if not sos_keys:
+    window = [
+        y0 // mcu_rows, -(-(y0 + height) // mcu_rows),
+        x0 // mcu_columns, -(-(x0 + width) // mcu_columns),
+    ]
+    if len(set(zip(scaled['Hi'], scaled['Vi']))) > 1:
+        # Upsampling uses the neighbouring samples
+        window = [
+            max(window[0] - 1, 0), min(window[1] + 1, mcus_y),
+            max(window[2] - 1, 0), min(window[3] + 1, mcus_x),
+        ]
+
+    top, left = window[0] * mcu_rows, window[2] * mcu_columns
+    scaled = dict(scaled)
+    scaled['Y'] = min(window[1] * mcu_rows, scaled['Y']) - top
+    scaled['X'] = min(window[3] * mcu_columns, scaled['X']) - left
+    crop = (
+        slice(y0 - top, y0 - top + height),
+        slice(x0 - left, x0 - left + width)
+    )
+
+    return tuple(window), scaled, crop
+
+
+def _check_region(frame, region):
+    """Return the rows and columns of `region` in the image.
+
+    Parameters
+    ----------
+    frame : dict
+        The SOFn marker segment info, or the frame info for the scaled
+        image.
+    region : tuple of int
+        The (y0, x0, height, width) of the region.
+
+    Returns
+    -------
+    tuple of slice
+        The (rows, columns) of the region.
+
+    Raises
+    ------
+    ValueError
+        If `region` isn't within the image.
+    """
+    y0, x0, height, width = region
+    if (
+        min(y0, x0) < 0
+        or min(height, width) < 1
+        or y0 + height > frame['Y']
+        or x0 + width > frame['X']
+    ):
         raise ValueError(
-            "Unable to decode the JPEG file as it contains no 'SOS' markers"
+            "The region {} isn't within the {} x {} image".format(
+                tuple(region), frame['Y'], frame['X']
+            )
+        )
+
+    return slice(y0, y0 + height), slice(x0, x0 + width)
+
+
+def _check_output(jpg, frame, region, planar, out, dtype):
+    """Return `out` as an ndarray suitable for the decoded image data.
+
+    Used to check `out` before decoding rather than after.
+
+    Parameters
+    ----------
+    jpg : jpeg.JPEG
+        The JPEG being decoded.
+    frame : dict
+        The SOFn marker segment info, or the frame info for the scaled
+        image.
+    region : tuple of int or None
+        The (y0, x0, height, width) of the region being decoded, or None
+        for the whole image.
+    planar : bool
+        If True then the image data has shape (samples, rows, columns).
+    out : numpy.ndarray or buffer
+        The object to write the image data to.
+    dtype : numpy.dtype or None
+        The requested dtype of the image data.
+
+    Returns
+    -------
+    numpy.ndarray
+        An ndarray using the memory of `out`, as returned by
+        ``get_output()``.
+    """
+    if region is not None:
+        frame = dict(frame, Y=region[2], X=region[3])
+
+    default = np.uint8 if jpg.precision <= 8 else np.uint16
+
+    return get_output(out, get_image_shape(frame, planar), dtype, default)
+
+
+def _get_components(frame):
+    """Return the geometry of each component in the frame.
+
+    Parameters
+    ----------
+    frame : dict
+        The SOFn marker segment info.
+
+    Returns
+    -------
+    collections.OrderedDict
+        The component geometry as {Ci : dict}, in frame order. Each dict
+        contains the 'Hi', 'Vi' and 'Tqi' values from the frame header,
+        the 'width' and 'height' of the component in samples, the number of
+        blocks containing samples, 'blocks_x' and 'blocks_y', and the
+        number of blocks including the MCU padding of interleaved scans,
+        'padded_x' and 'padded_y'.
+
+    References
+    ----------
+    ISO/IEC 10918-1, Section A.1.1 and A.2.4
+    """
+    columns, rows = frame['X'], frame['Y']
+    h_max, v_max = max(frame['Hi']), max(frame['Vi'])
+    # The number of MCUs per line and column in interleaved scans
+    mcus_x = -(-columns // (8 * h_max))
+    mcus_y = -(-rows // (8 * v_max))
+
+    components = OrderedDict()
+    for ci, hi, vi, tqi in zip(
+        frame['Ci'], frame['Hi'], frame['Vi'], frame['Tqi']
+    ):
+        width = -(-columns * hi // h_max)
+        height = -(-rows * vi // v_max)
+        components[ci] = {
+            'Hi' : hi,
+            'Vi' : vi,
+            'Tqi' : tqi,
+            'width' : width,
+            'height' : height,
+            'blocks_x' : -(-width // 8),
+            'blocks_y' : -(-height // 8),
+            'padded_x' : mcus_x * hi,
+            'padded_y' : mcus_y * vi,
+        }
+
+    return components
+
+
+def _get_huffman_table(bits, huffval, tables):
+    """Return the HuffmanTable for `bits` and `huffval`.
+
+    Parameters
+    ----------
+    bits : list of int
+        The DHT 'Li' values.
+    huffval : list of tuple
+        The DHT 'Vij' values.
+    tables : dict or cache.LRUCache
+        The cache of decoding tables to use and update.
+
+    Returns
+    -------
+    huffman.HuffmanTable
+        The table, reused from `tables` if an identical table has already
+        been built.
+    """
+    key = ('DHT', tuple(bits), tuple(huffval))
+    table = tables.get(key)
+    if table is None:
+        table = tables[key] = get_huffman_table(bits, huffval)
+
+    return table
+
+
+def _get_quantisation_table(qk, tables):
+    """Return the quantisation table `qk` as a read-only float32 ndarray.
+
+    Parameters
+    ----------
+    qk : list of int
+        The DQT 'Qk' values, in zigzag order.
+    tables : dict or cache.LRUCache
+        The cache of decoding tables to use and update.
+
+    Returns
+    -------
+    numpy.ndarray
+        The table in natural (row-major) order, reused from `tables` if an
+        identical table has already been built.
+    """
+    key = ('DQT', tuple(qk))
+    table = tables.get(key)
+    if table is None:
+        table = np.asarray(qk, dtype=np.float32)[ZIGZAG_INDEX]
+        table.flags.writeable = False
+        tables[key] = table
+
+    return table
+
+
+def _get_scan_data(data):
+    """Return the entropy-coded `data` with any byte stuffing removed.
+
+    Each 'ENC@offset' entry always holds the entropy-coded data as it
+    appears in the file, including any 0xFF 0x00 byte stuffing, whether
+    it's the ``memoryview`` recorded by the parser or some other
+    bytes-like. The stuffing is only removed once the scan is decoded.
+    """
+    return bytes(data).replace(b'\xff\x00', b'\xff')
+
+
+def _get_segments(scan, interval, nr_mcus):
+    """Return the restart intervals of a scan.
+
+    Parameters
+    ----------
+    scan : dict
+        The SOS marker segment info, including its ENC entries.
+    interval : int
+        The number of MCUs in each restart interval, 0 if restart intervals
+        aren't used.
+    nr_mcus : int
+        The total number of MCUs in the scan.
+
+    Returns
+    -------
+    list of (object, int, int)
+        The entropy-coded data of each restart interval, as recorded by
+        the parser and still containing any byte stuffing, with the index
+        of its first MCU and its number of MCUs.
+
+    Raises
+    ------
+    ValueError
+        If the scan is missing the entropy-coded data for one or more
+        restart intervals.
+    """
+    # Each ENC segment is a restart interval
+    interval = interval or nr_mcus
+    segments = []
+    first_mcu = 0
+    for key, data in scan.items():
+        if not key.startswith('ENC') or first_mcu >= nr_mcus:
+            continue
+
+        length = min(interval, nr_mcus - first_mcu)
+        segments.append((data, first_mcu, length))
+        first_mcu += interval
+
+    if first_mcu < nr_mcus:
+        raise ValueError(
+            "The scan is missing entropy-coded data for one or more "
+            "restart intervals"
         )
 
-    for key in sos_keys:
-        print("Decoding scan: '{}'".format(key))
-        (marker, fill_bytes, scan) = jpg.info[key]
+    return segments
 
-        # Debugging output
-        _debug_sos(key.split('@')[1], marker, 'SOS', scan)
 
-        csk, td, ta = scan['Csk'], scan['Td'], scan['Ta']
+def _get_scan_spec(scan, components, h_tables, dc=True, ac=True):
+    """Return the MCU layout of a scan.
 
-        # For the encoded data in the scan
-        enc_keys = [kk for kk in scan.keys() if 'ENC' in kk]
-        enc_keys = sorted(enc_keys, key=lambda x: int(x.split('@')[1]))
+    Parameters
+    ----------
+    scan : dict
+        The SOS marker segment info.
+    components : collections.OrderedDict
+        The component geometry, as returned by ``_get_components()``.
+    h_tables : dict
+        The current Huffman tables as {Tc : {Th : HuffmanTable}}.
+    dc : bool, optional
+        If False then the scan doesn't use the DC tables and their entry
+        in the specification is None, default True.
+    ac : bool, optional
+        If False then the scan doesn't use the AC tables and their entry
+        in the specification is None, default True.
 
-        # The encoded data still contains 0xFF 0x00 bytes
-        for enc_key in enc_keys:
-            print("Decoded encoded data: '{}'".format(enc_key))
-            encoded_data = scan[enc_key]
-            print(encoded_data)
-            for bb in encoded_data:
-                print('{:>08b}'.format(bb))
+    Returns
+    -------
+    int, int, list of tuple
+        The number of MCUs per line, the total number of MCUs and the
+        decoding specification for each component in the scan, as used by
+        ``_decode_huffman_segment()``.
 
-            for cs, dc_id, ac_id in zip(csk, td, ta):
-                dc_huff = h_tables[0][dc_id]
-                ac_huff = h_tables[1][ac_id]
+    References
+    ----------
+    ISO/IEC 10918-1, Section A.2
+    """
+    spec = []
+    for cs, td, ta in zip(scan['Csj'], scan['Tdj'], scan['Taj']):
+        component = components[cs]
+        try:
+            dc_table = h_tables[0][td] if dc else None
+            ac_table = h_tables[1][ta] if ac else None
+        except KeyError:
+            raise ValueError(
+                "The scan uses a Huffman table that hasn't been defined"
+            )
 
-                pass
+        padded_x = component['padded_x']
+        if scan['Ns'] == 1:
+            # Non-interleaved: each MCU is a single block
+            spec.append((padded_x, 1, [0], dc_table, ac_table))
+        else:
+            hi, vi = component['Hi'], component['Vi']
+            offsets = [
+                yy * padded_x + xx for yy in range(vi) for xx in range(hi)
+            ]
+            spec.append((vi * padded_x, hi, offsets, dc_table, ac_table))
+
+    if scan['Ns'] == 1:
+        component = components[scan['Csj'][0]]
+        mcus_x = component['blocks_x']
+        nr_mcus = mcus_x * component['blocks_y']
+    else:
+        component = components[scan['Csj'][0]]
+        mcus_x = component['padded_x'] // component['Hi']
+        nr_mcus = mcus_x * component['padded_y'] // component['Vi']
+
+    return mcus_x, nr_mcus, spec
+
+
+def _idct_blocks(coefficients, qtable, precision, size=(8, 8)):
+    """Return the samples for blocks of quantised DCT coefficients.
+
+    All the blocks are processed at once: the coefficients are reordered
+    from zigzag to natural order and dequantised, transformed with the
+    separable matrix form of the IDCT, then level shifted and clipped.
+
+    Parameters
+    ----------
+    coefficients : numpy.ndarray
+        The quantised coefficients in zigzag order, with shape (..., 64).
+    qtable : numpy.ndarray
+        The quantisation table in natural order.
+    precision : int
+        The sample precision in bits, 8 or 12.
+    size : tuple of int, optional
+        The (rows, columns) of samples in each output block, from 1 to 8.
+        Less than 8 uses a reduced size IDCT, scaling the block by
+        `size` / 8, see ``_reduced_idct_matrix()``. A `size` of (1, 1)
+        uses the DC coefficient only. Default (8, 8).
+
+    Returns
+    -------
+    numpy.ndarray
+        The samples with shape (..., rows, columns), as uint8 if
+        `precision` is 8 or uint16 otherwise.
+
+    References
+    ----------
+    ISO/IEC 10918-1, Sections A.3.1, A.3.3 and A.3.4
+    """
+    shape = coefficients.shape[:-1]
+    rows, columns = size
+    if size == (8, 8):
+        blocks = coefficients.reshape(-1, 64)[:, ZIGZAG_INDEX]
+        blocks = (blocks * qtable).reshape(-1, 8, 8)
+        samples = np.matmul(np.matmul(IDCT_MATRIX_T, blocks), IDCT_MATRIX)
+    elif size == (1, 1):
+        # DC only, the average value of the block
+        samples = coefficients.reshape(-1, 64)[:, :1] * (qtable[0] / 8)
+    else:
+        v_index, v_matrix = REDUCED_IDCT.get(rows, (None, IDCT_MATRIX))
+        h_index, h_matrix = REDUCED_IDCT.get(columns, (None, IDCT_MATRIX))
+        # Only the coefficients that contribute to the output
+        natural = np.ix_(
+            np.arange(8) if v_index is None else v_index,
+            np.arange(8) if h_index is None else h_index
+        )
+        index = ZIGZAG_INDEX.reshape(8, 8)[natural].ravel()
+        blocks = coefficients.reshape(-1, 64)[:, index]
+        blocks = blocks * qtable.reshape(8, 8)[natural].ravel()
+        blocks = blocks.reshape(-1, v_matrix.shape[0], h_matrix.shape[0])
+        samples = np.matmul(np.matmul(v_matrix.T, blocks), h_matrix)
+
+    samples += 1 << (precision - 1)
+    np.rint(samples, out=samples)
+    np.clip(samples, 0, (1 << precision) - 1, out=samples)
+
+    dtype = np.uint8 if precision <= 8 else np.uint16
+    return samples.astype(dtype).reshape(shape + (rows, columns))
+
+
+def _planes_to_image(planes, planar=False, out=None, dtype=None):
+    """Return the component `planes` as a single ndarray.
+
+    Parameters
+    ----------
+    planes : list of numpy.ndarray
+        The 2D samples for each component, all with the same shape.
+    planar : bool, optional
+        If True then return multiple components with shape (samples, rows,
+        columns) rather than (rows, columns, samples). Default False.
+    out : numpy.ndarray, optional
+        The array to write the image to, as returned by ``get_output()``.
+    dtype : numpy.dtype, optional
+        The dtype of the image, defaults to the dtype of `out` if used or
+        of the planes otherwise.
+
+    Returns
+    -------
+    numpy.ndarray
+        The image with shape (rows, columns) if there's a single component
+        or (rows, columns, samples) or (samples, rows, columns) otherwise.
+
+    Raises
+    ------
+    ValueError
+        If the components don't all have the same dimensions.
+    """
+    if len(set(plane.shape for plane in planes)) != 1:
+        raise ValueError(
+            "Unable to combine component planes with different dimensions"
+        )
+
+    if len(planes) == 1 and out is None and dtype is None:
+        return np.ascontiguousarray(planes[0])
+
+    rows, columns = planes[0].shape
+    if len(planes) == 1:
+        shape = (rows, columns)
+    elif planar:
+        shape = (len(planes), rows, columns)
+    else:
+        shape = (rows, columns, len(planes))
+
+    if out is None:
+        out = np.empty(shape, dtype=dtype or planes[0].dtype)
+
+    if len(planes) == 1:
+        np.copyto(out, planes[0], casting='unsafe')
+        return out
+
+    for ii, plane in enumerate(planes):
+        dst = out[ii] if planar else out[..., ii]
+        np.copyto(dst, plane, casting='unsafe')
+
+    return out
+
+
+def get_image_shape(frame, planar=False):
+    """Return the shape of the decoded image data for `frame`.
+
+    Parameters
+    ----------
+    frame : dict
+        The SOFn marker segment info.
+    planar : bool, optional
+        If True then return the planar shape for multiple components.
+
+    Returns
+    -------
+    tuple of int
+        (rows, columns) for a single component, otherwise (rows, columns,
+        samples) or (samples, rows, columns) if `planar` is True.
+    """
+    rows, columns, samples = frame['Y'], frame['X'], frame['Nf']
+    if samples == 1:
+        return (rows, columns)
+
+    if planar:
+        return (samples, rows, columns)
+
+    return (rows, columns, samples)
+
+
+def get_output(out, shape, dtype=None, default=np.uint8):
+    """Return `out` as a writable ndarray for the decoded image data.
+
+    Parameters
+    ----------
+    out : numpy.ndarray or buffer
+        The ndarray or buffer to write the image data to.
+    shape : tuple of int
+        The shape of the image data.
+    dtype : numpy.dtype, optional
+        The dtype of the image data. If `out` is an ndarray then defaults
+        to the dtype of `out`, otherwise to `default`.
+    default : numpy.dtype, optional
+        The dtype to use with buffers if `dtype` isn't used.
+
+    Returns
+    -------
+    numpy.ndarray
+        `out`, or an ndarray using the memory of `out` if `out` is a
+        buffer.
+
+    Raises
+    ------
+    TypeError
+        If `out` isn't an ndarray and doesn't support the buffer protocol.
+    ValueError
+        If `out` isn't writable or doesn't have the required shape, size
+        or dtype.
+    """
+    if isinstance(out, np.ndarray):
+        if out.shape != tuple(shape):
+            raise ValueError(
+                "The shape of 'out', {}, doesn't match the shape of the "
+                "image data, {}".format(out.shape, tuple(shape))
+            )
+
+        if dtype is not None and out.dtype != np.dtype(dtype):
+            raise ValueError(
+                "The dtype of 'out', {}, doesn't match 'dtype', {}"
+                .format(out.dtype, np.dtype(dtype))
+            )
+    else:
+        dtype = np.dtype(dtype or default)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        try:
+            length = memoryview(out).nbytes
+        except TypeError:
+            raise TypeError(
+                "'out' must be a numpy ndarray or support the buffer protocol"
+            )
+
+        if length != nbytes:
+            raise ValueError(
+                "The size of 'out', {} bytes, doesn't match the size of the "
+                "image data, {} bytes".format(length, nbytes)
+            )
+
+        out = np.frombuffer(out, dtype=dtype).reshape(shape)
+
+    if not out.flags.writeable:
+        raise ValueError("'out' must be writable")
+
+    return out
+
+
+def _release_scan(scan):
+    """Remove the ENC entries from the SOS marker segment info `scan`.
+
+    Releases the scan's reference to its entropy-coded data, which is then
+    freed unless referenced elsewhere. The RSTn entries are kept.
+    """
+    for key in [kk for kk in scan if kk.startswith('ENC')]:
+        del scan[key]
@@ -0,0 +1,1216 @@
+"""Decoders for 10918-1 lossless JPEGs."""
+
+from struct import Struct, error as StructError
+from time import perf_counter
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+from pydcmjpeg import tracing as _tracing
+from pydcmjpeg.cache import TABLE_CACHE
+from pydcmjpeg.decoders.arithmetic import (
+    _decode_lossless_differences, _get_lossless_units
+)
+from pydcmjpeg.decoders.jpeg_decoders import (
+    _check_output, _check_region, _convert_planes, _get_huffman_table,
+    _get_scan_data, _get_segments, _planes_to_image, _release_scan
+)
+from pydcmjpeg.huffman import LOOKAHEAD
+from pydcmjpeg.tracing import trace
+
+
+# The number of bits resolved by a single lookup in a difference table
+DIFFERENCE_LOOKAHEAD = 16
+_DIFFERENCE_MASK = (1 << DIFFERENCE_LOOKAHEAD) - 1
+
+# Unpack the next 32 bits of entropy-coded data
+_UNPACK_UINT32 = Struct('>I').unpack_from
+
+# The number of bits of entropy-coded data in each lane of a scan
+LANE_BITS = 256
+# The number of samples at the start of each lane that the preceding lane
+#   can synchronise with, at most 127
+_SYNC_SAMPLES = 16
+# The number of lanes a lane may be continued through while synchronising
+_SYNC_LANES = 8
+# The difference given to invalid Huffman codes by the lane decoder
+_INVALID_DIFFERENCE = 1 << 20
+
+
+def decode_lossless(jpg, workers=None, tables=None, release=False,
+                    as_rgb=False, upsample='fancy', planar=False, out=None,
+                    dtype=None, scale=1, region=None):
+    """Return the decoded image data for a Process 14 or 15 lossless JPEG.
+
+    The Huffman decoding, prediction and reconstruction are vectorised, so
+    a 512 x 512 16-bit greyscale frame takes tens of milliseconds to
+    decode. Arithmetic coded differences and scans that use more than one
+    Huffman table are entropy decoded one sample at a time in Python, which
+    is much slower.
+
+    Parameters
+    ----------
+    jpg : jpeg.JPEG
+        The JPEG to decode.
+    workers : int, optional
+        Not used, restart intervals are always decoded in the current
+        process.
+    tables : dict, optional
+        A cache of decoding tables to use and update, if not used then the
+        process-wide ``cache.TABLE_CACHE`` is used.
+    release : bool, optional
+        If True then remove the ENC entries of each scan from `jpg` once
+        the scan has been decoded. Default False.
+    as_rgb : bool, optional
+        If True then convert the image data from YCbCr to RGB, which
+        requires 3 components. If False (default) then no colour space
+        conversion is performed.
+    upsample : str, optional
+        The method used to upsample subsampled components to the full
+        image size, ``'fancy'`` (default) or ``'nearest'``.
+    planar : bool, optional
+        If True then return multiple component image data with shape
+        (samples, rows, columns), otherwise (default) return it with shape
+        (rows, columns, samples).
+    out : numpy.ndarray or buffer, optional
+        If used then write the image data to `out` instead of a new array.
+    dtype : numpy.dtype, optional
+        The dtype of the returned image data, default uint8 if the sample
+        precision is 8 bits or less or uint16 otherwise. If `out` is an
+        ndarray then defaults to the dtype of `out`.
+    scale : float, optional
+        Must be 1 (default), scaled decoding isn't available for lossless
+        JPEGs.
+    region : tuple of int, optional
+        If used then only return the region (y0, x0, height, width) of the
+        image. Every sample is predicted from its neighbours, so the whole
+        image is still decoded.
+
+    Returns
+    -------
+    numpy.ndarray
+        The decoded image data with shape (rows, columns) if there's a
+        single component or (rows, columns, samples) otherwise. If `out`
+        is used then the returned array uses the memory of `out`.
+
+    Raises
+    ------
+    NotImplementedError
+        If `scale` isn't 1.
+    ValueError
+        If the JPEG contains no scans or the encoded data is invalid, if
+        `as_rgb` is True and there aren't 3 components, if `out` isn't
+        suitable or if `region` isn't within the image.
+
+    References
+    ----------
+    ISO/IEC 10918-1, Annex H
+    """
+    tracing = _tracing.TRACE
+    if tracing:
+        start_time = perf_counter()
+
+    if scale != 1:
+        raise NotImplementedError(
+            "Scaled decoding isn't available for lossless JPEGs"
+        )
+
+    frame = jpg._index.frame
+    crop = None
+    if region is not None:
+        crop = _check_region(frame, region)
+
+    if out is not None:
+        out = _check_output(jpg, frame, region, planar, out, dtype)
+
+    planes = _decode_lossless_planes(jpg, tables, release)
+    planes = _convert_planes(planes, frame, as_rgb=as_rgb, upsample=upsample)
+    if crop is not None:
+        planes = [plane[crop] for plane in planes]
+
+    arr = _planes_to_image(planes, planar=planar, out=out, dtype=dtype)
+    if tracing:
+        trace(
+            'decode',
+            process=15 if 'SOF11' in jpg._index else 14,
+            elapsed=perf_counter() - start_time
+        )
+
+    return arr
+
+
+def _decode_lossless_planes(jpg, tables=None, release=False):
+    """Return the decoded samples for each component of a lossless JPEG.
+
+    Marker segments are processed in the order they occur so that DHT, DAC
+    and DRI segments between scans apply to the following scans.
+
+    Parameters
+    ----------
+    jpg : jpeg.JPEG
+        The JPEG to decode.
+    tables : dict, optional
+        A cache of decoding tables to use and update.
+    release : bool, optional
+        If True then remove the ENC entries of each scan once decoded.
+
+    Returns
+    -------
+    list of numpy.ndarray
+        The 2D samples for each component, in frame order, as uint8 if the
+        sample precision is 8 bits or less or uint16 otherwise.
+
+    Raises
+    ------
+    ValueError
+        If the JPEG contains no scans or the encoded data is invalid.
+    """
+    if tables is None:
+        tables = TABLE_CACHE
+
+    frame = jpg._index.frame
+    tracing = _tracing.TRACE
+    planes = {}
+    h_tables = {}
+    # The arithmetic coding conditioning as {Tc : {Tb : Cs}}
+    conditioning = {0 : {}, 1 : {}} if 'SOF11' in jpg._index else None
+    restart_interval = 0
+    for key in jpg._keys:
+        name = key.split('@')[0]
+        info = jpg.info[key][2]
+        if name == 'DHT':
+            for tc, th, li, vij in zip(
+                info['Tc'], info['Th'], info['Li'], info['Vij']
+            ):
+                if tc == 0:
+                    h_tables[th] = (
+                        (_get_huffman_table(li, vij, tables), )
+                        + _get_difference_tables(li, vij, tables)
+                    )
+        elif name == 'DAC' and conditioning is not None:
+            for tc, tb, cs in zip(info['Tc'], info['Tb'], info['Cs']):
+                conditioning[tc][tb] = cs
+        elif name == 'DRI':
+            restart_interval = info['Ri']
+        elif name == 'SOS':
+            if tracing:
+                start_time = perf_counter()
+
+            planes.update(
+                _decode_lossless_scan(
+                    info, frame, h_tables, restart_interval, conditioning
+                )
+            )
+            if tracing:
+                trace(
+                    'decode_scan', key=key, components=len(info['Csj']),
+                    elapsed=perf_counter() - start_time
+                )
+
+            if release:
+                _release_scan(info)
+
+    if not planes:
+        raise ValueError(
+            "Unable to decode the JPEG file as it contains no 'SOS' markers"
+        )
+
+    dtype = np.uint8 if frame['P'] <= 8 else np.uint16
+    return [planes[ci].astype(dtype) for ci in frame['Ci']]
+
+
+def _decode_lossless_scan(scan, frame, h_tables, restart_interval,
+                          conditioning=None):
+    """Return the reconstructed samples for the components in a scan.
+
+    Parameters
+    ----------
+    scan : dict
+        The SOS marker segment info, including the ENC entries.
+    frame : dict
+        The SOF3 or SOF11 marker segment info.
+    h_tables : dict
+        The current DC Huffman tables as {Th : (HuffmanTable, ...)}, with
+        the lookup tables returned by ``_get_difference_tables()``.
+    restart_interval : int
+        The number of MCUs in each restart interval, 0 if restart intervals
+        aren't used.
+    conditioning : dict, optional
+        If used then the scan is arithmetic coded and this is the current
+        arithmetic coding conditioning as {Tc : {Tb : Cs}}, otherwise
+        (default) the scan is Huffman coded.
+
+    Returns
+    -------
+    dict
+        The samples of each component in the scan as {Ci : numpy.ndarray},
+        with the samples as int64 and shape (height, width).
+
+    Raises
+    ------
+    ValueError
+        If the encoded data is invalid.
+
+    References
+    ----------
+    ISO/IEC 10918-1, Sections A.2 and H.1
+    """
+    predictor, point_transform = scan['Ss'], scan['Al']
+    if not 1 <= predictor <= 7:
+        raise ValueError(
+            "Invalid lossless predictor selection value {}".format(predictor)
+        )
+
+    # The (Hi, Vi, width, height) of each component
+    columns, rows = frame['X'], frame['Y']
+    h_max, v_max = max(frame['Hi']), max(frame['Vi'])
+    geometry = {
+        ci : (hi, vi, -(-columns * hi // h_max), -(-rows * vi // v_max))
+        for ci, hi, vi in zip(frame['Ci'], frame['Hi'], frame['Vi'])
+    }
+
+    # The sampling factors used for the MCU layout
+    csj = scan['Csj']
+    if scan['Ns'] == 1:
+        # Non-interleaved: each MCU is a single sample
+        _, _, mcus_x, mcus_y = geometry[csj[0]]
+        sampling = [(1, 1)]
+    else:
+        mcus_x, mcus_y = -(-columns // h_max), -(-rows // v_max)
+        sampling = [geometry[ci][:2] for ci in csj]
+
+    if conditioning is not None:
+        units = _get_lossless_units(scan, sampling, conditioning)
+    else:
+        units = []
+        for td, (hi, vi) in zip(scan['Tdj'], sampling):
+            try:
+                units.extend([h_tables[td]] * (hi * vi))
+            except KeyError:
+                raise ValueError(
+                    "The scan uses a Huffman table that hasn't been defined"
+                )
+
+    nr_mcus = mcus_x * mcus_y
+    segments = [
+        (_get_scan_data(data), first_mcu, length)
+        for data, first_mcu, length in _get_segments(
+            scan, restart_interval, nr_mcus
+        )
+    ]
+
+    # Decode the differences for every sample in the scan
+    if conditioning is not None:
+        differences = np.concatenate([
+            _decode_lossless_differences(
+                data, units, length, mcus_x, first_mcu % mcus_x
+            )
+            for data, first_mcu, length in segments
+        ])
+    else:
+        differences = None
+        segments = [(data, length) for data, _, length in segments]
+        if all(unit is units[0] for unit in units):
+            differences = _decode_lanes(segments, units[0][3], len(units))
+
+        if differences is None:
+            # Mixed tables, or the lanes didn't synchronise or the data is
+            #   invalid, so decode one sample at a time
+            differences = np.concatenate([
+                _decode_differences(data, units, length)
+                for data, length in segments
+            ])
+
+    differences = differences.reshape(mcus_y, mcus_x, -1)
+
+    # Reconstruct the samples of each component from its differences
+    interval = restart_interval or nr_mcus
+    restarts = None
+    if interval % mcus_x and interval < nr_mcus:
+        # The MCU row and column of the first MCU of each interval
+        restarts = np.divmod(np.arange(0, nr_mcus, interval), mcus_x)
+
+    planes = {}
+    start = 0
+    for ci, (hi, vi) in zip(csj, sampling):
+        plane = differences[..., start:start + hi * vi]
+        plane = plane.reshape(mcus_y, mcus_x, vi, hi).transpose(0, 2, 1, 3)
+        plane = plane.reshape(mcus_y * vi, mcus_x * hi)
+        start += hi * vi
+
+        if restarts is not None:
+            plane = _reconstruct(
+                plane, predictor, frame['P'], point_transform,
+                restarts=(restarts[0] * vi, restarts[1] * hi)
+            )
+        else:
+            plane = _reconstruct(
+                plane,
+                predictor,
+                frame['P'],
+                point_transform,
+                interval // mcus_x * vi if interval < nr_mcus else None
+            )
+
+        _, _, width, height = geometry[ci]
+        planes[ci] = plane[:height, :width]
+
+    return planes
+
+
+def _decode_differences(data, units, nr_mcus):
+    """Return the differences Huffman decoded from a restart interval.
+
+    When every sample uses the same table, pairs of short codes are
+    resolved with a single lookup.
+
+    Parameters
+    ----------
+    data : bytes-like
+        The entropy-coded data for the interval, without byte stuffing.
+    units : list of tuple
+        The Huffman table and the difference lookup tables, as returned by
+        ``_get_difference_tables()``, for each sample in an MCU.
+    nr_mcus : int
+        The number of MCUs in the interval.
+
+    Returns
+    -------
+    numpy.ndarray
+        The int32 differences of the samples in the interval, in the order
+        they were encoded.
+
+    Raises
+    ------
+    ValueError
+        If the encoded data is invalid.
+
+    References
+    ----------
+    ISO/IEC 10918-1, Section H.1.2.2
+    """
+    length = len(data)
+    # Pad so the last bytes can be added to the buffer with a 32-bit read
+    data = bytes(data) + b'\x00' * 8
+    unpack = _UNPACK_UINT32
+    differences = []
+    add_difference = differences.append
+    bits, nbits, pos = 0, 0, 0
+
+    try:
+        remaining = nr_mcus * len(units)
+        if all(unit is units[0] for unit in units):
+            table, lookup, pairs, _ = units[0]
+            while remaining > 1:
+                if nbits < DIFFERENCE_LOOKAHEAD:
+                    bits = (bits & ((1 << nbits) - 1)) << 32
+                    bits |= unpack(data, pos)[0]
+                    nbits += 32
+                    pos += 4
+
+                index = bits >> (nbits - DIFFERENCE_LOOKAHEAD)
+                index &= _DIFFERENCE_MASK
+                size, first, second = pairs[index]
+                if size:
+                    nbits -= size
+                    add_difference(first)
+                    add_difference(second)
+                    remaining -= 2
+                    continue
+
+                entry = lookup[index]
+                if entry:
+                    nbits -= entry & 0xFF
+                    add_difference(entry >> 8)
+                else:
+                    bits, nbits, pos, value = _decode_long_difference(
+                        data, bits, nbits, pos, table
+                    )
+                    add_difference(value)
+
+                remaining -= 1
+
+            # The last sample, if any
+            units = units[:remaining]
+            nr_mcus = 1
+
+        for table, lookup, _, _ in units * nr_mcus:
+            if nbits < DIFFERENCE_LOOKAHEAD:
+                bits = (bits & ((1 << nbits) - 1)) << 32
+                bits |= unpack(data, pos)[0]
+                nbits += 32
+                pos += 4
+
+            # Most codes and their additional bits are resolved by one lookup
+            index = bits >> (nbits - DIFFERENCE_LOOKAHEAD)
+            index &= _DIFFERENCE_MASK
+            entry = lookup[index]
+            if entry:
+                nbits -= entry & 0xFF
+                add_difference(entry >> 8)
+                continue
+
+            bits, nbits, pos, value = _decode_long_difference(
+                data, bits, nbits, pos, table
+            )
+            add_difference(value)
+    except StructError:
+        # Ran out of data, including the padding
+        pos = len(data)
+
+    if (pos << 3) - nbits > (length << 3):
+        raise ValueError(
+            "The encoded data ended before all the MCUs were decoded"
+        )
+
+    return np.asarray(differences, dtype=np.int32)
+
+
+def _decode_long_difference(data, bits, nbits, pos, table):
+    """Return a difference that can't be decoded with a single lookup.
+
+    Parameters
+    ----------
+    data : bytes
+        The padded entropy-coded data.
+    bits : int
+        The bit buffer, with at least ``DIFFERENCE_LOOKAHEAD`` bits.
+    nbits : int
+        The number of unused bits in `bits`.
+    pos : int
+        The offset of the next byte of `data` to add to the buffer.
+    table : huffman.HuffmanTable
+        The Huffman table to use.
+
+    Returns
+    -------
+    tuple of int
+        The updated (`bits`, `nbits`, `pos`) and the difference.
+
+    References
+    ----------
+    ISO/IEC 10918-1, Sections F.2.2.1 and H.1.2.2
+    """
+    if nbits < 32:
+        bits = (bits & ((1 << nbits) - 1)) << 32
+        bits |= _UNPACK_UINT32(data, pos)[0]
+        nbits += 32
+        pos += 4
+
+    # Long codes or large differences
+    index = (bits >> (nbits - LOOKAHEAD)) & ((1 << LOOKAHEAD) - 1)
+    entry = table.lookup[index]
+    if entry:
+        nbits -= entry >> 8
+        ssss = entry & 0xFF
+    else:
+        size, ssss = table.decode_slow(bits, nbits)
+        nbits -= size
+
+    if ssss == 16:
+        # No additional bits
+        return bits, nbits, pos, 32768
+
+    if not ssss:
+        return bits, nbits, pos, 0
+
+    nbits -= ssss
+    value = (bits >> nbits) & ((1 << ssss) - 1)
+    if value < (1 << (ssss - 1)):
+        value += 1 - (1 << ssss)
+
+    return bits, nbits, pos, value
+
+
+def _decode_lanes(segments, lanes, nr_samples):
+    """Return the differences Huffman decoded from every interval in a scan.
+
+    The entropy-coded data is split into lanes of ``LANE_BITS`` bits and
+    every lane is decoded at the same time, one code per step, starting
+    from the first bit of the lane. Except for the first lane of each
+    interval a lane probably doesn't start on a code boundary, but Huffman
+    codes resynchronise quickly, so each lane is then continued past its
+    end until it reaches the start of one of the first ``_SYNC_SAMPLES``
+    samples decoded by a following lane. From that sample onwards the
+    following lane decoded the same codes as a decoder that started from
+    the beginning of the interval would have, and the differences from each
+    interval are assembled by following the lanes from the first one.
+
+    Parameters
+    ----------
+    segments : list of (bytes-like, int)
+        The entropy-coded data, without byte stuffing, and the number of
+        MCUs for each restart interval in the scan.
+    lanes : tuple of numpy.ndarray
+        The lane decoding tables, as returned by
+        ``_get_difference_tables()``, used by every sample.
+    nr_samples : int
+        The number of samples in each MCU.
+
+    Returns
+    -------
+    numpy.ndarray or None
+        The int32 differences of the samples in the scan, in the order
+        they were encoded, or None if the lanes didn't synchronise or
+        the encoded data is invalid.
+
+    References
+    ----------
+    ISO/IEC 10918-1, Section H.1.2.2
+    """
+    entries, codes = lanes
+    lengths = np.asarray([len(data) for data, _ in segments], dtype=np.int64)
+    required = np.asarray(
+        [nr_mcus * nr_samples for _, nr_mcus in segments], dtype=np.int64
+    )
+    # The 56 bits starting at every byte, with padding so every lane can
+    #   always read 32 bits past the end of the data
+    data = b''.join([bytes(data) for data, _ in segments]) + b'\x00' * 16
+    words = np.ndarray(
+        (len(data) - 7, ), dtype='>u8', buffer=data, strides=(1, )
+    )
+    words = (words >> np.uint64(8)).astype(np.int64)
+
+    # The bit offsets of each interval and lane
+    total_bits = 8 * int(lengths.sum())
+    interval_end = np.cumsum(lengths) * 8
+    interval_start = interval_end - lengths * 8
+    nr_lanes = np.maximum(-(-lengths * 8 // LANE_BITS), 1)
+    first_lane = np.cumsum(nr_lanes) - nr_lanes
+    interval = np.repeat(np.arange(len(segments)), nr_lanes)
+    starts = np.arange(interval.size) - first_lane[interval]
+    starts = interval_start[interval] + starts * LANE_BITS
+    ends = np.minimum(starts + LANE_BITS, interval_end[interval])
+    interval_end = interval_end[interval]
+
+    # Decode each lane from its start until it passes its end, in blocks of
+    #   steps so lanes that have finished can be dropped
+    blocks = []
+    decoded = np.zeros(interval.size, dtype=np.int64)
+    finals = np.empty(interval.size, dtype=np.int64)
+    indices = np.arange(interval.size)
+    pos = starts.copy()
+    steps = LANE_BITS * int(required.sum()) // max(total_bits, 1) + 1
+    steps = max(steps, _SYNC_SAMPLES)
+    offset = 0
+    while indices.size:
+        lane_ends = ends[indices]
+        values, used, first = _decode_lane_block(
+            words, pos, lane_ends, steps, entries, codes,
+            0 if offset else _SYNC_SAMPLES
+        )
+        if not offset:
+            # The step + 1 of the first samples decoded by each lane
+            marks = np.zeros(total_bits + 64, dtype=np.int8)
+            marks[np.where(first < lane_ends, first, total_bits)] = (
+                np.arange(1, _SYNC_SAMPLES + 1, dtype=np.int8)[:, None]
+            )
+            marks[total_bits] = 0
+
+        blocks.append((indices, offset, values))
+        decoded[indices] += np.count_nonzero(used, axis=0)
+        done = pos >= lane_ends
+        finals[indices[done]] = pos[done]
+        indices, pos = indices[~done], pos[~done]
+        offset += steps
+        steps = max(steps // 4, 4)
+
+    # Continue each lane until it reaches a marked sample of a following
+    #   lane, the end of its interval or the synchronisation limit
+    limits = np.minimum(finals + _SYNC_LANES * LANE_BITS, interval_end)
+    pos = finals.copy()
+    indices = np.flatnonzero((pos < limits) & (marks[pos] == 0))
+    continued = []
+    while indices.size:
+        current = pos[indices]
+        values, used = _decode_lane_step(words, current, entries, codes)
+        current += used
+        pos[indices] = current
+        continued.append((indices, values))
+        indices = indices[(current < limits[indices]) & (marks[current] == 0)]
+
+    # Follow the lanes from the first lane of each interval
+    met = pos < limits
+    following = np.searchsorted(starts, pos, 'right') - 1
+    following = np.where(met, following, np.arange(interval.size))
+    valid = np.zeros(interval.size, dtype=bool)
+    valid[first_lane] = True
+    jump = following
+    while True:
+        reached = jump[valid]
+        if valid[reached].all():
+            break
+
+        valid[reached] = True
+        jump = jump[jump]
+
+    if (valid & ~met & (pos < interval_end)).any():
+        # A lane didn't synchronise
+        return None
+
+    # The samples of each valid lane are the ones it decoded from the
+    #   sample the preceding lane synchronised with, then its continuation
+    skipped = np.zeros(interval.size, dtype=np.int64)
+    linked = valid & met
+    skipped[following[linked]] = marks[pos[linked]] - 1
+    decoded[~valid] = 0
+    counts = decoded - skipped
+    extra = np.zeros(interval.size, dtype=np.int64)
+    for indices, _ in continued:
+        extra[indices] += 1
+
+    extra[~valid] = 0
+    counts += extra
+    total = int(counts.sum())
+    differences = np.empty(total + 1, dtype=np.int64)
+    offsets = np.cumsum(counts) - counts
+    base = offsets - skipped
+    for indices, offset, values in blocks:
+        step = np.arange(offset, offset + len(values))[:, None]
+        keep = (step >= skipped[indices]) & (step < decoded[indices])
+        differences[np.where(keep, base[indices] + step, total)] = values
+
+    base = offsets + decoded - skipped
+    for step, (indices, values) in enumerate(continued):
+        index = np.where(valid[indices], base[indices] + step, total)
+        differences[index] = values
+
+    # Check each interval has enough samples and the last one doesn't
+    #   extend past the end of the data
+    available = np.add.reduceat(counts, first_lane)
+    last = np.flatnonzero(valid & ~met)
+    if (
+        (available < required).any()
+        or (
+            (available[interval[last]] == required[interval[last]])
+            & (pos[last] > interval_end[last])
+        ).any()
+    ):
+        return None
+
+    if len(segments) > 1:
+        index = offsets[first_lane] - (np.cumsum(required) - required)
+        index = np.arange(int(required.sum())) + np.repeat(index, required)
+        differences = differences[index]
+    else:
+        differences = differences[:int(required[0])]
+
+    if (differences >= _INVALID_DIFFERENCE).any():
+        return None
+
+    return differences.astype(np.int32)
+
+
+def _decode_lane_block(words, pos, ends, steps, entries, codes, record):
+    """Return the differences decoded from lanes over a number of steps.
+
+    Parameters
+    ----------
+    words : numpy.ndarray
+        The int64 56-bit words starting at each byte of the data.
+    pos : numpy.ndarray
+        The bit offset of each lane, updated in place. Lanes stop once
+        they reach their end.
+    ends : numpy.ndarray
+        The bit offset of the end of each lane.
+    steps : int
+        The number of steps to decode.
+    entries, codes : numpy.ndarray
+        The lane decoding tables.
+    record : int
+        The number of steps to return the bit offsets of each lane for.
+
+    Returns
+    -------
+    numpy.ndarray, numpy.ndarray, numpy.ndarray
+        The differences and the number of bits used for each step and lane,
+        with shape (steps, lanes) and 0 bits used once a lane has ended,
+        and the bit offsets of each lane for the first `record` steps.
+    """
+    values = np.empty((steps, pos.size), dtype=np.int64)
+    used = np.empty((steps, pos.size), dtype=np.int64)
+    offsets = np.empty((record, pos.size), dtype=np.int64)
+    for step in range(steps):
+        if step < record:
+            offsets[step] = pos
+
+        values[step], used[step] = _decode_lane_step(
+            words, pos, entries, codes
+        )
+        used[step] *= pos < ends
+        pos += used[step]
+
+    return values, used, offsets
+
+
+def _decode_lane_step(words, pos, entries, codes):
+    """Return the difference decoded at the bit offset of each lane.
+
+    Parameters
+    ----------
+    words : numpy.ndarray
+        The int64 56-bit words starting at each byte of the data.
+    pos : numpy.ndarray
+        The bit offset of each lane.
+    entries, codes : numpy.ndarray
+        The lane decoding tables.
+
+    Returns
+    -------
+    numpy.ndarray, numpy.ndarray
+        The differences and the number of bits used, which is 32 with a
+        difference of ``_INVALID_DIFFERENCE`` for invalid codes.
+
+    References
+    ----------
+    ISO/IEC 10918-1, Sections F.2.2.1 and H.1.2.2
+    """
+    shift = pos & 7
+    word = words[pos >> 3]
+    entry = word >> (40 - shift)
+    entry &= _DIFFERENCE_MASK
+    entry = entries[entry]
+    values = entry >> 8
+    used = entry & 0xFF
+    slow = np.flatnonzero(used == 0)
+    if not slow.size:
+        return values, used
+
+    # Long codes or large differences, from the next 32 bits
+    word = (word[slow] >> (24 - shift[slow])) & 0xFFFFFFFF
+    code = codes[word >> 16]
+    ssss = code >> 8
+    size = np.where(ssss == 16, 0, ssss)
+    used[slow] = (code & 0xFF) + size
+    value = (word >> (32 - used[slow])) & ((1 << size) - 1)
+    # F.2.2.1: EXTEND the additional bits
+    value = np.where(
+        value < ((1 << size) >> 1), value + 1 - (1 << size), value
+    )
+    value[ssss == 16] = 32768
+    value[code == 32] = _INVALID_DIFFERENCE
+    values[slow] = value
+
+    return values, used
+
+
+def _get_difference_tables(bits, huffval, tables):
+    """Return the lookup tables for decoding lossless differences.
+
+    Parameters
+    ----------
+    bits : list of int
+        The DHT 'Li' values.
+    huffval : list of tuple
+        The DHT 'Vij' values.
+    tables : dict or cache.LRUCache
+        The cache of decoding tables to use and update.
+
+    Returns
+    -------
+    list of int
+        The 2**``DIFFERENCE_LOOKAHEAD`` entry lookup table indexed by the
+        next ``DIFFERENCE_LOOKAHEAD`` bits of the entropy-coded data, which
+        resolves both the Huffman code for SSSS and the SSSS additional
+        bits of the difference in a single step. Each entry is the
+        difference << 8 | the number of bits used, or 0 if the code and
+        its additional bits are longer than ``DIFFERENCE_LOOKAHEAD`` bits.
+    list of tuple
+        The 2**``DIFFERENCE_LOOKAHEAD`` entry lookup table for resolving
+        two consecutive differences in a single step. Each entry is (the
+        number of bits used, difference, difference), where the number of
+        bits used is 0 if the two codes and their additional bits are
+        longer than ``DIFFERENCE_LOOKAHEAD`` bits.
+    tuple of numpy.ndarray
+        The tables used by ``_decode_lanes()``: the first lookup table as
+        an int64 array and a 2**``DIFFERENCE_LOOKAHEAD`` entry table of
+        SSSS << 8 | the code length, indexed by the next 16 bits, with
+        32 for invalid codes.
+
+    References
+    ----------
+    ISO/IEC 10918-1, Sections F.2.2.1 and H.1.2.2
+    """
+    key = ('SSSS', tuple(bits), tuple(huffval))
+    lookups = tables.get(key)
+    if lookups is not None:
+        return lookups
+
+    table = _get_huffman_table(bits, huffval, tables)
+    lookahead = DIFFERENCE_LOOKAHEAD
+    index = np.arange(1 << lookahead, dtype=np.int64)
+    entries = np.zeros(1 << lookahead, dtype=np.int64)
+    for code, size, ssss in zip(
+        table.huffcode, table.huffsize, table.huffval
+    ):
+        extra = 0 if ssss == 16 else ssss
+        if size + extra > lookahead:
+            continue
+
+        start = code << (lookahead - size)
+        span = index[start:start + (1 << (lookahead - size))]
+        if ssss == 16:
+            difference = 32768
+        elif ssss:
+            # F.2.2.1: RECEIVE and EXTEND the additional bits
+            difference = span >> (lookahead - size - ssss)
+            difference &= (1 << ssss) - 1
+            difference = np.where(
+                difference < (1 << (ssss - 1)),
+                difference + 1 - (1 << ssss),
+                difference
+            )
+        else:
+            difference = 0
+
+        entries[start:start + len(span)] = (difference << 8) | (size + extra)
+
+    # The entry for the next code after the first one
+    used = entries & 0xFF
+    following = entries[(index << used) & _DIFFERENCE_MASK]
+    used += following & 0xFF
+    is_pair = (entries != 0) & (following != 0) & (used <= lookahead)
+    used[~is_pair] = 0
+    pairs = list(zip(
+        used.tolist(), (entries >> 8).tolist(), (following >> 8).tolist()
+    ))
+
+    # The code length and SSSS of every code, for the entries that are 0
+    codes = np.full(1 << lookahead, 32, dtype=np.int64)
+    for code, size, ssss in zip(
+        table.huffcode, table.huffsize, table.huffval
+    ):
+        start = code << (lookahead - size)
+        codes[start:start + (1 << (lookahead - size))] = (ssss << 8) | size
+
+    lookups = tables[key] = (entries.tolist(), pairs, (entries, codes))
+
+    return lookups
+
+
+def _reconstruct(differences, predictor, precision, point_transform=0,
+                 interval_rows=None, restarts=None):
+    """Return the samples reconstructed from their differences.
+
+    When the restart intervals are a whole number of rows each interval is
+    reconstructed independently, so all the intervals are reconstructed at
+    the same time. The one-dimensional predictors and predictor 4 are
+    applied to the whole interval at once using cumulative sums and
+    predictors 3 and 5 are applied one row at a time. Predictors 6 and 7
+    use the reconstructed sample to the left, so are applied to one
+    anti-diagonal at a time, as every sample on an anti-diagonal only
+    depends on the samples on the previous two. Restart intervals that
+    start part way along a row are always reconstructed one anti-diagonal
+    at a time.
+
+    Parameters
+    ----------
+    differences : numpy.ndarray
+        The 2D differences of each sample in the component.
+    predictor : int
+        The predictor selection value, 1 to 7.
+    precision : int
+        The sample precision in bits.
+    point_transform : int, optional
+        The point transform, Pt, default 0.
+    interval_rows : int, optional
+        The number of rows in each restart interval, if restart intervals
+        are used and are a whole number of rows.
+    restarts : tuple of numpy.ndarray, optional
+        The (rows, columns) of the first sample of every restart interval,
+        if restart intervals are used and aren't a whole number of rows.
+
+    Returns
+    -------
+    numpy.ndarray
+        The reconstructed samples as int64.
+
+    References
+    ----------
+    ISO/IEC 10918-1, Section H.1.2
+    """
+    differences = differences.astype(np.int64)
+    samples = np.empty_like(differences)
+    rows, columns = differences.shape
+    # At the start of the image and of each restart interval
+    initial = 1 << (precision - point_transform - 1)
+    interval_rows = min(interval_rows or rows, rows)
+
+    tracing = _tracing.TRACE
+    if tracing:
+        start_time = perf_counter()
+
+    if restarts is not None:
+        _predict_restarts(differences, samples, predictor, initial, restarts)
+    else:
+        # The intervals with `interval_rows` rows, then any shorter last one
+        end = rows - rows % interval_rows
+        shape = (-1, interval_rows, columns)
+        _predict(
+            differences[:end].reshape(shape),
+            samples[:end].reshape(shape),
+            predictor,
+            initial
+        )
+        if end < rows:
+            _predict(
+                differences[None, end:],
+                samples[None, end:],
+                predictor,
+                initial
+            )
+
+    if point_transform:
+        samples <<= point_transform
+
+    if tracing:
+        trace(
+            'predict', predictor=predictor, samples=samples.size,
+            elapsed=perf_counter() - start_time
+        )
+
+    return samples
+
+
+def _predict(differences, samples, predictor, initial):
+    """Reconstruct the samples of restart intervals from the differences.
+
+    Parameters
+    ----------
+    differences : numpy.ndarray
+        The int64 differences for the intervals, with shape (intervals,
+        rows, columns).
+    samples : numpy.ndarray
+        The int64 array to write the reconstructed samples to, with the
+        same shape as `differences`.
+    predictor : int
+        The predictor selection value, 1 to 7.
+    initial : int
+        The prediction for the first sample of each interval.
+
+    References
+    ----------
+    ISO/IEC 10918-1, Section H.1.2.1 and Table H.1
+    """
+    # The modulo 2**16 arithmetic of Section H.1.2.1
+    mask = 0xFFFF
+    _, rows, columns = differences.shape
+
+    # The first row uses Ra and the first column uses Rb
+    np.cumsum(differences[:, 0], axis=1, out=samples[:, 0])
+    samples[:, 0] += initial
+    samples[:, 0] &= mask
+    if rows == 1:
+        return
+
+    np.cumsum(differences[:, 1:, 0], axis=1, out=samples[:, 1:, 0])
+    samples[:, 1:, 0] += samples[:, :1, 0]
+    samples[:, 1:, 0] &= mask
+    if columns == 1:
+        return
+
+    diff = differences[:, 1:, 1:]
+    if predictor == 1:
+        # Ra: cumulative sums along each row
+        np.cumsum(diff, axis=2, out=samples[:, 1:, 1:])
+        samples[:, 1:, 1:] += samples[:, 1:, :1]
+    elif predictor == 2:
+        # Rb: cumulative sums down each column
+        np.cumsum(diff, axis=1, out=samples[:, 1:, 1:])
+        samples[:, 1:, 1:] += samples[:, :1, 1:]
+    elif predictor == 4:
+        # Ra + Rb - Rc: the difference between each row and the one above
+        #   is a cumulative sum along the row
+        delta = np.cumsum(diff, axis=2)
+        delta += (samples[:, 1:, :1] - samples[:, :-1, :1])
+        np.cumsum(delta, axis=1, out=samples[:, 1:, 1:])
+        samples[:, 1:, 1:] += samples[:, :1, 1:]
+    elif predictor == 3:
+        # Rc
+        for row in range(1, rows):
+            out = samples[:, row, 1:]
+            np.add(samples[:, row - 1, :-1], diff[:, row - 1], out=out)
+            out &= mask
+    elif predictor == 5:
+        # Ra + ((Rb - Rc) >> 1): a cumulative sum along each row
+        for row in range(1, rows):
+            above = samples[:, row - 1]
+            out = samples[:, row, 1:]
+            np.subtract(above[:, 1:], above[:, :-1], out=out)
+            out >>= 1
+            out += diff[:, row - 1]
+            np.cumsum(out, axis=1, out=out)
+            out += samples[:, row, :1]
+            out &= mask
+    else:
+        _predict_diagonals(differences, samples, predictor)
+
+    samples &= mask
+
+
+def _predict_diagonals(differences, samples, predictor):
+    """Reconstruct samples one anti-diagonal at a time.
+
+    The arrays are copied so each anti-diagonal is contiguous, with sample
+    (row, column) at (row + column, row).
+
+    Parameters
+    ----------
+    differences : numpy.ndarray
+        The int64 differences for the intervals, with shape (intervals,
+        rows, columns).
+    samples : numpy.ndarray
+        The samples, with the first row and column of each interval already
+        reconstructed, updated in place.
+    predictor : int
+        The predictor selection value, 6 or 7.
+    """
+    nr_intervals, rows, columns = samples.shape
+    diagonals = rows + columns - 1
+
+    def skewed(arr):
+        """Return a skewed copy of `arr` and a view of its samples."""
+        out = np.zeros((nr_intervals, diagonals, rows), dtype=np.int64)
+        item = out.itemsize
+        view = as_strided(
+            out,
+            shape=arr.shape,
+            strides=(diagonals * rows * item, (rows + 1) * item, rows * item)
+        )
+        view[...] = arr
+
+        return out, view
+
+    diff, _ = skewed(differences)
+    skew, view = skewed(samples)
+    for diagonal in range(2, diagonals):
+        # The rows of the samples after the first row and column
+        first = max(1, diagonal - columns + 1)
+        last = min(rows - 1, diagonal - 1) + 1
+        out = skew[:, diagonal, first:last]
+        ra = skew[:, diagonal - 1, first:last]
+        rb = skew[:, diagonal - 1, first - 1:last - 1]
+        if predictor == 6:
+            # Rb + ((Ra - Rc) >> 1)
+            np.subtract(ra, skew[:, diagonal - 2, first - 1:last - 1], out=out)
+            out >>= 1
+            out += rb
+        else:
+            # (Ra + Rb) >> 1
+            np.add(ra, rb, out=out)
+            out >>= 1
+
+        out += diff[:, diagonal, first:last]
+        out &= 0xFFFF
+
+    samples[...] = view
+
+
+def _predict_restarts(differences, samples, predictor, initial, restarts):
+    """Reconstruct samples with restart intervals that start part way along
+    a row.
+
+    The prediction for the first sample of each interval is `initial`, the
+    rest of the row the interval starts on uses Ra and the first column of
+    every other row uses Rb. These don't depend on any other samples so are
+    reconstructed first using cumulative sums. Every other sample uses the
+    predictor, even if Ra, Rb or Rc are in a preceding interval, and is
+    reconstructed one anti-diagonal at a time, with the arrays copied so
+    sample (row, column) is at (row + column + 1, row + 1) with zero
+    padding before the first row and column.
+
+    Parameters
+    ----------
+    differences : numpy.ndarray
+        The 2D int64 differences of each sample in the component.
+    samples : numpy.ndarray
+        The int64 array to write the reconstructed samples to, with the
+        same shape as `differences`.
+    predictor : int
+        The predictor selection value, 1 to 7.
+    initial : int
+        The prediction for the first sample of each interval.
+    restarts : tuple of numpy.ndarray
+        The (rows, columns) of the first sample of every restart interval.
+
+    References
+    ----------
+    ISO/IEC 10918-1, Section H.1.2.1 and Table H.1
+    """
+    rows, columns = samples.shape
+    diagonals = rows + columns
+    starts = np.zeros(samples.shape, dtype=bool)
+    starts[restarts] = True
+
+    # The rest of each row from the start of an interval: the cumulative
+    #   sum from the start of the interval
+    fixed = np.logical_or.accumulate(starts, axis=1)
+    total = np.cumsum(np.where(fixed, differences, 0), axis=1)
+    first = np.where(starts, np.arange(columns), 0)
+    first = np.maximum.accumulate(first, axis=1)
+    before = np.take_along_axis(total - differences, first, axis=1)
+    np.subtract(total, before, out=samples, where=fixed)
+
+    # The first column, which uses Rb unless an interval starts there
+    total = np.cumsum(differences[:, 0])
+    first = np.maximum.accumulate(np.where(starts[:, 0], np.arange(rows), 0))
+    samples[:, 0] = total - (total - differences[:, 0])[first]
+    fixed[:, 0] = True
+    samples[fixed] += initial
+    samples &= 0xFFFF
+
+    def skewed(arr):
+        """Return a skewed copy of `arr` and a view of its samples."""
+        out = np.zeros((diagonals, rows + 1), dtype=arr.dtype)
+        item = out.itemsize
+        view = as_strided(
+            out[1:, 1:],
+            shape=arr.shape,
+            strides=((rows + 2) * item, (rows + 1) * item)
+        )
+        view[...] = arr
+
+        return out, view
+
+    diff, _ = skewed(differences)
+    predicted, _ = skewed(~fixed)
+    skew, view = skewed(samples)
+    for diagonal in range(2, diagonals):
+        # The rows of the samples on the anti-diagonal, offset by 1
+        first = max(1, diagonal - columns + 1)
+        last = min(rows, diagonal) + 1
+        ra = skew[diagonal - 1, first:last]
+        rb = skew[diagonal - 1, first - 1:last - 1]
+        rc = skew[diagonal - 2, first - 1:last - 1]
+        if predictor == 1:
+            prediction = ra + diff[diagonal, first:last]
+        elif predictor == 2:
+            prediction = rb + diff[diagonal, first:last]
+        elif predictor == 3:
+            prediction = rc + diff[diagonal, first:last]
+        else:
+            if predictor == 4:
+                prediction = ra + rb
+                prediction -= rc
+            elif predictor == 5:
+                prediction = rb - rc
+                prediction >>= 1
+                prediction += ra
+            elif predictor == 6:
+                prediction = ra - rc
+                prediction >>= 1
+                prediction += rb
+            else:
+                prediction = ra + rb
+                prediction >>= 1
+
+            prediction += diff[diagonal, first:last]
+
+        prediction &= 0xFFFF
+        np.copyto(
+            skew[diagonal, first:last],
+            prediction,
+            where=predicted[diagonal, first:last]
+        )
+
+    samples[...] = view
@@ -0,0 +1,795 @@
+"""Decoders for 10918-1 progressive DCT-based JPEGs."""
+
+from time import perf_counter
+
+import numpy as np
+
+from pydcmjpeg import tracing as _tracing
+from pydcmjpeg.decoders.arithmetic import _decode_arithmetic_scan
+from pydcmjpeg.decoders.jpeg_decoders import (
+    _check_conversion, _check_output, _convert_planes, _get_components,
+    _get_planes, _get_scan_data, _get_scan_spec, _get_segments,
+    _get_window, _iter_scans, _planes_to_image, _release_scan, _scale_frame
+)
+from pydcmjpeg.huffman import BitReader
+from pydcmjpeg.tracing import trace
+
+
+# The quantisation table used for components without any decoded scans
+_EMPTY_TABLE = np.ones(64, dtype=np.float32)
+_EMPTY_TABLE.flags.writeable = False
+
+
+def decode_progressive(jpg, workers=None, tables=None, release=False,
+                       as_rgb=False, upsample='fancy', planar=False,
+                       out=None, dtype=None, scale=1, region=None):
+    """Return the decoded image data for a progressive DCT JPEG or an
+    arithmetic coded sequential DCT JPEG.
+
+    Used for Process 6 to 13 JPEGs, with spectral selection and successive
+    approximation, and for Process 3 and 5 JPEGs, which are decoded as if
+    they had a single scan for each component. Each component has a
+    single array of quantised coefficients that's allocated before the
+    first scan and updated in place by every scan that contains the
+    component, so the memory used doesn't depend on the number of scans.
+    The coefficients are only dequantised and inverse transformed once all
+    the scans have been decoded.
+
+    Parameters
+    ----------
+    jpg : jpeg.JPEG
+        The JPEG to decode.
+    workers : int, optional
+        Not used, the scans are always decoded in the current process.
+    tables : dict, optional
+        A cache of decoding tables to use and update instead of the
+        process-wide ``cache.TABLE_CACHE``.
+    release : bool, optional
+        If True then remove the ENC entries of each scan from `jpg` once
+        the scan has been decoded. Default False.
+    as_rgb : bool, optional
+        If True then convert the image data from YCbCr to RGB, which
+        requires 3 components. If False (default) then no colour space
+        conversion is performed.
+    upsample : str, optional
+        The method used to upsample subsampled components to the full
+        image size, ``'fancy'`` (default) or ``'nearest'``.
+    planar : bool, optional
+        If True then return multiple component image data with shape
+        (samples, rows, columns), otherwise (default) return it with shape
+        (rows, columns, samples).
+    out : numpy.ndarray or buffer, optional
+        If used then write the image data to `out` instead of a new array.
+    dtype : numpy.dtype, optional
+        The dtype of the returned image data, default uint8 if the sample
+        precision is 8 bits or uint16 if it's 12 bits. If `out` is an
+        ndarray then defaults to the dtype of `out`.
+    scale : float, optional
+        Decode the image data reduced by `scale`, one of 1/8, 2/8, ..., 1
+        (default), using reduced size IDCTs.
+    region : tuple of int, optional
+        If used then only return the region (y0, x0, height, width) of the
+        (scaled) image. Every scan is still entropy decoded, but only the
+        blocks that overlap the region are dequantised and inverse
+        transformed.
+
+    Returns
+    -------
+    numpy.ndarray
+        The decoded image data with shape (rows, columns) if there's a
+        single component or (rows, columns, samples) otherwise. If `out`
+        is used then the returned array uses the memory of `out`.
+
+    Raises
+    ------
+    ValueError
+        If the JPEG contains no scans, a scan's progression parameters are
+        invalid or the encoded data is invalid, if `as_rgb` is True and
+        there aren't 3 components, if `out` isn't suitable, if `scale`
+        isn't valid or if `region` isn't within the image.
+
+    References
+    ----------
+    ISO/IEC 10918-1, Annex G
+    """
+    tracing = _tracing.TRACE
+    if tracing:
+        start_time = perf_counter()
+
+    frame, sizes = _scale_frame(jpg._index.frame, scale)
+    window = None
+    if region is not None:
+        window, frame, crop = _get_window(
+            jpg._index.frame, frame, region, scale
+        )
+
+    if out is not None:
+        out = _check_output(jpg, frame, region, planar, out, dtype)
+
+    components = _decode_progressive_coefficients(jpg, tables, release)
+    planes = _get_planes(jpg, components, sizes, window)
+    planes = _convert_planes(planes, frame, as_rgb=as_rgb, upsample=upsample)
+    if region is not None:
+        planes = [plane[crop] for plane in planes]
+
+    arr = _planes_to_image(planes, planar=planar, out=out, dtype=dtype)
+    if tracing:
+        trace(
+            'decode', process=_get_process(jpg),
+            elapsed=perf_counter() - start_time
+        )
+
+    return arr
+
+
+def iter_progressive(jpg, scans=1, tables=None, as_rgb=False,
+                     upsample='fancy', scale=1):
+    """Yield the decoded image data for a progressive DCT JPEG as each
+    scan is decoded.
+
+    Used for Process 6 to 13 JPEGs. The coefficients are kept
+    between scans so each scan is only entropy decoded once, and the
+    image data yielded after a scan is the image as it would be if the
+    JPEG ended with that scan. Components that haven't been in any of the
+    decoded scans have all their coefficients zero, so their samples are
+    the midpoint of the sample range.
+
+    Parameters
+    ----------
+    jpg : jpeg.JPEG
+        The JPEG to decode.
+    scans : int, optional
+        The number of scans to decode before each image is yielded,
+        default 1. An image is always yielded after the last scan.
+    tables : dict, optional
+        A cache of decoding tables to use and update.
+    as_rgb : bool, optional
+        If True then convert the image data from YCbCr to RGB. Default
+        False.
+    upsample : str, optional
+        The method used to upsample subsampled components, ``'fancy'``
+        (default) or ``'nearest'``.
+    scale : float, optional
+        Decode the image data reduced by `scale`, one of 1/8, 2/8, ..., 1
+        (default).
+
+    Yields
+    ------
+    numpy.ndarray
+        The decoded image data with shape (rows, columns) if there's a
+        single component or (rows, columns, samples) otherwise. The last
+        image is the same as the image data from ``decode_progressive()``.
+        Nothing is yielded if the JPEG contains no scans.
+
+    Raises
+    ------
+    ValueError
+        If `scans` isn't a positive integer, if `as_rgb` is True and there
+        aren't 3 components, if `upsample` or `scale` isn't valid, all of
+        which are raised when called, or if a scan's progression parameters
+        or the encoded data are invalid, which are raised while iterating.
+    """
+    if int(scans) != scans or scans < 1:
+        raise ValueError(
+            "Invalid 'scans' value {}, must be a positive integer"
+            .format(scans)
+        )
+
+    _check_conversion(jpg._index.frame['Nf'], as_rgb, upsample)
+    frame, sizes = _scale_frame(jpg._index.frame, scale)
+
+    return _iter_progressive(
+        jpg, scans, tables, as_rgb, upsample, frame, sizes
+    )
+
+
+def _iter_progressive(jpg, scans, tables, as_rgb, upsample, frame, sizes):
+    """Yield the decoded image data for a progressive DCT JPEG.
+
+    Parameters
+    ----------
+    jpg : jpeg.JPEG
+        The JPEG to decode.
+    scans : int
+        The number of scans to decode before each image is yielded.
+    tables : dict or None
+        A cache of decoding tables to use and update.
+    as_rgb : bool
+        If True then convert the image data from YCbCr to RGB.
+    upsample : str
+        The method used to upsample subsampled components.
+    frame : dict
+        The SOFn marker segment info for the scaled image.
+    sizes : list of tuple of int
+        The (rows, columns) of samples output by the IDCT of each block
+        for each component.
+
+    Yields
+    ------
+    numpy.ndarray
+        The decoded image data after each `scans` scans.
+    """
+    nr_scans = len(jpg.get_keys('SOS'))
+    for index, (_, components) in enumerate(
+        _iter_progressive_coefficients(jpg, tables), 1
+    ):
+        if index % scans and index < nr_scans:
+            continue
+
+        # Any table can be used for components that aren't in a scan yet
+        #   as their coefficients are all zero
+        current = components.copy()
+        for ci, component in current.items():
+            if component['Qk'] is None:
+                current[ci] = dict(component, Qk=_EMPTY_TABLE)
+
+        planes = _get_planes(jpg, current, sizes)
+        planes = _convert_planes(
+            planes, frame, as_rgb=as_rgb, upsample=upsample
+        )
+        yield _planes_to_image(planes)
+
+
+def _check_scan(scan):
+    """Check the progression parameters of a progressive scan.
+
+    Parameters
+    ----------
+    scan : dict
+        The SOS marker segment info.
+
+    Raises
+    ------
+    ValueError
+        If the scan's Ss, Se, Ah or Al values are invalid or if an AC scan
+        contains more than one component.
+
+    References
+    ----------
+    ISO/IEC 10918-1, Sections B.2.3 and G.1.1.1
+    """
+    ss, se, ah, al = scan['Ss'], scan['Se'], scan['Ah'], scan['Al']
+    if ss == 0 and se != 0 or not ss <= se <= 63 or max(ah, al) > 13:
+        raise ValueError(
+            "The scan has invalid progression parameters: Ss {}, Se {}, "
+            "Ah {}, Al {}".format(ss, se, ah, al)
+        )
+
+    if ss and scan['Ns'] != 1:
+        raise ValueError(
+            "AC scans of progressive JPEGs must contain a single component"
+        )
+
+
+def _decode_progressive_coefficients(jpg, tables=None, release=False):
+    """Return the quantised DCT coefficients for a progressive JPEG.
+
+    Parameters
+    ----------
+    jpg : jpeg.JPEG
+        The JPEG to decode.
+    tables : dict, optional
+        A cache of decoding tables to use and update.
+    release : bool, optional
+        If True then remove the ENC entries of each scan once decoded.
+
+    Returns
+    -------
+    collections.OrderedDict
+        The component geometry, coefficients and quantisation tables, in
+        the same form as ``jpeg_decoders._decode_coefficients()``.
+
+    Raises
+    ------
+    ValueError
+        If the JPEG contains no scans or the encoded data is invalid.
+    """
+    components = None
+    for _, components in _iter_progressive_coefficients(jpg, tables, release):
+        pass
+
+    if components is None:
+        raise ValueError(
+            "Unable to decode the JPEG file as it contains no 'SOS' markers"
+        )
+
+    return components
+
+
+def _iter_progressive_coefficients(jpg, tables=None, release=False):
+    """Yield the quantised DCT coefficients after each progressive scan.
+
+    Parameters
+    ----------
+    jpg : jpeg.JPEG
+        The JPEG to decode.
+    tables : dict, optional
+        A cache of decoding tables to use and update.
+    release : bool, optional
+        If True then remove the ENC entries of each scan once decoded.
+
+    Yields
+    ------
+    str, collections.OrderedDict
+        The SOS marker key of the scan that's just been decoded and the
+        component geometry, coefficients and quantisation tables. The same
+        components are yielded every time and are updated in place by the
+        following scans. The 'Qk' of a component is None until the first
+        scan containing the component has been decoded.
+
+    Raises
+    ------
+    ValueError
+        If the encoded data is invalid.
+    """
+    components = _get_components(jpg._index.frame)
+    for component in components.values():
+        component['coefficients'] = np.zeros(
+            (component['padded_y'], component['padded_x'], 64),
+            dtype=np.int16
+        )
+        component['Qk'] = None
+
+    is_arithmetic = jpg.is_arithmetic
+    is_progressive = jpg.is_progressive
+    conditioning = {0 : {}, 1 : {}} if is_arithmetic else None
+
+    tracing = _tracing.TRACE
+    for key, info, h_tables, restart_interval in _iter_scans(
+        jpg, components, tables, conditioning
+    ):
+        if tracing:
+            start_time = perf_counter()
+
+        if is_arithmetic:
+            if is_progressive:
+                _check_scan(info)
+
+            _decode_arithmetic_scan(
+                info, components, conditioning, restart_interval,
+                is_progressive
+            )
+        else:
+            _decode_progressive_scan(
+                info, components, h_tables, restart_interval
+            )
+
+        if tracing:
+            trace(
+                'decode_scan', key=key, components=len(info['Csj']),
+                elapsed=perf_counter() - start_time
+            )
+
+        if release:
+            _release_scan(info)
+
+        yield key, components
+
+
+def _decode_progressive_scan(scan, components, h_tables, restart_interval):
+    """Decode a progressive Huffman scan into the component coefficients.
+
+    DC and AC first scans set coefficients that are still zero and
+    refinement scans add a single bit to them, so the decoded values are
+    added to the coefficients once the whole scan has been decoded.
+
+    Parameters
+    ----------
+    scan : dict
+        The SOS marker segment info, including the ENC entries.
+    components : collections.OrderedDict
+        The component geometry and coefficient arrays, updated in place.
+    h_tables : dict
+        The current Huffman tables as {Tc : {Th : HuffmanTable}}.
+    restart_interval : int
+        The number of MCUs in each restart interval, 0 if restart intervals
+        aren't used.
+
+    Raises
+    ------
+    ValueError
+        If the scan's progression parameters or encoded data are invalid.
+    """
+    _check_scan(scan)
+    is_dc = scan['Ss'] == 0
+    # DC refinement scans don't use the Huffman tables
+    mcus_x, nr_mcus, spec = _get_scan_spec(
+        scan, components, h_tables, dc=is_dc and not scan['Ah'],
+        ac=not is_dc
+    )
+    coefficients = [
+        components[cs]['coefficients'].reshape(-1) for cs in scan['Csj']
+    ]
+
+    positions = [[] for _ in spec]
+    values = [[] for _ in spec]
+    segments = _get_segments(scan, restart_interval, nr_mcus)
+    for data, first_mcu, length in segments:
+        results = _decode_progressive_segment(
+            _get_scan_data(data), scan, spec, first_mcu, length, mcus_x,
+            coefficients
+        )
+        for ii, (pos, val) in enumerate(results):
+            positions[ii].extend(pos)
+            values[ii].extend(val)
+
+    for arr, pos, val in zip(coefficients, positions, values):
+        arr[np.asarray(pos, dtype=np.intp)] += np.asarray(val, dtype=np.int16)
+
+
+def _decode_progressive_segment(data, scan, spec, first_mcu, nr_mcus, mcus_x,
+                                coefficients):
+    """Return the coefficient updates decoded from a restart interval.
+
+    Parameters
+    ----------
+    data : bytes-like
+        The entropy-coded data for the interval, without byte stuffing.
+    scan : dict
+        The SOS marker segment info.
+    spec : list of tuple
+        The decoding specification for each component in the scan, as
+        returned by ``jpeg_decoders._get_scan_spec()``.
+    first_mcu : int
+        The index of the first MCU in the interval.
+    nr_mcus : int
+        The number of MCUs in the interval.
+    mcus_x : int
+        The number of MCUs per line in the scan.
+    coefficients : list of numpy.ndarray
+        The flattened coefficients of each component in the scan, as
+        decoded by the previous scans.
+
+    Returns
+    -------
+    list of (list of int, list of int)
+        For each component in the scan, the (positions, values) to add to
+        the coefficients, where the positions are indices into the
+        component's flattened coefficient array.
+
+    Raises
+    ------
+    ValueError
+        If the encoded data is invalid.
+
+    References
+    ----------
+    ISO/IEC 10918-1, Section G.1.2
+    """
+    reader = BitReader(data)
+    results = [([], []) for _ in spec]
+    ss, se, ah, al = scan['Ss'], scan['Se'], scan['Ah'], scan['Al']
+    # DC predictions and the EOB run are reset by each restart interval
+    if ss == 0 and ah == 0:
+        _decode_dc_first(reader, spec, first_mcu, nr_mcus, mcus_x, al, results)
+    elif ss == 0:
+        _decode_dc_refine(
+            reader, spec, first_mcu, nr_mcus, mcus_x, al, results
+        )
+    elif ah == 0:
+        _decode_ac_first(
+            reader, spec[0], first_mcu, nr_mcus, mcus_x, ss, se, al,
+            results[0]
+        )
+    else:
+        _decode_ac_refine(
+            reader, spec[0], first_mcu, nr_mcus, mcus_x, ss, se, al,
+            coefficients[0].reshape(-1, 64), results[0]
+        )
+
+    if reader.is_exhausted:
+        raise ValueError(
+            "The encoded data ended before all the MCUs were decoded"
+        )
+
+    return results
+
+
+def _decode_dc_first(reader, spec, first_mcu, nr_mcus, mcus_x, al, results):
+    """Decode the DC coefficients of the first scan of a DC band.
+
+    Parameters
+    ----------
+    reader : huffman.BitReader
+        The reader for the interval's entropy-coded data.
+    spec : list of tuple
+        The decoding specification for each component in the scan.
+    first_mcu : int
+        The index of the first MCU in the interval.
+    nr_mcus : int
+        The number of MCUs in the interval.
+    mcus_x : int
+        The number of MCUs per line in the scan.
+    al : int
+        The successive approximation bit position low, the point
+        transform applied to the coefficients.
+    results : list of (list of int, list of int)
+        For each component in the scan, the (positions, values) of the
+        non-zero coefficients, updated in place.
+
+    References
+    ----------
+    ISO/IEC 10918-1, Section G.1.2.1
+    """
+    decode = reader.decode
+    receive_extend = reader.receive_extend
+    components = [
+        (ii, row_step, col_step, offsets, dc_table, pos.append, val.append)
+        for ii, ((row_step, col_step, offsets, dc_table, _), (pos, val))
+        in enumerate(zip(spec, results))
+    ]
+
+    predictions = [0] * len(spec)
+    for mcu in range(first_mcu, first_mcu + nr_mcus):
+        mcu_y, mcu_x = divmod(mcu, mcus_x)
+        for (ii, row_step, col_step, offsets, dc_table, add_position,
+             add_value) in components:
+            start = mcu_y * row_step + mcu_x * col_step
+            for offset in offsets:
+                size = decode(dc_table)
+                if size:
+                    predictions[ii] += receive_extend(size)
+
+                if predictions[ii]:
+                    add_position((start + offset) << 6)
+                    add_value(predictions[ii] << al)
+
+
+def _decode_dc_refine(reader, spec, first_mcu, nr_mcus, mcus_x, al,
+                      results):
+    """Decode the next bit of the DC coefficients in a refinement scan.
+
+    Parameters
+    ----------
+    reader : huffman.BitReader
+        The reader for the interval's entropy-coded data.
+    spec : list of tuple
+        The decoding specification for each component in the scan.
+    first_mcu : int
+        The index of the first MCU in the interval.
+    nr_mcus : int
+        The number of MCUs in the interval.
+    mcus_x : int
+        The number of MCUs per line in the scan.
+    al : int
+        The position of the bit being refined.
+    results : list of (list of int, list of int)
+        For each component in the scan, the (positions, values) of the
+        coefficients with the bit set, updated in place.
+
+    References
+    ----------
+    ISO/IEC 10918-1, Section G.1.2.1
+    """
+    read_bit = reader.read_bit
+    bit = 1 << al
+    components = [
+        (row_step, col_step, offsets, pos.append, val.append)
+        for (row_step, col_step, offsets, _, _), (pos, val)
+        in zip(spec, results)
+    ]
+
+    for mcu in range(first_mcu, first_mcu + nr_mcus):
+        mcu_y, mcu_x = divmod(mcu, mcus_x)
+        for row_step, col_step, offsets, add_position, add_value in components:
+            start = mcu_y * row_step + mcu_x * col_step
+            for offset in offsets:
+                if read_bit():
+                    add_position((start + offset) << 6)
+                    add_value(bit)
+
+
+def _decode_ac_first(reader, spec, first_mcu, nr_mcus, mcus_x, ss, se, al,
+                     results):
+    """Decode the AC coefficients of the first scan of a spectral band.
+
+    Parameters
+    ----------
+    reader : huffman.BitReader
+        The reader for the interval's entropy-coded data.
+    spec : tuple
+        The decoding specification for the scan's single component.
+    first_mcu : int
+        The index of the first MCU in the interval.
+    nr_mcus : int
+        The number of MCUs in the interval.
+    mcus_x : int
+        The number of MCUs per line in the scan.
+    ss, se : int
+        The start and end of the spectral band, in zigzag order.
+    al : int
+        The successive approximation bit position low, the point
+        transform applied to the coefficients.
+    results : (list of int, list of int)
+        The (positions, values) of the non-zero coefficients, updated in
+        place.
+
+    Raises
+    ------
+    ValueError
+        If the encoded data is invalid.
+
+    References
+    ----------
+    ISO/IEC 10918-1, Section G.1.2.2
+    """
+    decode = reader.decode
+    receive_extend = reader.receive_extend
+    read_bits = reader.read_bits
+    row_step, _, _, _, ac_table = spec
+    add_position, add_value = results[0].append, results[1].append
+
+    eob_run = 0
+    for mcu in range(first_mcu, first_mcu + nr_mcus):
+        # All the coefficients in the band are zero
+        if eob_run:
+            eob_run -= 1
+            continue
+
+        mcu_y, mcu_x = divmod(mcu, mcus_x)
+        block = (mcu_y * row_step + mcu_x) << 6
+        kk = ss
+        while kk <= se:
+            rs = decode(ac_table)
+            run = rs >> 4
+            size = rs & 0x0F
+            if size:
+                kk += run
+                if kk > se:
+                    raise ValueError("Invalid run length in the encoded data")
+
+                add_position(block + kk)
+                add_value(receive_extend(size) << al)
+                kk += 1
+            elif run == 15:
+                # ZRL: a run of 16 zeroes
+                kk += 16
+            else:
+                # EOBn: the end of this band and the next EOBRUN - 1 bands
+                eob_run = (1 << run) - 1 + read_bits(run)
+                break
+
+
+def _decode_ac_refine(reader, spec, first_mcu, nr_mcus, mcus_x, ss, se, al,
+                      coefficients, results):
+    """Decode the next bit of the AC coefficients in a refinement scan.
+
+    Coefficients that are already non-zero receive a correction bit, while
+    zero coefficients are run-length coded and may become +/- 1 << `al`.
+
+    Parameters
+    ----------
+    reader : huffman.BitReader
+        The reader for the interval's entropy-coded data.
+    spec : tuple
+        The decoding specification for the scan's single component.
+    first_mcu : int
+        The index of the first MCU in the interval.
+    nr_mcus : int
+        The number of MCUs in the interval.
+    mcus_x : int
+        The number of MCUs per line in the scan.
+    ss, se : int
+        The start and end of the spectral band, in zigzag order.
+    al : int
+        The position of the bit being refined.
+    coefficients : numpy.ndarray
+        The coefficients of the component with shape (blocks, 64), as
+        decoded by the previous scans.
+    results : (list of int, list of int)
+        The (positions, values) to add to the flattened coefficients,
+        updated in place.
+
+    Raises
+    ------
+    ValueError
+        If the encoded data is invalid.
+
+    References
+    ----------
+    ISO/IEC 10918-1, Section G.1.2.3
+    """
+    decode = reader.decode
+    read_bit = reader.read_bit
+    read_bits = reader.read_bits
+    row_step, _, _, _, ac_table = spec
+    add_position, add_value = results[0].append, results[1].append
+    positive, negative = 1 << al, -1 << al
+    end = se - ss
+
+    eob_run = 0
+    row = None
+    for mcu in range(first_mcu, first_mcu + nr_mcus):
+        mcu_y, mcu_x = divmod(mcu, mcus_x)
+        if mcu_y != row:
+            # The band's coefficients from the previous scans and the
+            #   positions of the non-zero ones, for a row of blocks
+            row = mcu_y
+            first = row * row_step
+            bands = coefficients[first:first + mcus_x, ss:se + 1]
+            nonzero = [[] for _ in range(mcus_x)]
+            for ii, kk in zip(*[aa.tolist() for aa in bands.nonzero()]):
+                nonzero[ii].append(kk)
+
+            bands = bands.tolist()
+
+        block = ((mcu_y * row_step + mcu_x) << 6) + ss
+        band = bands[mcu_x]
+        positions = nonzero[mcu_x]
+        # The index in `positions` of the next non-zero coefficient
+        nn = 0
+        kk = 0
+        while not eob_run and kk <= end:
+            rs = decode(ac_table)
+            run = rs >> 4
+            size = rs & 0x0F
+            value = 0
+            if size:
+                if size != 1:
+                    raise ValueError(
+                        "Invalid coefficient size in the encoded data"
+                    )
+
+                value = positive if read_bit() else negative
+            elif run != 15:
+                # EOBn: the end of this band and the next EOBRUN - 1 bands
+                eob_run = (1 << run) + read_bits(run)
+                break
+
+            # Skip `run` zero coefficients, refining the non-zero ones
+            while nn < len(positions):
+                position = positions[nn]
+                if position - kk > run:
+                    break
+
+                run -= position - kk
+                coefficient = band[position]
+                if read_bit() and not coefficient & positive:
+                    add_position(block + position)
+                    add_value(positive if coefficient > 0 else negative)
+
+                kk = position + 1
+                nn += 1
+
+            kk += run
+            if value:
+                if kk > end:
+                    raise ValueError("Invalid run length in the encoded data")
+
+                add_position(block + kk)
+                add_value(value)
+
+            kk += 1
+
+        if eob_run:
+            # Only the non-zero coefficients are refined
+            for kk in positions[nn:]:
+                coefficient = band[kk]
+                if read_bit() and not coefficient & positive:
+                    add_position(block + kk)
+                    add_value(positive if coefficient > 0 else negative)
+
+            eob_run -= 1
+
+
+def _get_process(jpg):
+    """Return the process number of a non-hierarchical progressive or
+    arithmetic coded sequential JPEG.
+
+    Processes 6 and 8 (Huffman) and 7 and 9 (arithmetic) use spectral
+    selection only, while processes 10 to 13 also use successive
+    approximation.
+    """
+    if not jpg.is_progressive:
+        return 3 if jpg.precision == 8 else 5
+
+    process = 6 if jpg.precision == 8 else 8
+    if jpg.is_arithmetic:
+        process += 1
+
+    for key in jpg.get_keys('SOS'):
+        scan = jpg.info[key][2]
+        if scan['Ah'] or scan['Al']:
+            return process + 4
+
+    return process
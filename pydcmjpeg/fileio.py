@@ -1,34 +1,277 @@
 """"""
 
 from collections import OrderedDict
-import logging
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import mmap
+import re
 from struct import unpack
+from time import perf_counter
 
+import numpy as np
+
+from pydcmjpeg import tracing as _tracing
 from pydcmjpeg._markers import MARKERS
 from pydcmjpeg.jpeg import get_jpeg
-
-
-LOGGER = logging.getLogger('pdcmjpeg')
+from pydcmjpeg.tracing import LOGGER, trace
+
+
+# The number of bytes initially read when only parsing the headers of a
+#   file-like, the size is doubled with each subsequent read
+HEADER_CHUNK_SIZE = 64 * 1024
+
+# A 0xFF byte that isn't part of a stuffed 0xFF 0x00 pair (10918)
+_MARKER_10918 = re.compile(b'\xff(?!\x00)')
+# A 0xFF byte that isn't followed by a stuffed zero bit (14495)
+_MARKER_14495 = re.compile(b'\xff(?![\x00-\x7f])')
+
+
+def decode_frames(frames, out=None, workers=None):
+    """Return the decoded image data for multiple JPEG frames.
+
+    Intended for the frames of a multi-frame DICOM dataset with
+    encapsulated Pixel Data, where every frame has the same dimensions and
+    usually the same Huffman and quantisation tables. Each frame is parsed
+    directly from memory, decoding tables are built once and reused (via
+    ``cache.TABLE_CACHE``) by every frame with identical DHT and DQT
+    segments, and the decoded frames are written into a single array.
+
+    Parameters
+    ----------
+    frames : iterable of bytes-like
+        The encoded JPEG for each frame.
+    out : numpy.ndarray, optional
+        The array to write the decoded frames to, with shape (frames, rows,
+        columns) for single component images or (frames, rows, columns,
+        samples) otherwise. If not used then a new array will be created.
+    workers : int, optional
+        If greater than 1 then decode the frames in parallel using a pool
+        of `workers` processes.
+
+    Returns
+    -------
+    numpy.ndarray
+        The decoded frames, `out` if it was used.
+
+    Raises
+    ------
+    ValueError
+        If the frames don't all have the same dimensions or if `out` has
+        the wrong shape or an incompatible dtype.
+    """
+    frames = list(frames)
+    if not frames:
+        raise ValueError("No frames to decode")
+
+    arr = _decode_frame(frames[0])
+    shape = (len(frames), ) + arr.shape
+    if out is None:
+        out = np.empty(shape, dtype=arr.dtype)
+    elif out.shape != shape:
+        raise ValueError(
+            "The shape of 'out' is {} but the decoded frames require {}"
+            .format(out.shape, shape)
+        )
+    elif not np.can_cast(arr.dtype, out.dtype):
+        raise ValueError(
+            "Unable to write decoded frames with dtype '{}' to 'out' with "
+            "dtype '{}'".format(arr.dtype, out.dtype)
+        )
+
+    out[0] = arr
+
+    if workers and workers > 1 and len(frames) > 2:
+        # Send the frames in batches to reduce the overhead of each task
+        size = -(-(len(frames) - 1) // (4 * workers))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                (ii, executor.submit(_decode_frames, frames[ii:ii + size]))
+                for ii in range(1, len(frames), size)
+            ]
+            for start, future in futures:
+                for ii, arr in enumerate(future.result(), start):
+                    _set_frame(out, ii, arr)
+    else:
+        for ii, frame in enumerate(frames[1:], 1):
+            _set_frame(out, ii, _decode_frame(frame))
+
+    return out
+
+
+def _decode_frame(frame, tables=None):
+    """Return the decoded image data for the JPEG in `frame`.
+
+    Parameters
+    ----------
+    frame : bytes-like
+        The encoded JPEG.
+    tables : dict, optional
+        The cache of decoding tables to use and update, if not used then
+        the process-wide ``cache.TABLE_CACHE`` is used.
+
+    Returns
+    -------
+    numpy.ndarray
+        The decoded image data.
+    """
+    jpg = jpgparse(frame, copy=False)
+    if not hasattr(jpg, 'decode'):
+        raise NotImplementedError(
+            "Decoding {} frames is not supported".format(type(jpg).__name__)
+        )
+
+    return jpg.decode(tables=tables)
+
+
+def _decode_frames(frames):
+    """Return a list of the decoded image data for each of `frames`."""
+    return [_decode_frame(frame) for frame in frames]
+
+
+def _set_frame(out, index, arr):
+    """Write the decoded frame `arr` to `out[index]`."""
+    if arr.shape != out.shape[1:]:
+        raise ValueError(
+            "Frame {} has shape {} which doesn't match the first frame's "
+            "shape of {}".format(index, arr.shape, out.shape[1:])
+        )
+
+    out[index] = arr
 
 
 def jpgmap(fpath):
-    """Return a memory-mapped representation of the JPEG file at `fpath`."""
+    """Return a memory-mapped representation of the JPEG file at `fpath`.
+
+    The file is mapped read-only and the entropy-coded data of each scan is
+    a ``memoryview`` of the mapped file rather than a copy. The map remains
+    open for as long as the returned object (or any of its scan data) is
+    referenced.
+
+    Parameters
+    ----------
+    fpath : str
+        The path to the JPEG file.
+
+    Returns
+    -------
+    JPEG, JPEGLS or JPEG2000
+        The representation of the JPEG file.
+    """
     LOGGER.debug('Mapping file: {}'.format(fpath))
-    with open(fpath, 'r+b') as fp:
-        # Size 0 means whole file
-        mm = mmap.mmap(fp.fileno(), 0)
-        return JPEGDict(map_jpg(mm))
-
-
-def jpgread(fpath):
-    """Return a represention of the JPEG file at `fpath`."""
+    with open(fpath, 'rb') as fp:
+        # Size 0 means whole file, the map stays valid after closing `fp`
+        mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+    info = map_jpg(mm)
+    LOGGER.debug("File mapped successfully")
+
+    return get_jpeg(mm, info, parser=partial(map_jpg, mm))
+
+
+def jpginfo(fpath):
+    """Return a representation of the headers of the JPEG file at `fpath`.
+
+    Equivalent to ``jpgread(fpath, headers_only=True)``.
+
+    Parameters
+    ----------
+    fpath : str
+        The path to the JPEG file.
+
+    Returns
+    -------
+    JPEG, JPEGLS or JPEG2000
+        The representation of the JPEG file's headers.
+    """
+    return jpgread(fpath, headers_only=True)
+
+
+def jpgparse(buf, copy=True, headers_only=False, incomplete=False):
+    """Return a representation of the JPEG in the buffer `buf`.
+
+    The JPEG is parsed directly from `buf` without wrapping it in a
+    file-like, which makes this the fastest way to parse JPEG data that's
+    already in memory, such as the frames of a DICOM dataset's
+    encapsulated Pixel Data.
+
+    Parameters
+    ----------
+    buf : bytes, bytearray, memoryview or mmap.mmap
+        The encoded JPEG.
+    copy : bool, optional
+        If True (default) then `buf` is copied once and the entropy-coded
+        data of each scan is a ``memoryview`` of the copy. If False then
+        it's a ``memoryview`` of `buf`, as for ``jpgmap()``, and `buf`
+        shouldn't be modified while the returned object is in use. Any
+        0xFF 0x00 byte stuffing is only removed when a scan is decoded.
+    headers_only : bool, optional
+        If True then stop parsing at the first SOS (or SOD) marker, see
+        ``jpgread()``. Default False.
+    incomplete : bool, optional
+        If True then `buf` may only contain the start of the JPEG, such as
+        when the JPEG is still being received, and only the marker
+        segments and complete scans in `buf` are parsed, see
+        ``parse_buffer()``. Default False.
+
+    Returns
+    -------
+    JPEG, JPEGLS or JPEG2000
+        The representation of the JPEG.
+
+    Raises
+    ------
+    ValueError
+        If `buf` doesn't contain a valid JPEG, or if `incomplete` is True
+        and the frame header (SOFn or SIZ) hasn't been received yet.
+    """
+    info = parse_buffer(
+        buf, copy, headers_only=headers_only, incomplete=incomplete
+    )
+    if incomplete and not [kk for kk in info if kk[:3] in ['SOF', 'SIZ']]:
+        # The type of JPEG isn't known until the frame header
+        raise ValueError(
+            "Unable to parse the JPEG as no frame header has been received "
+            "yet"
+        )
+
+    return get_jpeg(
+        buf, info,
+        parser=partial(parse_buffer, buf, copy, incomplete=incomplete)
+    )
+
+
+def jpgread(fpath, headers_only=False):
+    """Return a represention of the JPEG file at `fpath`.
+
+    Parameters
+    ----------
+    fpath : str
+        The path to the JPEG file.
+    headers_only : bool, optional
+        If True then stop parsing at the first SOS marker (or the first
+        SOD marker for JPEG 2000) without reading any of the entropy-coded
+        data, which is much faster when only the image's properties such as
+        `rows`, `columns`, `precision`, `samples` and `uid` are needed. The
+        file is parsed in full the first time the image is decoded.
+        Default False.
+
+    Returns
+    -------
+    JPEG, JPEGLS or JPEG2000
+        The representation of the JPEG file.
+    """
     LOGGER.debug("Reading file: {}".format(fpath))
     with open(fpath, 'rb') as fp:
-        info = parse_jpg(fp)
+        info = parse_jpg(fp, headers_only=headers_only)
         LOGGER.debug("File parsed successfully")
 
-        return get_jpeg(fp, info)
+        return get_jpeg(fp, info, parser=partial(_read_info, fpath))
+
+
+def _read_info(fpath):
+    """Return the parsed JPEG file at `fpath`."""
+    with open(fpath, 'rb') as fp:
+        return parse_jpg(fp)
 
 
 def jpgwrite(fpath, jpg):
@@ -42,210 +285,483 @@ def _marker_key(name, offset):
 
 
 def map_jpg(mm):
-    pass
-
-
-def parse_jpg(fp):
-    """Return a JPEG but don't decode yet."""
-    # Passing 10918-2 Process 1 compliance tests
-    if fp.read(1) != b'\xff':
-        fp.seek(0)
+    """Return the parsed JPEG in the memory-mapped file `mm`.
+
+    Equivalent to ``parse_buffer(mm, copy=False)``, so `mm` isn't copied
+    and each 'ENC@offset' entry is a ``memoryview`` of the raw data in
+    `mm`, which still contains any 0xFF 0x00 byte stuffing.
+
+    Parameters
+    ----------
+    mm : mmap.mmap
+        The memory-mapped JPEG file.
+
+    Returns
+    -------
+    collections.OrderedDict
+        The parsed JPEG.
+    """
+    return parse_buffer(mm, copy=False)
+
+
+def _find_scan_end(buf, pos, jpg='JPEG'):
+    """Return the offset of the marker that terminates a scan's data.
+
+    Parameters
+    ----------
+    buf : bytes-like
+        The buffer containing the entropy-coded data of the scan.
+    pos : int
+        The offset in `buf` to start searching from.
+    jpg : str, optional
+        The type of JPEG, either ``'JPEG'`` (byte stuffed with 0xFF 0x00)
+        or ``'JPEG-LS'`` (bit stuffed).
+
+    Returns
+    -------
+    end : int or None
+        The offset of the first 0xFF byte (including any fill bytes) of the
+        marker that terminates the scan, or None if the end of `buf` was
+        reached before the terminating marker was found.
+    restarts : list of (int, int)
+        The offsets of the first 0xFF byte (including any fill bytes) and
+        the final 0xFF byte of each RSTn marker found.
+    pos : int
+        The offset in `buf` that searching should resume from once more data
+        has been added, only meaningful if `end` is None.
+    """
+    search = _MARKER_14495.search if jpg == 'JPEG-LS' else _MARKER_10918.search
+    length = len(buf)
+    restarts = []
+    while True:
+        match = search(buf, pos)
+        if match is None:
+            # The only 0xFF bytes are stuffed, but the last byte may be
+            #   the 0xFF of a stuffed pair
+            if length and buf[length - 1] == 0xFF:
+                return None, restarts, length - 1
+
+            return None, restarts, length
+
+        start = match.start()
+        # Skip any fill bytes
+        offset = start
+        while offset + 1 < length and buf[offset + 1] == 0xFF:
+            offset += 1
+
+        if offset + 1 == length:
+            # Need more data to determine the marker
+            return None, restarts, start
+
+        if 0xD0 <= buf[offset + 1] <= 0xD7:
+            # RSTn marker, the scan continues
+            restarts.append((start, offset))
+            pos = offset + 2
+            continue
+
+        return start, restarts, start
+
+
+def _split_scan(buf, start, end, restarts, offset=0):
+    """Return the ENC and RSTn entries for the entropy-coded data of a scan.
+
+    Parameters
+    ----------
+    buf : bytes-like
+        The buffer containing the entropy-coded data of the scan.
+    start : int
+        The offset in `buf` of the first byte following the scan header.
+    end : int
+        The offset in `buf` of the marker that terminates the scan.
+    restarts : list of (int, int)
+        The RSTn marker offsets, as returned by ``_find_scan_end()``.
+    offset : int, optional
+        The offset of the start of `buf` within the file.
+
+    Returns
+    -------
+    list of (str, object)
+        The ('ENC@offset', data) and ('RSTn@offset', None) entries of
+        the scan, ordered by offset. Each ENC entry is a slice of `buf`,
+        which is only a view when `buf` is a ``memoryview``, and still
+        contains any byte stuffing.
+    """
+    entries = []
+    for stop, rst_end in restarts + [(end, None)]:
+        entries.append((_marker_key('ENC', offset + start), buf[start:stop]))
+
+        if rst_end is None:
+            break
+
+        # The RSTn marker follows the ENC
+        start = rst_end + 2
+        name = MARKERS[0xFF00 | buf[rst_end + 1]][0]
+        entries.append((_marker_key(name, offset + start), None))
+
+    return entries
+
+
+def parse_buffer(buf, copy=True, headers_only=False, incomplete=False):
+    """Return the parsed JPEG in the buffer `buf`.
+
+    `buf` is walked using integer offsets and each marker segment is
+    passed to its reader as a slice of `buf`. Used by all the parsers,
+    ``parse_jpg()`` reads the data from its file-like and then parses it
+    here.
+
+    Parameters
+    ----------
+    buf : bytes, bytearray, memoryview or mmap.mmap
+        The encoded JPEG. The offsets in the marker keys are relative to the
+        start of `buf`.
+    copy : bool, optional
+        If True (default) then a mutable `buf` is copied once before
+        parsing, otherwise it's used as-is. Either way each 'ENC@offset'
+        entry is a ``memoryview`` of the raw entropy-coded data, which
+        still contains any byte stuffing.
+    headers_only : bool, optional
+        If True then stop parsing after the first SOS marker segment (or
+        the first SOD marker for JPEG 2000), without searching the
+        entropy-coded data. Default False.
+    incomplete : bool, optional
+        If True then reaching the end of `buf` before the EOI marker
+        isn't an error and the markers parsed so far are returned instead.
+        A scan is only included if its entropy-coded data is followed by
+        a marker other than RSTn, so a scan that's still being received is
+        left out along with any partial marker segment. Default False.
+
+    Returns
+    -------
+    collections.OrderedDict
+        The parsed JPEG.
+
+    Raises
+    ------
+    ValueError
+        If `buf` doesn't contain a valid JPEG or if `incomplete` is False
+        and the end of `buf` is reached before the EOI marker.
+    """
+    return _parse_buffer(buf, copy, headers_only, incomplete)[0]
+
+
+def _parse_buffer(buf, copy=True, headers_only=False, incomplete=False,
+                  resume=None):
+    """Return the parsed JPEG in `buf` and the offset parsing stopped at.
+
+    Parameters
+    ----------
+    buf : bytes, bytearray, memoryview or mmap.mmap
+        The encoded JPEG.
+    copy, headers_only, incomplete : bool, optional
+        See ``parse_buffer()``.
+    resume : tuple of (collections.OrderedDict, int), optional
+        The parsed JPEG and offset returned by a previous call with
+        `incomplete` True, where `buf` starts with the data that was
+        parsed then. If used then parsing continues from the offset
+        rather than the start of `buf`.
+
+    Returns
+    -------
+    collections.OrderedDict, int
+        The parsed JPEG and the offset of the first byte following the
+        last complete marker segment (or scan) in `buf`.
+    """
+    tracing = _tracing.TRACE
+    start_time = perf_counter() if tracing else None
+
+    if copy and not headers_only and not isinstance(buf, bytes):
+        # The scans are views of the copy, which is only freed once all of
+        #   them have been released
+        buf = bytes(buf)
+
+    buf = memoryview(buf)
+    if buf.format != 'B' or buf.ndim != 1:
+        buf = buf.cast('B')
+
+    length = len(buf)
+    if resume and resume[0]:
+        info, offset = resume
+        return _parse_markers(
+            buf, offset, info, headers_only, incomplete, tracing, start_time
+        )
+
+    if not length or buf[0] != 0xFF:
         raise ValueError('File is not JPEG')
 
-    JPEG_TYPE = 'JPEG'
+    # Skip any fill bytes preceding the SOI or SOC marker
+    offset = 1
+    while offset < length and buf[offset] == 0xFF:
+        offset += 1
 
-    _fill_bytes = 0
-    while fp.read(1) == b'\xff':
-        _fill_bytes += 1
-        pass
+    if offset == length and incomplete:
+        # Still waiting on the SOI or SOC marker
+        return OrderedDict(), 0
 
-    #if _fill_bytes == 1:
-    #    _fill_bytes = 0
-
-    fp.seek(-2, 1)
-
-    # Confirm SOI or SOC marker
-    marker = fp.read(2)
+    marker = bytes(buf[offset - 1:offset + 1])
     if marker not in [b'\xFF\xD8', b'\xFF\x4F']:
         raise ValueError('No SOI or SOC marker found')
 
-    if marker == b'\xFF\xD8':
-        info = OrderedDict()
-        info[_marker_key('SOI', fp.tell())] = (unpack('>H', b'\xFF\xD8')[0], _fill_bytes, {})
-    elif marker == b'\xFF\x4F':
-        info = OrderedDict()
-        info[_marker_key('SOC', fp.tell())] = (unpack('>H', b'\xFF\x4F')[0], _fill_bytes, {})
+    _fill_bytes = offset - 1
+    # `offset` is the first byte following the current marker
+    offset += 1
+    name = 'SOI' if marker == b'\xFF\xD8' else 'SOC'
+    info = OrderedDict()
+    info[_marker_key(name, offset)] = (
+        unpack('>H', marker)[0], _fill_bytes, {}
+    )
+    if tracing:
+        trace(
+            'marker', name=name, offset=offset - 2, fill=_fill_bytes, length=0
+        )
+
+    return _parse_markers(
+        buf, offset, info, headers_only, incomplete, tracing, start_time
+    )
+
+
+def _parse_markers(buf, offset, info, headers_only, incomplete, tracing,
+                   start_time):
+    """Parse the markers in `buf` that follow the SOI or SOC marker.
+
+    Parameters
+    ----------
+    buf : memoryview
+        The encoded JPEG as unsigned bytes.
+    offset : int
+        The offset of the first byte following the last parsed marker.
+    info : collections.OrderedDict
+        The markers parsed so far, updated in-place.
+    headers_only, incomplete : bool
+        See ``parse_buffer()``.
+    tracing : bool
+        True if tracing is enabled.
+    start_time : float or None
+        The time parsing started if `tracing` is True.
+
+    Returns
+    -------
+    collections.OrderedDict, int
+        The parsed JPEG and the offset of the first byte following the
+        last complete marker segment (or scan) in `buf`.
+    """
+    length = len(buf)
+    keys = [kk.split('@')[0] for kk in info]
+    jpg = 'JPEG-LS' if 'SOF55' in keys else 'JPEG'
+    sot_offset = None
+    while True:
+        # Skip fill bytes, the last 0xFF byte is part of the marker
+        start = offset
+        while offset < length and buf[offset] == 0xFF:
+            offset += 1
+
+        if offset >= length:
+            if incomplete:
+                offset = start
+                break
 
-    START_OFFSET = None
+            raise ValueError(
+                "The end of the data was reached before the EOI marker"
+            )
+
+        _fill_bytes = max(offset - start - 1, 0)
+        _marker = 0xFF00 | buf[offset]
+        offset += 1
+
+        if _marker not in MARKERS:
+            raise NotImplementedError(
+                "Unknown marker {} at offset {}"
+                .format(hex(_marker), offset - 2)
+            )
+
+        name, description, handler = MARKERS[_marker]
+        key = _marker_key(name, offset)
+        if name == 'EOI' or handler is None or name == 'SOD':
+            # Markers without a segment
+            if tracing:
+                trace(
+                    'marker', name=name, offset=offset - 2, fill=_fill_bytes,
+                    length=0
+                )
+
+        if name == 'EOI':
+            info[key] = (_marker, _fill_bytes, {})
+            break
+
+        if handler is None:
+            info[key] = (_marker, _fill_bytes, {})
+            continue
+
+        if name == 'SOD':
+            # No marker segment parameters
+            info[key] = (_marker, _fill_bytes, handler(b''))
+            if headers_only:
+                break
 
-    while True:
-        _fill_bytes = 0
-
-        # Skip fill
-        next_byte = fp.read(1)
-        while next_byte == b'\xFF':
-            _fill_bytes += 1
-            next_byte = fp.read(1)
-
-        # Remove the byte thats actually part of the marker
-        if _fill_bytes:
-            _fill_bytes -= 1
-
-        fp.seek(-2, 1)
-
-        _marker = unpack('>H', fp.read(2))[0]
-
-        mm = MARKERS.get(_marker, 'UNKNOWN')[0]
-        print('{}@{} : {}'.format(hex(_marker), fp.tell() - 2, mm))
-
-        if _marker in MARKERS:
-            name, description, handler = MARKERS[_marker]
-            #print(hex(_marker), name, fp.tell() - 2)
-            key = _marker_key(name, fp.tell())
-            if name not in ['SOS', 'EOI', 'LSE', 'QCC', 'SOD', 'SOT', 'COC']:
-                if handler is None:
-                    #length = unpack('>H', fp.read(2))[0] - 2
-                    #fp.seek(length, 1)
-                    #fp.seek(2, 1)
-                    info[key] = (_marker, _fill_bytes, {})
-                    continue
-
-                info[key] = (_marker, _fill_bytes , handler(fp))
-                print(key, _marker, info[key])
-
-            elif name is 'SOT':
-                START_OFFSET = fp.tell() - 2
-                print('SOT offset', START_OFFSET)
-                info[key] = (_marker, _fill_bytes, handler(fp))
-                print(key, _marker, info[key])
-            elif name is 'SOD':
-                info[key] = (_marker, _fill_bytes, handler(fp))
-                print(key, _marker, info[key])
-
-                # Tile part length
-                # get last SOT marker
-                sot_keys = [kk for kk in info.keys() if 'SOT' in kk]
-                sot = info[sot_keys[-1]]
-                tile_length = sot[2]['Psot']
-                print(tile_length)
-                if tile_length == 0:
-                    # Tile goes to EOC
-                    pass
-                else:
-                    # tile_length is from first byte of SOT to end of tile-part
-                    fp.seek(START_OFFSET)
-                    fp.seek(START_OFFSET + tile_length)
-                    print(START_OFFSET + tile_length, fp.tell())
-
-            elif name in ['QCC', 'COC']:
-                # JPEG2000
-                csiz = None
-                for kk in info:
-                    if 'SIZ' in kk:
-                        csiz = info[kk][2]['Csiz']
-
-                if not csiz:
-                    raise ValueError('Bad order')
-
-                info[key] = (_marker, _fill_bytes, handler(fp, csiz))
-                print(key, _marker, info[key])
-
-            elif name is 'SOS':
-                # SOS's info dict contains an extra 'encoded_data' keys
-                # which use RSTN@offset and ENC@offset
-
-                for kk in info:
-                    if 'SOF55' in kk:
-                        JPEG_TYPE = 'JPEG-LS'
-                        break
-                info[key] = [_marker, _fill_bytes, handler(fp, jpg=JPEG_TYPE)]
-                print(key, _marker, info[key])
-
-                sos_info = {}
-                encoded_data = bytearray()
-                _enc_start = fp.tell()
-
-                while True:
-                    _enc_key = _marker_key('ENC', _enc_start)
-                    prev_byte = fp.read(1)
-                    if prev_byte != b'\xFF':
-                        encoded_data.extend(prev_byte)
-                        continue
-
-                    # To get here next_byte must be 0xFF
-                    # If the next byte is 0x00 then keep reading
-                    # JPEGLS: if the next bit is 0, discard the inserted bit
-                    #         if the next bit is 1, then is a marker
-                    # If the next byte is 0xFF then keep reading until
-                    #   a non-0xFF byte is found
-                    # If the marker is a RST marker then keep reading
-                    # Otherwise rewind to the start of the fill bytes and break
-
-                    next_byte = fp.read(1)
-                    if JPEG_TYPE == 'JPEG':
-                        if next_byte == b'\x00':
-                            # Skip padding bytes
-                            # The previous byte wasn't added so do it now
-                            encoded_data.extend(prev_byte)
-                            #encoded_data.extend(next_byte)
-                            continue
-                    elif JPEG_TYPE == 'JPEG-LS':
-                        encoded_data.extend(prev_byte)
-                        encoded_data.extend(next_byte)
-                        next_byte = unpack('B', next_byte)[0]
-                        #print('nb', next_byte, bin(next_byte))
-                        #print('{:>08b}'.format(next_byte))
-                        #print('{:>08b}'.format(next_byte)[0])
-                        #print('{:>08b}'.format(next_byte)[0] == '0')
-
-                        if '{:>08b}'.format(next_byte)[0] == '0':
-                            #print('MSB is 0')
-                            continue
-
-                    # To get here next_byte must be non-padding (non 0x00)
-                    #   so we must be at the end of the encoded data
-
-                    info[key][2].update({_enc_key : encoded_data})
-                    encoded_data = bytearray()
-
-                    # The number of 0xFF bytes before the marker
-                    #   i.e. 0xFF 0xFF 0xFF 0xD9 is 2 fill bytes
-                    _sos_fill_bytes = 0
-                    # While we still have 0xFF bytes
-                    while next_byte == b'\xFF':
-                        _sos_fill_bytes += 1
-                        next_byte = fp.read(1)
-
-                    # Check to see if marker is RST_m
-                    if next_byte in [b'\xD0', b'\xD1', b'\xD2', b'\xD3',
-                                     b'\xD4', b'\xD5', b'\xD6', b'\xD7']:
-                        _sos_marker = unpack('>H', b'\xFF' + next_byte)[0]
-                        _sos_marker, _, _ = MARKERS[_sos_marker]
-                        _sos_key = _marker_key(_sos_marker, fp.tell())
-                        info[key][2].update({_sos_key : None})
-
-                        _enc_start = fp.tell()
-                        continue
-
-                    # End of the current scan, rewind and break
-                    # Back up to the start of the 0xFF
-                    # Currently position at first byte after marker
-                    fp.seek(-2 - _sos_fill_bytes, 1)
-                    break
+            # Psot is the length from the start of the SOT marker to the
+            #   end of the tile-part, 0 if the tile-part goes to the EOC
+            sot_keys = [kk for kk in info if kk.startswith('SOT')]
+            tile_length = info[sot_keys[-1]][2]['Psot']
+            if tile_length:
+                offset = sot_offset + tile_length
+
+            continue
+
+        segment_length = int.from_bytes(buf[offset:offset + 2], 'big')
+        if offset + max(segment_length, 2) > length:
+            if incomplete:
+                offset = start
+                break
 
-            elif name is 'EOI':
-                info[key] = (_marker, _fill_bytes, {})
-                print(key, _marker, info[key])
+            raise ValueError(
+                "The end of the data was reached before the end of the {} "
+                "marker segment at offset {}".format(name, offset - 2)
+            )
+
+        if tracing:
+            trace(
+                'marker', name=name, offset=offset - 2, fill=_fill_bytes,
+                length=segment_length
+            )
+
+        data = buf[offset:offset + segment_length]
+        if name == 'SOS':
+            if 'SOF55' in [kk.split('@')[0] for kk in info]:
+                jpg = 'JPEG-LS'
+
+            # SOS's info dict also contains the ENC@offset and
+            #   RSTn@offset entries of the scan data
+            info[key] = [_marker, _fill_bytes, handler(data, jpg=jpg)]
+            if headers_only:
+                offset += segment_length
                 break
 
-            elif name is 'LSE':
-                # JPEG-LS
-                info[key] = (_marker, _fill_bytes, handler(fp, info))
-                print(key, _marker, info[key])
+            offset += segment_length
+            end, restarts, _ = _find_scan_end(buf, offset, jpg)
+            if end is None:
+                if incomplete:
+                    # Only complete scans are included
+                    del info[key]
+                    offset = start
+                    break
 
+                raise ValueError(
+                    "The end of the file was reached before the end of the "
+                    "scan data starting at offset {}".format(offset)
+                )
+
+            entries = _split_scan(buf, offset, end, restarts)
+            info[key][2].update(entries)
+            if tracing:
+                trace(
+                    'scan_data', offset=offset, length=end - offset,
+                    segments=len(restarts) + 1
+                )
+
+            offset = end
+            continue
+
+        if name in ['QCC', 'COC']:
+            # JPEG 2000
+            csiz = None
+            for kk in info:
+                if 'SIZ' in kk:
+                    csiz = info[kk][2]['Csiz']
+
+            if not csiz:
+                raise ValueError('Bad order')
+
+            info[key] = (_marker, _fill_bytes, handler(data, csiz))
+        elif name == 'LSE':
+            info[key] = (_marker, _fill_bytes, handler(data, info))
         else:
-            print('Unknown marker {0} at offset {1}'
-                  .format(hex(_marker), fp.tell() - 2))
-            raise NotImplementedError
+            if name == 'SOT':
+                sot_offset = offset - 2
+
+            info[key] = (_marker, _fill_bytes, handler(data))
+
+        offset += segment_length
+
+    if tracing:
+        trace(
+            'parse', markers=len(info), elapsed=perf_counter() - start_time
+        )
+
+    return info, offset
+
+
+def _read_segment(fp):
+    """Return the data of the marker segment at the current offset of `fp`.
+
+    Parameters
+    ----------
+    fp : file-like
+        The file-like containing the JPEG, positioned at the first byte
+        of the marker segment's length parameter. On return it will be
+        positioned at the first byte following the segment.
+
+    Returns
+    -------
+    bytes
+        The marker segment, starting at the length parameter.
+    """
+    length = fp.read(2)
+
+    return length + fp.read(unpack('>H', length)[0] - 2)
+
+
+def parse_jpg(fp, headers_only=False):
+    """Return the parsed JPEG in the file-like `fp`.
+
+    The data from the current offset of `fp` onwards is read and then
+    parsed with ``parse_buffer()``, so the offsets in the marker keys are
+    relative to the offset of `fp` when called.
+
+    Parameters
+    ----------
+    fp : file-like
+        The file-like containing the JPEG.
+    headers_only : bool, optional
+        If True then only read as far as the end of the first SOS marker
+        segment (or the first SOD marker for JPEG 2000), leaving `fp`
+        positioned at the start of the entropy-coded data. Default False.
+
+    Returns
+    -------
+    collections.OrderedDict
+        The parsed JPEG.
+
+    Raises
+    ------
+    ValueError
+        If `fp` doesn't contain a valid JPEG.
+    """
+    if not headers_only:
+        return parse_buffer(fp.read())
+
+    # The headers are usually a small part of the file, so read chunks of
+    #   increasing size until the first scan header has been parsed, with
+    #   each chunk parsed from the end of the last complete marker segment
+    start = fp.tell()
+    data = b''
+    size = HEADER_CHUNK_SIZE
+    info, offset = OrderedDict(), 0
+    while True:
+        chunk = fp.read(size)
+        if not chunk:
+            # Raises an exception for the truncated data
+            _parse_buffer(data, headers_only=True, resume=(info, offset))
+            break
+
+        data += chunk
+        info, offset = _parse_buffer(
+            data, headers_only=True, incomplete=True, resume=(info, offset)
+        )
+        if info and next(reversed(info))[:3] in ['SOS', 'SOD', 'EOI']:
+            break
+
+        size *= 2
+
+    # Position `fp` at the first byte following the last marker
+    fp.seek(start + offset)
 
     return info
@@ -1,34 +1,58 @@
-"""Functions for creating Huffman tables."""
+"""Functions for creating and decoding with Huffman tables."""
+
+from struct import Struct
+
+
+# The number of bits resolved by a single lookup in HuffmanTable.lookup
+LOOKAHEAD = 9
+_LOOKAHEAD_MASK = (1 << LOOKAHEAD) - 1
+
+# Unpack the next 32 bits of entropy-coded data
+_UNPACK_UINT32 = Struct('>I').unpack_from
 
-import heapq
 
-# temporary
 def _get_huffman(htable):
-    """
-    {
-        0 : {
-                0 : (bits, huffval),
-                1 : (bits, huffval),
-            },
-        1 : {
-                0 : (bits, huffval),
-                1 : (bits, huffval),
-            },
-    }
+    """Return the Huffman decoding tables for `htable`.
+
+    Parameters
+    ----------
+    htable : dict
+        The (bits, huffval) pairs for each table class and destination::
+
+            {
+                0 : {
+                        0 : (bits, huffval),
+                        1 : (bits, huffval),
+                    },
+                1 : {
+                        0 : (bits, huffval),
+                        1 : (bits, huffval),
+                    },
+            }
 
     Returns
-    {
-        0 : {
-                0 : heapq,
-                1 : heapq,
-            },
-        1 : {
-                0 : heapq,
-                1 : heapq,
-        }
-    }
+    -------
+    dict
+        The HuffmanTable for each table class and destination::
+
+            {
+                0 : {
+                        0 : HuffmanTable,
+                        1 : HuffmanTable,
+                    },
+                1 : {
+                        0 : HuffmanTable,
+                        1 : HuffmanTable,
+                }
+            }
     """
-    return
+    tables = {}
+    for table_class, destinations in htable.items():
+        tables[table_class] = {}
+        for table_id, (bits, huffval) in destinations.items():
+            tables[table_class][table_id] = get_huffman_table(bits, huffval)
+
+    return tables
 
 
 def get_huffman_table(bits, huffval, method='default'):
@@ -39,46 +63,256 @@ def get_huffman_table(bits, huffval, method='default'):
     bits : list of int
         The number of Huffman codes for each of the 16 possible lengths allowed
         by 10918. Corresponds to the Huffman BITS list.
-    huffval : dict of list of int
-        The values associated with each Huffman code length. The keys to the
-        dict are the Huffman codes lengths.
+    huffval : list or dict of list of int
+        The values associated with each Huffman code length. Either the DHT
+        'Vij' list of 16 items (one for each length, None if no codes of
+        that length) or a dict with the Huffman code lengths as keys.
+    method : str, optional
+        The method used to build the table, only ``'default'`` is
+        available.
 
     Returns
     -------
-    Uh...?
+    HuffmanTable
+        The table used for decoding.
 
     References
     ----------
-    ISO/IEC 10918-1
+    ISO/IEC 10918-1, Annex C and Section F.2.2.3
     """
     if method == 'default':
-        return _get_huffman_heapq(bits, huffval)
+        return HuffmanTable(bits, huffval)
     else:
         raise ValueError(
             "Unknown method '{}' for building a Huffman table".format(method)
         )
 
 
-def _get_huffman_heapq(bits, huffval):
-    """Use python's heapq to build a Huffman tree.
+class HuffmanTable(object):
+    """A Huffman decoding table.
 
-    Parameters
+    Decoding uses a lookup table indexed by the next ``LOOKAHEAD`` bits of
+    the entropy-coded data, which resolves the code length and value of all
+    codes up to ``LOOKAHEAD`` bits long in a single step. Longer codes fall
+    back to the MAXCODE, MINCODE and VALPTR procedure of Figure F.16.
+
+    Attributes
     ----------
-    bits : list of int
-        The number of Huffman codes for each of the 16 possible lengths allowed
-        by 10918. Corresponds to the Huffman BITS list.
-    huffval : dict of list of int
-        The values associated with each Huffman code length. The keys to the
-        dict are the Huffman codes lengths.
+    huffval : list of int
+        The HUFFVAL list, the values ordered by code.
+    huffsize : list of int
+        The HUFFSIZE list, the length of the code for each value.
+    huffcode : list of int
+        The HUFFCODE list, the code for each value.
+    lookup : list of int
+        The 2**``LOOKAHEAD`` entry lookup table, each entry is the code
+        length << 8 | value, or 0 if the code is longer than ``LOOKAHEAD``
+        bits.
+    maxcode : list of int
+        The largest code of each length (index 1 to 16), -1 if no codes.
+    mincode : list of int
+        The smallest code of each length (index 1 to 16).
+    valptr : list of int
+        The index in `huffval` of the first value with each code length.
+    """
+    def __init__(self, bits, huffval):
+        """Initialise a new HuffmanTable.
 
-    Returns
-    -------
-    heapq
-        heap([], (binary, length))
+        Parameters
+        ----------
+        bits : list of int
+            The BITS list, the number of codes of each length from 1 to 16.
+        huffval : list or dict of list of int
+            The values associated with each Huffman code length, as
+            either the DHT 'Vij' list or a dict keyed by code length.
+        """
+        bits = list(bits)
+        if len(bits) != 16:
+            raise ValueError("BITS must contain 16 values")
+
+        if isinstance(huffval, dict):
+            huffval = [huffval.get(ii) for ii in range(1, 17)]
+
+        self.bits = bits
+        self.huffval = []
+        for nr_codes, values in zip(bits, huffval):
+            values = list(values or [])
+            if len(values) != nr_codes:
+                raise ValueError(
+                    "The number of Huffman values doesn't match BITS"
+                )
+            self.huffval.extend(values)
+
+        # Figure C.1: generate HUFFSIZE
+        self.huffsize = []
+        for length, nr_codes in enumerate(bits, 1):
+            self.huffsize.extend([length] * nr_codes)
+
+        # Figure C.2: generate HUFFCODE
+        self.huffcode = []
+        code = 0
+        size = self.huffsize[0] if self.huffsize else 0
+        for length in self.huffsize:
+            code <<= length - size
+            size = length
+            self.huffcode.append(code)
+            code += 1
+
+        if code > (1 << size):
+            raise ValueError("Invalid Huffman table, too many codes")
+
+        # Figure F.15: generate MAXCODE, MINCODE and VALPTR
+        self.maxcode = [-1] * 17
+        self.mincode = [0] * 17
+        self.valptr = [0] * 17
+        index = 0
+        for length, nr_codes in enumerate(bits, 1):
+            if nr_codes:
+                self.valptr[length] = index
+                self.mincode[length] = self.huffcode[index]
+                index += nr_codes
+                self.maxcode[length] = self.huffcode[index - 1]
+
+        # The lookahead table
+        self.lookup = [0] * (1 << LOOKAHEAD)
+        for code, length, value in zip(
+            self.huffcode, self.huffsize, self.huffval
+        ):
+            if length > LOOKAHEAD:
+                break
+
+            shift = LOOKAHEAD - length
+            entry = (length << 8) | value
+            start = code << shift
+            self.lookup[start:start + (1 << shift)] = [entry] * (1 << shift)
+
+    def decode_slow(self, bits, nbits):
+        """Return the (length, value) for a code longer than ``LOOKAHEAD``.
+
+        Parameters
+        ----------
+        bits : int
+            The bit buffer, the code starts at bit `nbits` - 1.
+        nbits : int
+            The number of bits available in `bits`, must be at least 16.
+
+        Returns
+        -------
+        int, int
+            The code length and the decoded value.
+
+        Raises
+        ------
+        ValueError
+            If no valid code is found.
+        """
+        maxcode = self.maxcode
+        length = LOOKAHEAD + 1
+        code = (bits >> (nbits - length)) & ((1 << length) - 1)
+        while code > maxcode[length]:
+            length += 1
+            if length > 16:
+                raise ValueError("Invalid Huffman code in the encoded data")
+
+            code = (bits >> (nbits - length)) & ((1 << length) - 1)
+
+        index = self.valptr[length] + code - self.mincode[length]
+        return length, self.huffval[index]
+
+
+class BitReader(object):
+    """Read bits from a single segment of entropy-coded data, MSB first.
+
+    The data should have any byte stuffing removed. The bit buffer is
+    refilled 32 bits at a time and reading past the end of the data returns
+    0 bits.
     """
+    __slots__ = ('bits', 'nbits', 'pos', '_data', '_length')
+
+    def __init__(self, data):
+        """Initialise a new BitReader.
+
+        Parameters
+        ----------
+        data : bytes-like
+            The entropy-coded data, without byte stuffing.
+        """
+        self._length = len(data)
+        # Pad so the last bytes can be added to the buffer with a 32-bit read
+        self._data = bytes(data) + b'\x00' * 4
+        # The bit buffer, only the lowest `nbits` are valid
+        self.bits = 0
+        self.nbits = 0
+        # The offset of the next byte to add to the bit buffer
+        self.pos = 0
+
+    def decode(self, table):
+        """Return the next value decoded with the HuffmanTable `table`."""
+        if self.nbits < 16:
+            self.fill()
+
+        nbits = self.nbits
+        index = (self.bits >> (nbits - LOOKAHEAD)) & _LOOKAHEAD_MASK
+        entry = table.lookup[index]
+        if entry:
+            self.nbits = nbits - (entry >> 8)
+            return entry & 0xFF
+
+        length, value = table.decode_slow(self.bits, nbits)
+        self.nbits = nbits - length
+        return value
+
+    def fill(self):
+        """Add the next 32 bits of data to the bit buffer."""
+        word = 0
+        if self.pos <= self._length:
+            word = _UNPACK_UINT32(self._data, self.pos)[0]
+
+        self.bits = ((self.bits & ((1 << self.nbits) - 1)) << 32) | word
+        self.nbits += 32
+        self.pos += 4
+
+    @property
+    def is_exhausted(self):
+        """Return True if more bits have been read than are in the data."""
+        return (self.pos << 3) - self.nbits > (self._length << 3)
+
+    def read_bit(self):
+        """Return the next bit as an int."""
+        if not self.nbits:
+            self.fill()
+
+        self.nbits -= 1
+        return (self.bits >> self.nbits) & 1
+
+    def read_bits(self, length):
+        """Return the next `length` bits as an unsigned int."""
+        if not length:
+            return 0
+
+        if self.nbits < length:
+            self.fill()
+
+        self.nbits -= length
+        return (self.bits >> self.nbits) & ((1 << length) - 1)
+
+    def receive_extend(self, length):
+        """Return the next `length` bits as a signed difference.
+
+        Equivalent to the RECEIVE and EXTEND procedures of Section F.2.2.1.
+        """
+        if not length:
+            return 0
+
+        if self.nbits < length:
+            self.fill()
 
-    pass
+        self.nbits -= length
+        value = (self.bits >> self.nbits) & ((1 << length) - 1)
+        if value < (1 << (length - 1)):
+            value += 1 - (1 << length)
 
+        return value
 
 
 '''
@@ -1,8 +1,17 @@
 
 from collections import OrderedDict
+from hashlib import blake2b
+import os
 
+import numpy as np
+
+from pydcmjpeg.cache import ARRAY_CACHE
 from pydcmjpeg.config import JPEG_10918, JPEG_14495, JPEG_15444
-from pydcmjpeg.decoders import decode_baseline
+from pydcmjpeg.decoders import (
+    decode_baseline, decode_lossless, decode_progressive, get_output,
+    iter_baseline, iter_progressive
+)
+from pydcmjpeg.marker import MarkerIndex
 
 
 class JPEG(object):
@@ -54,7 +63,7 @@ class JPEG(object):
     29: Lossless, arithmetic, 2 to 16-bit
 
     """
-    def __init__(self, fp, info):
+    def __init__(self, fp, info, parser=None):
         """Initialise a new JPEG.
 
         Parameters
@@ -63,28 +72,232 @@ class JPEG(object):
             The file-like that contains the JPEG image.
         info : dict
             The parsed JPEG image.
+        parser : callable, optional
+            The function used to parse the entire JPEG image, as
+            ``parser()``. Required if `info` only contains the headers up to
+            and including the first SOS marker segment, in which case it's
+            called the first time the image is decoded. Also used to parse
+            the JPEG again if it's decoded after its entropy-coded data has
+            been released.
         """
         self._fp = fp
         self.info = info
+        # Index of the markers in `info`
+        self._index = MarkerIndex(info)
+        # Used to parse the entire JPEG when only the headers are parsed
+        #   or the entropy-coded data has been released
+        self._parser = parser
+        self._released = False
+
+        # The most recently decoded image data, as (key, numpy.ndarray)
+        self._cache = None
+        # The keys of the image data added to the process-wide cache
+        self._cache_keys = set()
+        self._source = None
+
+    def _cache_key(self, **kwargs):
+        """Return the key for the cached image data.
+
+        Parameters
+        ----------
+        **kwargs
+            The decoding parameters that affect the decoded image data.
+
+        Returns
+        -------
+        tuple
+            The cache key.
+        """
+        return tuple(sorted(kwargs.items()))
 
-        # Used to track whether or not we have decoded the JPEG
-        self._array = None
-        self._array_id = None
+    def clear_cache(self):
+        """Remove the JPEG's decoded image data from the caches."""
+        self._cache = None
+        for key in self._cache_keys:
+            ARRAY_CACHE.pop(key)
+
+        self._cache_keys.clear()
 
     @property
     def columns(self):
         """Return the number of columns in the image as an int."""
-        keys = self.get_keys('SOF')
-        if keys:
-            return self.info[keys[0]][2]['X']
+        frame = self._index.frame
+        if frame:
+            return frame['X']
 
         raise ValueError(
             "Unable to get the number of columns in the image as no SOFn "
             "marker was found"
         )
 
-    def _decode(self):
-        """Decode the JPEG image data in place.
+    def decode(self, workers=None, tables=None, release=False,
+               readonly=False, as_rgb=False, upsample='fancy', planar=False,
+               out=None, dtype=None, scale=1, region=None):
+        """Return the decoded JPEG image data as a numpy ndarray.
+
+        The decoded image data is cached as a read-only array, so decoding
+        again with the same parameters doesn't decode the JPEG again unless
+        ``clear_cache()`` is used. By default a writable copy of the cached
+        array is returned, so changing it doesn't affect later decodes. If
+        the process-wide ``cache.ARRAY_CACHE`` is enabled then the cached
+        array is also added to it, and may be shared with other JPEG
+        objects decoded from the same source. Image data written to `out`
+        isn't cached.
+
+        Parameters
+        ----------
+        workers : int, optional
+            If greater than 1 then entropy decode the restart intervals of
+            each scan in parallel using a pool of `workers` processes,
+            which is started by the first decode that uses it and then
+            reused until a different number of workers is used. Only
+            applies to sequential DCT Huffman JPEGs (Processes 1, 2 and 4)
+            and is only useful for large images that use restart
+            intervals. Progressive, arithmetic coded and lossless JPEGs
+            are always decoded in the current process.
+        tables : dict, optional
+            A cache of decoding tables to use and update instead of the
+            process-wide ``cache.TABLE_CACHE``, which already reuses the
+            tables built from identical DHT and DQT segments.
+        release : bool, optional
+            If True then release the entropy-coded data of each scan as
+            soon as it's been decoded, which reduces the memory used when
+            decoding JPEGs with multiple scans. The JPEG will be parsed
+            again if it's decoded again. Default False.
+        readonly : bool, optional
+            If True then return the read-only cached image data itself,
+            which avoids copying it, otherwise (default) return a writable
+            copy.
+        as_rgb : bool, optional
+            If True then convert the image data from YCbCr to RGB, such as
+            when the DICOM *Photometric Interpretation* is ``YBR_FULL`` or
+            ``YBR_FULL_422``. If False (default) then return the image data
+            in the colour space it was encoded in.
+        upsample : str, optional
+            The method used to upsample subsampled components to the full
+            image size, one of ``'fancy'`` (default) for triangle
+            interpolation between the nearest samples or ``'nearest'`` for
+            sample replication, which is faster.
+        planar : bool, optional
+            If True then return image data with multiple components with
+            shape (samples, rows, columns), as for a DICOM *Planar
+            Configuration* of 1. If False (default) then return it with
+            shape (rows, columns, samples), as for a *Planar Configuration*
+            of 0.
+        out : numpy.ndarray or buffer, optional
+            If used then write the image data directly to `out` and return
+            it, such as when decoding to a slice of a larger volume. `out`
+            must be writable and either an ndarray with the same shape as
+            the image data or an object supporting the buffer protocol,
+            such as a ``bytearray``, with the same size in bytes.
+        dtype : numpy.dtype, optional
+            The dtype of the image data, defaults to the dtype of `out` if
+            `out` is an ndarray, otherwise uint8 for 8-bit images or uint16
+            for 12 and 16-bit images.
+        scale : float, optional
+            Decode the image data reduced in size by `scale`, one of 1/8,
+            2/8, ..., 1 (default), such as for thumbnails. Scaling uses
+            reduced size IDCTs of the lowest frequency coefficients, so
+            decoding at 1/8 only uses the DC coefficients, and is much
+            faster than decoding at full size then resizing. The scaled
+            image has ``ceil(rows * scale)`` rows and
+            ``ceil(columns * scale)`` columns.
+        region : tuple of int, optional
+            If used then only decode the region (y0, x0, height, width) of
+            the image, in the coordinates of the scaled image if `scale` is
+            used. The decoded region is the same as the region of the
+            decoded image, but only the MCUs that overlap the region are
+            dequantised, inverse transformed and colour converted. If the
+            JPEG uses restart intervals then only the intervals containing
+            those MCUs are entropy decoded.
+
+        Returns
+        -------
+        numpy.ndarray
+            An ndarray containing the image data, using the memory of `out`
+            if `out` is used.
+
+        Raises
+        ------
+        NotImplementedError
+            If the JPEG is of an unsupported type.
+        TypeError
+            If `out` isn't an ndarray and doesn't support the buffer
+            protocol.
+        ValueError
+            If `as_rgb` is True and the JPEG doesn't have 3 components, or
+            if `out` isn't writable or its shape, size or dtype doesn't
+            match the image data, if `scale` isn't valid or if `region`
+            isn't within the image.
+        """
+        key = self._cache_key(
+            as_rgb=as_rgb,
+            upsample=upsample,
+            planar=planar,
+            dtype=None if dtype is None else np.dtype(dtype).str,
+            scale=scale,
+            region=None if region is None else tuple(region),
+        )
+        arr = self._get_cached(key)
+        if out is not None:
+            if arr is None:
+                return self._decode(
+                    workers=workers, tables=tables, release=release,
+                    as_rgb=as_rgb, upsample=upsample, planar=planar, out=out,
+                    dtype=dtype, scale=scale, region=region
+                )
+
+            out = get_output(out, arr.shape, dtype, arr.dtype)
+            np.copyto(out, arr, casting='unsafe')
+            return out
+
+        if arr is None:
+            arr = self._decode(
+                workers=workers, tables=tables, release=release,
+                as_rgb=as_rgb, upsample=upsample, planar=planar, dtype=dtype,
+                scale=scale, region=region
+            )
+            self._set_cached(key, arr)
+
+        if readonly:
+            return arr
+
+        return arr.copy()
+
+    def _decode(self, workers=None, tables=None, release=False,
+                as_rgb=False, upsample='fancy', planar=False, out=None,
+                dtype=None, scale=1, region=None):
+        """Return the decoded JPEG image data.
+
+        Parameters
+        ----------
+        workers : int, optional
+            The number of processes to use when decoding the restart
+            intervals of sequential DCT Huffman scans.
+        tables : dict, optional
+            A cache of decoding tables to use and update.
+        release : bool, optional
+            If True then release the entropy-coded data of each scan once
+            it's been decoded.
+        as_rgb : bool, optional
+            If True then convert the image data from YCbCr to RGB.
+        upsample : str, optional
+            The method used to upsample subsampled components.
+        planar : bool, optional
+            If True then return the image data as (samples, rows, columns).
+        out : numpy.ndarray or buffer, optional
+            The ndarray or buffer to write the image data to.
+        dtype : numpy.dtype, optional
+            The dtype of the image data.
+        scale : float, optional
+            The scaling factor for the image data.
+        region : tuple of int, optional
+            The (y0, x0, height, width) of the region to decode.
+
+        Returns
+        -------
+        numpy.ndarray
+            The decoded image data.
 
         Raises
         ------
@@ -98,32 +311,63 @@ class JPEG(object):
                 "for which decoding is not supported"
             )
 
-        if self.is_process1:
+        self._parse()
+
+        if self.is_process1 or self.is_process2 or self.is_process4:
             decoder = decode_baseline
-        #elif self.is_process2:
-        #    decoder = decode_extended_8
-        #elif self.is_process4:
-        #    decoder = decode_extended_12
-        #elif self.is_process14:
-        #    decoder = decode_lossless
-        #elif self.is_process14_sv1:
-        #    decoder = decode_lossless
+        elif self.is_progressive or self.is_process3 or self.is_process5:
+            decoder = decode_progressive
+        elif self.is_process14 or self.is_process15:
+            decoder = decode_lossless
 
         try:
-            self._array = decoder(self)
-            self._array_id = id(self._array)
-        except Exception as exc:
-            self._array = None
-            self._array_id = None
-            raise exc
+            return decoder(
+                self, workers=workers, tables=tables, release=release,
+                as_rgb=as_rgb, upsample=upsample, planar=planar, out=out,
+                dtype=dtype, scale=scale, region=region
+            )
+        finally:
+            if release:
+                self._released = True
+
+    def _get_cached(self, key):
+        """Return the cached image data for `key` or None if not cached."""
+        if self._cache is not None and self._cache[0] == key:
+            return self._cache[1]
+
+        if not ARRAY_CACHE.maxsize:
+            return None
+
+        arr = ARRAY_CACHE.get((self._source_key(), key))
+        if arr is not None:
+            self._cache = (key, arr)
+
+        return arr
 
     def get_keys(self, name):
         """Return a list of keys with marker containing `name`."""
-        return [mm for mm in self._keys if name in mm]
+        return self._index.get_keys(name)
+
+    @property
+    def is_parsed(self):
+        """Return True if the JPEG's scan data is available."""
+        return not self._released and 'EOI' in self._index
 
     @property
     def is_arithmetic(self):
-        raise NotImplementedError
+        """Return True if the JPEG uses arithmetic coding, False otherwise.
+
+        Arithmetic coding processes are:
+            3, 5, 7, 9, 11, 13, 15 (non-hierarchical) and 17, 19, 21, 23,
+            25, 27, 29 (hierarchical)
+        """
+        arithmetic_markers = (
+            'SOF9', 'SOF10', 'SOF11', 'SOF13', 'SOF14', 'SOF15'
+        )
+        if [mm for mm in arithmetic_markers if mm in self._index]:
+            return True
+
+        return False
 
     @property
     def is_baseline(self):
@@ -142,7 +386,7 @@ class JPEG(object):
         Hierarchical baseline processes are:
             16, 17, 20, 21, 24, 25.
         """
-        return 'SOF0' in self.markers
+        return 'SOF0' in self._index
 
     @property
     def is_decodable(self):
@@ -151,8 +395,25 @@ class JPEG(object):
         The following processes are decodable:
 
         * Process 1 (Basline DCT)
+        * Process 2 to 5 (Extended sequential DCT, Huffman and arithmetic,
+          8 and 12-bit)
+        * Process 6 to 13 (Progressive DCT, Huffman and arithmetic, 8 and
+          12-bit)
+        * Process 14 and 15 (Lossless, Huffman and arithmetic), all
+          selection values
         """
-        if self.is_process1:
+        if self.is_process1 or self.is_process2 or self.is_process4:
+            return True
+
+        if self.is_process3 or self.is_process5:
+            return True
+
+        progressive_markers = ('SOF2', 'SOF10')
+        if [mm for mm in progressive_markers if mm in self._index]:
+            if self.is_non_hierarchical:
+                return self.precision in (8, 12)
+
+        if self.is_process14 or self.is_process15:
             return True
 
         return False
@@ -175,7 +436,7 @@ class JPEG(object):
             16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27
         """
         extended_markers = ('SOF1', 'SOF9', 'SOF5', 'SOF13')
-        if [mm for mm in extended_markers if mm in self.markers]:
+        if [mm for mm in extended_markers if mm in self._index]:
             return True
 
         return False
@@ -190,11 +451,23 @@ class JPEG(object):
         * Decoders shall process scans with 1, 2, 3 and 4 components
         * Interleaved and non-interleaved scans
         """
-        return 'DHP' in self.markers
+        return 'DHP' in self._index
 
     @property
     def is_huffman(self):
-        raise NotImplementedError
+        """Return True if the JPEG uses Huffman coding, False otherwise.
+
+        Huffman coding processes are:
+            1, 2, 4, 6, 8, 10, 12, 14 (non-hierarchical) and 16, 18, 20, 22,
+            24, 26, 28 (hierarchical)
+        """
+        huffman_markers = (
+            'SOF0', 'SOF1', 'SOF2', 'SOF3', 'SOF5', 'SOF6', 'SOF7'
+        )
+        if [mm for mm in huffman_markers if mm in self._index]:
+            return True
+
+        return False
 
     @property
     def is_lossless(self):
@@ -214,7 +487,7 @@ class JPEG(object):
             28, 29
         """
         lossless_markers = ('SOF3', 'SOF11') #, 'SOF7', 'SOF15')
-        if [mm for mm in lossless_markers if mm in self.markers]:
+        if [mm for mm in lossless_markers if mm in self._index]:
             return True
 
         return False
@@ -234,7 +507,14 @@ class JPEG(object):
 
     @property
     def is_process2(self):
-        """Return True if the JPEG is Process 2, False otherwise."""
+        """Return True if the JPEG is Process 2, False otherwise.
+
+        Process 2 is extended sequential DCT with Huffman coding and
+        8-bit samples.
+        """
+        if 'SOF1' not in self._index:
+            return False
+
         try:
             precision = self.precision
         except ValueError:
@@ -245,9 +525,36 @@ class JPEG(object):
 
         return False
 
+    @property
+    def is_process3(self):
+        """Return True if the JPEG is Process 3, False otherwise.
+
+        Process 3 is extended sequential DCT with arithmetic coding and
+        8-bit samples.
+        """
+        if 'SOF9' not in self._index:
+            return False
+
+        try:
+            precision = self.precision
+        except ValueError:
+            return False
+
+        if self.is_non_hierarchical and precision == 8:
+            return True
+
+        return False
+
     @property
     def is_process4(self):
-        """Return True if the JPEG is Process 4, False otherwise."""
+        """Return True if the JPEG is Process 4, False otherwise.
+
+        Process 4 is extended sequential DCT with Huffman coding and
+        12-bit samples.
+        """
+        if 'SOF1' not in self._index:
+            return False
+
         try:
             precision = self.precision
         except ValueError:
@@ -258,16 +565,36 @@ class JPEG(object):
 
         return False
 
+    @property
+    def is_process5(self):
+        """Return True if the JPEG is Process 5, False otherwise.
+
+        Process 5 is extended sequential DCT with arithmetic coding and
+        12-bit samples.
+        """
+        if 'SOF9' not in self._index:
+            return False
+
+        try:
+            precision = self.precision
+        except ValueError:
+            return False
+
+        if self.is_non_hierarchical and precision == 12:
+            return True
+
+        return False
+
     @property
     def is_process14(self):
         """Return True if the JPEG is Process 14, False otherwise."""
-        if 'SOF3' not in self.markers:
+        if 'SOF3' not in self._index:
             return False
 
         if self.is_non_hierarchical and self.is_lossless:
             return True
 
-        raise False
+        return False
 
     @property
     def is_process14_sv1(self):
@@ -279,7 +606,7 @@ class JPEG(object):
             True if JPEG is process 14, first-order prediction, selection
             value 1, False otherwise.
         """
-        if 'SOF3' not in self.markers:
+        if 'SOF3' not in self._index:
             return False
 
         if self.is_hierarchical or not self.is_lossless:
@@ -290,30 +617,219 @@ class JPEG(object):
 
         return False
 
+    @property
+    def is_process15(self):
+        """Return True if the JPEG is Process 15, False otherwise."""
+        if 'SOF11' not in self._index:
+            return False
+
+        if self.is_non_hierarchical and self.is_lossless:
+            return True
+
+        return False
+
     @property
     def is_progressive(self):
-        raise NotImplementedError
+        """Return True if the JPEG is progressive, False otherwise.
+
+        Progressive processes
+        * DCT-based process
+        * Each component of the source image has 8 or 12-bit samples
+        * Spectral selection, with or without successive approximation
+        * Huffman or arithmetic coding with up to 4 AC and 4 DC tables
+        * Decoders shall process scans with 1, 2, 3 and 4 components
+        * Interleaved and non-interleaved scans
+
+        Non-hierarchical progressive processes are:
+            6, 7, 8, 9, 10, 11, 12, 13
+        Hierarchical progressive processes are:
+            20, 21, 22, 23, 24, 25, 26, 27
+        """
+        progressive_markers = ('SOF2', 'SOF6', 'SOF10', 'SOF14')
+        if [mm for mm in progressive_markers if mm in self._index]:
+            return True
+
+        return False
 
     @property
     def is_sequential(self):
         raise NotImplementedError
 
+    def iter_progressive(self, scans=1, tables=None, as_rgb=False,
+                         upsample='fancy', scale=1):
+        """Yield the decoded image data of a progressive JPEG after each
+        scan.
+
+        For showing a preview of the image while the rest of the JPEG is
+        still being received. The quantised coefficients are kept from one
+        scan to the next, so each scan is only entropy decoded once and
+        yielding an image only costs the inverse transform and colour
+        conversion. To render a partially received JPEG use
+        ``jpgparse(buf, incomplete=True)``, which parses all the complete
+        scans in `buf`. The yielded image data isn't cached.
+
+        Parameters
+        ----------
+        scans : int, optional
+            The number of scans to decode before each image is yielded,
+            default 1. An image is always yielded after the last scan.
+        tables : dict, optional
+            A cache of decoding tables to use and update instead of the
+            process-wide ``cache.TABLE_CACHE``.
+        as_rgb : bool, optional
+            If True then convert the image data from YCbCr to RGB. If False
+            (default) then return the image data in the colour space it was
+            encoded in.
+        upsample : str, optional
+            The method used to upsample subsampled components, one of
+            ``'fancy'`` (default) or ``'nearest'``.
+        scale : float, optional
+            Decode the image data reduced in size by `scale`, one of 1/8,
+            2/8, ..., 1 (default). A `scale` of 1/8 only uses the DC
+            coefficients, which are usually in the first scan.
+
+        Yields
+        ------
+        numpy.ndarray
+            The image data decoded from all the scans so far, with shape
+            (rows, columns) if there's a single component or
+            (rows, columns, samples) otherwise. The last image is the same
+            as the image data from ``decode()``.
+
+        Raises
+        ------
+        NotImplementedError
+            If the JPEG is of an unsupported type or isn't a progressive
+            DCT JPEG.
+        ValueError
+            If `scans` isn't a positive integer, if `as_rgb` is True and
+            the JPEG doesn't have 3 components or if `scale` isn't valid.
+        """
+        if not self.is_decodable:
+            raise NotImplementedError(
+                "Unable to decode the JPEG image data as it's of a type "
+                "for which decoding is not supported"
+            )
+
+        if not self.is_progressive:
+            raise NotImplementedError(
+                "Progressive decoding is only supported for progressive DCT "
+                "JPEGs"
+            )
+
+        self._parse()
+
+        return iter_progressive(
+            self, scans=scans, tables=tables, as_rgb=as_rgb,
+            upsample=upsample, scale=scale
+        )
+
+    def iter_rows(self, band=1, tables=None, as_rgb=False, upsample='fancy',
+                  scale=1):
+        """Yield the decoded JPEG image data in bands of rows.
+
+        For very large images, such as whole slide images, where the
+        decoded image data may not fit in memory. If the JPEG has a single
+        scan containing all the components then each band is yielded as
+        soon as its MCU rows have been decoded and only one MCU row of
+        coefficients and samples either side of the current band is kept,
+        so the peak memory used is bounded by the image width rather than
+        the image size. Otherwise the whole image is decoded first. The
+        yielded image data isn't cached.
+
+        Parameters
+        ----------
+        band : int, optional
+            The number of MCU rows in each band, default 1. An MCU row is
+            8 rows of the image, or 16 if the components are vertically
+            subsampled, multiplied by `scale`.
+        tables : dict, optional
+            A cache of decoding tables to use and update instead of the
+            process-wide ``cache.TABLE_CACHE``.
+        as_rgb : bool, optional
+            If True then convert the image data from YCbCr to RGB. If False
+            (default) then return the image data in the colour space it was
+            encoded in.
+        upsample : str, optional
+            The method used to upsample subsampled components, one of
+            ``'fancy'`` (default) or ``'nearest'``.
+        scale : float, optional
+            Decode the image data reduced in size by `scale`, one of 1/8,
+            2/8, ..., 1 (default).
+
+        Yields
+        ------
+        numpy.ndarray
+            The image data for each band, from the top of the image, with
+            shape (rows, columns) if there's a single component or
+            (rows, columns, samples) otherwise. Concatenating the bands
+            gives the same image data as ``decode()``.
+
+        Raises
+        ------
+        NotImplementedError
+            If the JPEG is of an unsupported type or isn't a Process 1, 2
+            or 4 JPEG.
+        ValueError
+            If `band` isn't a positive integer, if `as_rgb` is True and the
+            JPEG doesn't have 3 components or if `scale` isn't valid.
+        """
+        if not self.is_decodable:
+            raise NotImplementedError(
+                "Unable to decode the JPEG image data as it's of a type "
+                "for which decoding is not supported"
+            )
+
+        if not (self.is_process1 or self.is_process2 or self.is_process4):
+            raise NotImplementedError(
+                "Decoding in bands is only supported for Process 1, 2 and 4 "
+                "JPEGs"
+            )
+
+        self._parse()
+
+        return iter_baseline(
+            self, band=band, tables=tables, as_rgb=as_rgb, upsample=upsample,
+            scale=scale
+        )
+
+    def _parse(self):
+        """Parse the entire JPEG if it's not already been parsed.
+
+        Raises
+        ------
+        ValueError
+            If the JPEG needs to be parsed and there's no parser.
+        """
+        if self.is_parsed:
+            return
+
+        if self._parser is None:
+            raise ValueError(
+                "Unable to decode the JPEG image data as its entropy-coded "
+                "data has been released or was never parsed"
+            )
+
+        self.info = self._parser()
+        self._index = MarkerIndex(self.info)
+        self._released = False
+
     @property
     def _keys(self):
         """Return a list of the info keys, ordered by offset."""
-        return sorted(self.info.keys(), key=lambda x: int(x.split('@')[1]))
+        return list(self._index.keys)
 
     @property
     def markers(self):
         """Return a list of the found JPEG markers, ordered by offset."""
-        return [mm.split('@')[0] for mm in self._keys]
+        return list(self._index.markers)
 
     @property
     def precision(self):
         """Return the precision of the sample as an int."""
-        keys = self.get_keys('SOF')
-        if keys:
-            return self.info[keys[0]][2]['P']
+        frame = self._index.frame
+        if frame:
+            return frame['P']
 
         raise ValueError(
             "Unable to get the sample precision of the image as no SOFn "
@@ -323,9 +839,9 @@ class JPEG(object):
     @property
     def rows(self):
         """Return the number of rows in the image as an int."""
-        keys = self.get_keys('SOF')
-        if keys:
-            return self.info[keys[0]][2]['Y']
+        frame = self._index.frame
+        if frame:
+            return frame['Y']
 
         raise ValueError(
             "Unable to get the number of rows in the image as no SOFn "
@@ -335,15 +851,48 @@ class JPEG(object):
     @property
     def samples(self):
         """Return the number of components in the JPEG as an int."""
-        keys = self.get_keys('SOF')
-        if keys:
-            return self.info[keys[0]][2]['Nf']
+        frame = self._index.frame
+        if frame:
+            return frame['Nf']
 
         raise ValueError(
             "Unable to get the number of components in the image as no SOFn "
             "marker was found"
         )
 
+    def _set_cached(self, key, arr):
+        """Cache the decoded image data `arr` as `key`."""
+        # Callers get a copy unless they ask for the read-only original
+        arr.flags.writeable = False
+        self._cache = (key, arr)
+        if not ARRAY_CACHE.maxsize:
+            return
+
+        cache_key = (self._source_key(), key)
+        ARRAY_CACHE.put(cache_key, arr)
+        self._cache_keys.add(cache_key)
+
+    def _source_key(self):
+        """Return a key identifying the source of the JPEG.
+
+        Returns
+        -------
+        tuple
+            For files the absolute path, size and modification time of the
+            file, otherwise a hash of the encoded JPEG data.
+        """
+        if self._source is None:
+            fp = self._fp
+            if isinstance(getattr(fp, 'name', None), str):
+                stat = os.stat(fp.name)
+                self._source = (
+                    os.path.abspath(fp.name), stat.st_size, stat.st_mtime_ns
+                )
+            else:
+                self._source = (blake2b(fp).digest(), )
+
+        return self._source
+
     @property
     def selection_value(self):
         """Return the JPEG lossless selection value.
@@ -366,13 +915,16 @@ class JPEG(object):
                 "Selection value is only available for lossless JPEG"
             )
 
-        sos_markers = [mm for mm in self._keys if 'SOS' in mm]
+        sos_markers = self.get_keys('SOS')
         return self.info[sos_markers[0]][2]['Ss']
 
     @property
     def to_array(self):
         """Return the JPEG image data as a numpy ndarray.
 
+        Equivalent to ``decode()`` with the default parameters, so a
+        writable copy of the cached image data is returned.
+
         Returns
         -------
         numpy.ndarray
@@ -383,12 +935,7 @@ class JPEG(object):
         NotImplementedError
             If the JPEG is of an unsupported type.
         """
-        if self._array and id(self._array) == self._array_id:
-            return self._array
-
-        self._decode()
-
-        return self._array
+        return self.decode()
 
     @property
     def to_bytes(self):
@@ -445,8 +992,19 @@ class JPEG2000(object):
         self.info = info
 
 
-def get_jpeg(fp, info):
-    """Return a class representing the JPEG file."""
+def get_jpeg(fp, info, parser=None):
+    """Return a class representing the JPEG file.
+
+    Parameters
+    ----------
+    fp : file-like
+        The file-like that contains the JPEG image.
+    info : dict
+        The parsed JPEG image.
+    parser : callable, optional
+        The function used to parse the entire JPEG, see ``JPEG``. Only used
+        for 10918 JPEGs.
+    """
     markers = [key.split('@')[0] for key in info]
     is_10918 = set(JPEG_10918).intersection(markers)
     is_14495 = set(JPEG_14495).intersection(markers)
@@ -461,7 +1019,7 @@ def get_jpeg(fp, info):
             "supported protocols"
         )
     elif is_10918:
-        return JPEG(fp, info)
+        return JPEG(fp, info, parser)
     elif is_14495:
         return JPEGLS(fp, info)
     elif is_15444:
@@ -28,3 +28,108 @@ class MarkerSegment(object):
     def offset(self):
         """Return the byte offset of the start of the marker segment."""
         return self._offset
+
+
+class MarkerIndex(object):
+    """An index of the marker segments in a parsed JPEG.
+
+    The index is built once from the parsed JPEG and then allows looking up
+    markers by name without having to sort or search the keys of the parsed
+    JPEG each time.
+    """
+    def __init__(self, info):
+        """Initialise a new index.
+
+        Parameters
+        ----------
+        info : dict
+            The parsed JPEG image, with keys as 'NAME@offset' and values as
+            (marker, fill bytes, info).
+        """
+        # The keys and corresponding (name, offset), ordered by offset
+        split = [(key, key.split('@')) for key in info]
+        split = sorted(split, key=lambda x: int(x[1][1]))
+
+        self._keys = []
+        self._markers = []
+        self._segments = []
+        # Marker name -> keys and offsets, ordered by offset
+        self._names = {}
+        self._offsets = {}
+        for key, (name, offset) in split:
+            offset = int(offset)
+            self._keys.append(key)
+            self._markers.append(name)
+            self._segments.append(MarkerSegment(info[key][0], offset))
+            self._names.setdefault(name, []).append(key)
+            self._offsets.setdefault(name, []).append(offset)
+
+        # Results of get_keys(), name -> keys
+        self._queries = {}
+
+        # The first frame header
+        self._frame = None
+        frame_keys = self.get_keys('SOF')
+        if frame_keys:
+            self._frame = info[frame_keys[0]][2]
+
+    def __contains__(self, name):
+        """Return True if a marker called `name` is in the index."""
+        return name in self._names
+
+    def __len__(self):
+        """Return the number of markers in the index."""
+        return len(self._keys)
+
+    @property
+    def frame(self):
+        """Return the info for the first SOFn frame header as dict or None."""
+        return self._frame
+
+    def get_keys(self, name):
+        """Return a list of keys with marker containing `name`.
+
+        Parameters
+        ----------
+        name : str
+            The (partial) marker name to match, such as 'SOF' or 'SOF0'.
+
+        Returns
+        -------
+        list of str
+            The matching 'NAME@offset' keys, ordered by offset.
+        """
+        try:
+            return list(self._queries[name])
+        except KeyError:
+            pass
+
+        names = [nn for nn in self._names if name in nn]
+        if len(names) == 1:
+            keys = self._names[names[0]]
+        else:
+            keys = [kk for kk, nn in zip(self._keys, self._markers)
+                    if nn in names]
+
+        self._queries[name] = keys
+
+        return list(keys)
+
+    @property
+    def keys(self):
+        """Return a list of the 'NAME@offset' keys, ordered by offset."""
+        return self._keys
+
+    @property
+    def markers(self):
+        """Return a list of the marker names, ordered by offset."""
+        return self._markers
+
+    def offsets(self, name):
+        """Return a list of the offsets of the markers called `name`."""
+        return list(self._offsets.get(name, []))
+
+    @property
+    def segments(self):
+        """Return a list of MarkerSegment, ordered by offset."""
+        return self._segments
@@ -20,18 +20,36 @@ Scan
 
 ECS
 <MCU1>, <MCU_2>, ..., <MCU_R>
-"""
-
-from struct import unpack
-
 
+Each reader takes the bytes-like `data` of a single marker segment, starting
+at the segment's length parameter (the first byte after the marker) and
+returns the segment's parameters as a dict.
+"""
 
-def _split_byte(bs):
-    """Split the 8-bit byte `bs` into two 4-bit integers."""
+from struct import Struct
+
+
+# Precompiled unpackers for the fixed length parameters of marker segments
+_UNPACK_UINT16 = Struct('>H').unpack_from
+_UNPACK_UINT16_PAIR = Struct('>HH').unpack_from
+_UNPACK_COC = Struct('>6B').unpack_from
+_UNPACK_COD = Struct('>HBBHB5B').unpack_from
+_UNPACK_DQT_8 = Struct('>64B').unpack_from
+_UNPACK_DQT_16 = Struct('>64H').unpack_from
+_UNPACK_LSE = Struct('>HB').unpack_from
+_UNPACK_LSE_PRESET = Struct('>5H').unpack_from
+_UNPACK_QCD = Struct('>HB').unpack_from
+_UNPACK_SIZ = Struct('>HHLLLLLLLLH').unpack_from
+_UNPACK_SOF = Struct('>HBHHB').unpack_from
+_UNPACK_SOS = Struct('>HB').unpack_from
+_UNPACK_SOT = Struct('>HHLBB').unpack_from
+
+def _split_byte(byte):
+    """Split the 8-bit int `byte` into two 4-bit integers."""
     mask_msb = 0b11110000
     mask_lsb = 0b00001111
 
-    return (mask_msb & bs[0]) >> 4, mask_lsb & bs[0]
+    return (mask_msb & byte) >> 4, mask_lsb & byte
 
 
 def _get_bit(byte, ii):
@@ -42,44 +60,45 @@ def _get_bit(byte, ii):
     return (byte >> (7 - ii)) & 1
 
 
-def APP(fp):
+def APP(data):
     """Parse an APP_n maker segment.
 
     APP_n - Application data marker
     Lp - Application data segment length
     Ap - Application data
     """
-    length = unpack('>H', fp.read(2))[0]
+    length = _UNPACK_UINT16(data)[0]
 
     info = {
         'Lp' : length,
-        'Ap' : fp.read(length - 2)
+        'Ap' : bytes(data[2:length])
     }
 
     return info
 
 
-def COC(fp, csiz):
+def COC(data, csiz):
     """Parse a COC marker segment."""
-    lcoc = unpack('>H', fp.read(2))[0]
-    print('Csiz', csiz)
+    lcoc = _UNPACK_UINT16(data)[0]
     if csiz < 257:
-        ccoc = unpack('B', fp.read(1))[0]
+        ccoc = data[2]
+        offset = 3
     else:
-        ccoc = unpack('>H', fp.read(2))[0]
-    scoc = unpack('B', fp.read(1))[0]
+        ccoc = _UNPACK_UINT16(data, 2)[0]
+        offset = 4
 
-    _decomp_levels = unpack('B', fp.read(1))[0]
-    _block_width = unpack('B', fp.read(1))[0]
-    _block_height = unpack('B', fp.read(1))[0]
-    _block_style = unpack('B', fp.read(1))[0]
-    _transform = unpack('B', fp.read(1))[0]
+    (scoc,
+     _decomp_levels,
+     _block_width,
+     _block_height,
+     _block_style,
+     _transform) = _UNPACK_COC(data, offset)
+    offset += 6
 
     _precincts = []
     has_precincts = _get_bit(scoc, 7)
     if has_precincts == 1:
-        for ii in range(_decomp_levels + 1):
-            _precincts.append(unpack('B', fp.read(1))[0])
+        _precincts = list(data[offset:offset + _decomp_levels + 1])
 
     info = {
         'Lcoc' : lcoc,
@@ -100,28 +119,29 @@ def COC(fp, csiz):
     return info
 
 
-def COD(fp):
+def COD(data):
     """Parse a COD marker segment."""
-    lcod = unpack('>H', fp.read(2))[0]
-    scod = unpack('B', fp.read(1))[0]
+    (lcod,
+     scod,
+     _progression_order,
+     _nr_layers,
+     _mc_transform,
+     # SPcod
+     _decomp_levels,
+     _block_width,
+     _block_height,
+     _block_style,
+     _transform) = _UNPACK_COD(data)
     sgcod = {
-        'progression_order' : unpack('B', fp.read(1))[0],
-        'nr_layers' : unpack('>H', fp.read(2))[0],
-        'mc_transform' : unpack('B', fp.read(1))[0],
+        'progression_order' : _progression_order,
+        'nr_layers' : _nr_layers,
+        'mc_transform' : _mc_transform,
     }
 
-    # SPcod
-    _decomp_levels = unpack('B', fp.read(1))[0]
-    _block_width = unpack('B', fp.read(1))[0]
-    _block_height = unpack('B', fp.read(1))[0]
-    _block_style = unpack('B', fp.read(1))[0]
-    _transform = unpack('B', fp.read(1))[0]
-
     _precincts = []
     has_precincts = _get_bit(scod, 7)
     if has_precincts == 1:
-        for ii in range(_decomp_levels + 1):
-            _precincts.append(unpack('B', fp.read(1))[0])
+        _precincts = list(data[12:12 + _decomp_levels + 1])
 
     info = {
         'Lcod' : lcod,
@@ -142,40 +162,37 @@ def COD(fp):
     return info
 
 
-def COM(fp):
+def COM(data):
     """Parse a COM marker segment.
 
     COM - Comment marker
     Lc - Comment segment length
     Cm - Comment bytes.
     """
-    length = unpack('>H', fp.read(2))[0]
-    comment = unpack('{}s'.format(length - 2), fp.read(length - 2))[0]
+    length = _UNPACK_UINT16(data)[0]
 
     info = {
         'Lc' : length,
-        'Cm' : comment
+        'Cm' : bytes(data[2:length])
     }
 
     return info
 
 
-def COM_JP2(fp):
+def COM_JP2(data):
     """Parse a JP2K COM marker segment"""
-    lcom = unpack('>H', fp.read(2))[0]
-    rcom = unpack('>H', fp.read(2))[0]
-    ccom = unpack('{}s'.format(lcom - 4), fp.read(lcom - 4))[0]
+    lcom, rcom = _UNPACK_UINT16_PAIR(data)
 
     info = {
         'Lcom' : lcom,
         'Rcom' : rcom,
-        'Ccom' : ccom,
+        'Ccom' : bytes(data[4:lcom]),
     }
 
     return info
 
 
-def DAC(fp):
+def DAC(data):
     """Parse a DAC marker segment.
 
     DAC - Define arithmetic coding conditioning marker
@@ -184,14 +201,12 @@ def DAC(fp):
     Tb - Arithmetic coding conditioning table destination identifier
     Cs - Conditioning table value
     """
-    length = unpack('>H', fp.read(2))[0]
-    _remaining = length - 2
+    length = _UNPACK_UINT16(data)[0]
 
     _tc, _tb, _cs = [], [], []
-    while _remaining:
-        tc, tb = _split_byte(fp.read(1))
-        _cs.append(unpack('>B', fp.read(1))[0])
-        _remaining -= 2
+    for offset in range(2, length, 2):
+        tc, tb = _split_byte(data[offset])
+        _cs.append(data[offset + 1])
         _tc.append(tc)
         _tb.append(tb)
 
@@ -205,7 +220,7 @@ def DAC(fp):
     return info
 
 
-def DHT(fp):
+def DHT(data):
     """Parse a DHT marker segment.
 
     DHT - Define Huffman table marker
@@ -217,28 +232,27 @@ def DHT(fp):
     Vij - Value associated with each Huffman code of length i, equivalent to
           HUFFVAL
     """
-    length = unpack('>H', fp.read(2))[0]
-    _remaining = length - 2
+    length = _UNPACK_UINT16(data)[0]
+    offset = 2
 
     _tc, _th = [], []
     _li = []
     _vij = []
-    while _remaining > 0:
-        tc, th = _split_byte(fp.read(1))
+    while offset < length:
+        tc, th = _split_byte(data[offset])
         _tc.append(tc)
         _th.append(th)
-        _remaining -= 1
 
         # li (BITS) is the number of codes for each code length, from 1 to 16
-        li = unpack('>16B', fp.read(16))
-        _remaining -= 16
+        li = tuple(data[offset + 1:offset + 17])
+        offset += 17
         # vij is a list of the 8-bit symbols values (HUFFVAL), each of which
         #   is assigned a Huffman code.
         vij = []
         for nr in li:
             if nr:
-                vij.append(unpack('>{}B'.format(nr), fp.read(nr)))
-                _remaining -= nr
+                vij.append(tuple(data[offset:offset + nr]))
+                offset += nr
             else:
                 vij.append(None)
 
@@ -256,15 +270,14 @@ def DHT(fp):
     return info
 
 
-def DNL(fp):
+def DNL(data):
     """Parse a DNL marker segment.
 
     DNL - Define number of line marker
     Ld - Define number of lines segment length
     NL - Number of lines in the frame
     """
-    length = unpack('>H', fp.read(2))[0]
-    _nl = unpack('>H', fp.read(2))[0]
+    length, _nl = _UNPACK_UINT16_PAIR(data)
 
     info = {
         'Ld' : length,
@@ -274,7 +287,7 @@ def DNL(fp):
     return info
 
 
-def DQT(fp):
+def DQT(data):
     """Parse DQT marker segment.
 
     DQT - Define quantization table marker
@@ -284,25 +297,24 @@ def DQT(fp):
     Qk - Quantization table element
     """
     # length is 2 + sum(t=1, N) of (65 + 64 * Pq(t))
-    length = unpack('>H', fp.read(2))[0]
-    _remaining = length - 2
+    length = _UNPACK_UINT16(data)[0]
+    offset = 2
 
     _pq, _tq, _qk = [], [], []
-    while _remaining > 0:
-        precision, table_id = _split_byte(fp.read(1))
-        _remaining -= 1
+    while offset < length:
+        precision, table_id = _split_byte(data[offset])
+        offset += 1
         _pq.append(precision)
         _tq.append(table_id)
 
         # If Pq is 0, Qk is 8-bit, if Pq is 1, Qk is 16-bit
         Q_k = []
-        for ii in range(64):
-            if precision == 0:
-                Q_k.append(unpack('>B', fp.read(1))[0])
-                _remaining -= 1
-            elif precision == 1:
-                Q_k.append(unpack('>H', fp.read(2))[0])
-                _remaining -= 2
+        if precision == 0:
+            Q_k = list(_UNPACK_DQT_8(data, offset))
+            offset += 64
+        elif precision == 1:
+            Q_k = list(_UNPACK_DQT_16(data, offset))
+            offset += 128
 
         _qk.append(Q_k)
 
@@ -316,22 +328,24 @@ def DQT(fp):
     return info
 
 
-def DRI(fp):
+def DRI(data):
     """Parse a DRI marker segment.
 
     DRI - Define restart interval marker
     Lr - Define restart interval segment length
     Ri - Restart interval (number of MCU in the restart interval)
     """
+    length, _ri = _UNPACK_UINT16_PAIR(data)
+
     info = {
-        'Lr' : unpack('>H', fp.read(2))[0],
-        'Ri' : unpack('>H', fp.read(2))[0]
+        'Lr' : length,
+        'Ri' : _ri
     }
 
     return info
 
 
-def EXP(fp):
+def EXP(data):
     """Parse an EXP marker segment.
 
     EXP - Expand reference components marker
@@ -339,8 +353,8 @@ def EXP(fp):
     Eh - Expand horizontally
     Ev - Expand vertically
     """
-    length = unpack('>H', fp.read(2))[0]
-    _eh, _ev = _split_byte(unpack('>B', fp.read(1))[0])
+    length = _UNPACK_UINT16(data)[0]
+    _eh, _ev = _split_byte(data[2])
 
     info = {
         'Le' : length,
@@ -351,7 +365,7 @@ def EXP(fp):
     return info
 
 
-def LSE(fp, jpg_info):
+def LSE(data, jpg_info):
     """Parse an LSE marker segment (JPEG-LS).
 
     LSE - JPEG-LS preset parameters marker
@@ -379,9 +393,7 @@ def LSE(fp, jpg_info):
             Ye - number of lines in the image
             Xe - number of columns in the image
     """
-    length = unpack('>H', fp.read(2))[0]
-    _id = unpack('B', fp.read(1))[0]
-
+    length, _id = _UNPACK_LSE(data)
 
     info = {
         'Ll' : length,
@@ -389,22 +401,24 @@ def LSE(fp, jpg_info):
     }
 
     if _id == 1:
-        info['MAXVAL'] = unpack('>H', fp.read(2))[0]
-        info['T1'] = unpack('>H', fp.read(2))[0]
-        info['T2'] = unpack('>H', fp.read(2))[0]
-        info['T3'] = unpack('>H', fp.read(2))[0]
-        info['RESET'] = unpack('>H', fp.read(2))[0]
+        (info['MAXVAL'],
+         info['T1'],
+         info['T2'],
+         info['T3'],
+         info['RESET']) = _UNPACK_LSE_PRESET(data, 3)
     elif _id == 2:
-        info['TID'] = unpack('>H', fp.read(1))[0]
-        info['Wt'] = unpack('>H', fp.read(1))[0]
+        info['TID'] = data[3]
+        info['Wt'] = data[4]
         info['TABLE'] = []
 
         if (5 + info['Wt'] * (info['MAXVAL'] + 1)) < 65535:
             MAXTAB = info['MAXVAL']
         else:
             MAXTAB = abs(65530 / info['Wt']) - 1
+        offset = 5
         for ii in range(MAXTAB):
-            info['TABLE'].append(fp.read(info['Wt']))
+            info['TABLE'].append(bytes(data[offset:offset + info['Wt']]))
+            offset += info['Wt']
     elif _id == 3:
         # Find most recent LSE entry prior to this one
         lse_keys = [kk for kk in jpg_info.keys() if kk.split('@')[0] == 'LSE']
@@ -421,31 +435,34 @@ def LSE(fp, jpg_info):
         info['TID'] = jpg_info[most_recent]['TID']
         info['Wt'] = jpg_info[most_recent]['TID']
         info['TABLE'] = []
+        offset = 3
         for ii in range(MAXTABX):
-            info['TABLE'].append(fp.read(info['Wt']))
+            info['TABLE'].append(bytes(data[offset:offset + info['Wt']]))
+            offset += info['Wt']
     elif _id == 4:
-        info['Wxy'] = unpack('>H', fp.read(1))[0]
-        info['Ye'] = fp.read(info['Wxy'])
-        info['Xe'] = fp.read(info['Wxy'])
-        pass
+        info['Wxy'] = data[3]
+        info['Ye'] = bytes(data[4:4 + info['Wxy']])
+        info['Xe'] = bytes(data[4 + info['Wxy']:4 + 2 * info['Wxy']])
     else:
         raise ValueError(
-            'An LSE ID parameter value of {} is not valid'.format(ID)
+            'An LSE ID parameter value of {} is not valid'.format(_id)
         )
 
     return info
 
 
 # FIXME
-def QCC(fp, csiz):
+def QCC(data, csiz):
     """Parse a QCC marker segment"""
-    lqcc = unpack('>H', fp.read(2))[0]
+    lqcc = _UNPACK_UINT16(data)[0]
     if csiz < 257:
-        cqcc = unpack('B', fp.read(1))[0]
+        cqcc = data[2]
+        offset = 3
     else:
-        cqcc = unpack('>H', fp.read(2))[0]
+        cqcc = _UNPACK_UINT16(data, 2)[0]
+        offset = 4
 
-    sqcc = unpack('B', fp.read(1))[0]
+    sqcc = data[offset]
 
     _spqcc = []
 
@@ -456,30 +473,29 @@ def QCC(fp, csiz):
     return info
 
 
-def QCD(fp):
+def QCD(data):
     """Parse a QCD marker segment.
 
 
     """
-    lqcd = unpack('>H', fp.read(2))[0]
-    sqcd = unpack('B', fp.read(1))[0]
+    lqcd, sqcd = _UNPACK_QCD(data)
 
     _spqcd = []
-    _remaining = lqcd - 3
+    offset = 3
     bitstring = '{:>08b}'.format(sqcd)
-    while _remaining > 0:
+    while offset < lqcd:
         if bitstring[3:] == '00000':
             # xxx0 0000: no quantisation
-            _spqcd.append(unpack('B', fp.read(1))[0])
-            _remaining -= 1
+            _spqcd.append(data[offset])
+            offset += 1
         elif bitstring[3:] == '00001':
             # xxx0 0001: scalar derived
-            _spqcd.append(unpack('>H', fp.read(2))[0])
-            _remaining -= 2
+            _spqcd.append(_UNPACK_UINT16(data, offset)[0])
+            offset += 2
         elif bitstring[3:] == '00010':
             # xxx0 0010: scalar expounded
-            _spqcd.append(unpack('>H', fp.read(2))[0])
-            _remaining -= 2
+            _spqcd.append(_UNPACK_UINT16(data, offset)[0])
+            offset += 2
         else:
             raise NotImplementedError('QCD invalid value')
 
@@ -494,7 +510,7 @@ def QCD(fp):
     return info
 
 
-def SIZ(fp):
+def SIZ(data):
     """Parse a SIZ marker segment
 
     SIZ - Image and tile size marker
@@ -514,34 +530,35 @@ def SIZ(fp):
     YRsiz - vertical separation of a sample of ith component
 
     """
+    (lsiz, rsiz,
+     xsiz, ysiz, xosiz, yosiz,
+     xtsiz, ytsiz, xtosiz, ytosiz,
+     csiz) = _UNPACK_SIZ(data)
+
     info = {
-        'Lsiz' : unpack('>H', fp.read(2))[0],
-        'Rsiz' : unpack('>H', fp.read(2))[0],
-        'Xsiz' : unpack('>L', fp.read(4))[0],
-        'Ysiz' : unpack('>L', fp.read(4))[0],
-        'XOsiz' : unpack('>L', fp.read(4))[0],
-        'YOsiz' : unpack('>L', fp.read(4))[0],
-        'XTsiz' : unpack('>L', fp.read(4))[0],
-        'YTsiz' : unpack('>L', fp.read(4))[0],
-        'XTOsiz' : unpack('>L', fp.read(4))[0],
-        'YTOsiz' : unpack('>L', fp.read(4))[0],
-        'Csiz' : unpack('>H', fp.read(2))[0],
+        'Lsiz' : lsiz,
+        'Rsiz' : rsiz,
+        'Xsiz' : xsiz,
+        'Ysiz' : ysiz,
+        'XOsiz' : xosiz,
+        'YOsiz' : yosiz,
+        'XTsiz' : xtsiz,
+        'YTsiz' : ytsiz,
+        'XTOsiz' : xtosiz,
+        'YTOsiz' : ytosiz,
+        'Csiz' : csiz,
     }
 
-    _ssiz, _xrsiz, _yrsiz = [], [], []
-    for ii in range(info['Csiz']):
-        _ssiz.append(unpack('B', fp.read(1))[0])
-        _xrsiz.append(unpack('B', fp.read(1))[0])
-        _yrsiz.append(unpack('B', fp.read(1))[0])
-
-    info['Ssiz'] = _ssiz
-    info['XRsiz'] = _xrsiz
-    info['YRsiz'] = _yrsiz
+    # Ssiz, XRsiz and YRsiz for each component
+    params = data[38:38 + 3 * csiz]
+    info['Ssiz'] = list(params[0::3])
+    info['XRsiz'] = list(params[1::3])
+    info['YRsiz'] = list(params[2::3])
 
     return info
 
 
-def SOD(fp):
+def SOD(data):
     """Parse an SOD marker segment.
 
     SOD - Start of data segment 0xFF 0x93
@@ -554,7 +571,7 @@ def SOD(fp):
     return info
 
 
-def SOF(fp):
+def SOF(data):
     """Read a SOF_NN 'Start of frame' header.
 
     +-----------+------+----------------------------------------------+
@@ -598,20 +615,14 @@ def SOF(fp):
      precision,
      nr_lines,
      samples_per_line,
-     nr_components) = unpack('>HBHHB', fp.read(8))
-
-    component_id = []
-    horizontal_sampling_factor = []
-    vertical_sampling_factor = []
-    quantisation_selector = []
-    for ii in range(nr_components):
-        _ci = unpack('>B', fp.read(1))[0]
-        component_id.append(_ci)
-        _hor, _vert = _split_byte(fp.read(1))
-        horizontal_sampling_factor.append(_hor)
-        vertical_sampling_factor.append(_vert)
-        _tqi = unpack('>B', fp.read(1))[0]
-        quantisation_selector.append(_tqi)
+     nr_components) = _UNPACK_SOF(data)
+
+    # Ci, Hi and Vi, Tqi for each component
+    params = data[8:8 + 3 * nr_components]
+    component_id = list(params[0::3])
+    horizontal_sampling_factor = [hv >> 4 for hv in params[1::3]]
+    vertical_sampling_factor = [hv & 0x0F for hv in params[1::3]]
+    quantisation_selector = list(params[2::3])
 
     info = {
         'Lf' : length,
@@ -628,10 +639,9 @@ def SOF(fp):
     return info
 
 
-def SOP(fp):
+def SOP(data):
     """Parse a SOP marker segment"""
-    lsop = unpack('>H', fp.read(2))[0]
-    nsop = unpack('>H', fp.read(2))[0]
+    lsop, nsop = _UNPACK_UINT16_PAIR(data)
 
     info = {
         'Lsop' : lsop,
@@ -641,7 +651,7 @@ def SOP(fp):
     return info
 
 
-def SOS(fp, jpg='JPEG'):
+def SOS(data, jpg='JPEG'):
     """Read a SOS 'Start of scan' header.
 
     +-----------+------+----------------------------------------------+
@@ -686,22 +696,21 @@ def SOS(fp, jpg='JPEG'):
          Shall be set to 0 for sequential DCT. In lossless mode specifies
          the point transform Pt.
     """
-    (length, nr_components) = unpack('>HB', fp.read(3))
-
-    csj, tdj, taj, tmj = [], [], [], []
-    for ii in range(nr_components):
-        _cs = unpack('>B', fp.read(1))[0]
-        csj.append(_cs)
-        if jpg == 'JPEG':
-            _td, _ta = _split_byte(fp.read(1))
-            tdj.append(_td)
-            taj.append(_ta)
-        elif jpg == 'JPEG-LS':
-            tmj.append(unpack('>B', fp.read(1))[0])
+    (length, nr_components) = _UNPACK_SOS(data)
 
+    # Csj and Tdj, Taj (or Tmj) for each component
+    offset = 3 + 2 * nr_components
+    params = data[3:offset]
+    csj = list(params[0::2])
+    tdj, taj, tmj = [], [], []
+    if jpg == 'JPEG':
+        tdj = [tables >> 4 for tables in params[1::2]]
+        taj = [tables & 0x0F for tables in params[1::2]]
+    elif jpg == 'JPEG-LS':
+        tmj = list(params[1::2])
 
-    (ss, se) = unpack('>BB', fp.read(2))
-    ah, al = _split_byte(fp.read(1))
+    (ss, se, _approx) = data[offset:offset + 3]
+    ah, al = _split_byte(_approx)
 
     if jpg == 'JPEG':
         return {
@@ -728,7 +737,7 @@ def SOS(fp, jpg='JPEG'):
         }
 
 
-def SOT(fp):
+def SOT(data):
     """Parse an SOT marker segment.
 
     SOT - Start of tile-part segment
@@ -739,17 +748,19 @@ def SOT(fp):
     TPsot - Tile part index
     TNsot - number of tile-parts of a tile in the codestream
     """
+    (lsot, isot, psot, tpsot, tnsot) = _UNPACK_SOT(data)
+
     info = {
-        'Lsot' : unpack('>H', fp.read(2))[0],
-        'Isot' : unpack('>H', fp.read(2))[0],
-        'Psot' : unpack('>L', fp.read(4))[0],
-        'TPsot' : unpack('B', fp.read(1))[0],
-        'TNsot' : unpack('B', fp.read(1))[0]
+        'Lsot' : lsot,
+        'Isot' : isot,
+        'Psot' : psot,
+        'TPsot' : tpsot,
+        'TNsot' : tnsot
     }
 
     return info
 
 
-def skip(fp):
-    length = unpack('>H', fp.read(2))[0]
-    fp.seek(length - 2, 1)
+def skip(data):
+    """Skip a marker segment."""
+    pass
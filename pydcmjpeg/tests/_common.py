@@ -16,9 +16,15 @@ DATA_DIR = os.path.abspath(
 
 DPROCESS01 = os.path.join(DATA_DIR, '10918', 'process_01')
 DPROCESS02 = os.path.join(DATA_DIR, '10918', 'process_02')
+DPROCESS03 = os.path.join(DATA_DIR, '10918', 'process_03')
 DPROCESS04 = os.path.join(DATA_DIR, '10918', 'process_04')
+DPROCESS05 = os.path.join(DATA_DIR, '10918', 'process_05')
+DPROCESS10 = os.path.join(DATA_DIR, '10918', 'process_10')
+DPROCESS11 = os.path.join(DATA_DIR, '10918', 'process_11')
+DPROCESS13 = os.path.join(DATA_DIR, '10918', 'process_13')
 DPROCESS14 = os.path.join(DATA_DIR, '10918', 'process_14')
 DPROCESS14SV1 = os.path.join(DATA_DIR, '10918', 'process_14_sv1')
+DPROCESS15 = os.path.join(DATA_DIR, '10918', 'process_15')
 
 REFERENCE_DATA = {
     'p1' : [
@@ -59,6 +65,8 @@ REFERENCE_DATA = {
             (100, 100, 3, 8)
         ),
         (os.path.join(DPROCESS01, 'SC_rgb_small_odd_jpeg.jpg'), (3, 3, 3, 8)),
+        (os.path.join(DPROCESS01, 'grey_odd_pillow.jpg'), (37, 53, 1, 8)),
+        (os.path.join(DPROCESS01, 'SC_rgb_pillow.jpg'), (100, 100, 3, 8)),
     ],
     'p2' : [
         (os.path.join(CPROCESS02, 'C1.JPG'), (257, 255, 4, 8)),
@@ -67,7 +75,21 @@ REFERENCE_DATA = {
         (os.path.join(DPROCESS02, 'rgb_8_422.jpg'), (5, 4, 3, 8)),
         (os.path.join(DPROCESS02, 'rgb_8_444.jpg'), (5, 4, 3, 8)),
     ],
-    'p3' : None,
+    'p3' : [
+        (os.path.join(DPROCESS03, 'color3d_arith_422.jpg'), (480, 640, 3, 8)),
+        (
+            os.path.join(DPROCESS03, 'grey_odd_pillow_arith_dac.jpg'),
+            (37, 53, 1, 8)
+        ),
+        (
+            os.path.join(DPROCESS03, 'SC_rgb_pillow_arith.jpg'),
+            (100, 100, 3, 8)
+        ),
+        (
+            os.path.join(DPROCESS03, 'SC_rgb_pillow_arith_rst.jpg'),
+            (100, 100, 3, 8)
+        ),
+    ],
     'p4' : [
         (os.path.join(CPROCESS04, 'E1.JPG'), (257, 255, 4, 12)),
         (os.path.join(CPROCESS04, 'E2.JPG'), (257, 255, 4, 12)),
@@ -76,26 +98,89 @@ REFERENCE_DATA = {
         (os.path.join(DPROCESS04, 'rgb_12_422.jpg'), (5, 4, 3, 12)),
         (os.path.join(DPROCESS04, 'rgb_12_444.jpg'), (5, 4, 3, 12)),
     ],
-    'p5' : None,
+    'p5' : [
+        (os.path.join(DPROCESS05, 'grey_12_arith.jpg'), (5, 4, 1, 12)),
+        (os.path.join(DPROCESS05, 'rgb_12_422_arith.jpg'), (5, 4, 3, 12)),
+    ],
     'p6' : None,
     'p7' : None,
     'p8' : None,
     'p9' : None,
-    'p10' : None,
-    'p11' : None,
+    'p10' : [
+        (
+            os.path.join(DPROCESS10, 'color3d_pillow_progressive_422.jpg'),
+            (480, 640, 3, 8)
+        ),
+        (
+            os.path.join(DPROCESS10, 'grey_odd_pillow_progressive.jpg'),
+            (37, 53, 1, 8)
+        ),
+        (
+            os.path.join(DPROCESS10, 'SC_rgb_pillow_progressive.jpg'),
+            (100, 100, 3, 8)
+        ),
+        (
+            os.path.join(DPROCESS10, 'SC_rgb_pillow_progressive_rst.jpg'),
+            (100, 100, 3, 8)
+        ),
+    ],
+    'p11' : [
+        (
+            os.path.join(DPROCESS11, 'color3d_arith_progressive_422.jpg'),
+            (480, 640, 3, 8)
+        ),
+        (
+            os.path.join(
+                DPROCESS11, 'grey_odd_pillow_arith_progressive_dac.jpg'
+            ),
+            (37, 53, 1, 8)
+        ),
+        (
+            os.path.join(DPROCESS11, 'SC_rgb_pillow_arith_progressive.jpg'),
+            (100, 100, 3, 8)
+        ),
+        (
+            os.path.join(
+                DPROCESS11, 'SC_rgb_pillow_arith_progressive_rst.jpg'
+            ),
+            (100, 100, 3, 8)
+        ),
+    ],
     'p12' : None,
-    'p13' : None,
+    'p13' : [
+        (
+            os.path.join(DPROCESS13, 'grey_12_arith_progressive.jpg'),
+            (5, 4, 1, 12)
+        ),
+    ],
     'p14' : [
-
+        (os.path.join(CPROCESS14, 'O2.JPG'), (257, 255, 4, 16)),
     ],
     'p14sv1' : [
         #(os.path.join(DPROCESS14SV1, 'JPEG-LL_frame1.jpg'), None),
+        (os.path.join(CPROCESS14, 'O1.JPG'), (257, 255, 4, 8)),
         (
             os.path.join(DPROCESS14SV1, 'SC_rgb_jpeg_gdcm.jpg'),
             (100, 100, 3, 8)
         ),
+        (
+            os.path.join(DPROCESS14SV1, 'SC_rgb_jpeg_rst30.jpg'),
+            (100, 100, 3, 8)
+        ),
+    ],
+    'p15' : [
+        (os.path.join(DPROCESS15, 'O1_arith.jpg'), (257, 255, 4, 8)),
+        (
+            os.path.join(DPROCESS15, 'O1_arith_sv6_rst_dac.jpg'),
+            (257, 255, 4, 8)
+        ),
+        (os.path.join(DPROCESS15, 'O2_arith_16.jpg'), (65, 85, 1, 16)),
+        (os.path.join(DPROCESS15, 'SC_rgb_arith.jpg'), (100, 100, 3, 8)),
+        (
+            os.path.join(DPROCESS15, 'SC_rgb_arith_rst250.jpg'),
+            (100, 100, 3, 8)
+        ),
     ],
-    'p15' : None,
     'p16' : None,
     'p17' : None,
     'p18' : None,
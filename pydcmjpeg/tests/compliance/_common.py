@@ -3,6 +3,7 @@
 import numpy as np
 
 from pydcmjpeg.config import ZIGZAG
+from pydcmjpeg.decoders.jpeg_decoders import _get_scan_data
 from pydcmjpeg.utils import get_bit
 
 
@@ -48,12 +49,64 @@ QUANTIZATION_D = np.asarray(
      [19, 22, 26, 27, 29, 34, 34, 38],
      [22, 22, 26, 27, 29, 34, 37, 40],
      [22, 26, 27, 29, 32, 35, 40, 48],
-     [26, 27, 29, 32, 25, 40, 48, 58],
+     [26, 27, 29, 32, 35, 40, 48, 58],
      [26, 27, 29, 34, 38, 46, 56, 69],
      [27, 29, 35, 38, 46, 56, 69, 83]]
 )
 
 
+def _fdct_matrix():
+    """Return the 8x8 DCT basis matrix with double precision."""
+    uu = np.arange(8).reshape(8, 1)
+    xx = np.arange(8).reshape(1, 8)
+    matrix = np.cos((2 * xx + 1) * uu * np.pi / 16) / 2
+    matrix[0, :] /= np.sqrt(2)
+
+    return matrix
+
+
+def get_dref_difference(plane, qtable, fpath, precision):
+    """Return the largest difference from the decoder reference data.
+
+    Implements steps 2 and 3 of the procedure for determining the compliance
+    of a DCT-based decoder: the quantized DCT coefficients are calculated
+    from the decoded component and compared with the reference data. Blocks
+    completed by extension are not considered.
+
+    Parameters
+    ----------
+    plane : numpy.ndarray
+        The decoded 2D samples for the component.
+    qtable : numpy.ndarray
+        The 8x8 quantization table used by the component.
+    fpath : str
+        The path to the DREF_*.DCT decoder reference data for the component.
+    precision : int
+        The sample precision, 8 or 12.
+
+    Returns
+    -------
+    int
+        The largest absolute difference between the quantized coefficients.
+    """
+    rows, columns = plane.shape
+    blocks_y, blocks_x = rows // 8, columns // 8
+    blocks = plane[:blocks_y * 8, :blocks_x * 8].astype(np.float64)
+    blocks = blocks.reshape(blocks_y, 8, blocks_x, 8).transpose(0, 2, 1, 3)
+    blocks -= 2**(precision - 1)
+
+    matrix = _fdct_matrix()
+    coefficients = np.rint(matrix @ blocks @ matrix.T / qtable)
+    coefficients = coefficients.reshape(blocks_y, blocks_x, 64)
+
+    # The reference includes the extended blocks and is in zigzag order
+    reference = np.fromfile(fpath, dtype='>i2')
+    reference = reference.reshape(-1, -(-columns // 8), 64)
+    reference = reference[:blocks_y, :blocks_x, ZIGZAG]
+
+    return int(np.abs(coefficients - reference).max())
+
+
 def _write_soi(fp, offset, marker, name, info):
     fp.write('{0:<7}{1:<4}({2})\n'.format(offset, name, marker))
 
@@ -199,7 +252,7 @@ def _write_sos(fp, offset, marker, name, info):
         if key.split('@')[0] == 'ENC':
             fp.write(
                 '       {} bytes of entropy-coded data\n'
-                .format(len(info[key]))
+                .format(len(_get_scan_data(info[key])))
             )
         else:
             (name, offset) = key.split('@')
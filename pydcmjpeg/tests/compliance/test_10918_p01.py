@@ -6,9 +6,13 @@ from tempfile import NamedTemporaryFile
 import pytest
 
 from pydcmjpeg._markers import MARKERS
+from pydcmjpeg.decoders.jpeg_decoders import _decode_planes
 from pydcmjpeg.fileio import jpgread, parse_jpg
 
-from ._common import WRITERS
+from ._common import (
+    WRITERS, get_dref_difference,
+    QUANTIZATION_A, QUANTIZATION_B, QUANTIZATION_C, QUANTIZATION_D,
+)
 
 
 COMPL_DIR = os.path.abspath(
@@ -221,3 +225,29 @@ class TestJPEGProcess01_Parse(object):
             with open(PROCESS01_B2_REF, 'r', encoding='utf-8', errors='ignore') as rfile:
                 for out, ref in zip(tfile, rfile):
                     assert ref == out
+
+
+class TestJPEGProcess01_Decode(object):
+    """JPEG 10918-2 compliance tests for decoding Process 1.
+
+    The quantized DCT coefficients of each decoded component shall differ
+    from the decoder reference test data by no more than one.
+    """
+    def test_decode_a1(self):
+        """Test decoding the A1 file."""
+        jpg = jpgread(PROCESS01_A1)
+        assert jpg.is_process1
+        planes = _decode_planes(jpg)
+        assert [(65, 85), (129, 85), (65, 255), (257, 85)] == [
+            plane.shape for plane in planes
+        ]
+
+        references = [
+            (PROCESS01_DREF_A8, QUANTIZATION_A),
+            (PROCESS01_DREF_B8, QUANTIZATION_B),
+            (PROCESS01_DREF_C8, QUANTIZATION_C),
+            (PROCESS01_DREF_D8, QUANTIZATION_D),
+        ]
+        for plane, (fpath, qtable) in zip(planes, references):
+            assert 'uint8' == plane.dtype
+            assert 1 >= get_dref_difference(plane, qtable, fpath, 8)
@@ -6,10 +6,14 @@ from tempfile import NamedTemporaryFile
 import pytest
 
 from pydcmjpeg._markers import MARKERS
+from pydcmjpeg.decoders.jpeg_decoders import _decode_planes
 from pydcmjpeg.fileio import jpgread, parse_jpg
 
 from pydcmjpeg.tests.compliance import _common as COMMON
-from ._common import WRITERS
+from ._common import (
+    WRITERS, get_dref_difference,
+    QUANTIZATION_A, QUANTIZATION_B, QUANTIZATION_C, QUANTIZATION_D,
+)
 
 
 COMPL_DIR = os.path.abspath(
@@ -334,3 +338,56 @@ class TestJPEGProcess02_Parse(object):
             with open(PROCESS02_C2_REF, 'r', encoding='utf-8', errors='ignore') as rfile:
                 for out, ref in zip(tfile, rfile):
                     assert ref == out
+
+
+class TestJPEGProcess02_Decode(object):
+    """JPEG 10918-2 compliance tests for decoding Process 2.
+
+    The quantized DCT coefficients of each decoded component shall differ
+    from the decoder reference test data by no more than one.
+    """
+    def test_decode_c1(self):
+        """Test decoding the C1 file."""
+        jpg = jpgread(PROCESS02_C1)
+        assert jpg.is_process2
+        planes = _decode_planes(jpg)
+        assert [(65, 85), (129, 85), (65, 255), (257, 85)] == [
+            plane.shape for plane in planes
+        ]
+
+        references = [
+            (PROCESS02_DREF_A8, QUANTIZATION_A),
+            (PROCESS02_DREF_B8, QUANTIZATION_B),
+            (PROCESS02_DREF_C8, QUANTIZATION_C),
+            (PROCESS02_DREF_D8, QUANTIZATION_D),
+        ]
+        for plane, (fpath, qtable) in zip(planes, references):
+            assert 'uint8' == plane.dtype
+            assert 1 >= get_dref_difference(plane, qtable, fpath, 8)
+
+        arr = jpg.decode()
+        assert (257, 255, 4) == arr.shape
+        assert 'uint8' == arr.dtype
+
+    def test_decode_c2(self):
+        """Test decoding the C2 file."""
+        jpg = jpgread(PROCESS02_C2)
+        assert jpg.is_process2
+        planes = _decode_planes(jpg)
+        assert [(65, 85), (129, 85), (65, 255), (257, 85)] == [
+            plane.shape for plane in planes
+        ]
+
+        references = [
+            (PROCESS02_DREF_A8, QUANTIZATION_A),
+            (PROCESS02_DREF_B8, QUANTIZATION_B),
+            (PROCESS02_DREF_C8, QUANTIZATION_C),
+            (PROCESS02_DREF_D8, QUANTIZATION_D),
+        ]
+        for plane, (fpath, qtable) in zip(planes, references):
+            assert 'uint8' == plane.dtype
+            assert 1 >= get_dref_difference(plane, qtable, fpath, 8)
+
+        arr = jpg.decode()
+        assert (257, 255, 4) == arr.shape
+        assert 'uint8' == arr.dtype
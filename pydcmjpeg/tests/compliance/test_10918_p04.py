@@ -6,10 +6,14 @@ from tempfile import NamedTemporaryFile
 import pytest
 
 from pydcmjpeg._markers import MARKERS
+from pydcmjpeg.decoders.jpeg_decoders import _decode_planes
 from pydcmjpeg.fileio import jpgread, parse_jpg
 
 from pydcmjpeg.tests.compliance import _common as COMMON
-from ._common import WRITERS
+from ._common import (
+    WRITERS, get_dref_difference,
+    QUANTIZATION_A, QUANTIZATION_B, QUANTIZATION_C, QUANTIZATION_D,
+)
 
 
 COMPL_DIR = os.path.abspath(
@@ -33,10 +37,10 @@ PROCESS04_C1_REF = os.path.join(C10918_PROCESS04, 'C1.TXT')
 PROCESS04_C2_REF = os.path.join(C10918_PROCESS04, 'C2.TXT')
 PROCESS04_E1_REF = os.path.join(C10918_PROCESS04, 'E1.TXT')
 PROCESS04_E2_REF = os.path.join(C10918_PROCESS04, 'E2.TXT')
-PROCESS04_DREF_A8  = os.path.join(C10918_PROCESS04, 'DREF_A8.DCT')
-PROCESS04_DREF_B8  = os.path.join(C10918_PROCESS04, 'DREF_B8.DCT')
-PROCESS04_DREF_C8  = os.path.join(C10918_PROCESS04, 'DREF_C8.DCT')
-PROCESS04_DREF_D8  = os.path.join(C10918_PROCESS04, 'DREF_D8.DCT')
+PROCESS04_DREF_A12  = os.path.join(C10918_PROCESS04, 'DREF_A12.DCT')
+PROCESS04_DREF_B12  = os.path.join(C10918_PROCESS04, 'DREF_B12.DCT')
+PROCESS04_DREF_C12  = os.path.join(C10918_PROCESS04, 'DREF_C12.DCT')
+PROCESS04_DREF_D12  = os.path.join(C10918_PROCESS04, 'DREF_D12.DCT')
 
 
 class TestJPEGProcess04_Parse(object):
@@ -444,3 +448,58 @@ class TestJPEGProcess04_Parse(object):
             with open(PROCESS04_E2_REF, 'r', encoding='utf-8', errors='ignore') as rfile:
                 for out, ref in zip(tfile, rfile):
                     assert ref == out
+
+
+class TestJPEGProcess04_Decode(object):
+    """JPEG 10918-2 compliance tests for decoding Process 4.
+
+    The quantized DCT coefficients of each decoded component shall differ
+    from the decoder reference test data by no more than one.
+    """
+    def test_decode_e1(self):
+        """Test decoding the E1 file."""
+        jpg = jpgread(PROCESS04_E1)
+        assert jpg.is_process4
+        planes = _decode_planes(jpg)
+        assert [(65, 85), (129, 85), (65, 255), (257, 85)] == [
+            plane.shape for plane in planes
+        ]
+
+        # The 12-bit quantisation tables are 4 times the 8-bit ones
+        references = [
+            (PROCESS04_DREF_A12, 4 * QUANTIZATION_A),
+            (PROCESS04_DREF_B12, 4 * QUANTIZATION_B),
+            (PROCESS04_DREF_C12, 4 * QUANTIZATION_C),
+            (PROCESS04_DREF_D12, 4 * QUANTIZATION_D),
+        ]
+        for plane, (fpath, qtable) in zip(planes, references):
+            assert 'uint16' == plane.dtype
+            assert 1 >= get_dref_difference(plane, qtable, fpath, 12)
+
+        arr = jpg.decode()
+        assert (257, 255, 4) == arr.shape
+        assert 'uint16' == arr.dtype
+
+    def test_decode_e2(self):
+        """Test decoding the E2 file."""
+        jpg = jpgread(PROCESS04_E2)
+        assert jpg.is_process4
+        planes = _decode_planes(jpg)
+        assert [(65, 85), (129, 85), (65, 255), (257, 85)] == [
+            plane.shape for plane in planes
+        ]
+
+        # The 12-bit quantisation tables are 4 times the 8-bit ones
+        references = [
+            (PROCESS04_DREF_A12, 4 * QUANTIZATION_A),
+            (PROCESS04_DREF_B12, 4 * QUANTIZATION_B),
+            (PROCESS04_DREF_C12, 4 * QUANTIZATION_C),
+            (PROCESS04_DREF_D12, 4 * QUANTIZATION_D),
+        ]
+        for plane, (fpath, qtable) in zip(planes, references):
+            assert 'uint16' == plane.dtype
+            assert 1 >= get_dref_difference(plane, qtable, fpath, 12)
+
+        arr = jpg.decode()
+        assert (257, 255, 4) == arr.shape
+        assert 'uint16' == arr.dtype
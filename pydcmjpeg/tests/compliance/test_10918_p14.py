@@ -3,9 +3,11 @@
 import os
 from tempfile import NamedTemporaryFile
 
+import numpy as np
 import pytest
 
 from pydcmjpeg._markers import MARKERS
+from pydcmjpeg.decoders.lossless import _decode_lossless_planes
 from pydcmjpeg.fileio import jpgread, parse_jpg
 
 from pydcmjpeg.tests.compliance import _common as COMMON
@@ -23,6 +25,10 @@ PROCESS14_O1 = os.path.join(C10918_PROCESS14, 'O1.JPG')
 PROCESS14_O2 = os.path.join(C10918_PROCESS14, 'O2.JPG')
 PROCESS14_O1_REF = os.path.join(C10918_PROCESS14, 'O1.TXT')
 PROCESS14_O2_REF = os.path.join(C10918_PROCESS14, 'O2.TXT')
+PROCESS14_A16 = os.path.join(C10918_PROCESS14, 'A16.SRC')
+PROCESS14_B16 = os.path.join(C10918_PROCESS14, 'B16.SRC')
+PROCESS14_C16 = os.path.join(C10918_PROCESS14, 'C16.SRC')
+PROCESS14_D16 = os.path.join(C10918_PROCESS14, 'D16.SRC')
 
 
 class TestJPEGProcess14_Parse(object):
@@ -155,3 +161,41 @@ class TestJPEGProcess14_Parse(object):
             with open(PROCESS14_O2_REF, 'r', encoding='utf-8', errors='ignore') as rfile:
                 for out, ref in zip(tfile, rfile):
                     assert ref == out
+
+
+class TestJPEGProcess14_Decode(object):
+    """JPEG 10918-2 compliance tests for decoding Process 14.
+
+    The decoded components shall be identical to the lossless decoder
+    reference data. The 16-bit reference data is little endian for O1,
+    which only uses the lower 8 bits, and big endian for O2.
+    """
+    references = [PROCESS14_A16, PROCESS14_B16, PROCESS14_C16, PROCESS14_D16]
+
+    def test_decode_o1(self):
+        """Test decoding the O1 file."""
+        jpg = jpgread(PROCESS14_O1)
+        assert jpg.is_process14
+        planes = _decode_lossless_planes(jpg)
+        assert [(65, 85), (129, 85), (65, 255), (257, 85)] == [
+            plane.shape for plane in planes
+        ]
+
+        for plane, fpath in zip(planes, self.references):
+            assert 'uint8' == plane.dtype
+            reference = np.fromfile(fpath, dtype='<u2')
+            assert np.array_equal(reference, plane.ravel())
+
+    def test_decode_o2(self):
+        """Test decoding the O2 file."""
+        jpg = jpgread(PROCESS14_O2)
+        assert jpg.is_process14
+        planes = _decode_lossless_planes(jpg)
+        assert [(65, 85), (129, 85), (65, 255), (257, 85)] == [
+            plane.shape for plane in planes
+        ]
+
+        for plane, fpath in zip(planes, self.references):
+            assert 'uint16' == plane.dtype
+            reference = np.fromfile(fpath, dtype='>u2')
+            assert np.array_equal(reference, plane.ravel())
@@ -0,0 +1,49 @@
+"""Tests for the pydcmjpeg.arithmetic module."""
+
+from pydcmjpeg.arithmetic import ArithmeticDecoder, FIXED_STATE
+
+
+# Section K.4.1: the test sequence and its arithmetic coded data, without
+#   the byte stuffing and the trailing EOI marker
+K4_DATA = bytes.fromhex(
+    '00020051000000C0035287 2AAAAAAAAA82C02000FCD79EF674EAABF7697EE74C'
+    .replace(' ', '')
+)
+K4_ENCODED = bytes.fromhex(
+    '655B5144F7969D517855BFFFFC5184C7CEF93900287D46708ECBC0F6'
+)
+
+
+def to_bits(data):
+    """Return `data` as a list of bits, most significant bit first."""
+    return [(byte >> (7 - ii)) & 1 for byte in data for ii in range(8)]
+
+
+class TestArithmeticDecoder(object):
+    """Tests for arithmetic.ArithmeticDecoder."""
+    def test_k4(self):
+        """Test decoding the test sequence of Section K.4."""
+        decoder = ArithmeticDecoder(K4_ENCODED)
+        stats = bytearray(1)
+        bits = [decoder.decode(stats, 0) for _ in range(len(K4_DATA) * 8)]
+        assert to_bits(K4_DATA) == bits
+        # The final bytes are reconstructed from 0s read past the end
+        assert len(K4_ENCODED) < decoder.pos
+
+    def test_statistics_bins(self):
+        """Test each bin has its own state."""
+        decoder = ArithmeticDecoder(K4_ENCODED)
+        stats = bytearray(4)
+        for _ in range(64):
+            decoder.decode(stats, 0)
+
+        assert stats[0]
+        assert bytearray(3) == stats[1:]
+
+    def test_fixed_state(self):
+        """Test the fixed probability estimate is never updated."""
+        decoder = ArithmeticDecoder(K4_ENCODED)
+        stats = bytearray([FIXED_STATE])
+        bits = [decoder.decode(stats, 0) for _ in range(200)]
+        assert FIXED_STATE == stats[0]
+        assert 0 in bits and 1 in bits
@@ -0,0 +1,88 @@
+"""Tests for the pydcmjpeg.cache module."""
+
+from threading import Thread
+
+import numpy as np
+
+from pydcmjpeg.cache import LRUCache
+
+
+class TestLRUCache(object):
+    """Tests for cache.LRUCache."""
+    def test_items(self):
+        """Test the number of items is bounded by default."""
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        assert 1 == cache.get('a')
+        cache.put('c', 3)
+        # 'b' was the least recently used
+        assert 'b' not in cache
+        assert 'a' in cache
+        assert 'c' in cache
+        assert 2 == len(cache)
+        assert cache.get('b') is None
+        assert 0 == cache.get('b', 0)
+
+    def test_size(self):
+        """Test the cache is bounded by the size of the values."""
+        cache = LRUCache(100, getsize=lambda arr: arr.nbytes)
+        cache.put('a', np.zeros(60, dtype='uint8'))
+        cache.put('b', np.zeros(30, dtype='uint8'))
+        assert 90 == cache.size
+        cache.put('c', np.zeros(20, dtype='uint8'))
+        assert 'a' not in cache
+        assert 50 == cache.size
+
+        # Too large to cache
+        cache.put('d', np.zeros(101, dtype='uint8'))
+        assert 'd' not in cache
+        assert 50 == cache.size
+
+        # Replacing a value
+        cache.put('b', np.zeros(10, dtype='uint8'))
+        assert 30 == cache.size
+
+    def test_pop_clear(self):
+        """Test removing items."""
+        cache = LRUCache(10)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        assert 1 == cache.pop('a')
+        assert cache.pop('a') is None
+        assert 1 == cache.size
+        cache.clear()
+        assert 0 == len(cache)
+        assert 0 == cache.size
+
+    def test_resize(self):
+        """Test resizing the cache."""
+        cache = LRUCache(0)
+        cache.put('a', 1)
+        assert 0 == len(cache)
+
+        cache.resize(3)
+        for ii in range(3):
+            cache.put(ii, ii)
+
+        cache.resize(1)
+        assert [2] == [ii for ii in range(3) if ii in cache]
+
+    def test_threads(self):
+        """Test using the cache from multiple threads."""
+        cache = LRUCache(50)
+
+        def func(offset):
+            for ii in range(1000):
+                cache.put(offset + ii % 100, ii)
+                cache.get(offset + (ii + 1) % 100)
+
+        threads = [Thread(target=func, args=(ii * 100, )) for ii in range(4)]
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        assert 50 == len(cache)
+        assert 50 == cache.size
@@ -0,0 +1,1360 @@
+"""Tests for the pydcmjpeg.decoders package."""
+
+import os
+
+import numpy as np
+import pytest
+
+from pydcmjpeg.cache import LRUCache, TABLE_CACHE
+from pydcmjpeg.decoders.arithmetic import _decode_magnitude
+from pydcmjpeg.decoders.colour import upsample, ycbcr_to_rgb
+from pydcmjpeg.decoders.jpeg_decoders import (
+    decode_baseline, get_output, iter_baseline, _decode_coefficients,
+    _get_components,
+    _get_huffman_table, _get_quantisation_table, _get_scan_data,
+    _get_segments, _idct_blocks, _in_window, _planes_to_image,
+    _scale_frame, _shutdown_executors, ZIGZAG_INDEX, _EXECUTORS
+)
+from pydcmjpeg.decoders.lossless import (
+    decode_lossless, _decode_differences, _decode_lanes,
+    _decode_lossless_planes, _get_difference_tables, _reconstruct
+)
+from pydcmjpeg.decoders.progressive import (
+    decode_progressive, iter_progressive, _decode_progressive_coefficients
+)
+from pydcmjpeg.fileio import jpgmap, jpgparse, jpgread
+from pydcmjpeg.marker import MarkerIndex
+
+from ._common import (
+    REFERENCE_DATA, CPROCESS01, CPROCESS04, CPROCESS14, DPROCESS01,
+    DPROCESS03, DPROCESS04, DPROCESS05, DPROCESS10, DPROCESS11, DPROCESS13,
+    DPROCESS14SV1, DPROCESS15
+)
+
+
+P1_A1 = os.path.join(CPROCESS01, 'A1.JPG')
+P1_B2 = os.path.join(CPROCESS01, 'B2.JPG')
+P1_GREY = os.path.join(DPROCESS01, 'grey_8.jpg')
+P1_HUFF_SIMPLE = os.path.join(DPROCESS01, 'huff_simple0.jpg')
+P1_RGB = os.path.join(DPROCESS01, 'SC_rgb_jpeg_dcmtk.jpg')
+P1_YBR_420 = os.path.join(DPROCESS01, 'SC_rgb_dcmtk_+eb+cy+n1.jpg')
+P1_YBR_422 = os.path.join(DPROCESS01, 'SC_rgb_dcmtk_+eb+cy+n2.jpg')
+P4_E1 = os.path.join(CPROCESS04, 'E1.JPG')
+P4_GREY = os.path.join(DPROCESS04, 'grey_12.jpg')
+P10_GREY = os.path.join(DPROCESS10, 'grey_odd_pillow_progressive.jpg')
+P10_RGB = os.path.join(DPROCESS10, 'SC_rgb_pillow_progressive.jpg')
+P10_RGB_RST = os.path.join(DPROCESS10, 'SC_rgb_pillow_progressive_rst.jpg')
+P11_RGB = os.path.join(DPROCESS11, 'SC_rgb_pillow_arith_progressive.jpg')
+P11_RGB_RST = os.path.join(
+    DPROCESS11, 'SC_rgb_pillow_arith_progressive_rst.jpg'
+)
+P14_RGB = os.path.join(DPROCESS14SV1, 'SC_rgb_jpeg_gdcm.jpg')
+P14_RGB_RST = os.path.join(DPROCESS14SV1, 'SC_rgb_jpeg_rst30.jpg')
+P15_RGB_RST = os.path.join(DPROCESS15, 'SC_rgb_arith_rst250.jpg')
+
+# Progressive JPEGs and sequential JPEGs with the same coefficients
+PROGRESSIVE_PAIRS = [
+    (P10_GREY, os.path.join(DPROCESS01, 'grey_odd_pillow.jpg')),
+    (P10_RGB, os.path.join(DPROCESS01, 'SC_rgb_pillow.jpg')),
+    (P10_RGB_RST, os.path.join(DPROCESS01, 'SC_rgb_pillow.jpg')),
+]
+
+# Arithmetic coded DCT JPEGs and Huffman coded JPEGs with the same
+#   coefficients
+ARITHMETIC_PAIRS = [
+    (
+        os.path.join(DPROCESS03, 'color3d_arith_422.jpg'),
+        os.path.join(DPROCESS01, 'color3d_jpeg_baseline_422_frame1.jpg')
+    ),
+    (
+        os.path.join(DPROCESS03, 'grey_odd_pillow_arith_dac.jpg'),
+        os.path.join(DPROCESS01, 'grey_odd_pillow.jpg')
+    ),
+    (
+        os.path.join(DPROCESS03, 'SC_rgb_pillow_arith_rst.jpg'),
+        os.path.join(DPROCESS01, 'SC_rgb_pillow.jpg')
+    ),
+    (
+        os.path.join(DPROCESS05, 'rgb_12_422_arith.jpg'),
+        os.path.join(DPROCESS04, 'rgb_12_422.jpg')
+    ),
+    (
+        os.path.join(DPROCESS11, 'grey_odd_pillow_arith_progressive_dac.jpg'),
+        os.path.join(DPROCESS01, 'grey_odd_pillow.jpg')
+    ),
+    (P11_RGB, os.path.join(DPROCESS01, 'SC_rgb_pillow.jpg')),
+    (P11_RGB_RST, os.path.join(DPROCESS01, 'SC_rgb_pillow.jpg')),
+    (
+        os.path.join(DPROCESS13, 'grey_12_arith_progressive.jpg'),
+        os.path.join(DPROCESS04, 'grey_12.jpg')
+    ),
+]
+
+# The libjpeg output for grey_8.jpg
+GREY_8 = [
+    [255, 170, 85, 0],
+    [170, 85, 0, 85],
+    [85, 0, 85, 170],
+    [0, 85, 170, 255],
+    [85, 170, 255, 85],
+]
+
+# The RGB values of the bands in the SC_rgb images, at (row, 50)
+SC_RGB = {
+    5: [255, 0, 0],
+    15: [255, 128, 128],
+    25: [0, 255, 0],
+    35: [128, 255, 128],
+    45: [0, 0, 255],
+    55: [128, 128, 255],
+    65: [0, 0, 0],
+    75: [64, 64, 64],
+    85: [192, 192, 192],
+    95: [255, 255, 255],
+}
+
+
+class TestGetComponents(object):
+    """Tests for jpeg_decoders._get_components."""
+    def test_interleaved(self):
+        """Test the geometry of the A1 components."""
+        frame = jpgread(P1_A1)._index.frame
+        components = _get_components(frame)
+        assert frame['Ci'] == list(components.keys())
+        geometry = [
+            (cc['width'], cc['height'], cc['blocks_x'], cc['blocks_y'],
+             cc['padded_x'], cc['padded_y'])
+            for cc in components.values()
+        ]
+        assert [
+            (85, 65, 11, 9, 11, 9),
+            (85, 129, 11, 17, 11, 18),
+            (255, 65, 32, 9, 33, 9),
+            (85, 257, 11, 33, 11, 36),
+        ] == geometry
+
+    def test_single(self):
+        """Test the geometry of a single component."""
+        frame = {
+            'X' : 17, 'Y' : 9, 'Ci' : [1], 'Hi' : [2], 'Vi' : [2],
+            'Tqi' : [0],
+        }
+        component = _get_components(frame)[1]
+        assert 17 == component['width']
+        assert 9 == component['height']
+        assert 3 == component['blocks_x']
+        assert 2 == component['blocks_y']
+
+
+class TestTables(object):
+    """Tests for caching the decoding tables."""
+    def test_quantisation_table(self):
+        """Test the quantisation table is in natural order."""
+        tables = {}
+        table = _get_quantisation_table(list(range(64)), tables)
+        assert 'float32' == table.dtype
+        assert not table.flags.writeable
+        assert [0, 1, 5, 6, 14, 15, 27, 28] == table[:8].tolist()
+        assert table is _get_quantisation_table(list(range(64)), tables)
+
+    def test_huffman_table(self):
+        """Test Huffman tables are reused."""
+        tables = LRUCache(1)
+        bits = [0, 1] + [0] * 14
+        table = _get_huffman_table(bits, [None, (0, )] + [None] * 14, tables)
+        assert table is _get_huffman_table(
+            bits, [None, (0, )] + [None] * 14, tables
+        )
+        other = _get_huffman_table(bits, [None, (1, )] + [None] * 14, tables)
+        assert other is not table
+        assert 1 == len(tables)
+
+    def test_process_cache(self):
+        """Test the process-wide cache is used by default."""
+        TABLE_CACHE.clear()
+        _decode_coefficients(jpgread(P1_RGB))
+        cached = {
+            key : TABLE_CACHE[key] for key in list(TABLE_CACHE._items)
+        }
+        # 2 DQT and 4 DHT
+        assert 6 == len(cached)
+
+        components = _decode_coefficients(jpgread(P1_RGB))
+        assert 6 == len(TABLE_CACHE)
+        for key, table in cached.items():
+            assert TABLE_CACHE[key] is table
+
+        tables = [cached[kk] for kk in cached if kk[0] == 'DQT']
+        for component in components.values():
+            assert [tt for tt in tables if tt is component['Qk']]
+
+
+class TestIDCT(object):
+    """Tests for jpeg_decoders._idct_blocks."""
+    def test_zigzag_index(self):
+        """Test the zigzag to natural reordering."""
+        zigzag = np.arange(64)
+        natural = zigzag[ZIGZAG_INDEX].reshape(8, 8)
+        assert [0, 1, 5, 6, 14, 15, 27, 28] == natural[0].tolist()
+        assert [35, 36, 48, 49, 57, 58, 62, 63] == natural[7].tolist()
+
+    def test_dc_only(self):
+        """Test blocks with only a DC coefficient are flat."""
+        coefficients = np.zeros((2, 3, 64), dtype=np.int16)
+        coefficients[0, 0, 0] = 10
+        coefficients[1, 2, 0] = -200
+        qtable = np.full(64, 8, dtype=np.float32)
+        samples = _idct_blocks(coefficients, qtable, 8)
+        assert (2, 3, 8, 8) == samples.shape
+        assert 'uint8' == samples.dtype
+        # 10 * 8 / 8 + 128
+        assert np.all(samples[0, 0] == 138)
+        assert np.all(samples[0, 1] == 128)
+        # Clipped to 0
+        assert np.all(samples[1, 2] == 0)
+
+    def test_precision(self):
+        """Test the level shift and clipping for 12-bit samples."""
+        coefficients = np.zeros((2, 64), dtype=np.int16)
+        coefficients[0, 0] = 1000
+        qtable = np.ones(64, dtype=np.float32)
+        samples = _idct_blocks(coefficients, qtable, 12)
+        assert 'uint16' == samples.dtype
+        assert np.all(samples[0] == 2048 + 125)
+        assert np.all(samples[1] == 2048)
+
+    def test_ac(self):
+        """Test a single horizontal AC coefficient."""
+        coefficients = np.zeros((1, 64), dtype=np.int16)
+        coefficients[0, 1] = 20
+        qtable = np.ones(64, dtype=np.float32)
+        samples = _idct_blocks(coefficients, qtable, 8).astype('int')[0]
+        # Each row is identical, decreasing from left to right
+        assert np.all(samples == samples[0])
+        assert np.all(np.diff(samples[0]) <= 0)
+        assert samples[0, 0] - 128 == 128 - samples[0, 7]
+
+    @pytest.mark.parametrize("size", [(1, 1), (2, 2), (4, 4), (4, 8)])
+    def test_reduced(self, size):
+        """Test the reduced size IDCTs average the full size samples."""
+        rng = np.random.RandomState(0)
+        coefficients = rng.randint(-20, 20, size=(10, 64)).astype(np.int16)
+        qtable = np.full(64, 2, dtype=np.float32)
+        full = _idct_blocks(coefficients, qtable, 8).astype('float')
+        samples = _idct_blocks(coefficients, qtable, 8, size=size)
+        assert (10, ) + size == samples.shape
+        assert 'uint8' == samples.dtype
+        rows, columns = 8 // size[0], 8 // size[1]
+        average = full.reshape(
+            10, size[0], rows, size[1], columns
+        ).mean(axis=(2, 4))
+        assert 1 >= np.abs(samples - average).max()
+
+    def test_reduced_truncated(self):
+        """Test the reduced size IDCTs that don't divide 8."""
+        coefficients = np.zeros((1, 64), dtype=np.int16)
+        coefficients[0, 0] = 80
+        coefficients[0, 1] = 20
+        qtable = np.ones(64, dtype=np.float32)
+        samples = _idct_blocks(coefficients, qtable, 8, size=(3, 6))
+        assert (1, 3, 6) == samples.shape
+        samples = samples[0].astype('int')
+        assert np.all(samples == samples[0])
+        assert np.all(np.diff(samples[0]) < 0)
+        assert 138 == round(samples.mean())
+
+    def test_reduced_dc_only(self):
+        """Test the 1 x 1 IDCT uses the DC coefficient only."""
+        coefficients = np.zeros((2, 64), dtype=np.int16)
+        coefficients[0, 0] = 10
+        coefficients[:, 1:] = 100
+        qtable = np.full(64, 8, dtype=np.float32)
+        samples = _idct_blocks(coefficients, qtable, 8, size=(1, 1))
+        assert [[[138]], [[128]]] == samples.tolist()
+
+
+class TestScaleFrame(object):
+    """Tests for jpeg_decoders._scale_frame."""
+    def test_no_scaling(self):
+        """Test a scale of 1."""
+        frame = jpgread(P1_YBR_420)._index.frame
+        scaled, sizes = _scale_frame(frame, 1)
+        assert scaled is frame
+        assert [(8, 8)] * 3 == sizes
+
+    def test_subsampled(self):
+        """Test the chroma IDCTs are larger for subsampled components."""
+        frame = jpgread(P1_YBR_420)._index.frame
+        scaled, sizes = _scale_frame(frame, 0.5)
+        assert [(4, 4), (8, 8), (8, 8)] == sizes
+        assert (50, 50) == (scaled['Y'], scaled['X'])
+        assert [1, 1, 1] == scaled['Hi'] == scaled['Vi']
+        # The original is unchanged
+        assert [2, 1, 1] == frame['Hi']
+
+        # The chroma IDCTs can't be larger than 8 x 8
+        scaled, sizes = _scale_frame(frame, 1 / 8)
+        assert [(1, 1), (2, 2), (2, 2)] == sizes
+        scaled, sizes = _scale_frame(frame, 6 / 8)
+        assert [(6, 6)] * 3 == sizes
+        assert (75, 75) == (scaled['Y'], scaled['X'])
+        assert [2, 1, 1] == scaled['Hi'] == scaled['Vi']
+
+    def test_subsampled_ratio(self):
+        """Test sampling factors that don't divide the IDCT size."""
+        frame = jpgread(P1_A1)._index.frame
+        assert [1, 1, 3, 1] == frame['Hi']
+        scaled, sizes = _scale_frame(frame, 1 / 4)
+        assert [6, 6, 2, 6] == [columns for _, columns in sizes]
+        assert [1, 1, 1, 1] == scaled['Hi']
+        # 3 x 4 is larger than 8 so needs upsampling
+        scaled, sizes = _scale_frame(frame, 1 / 2)
+        assert [4, 4, 4, 4] == [columns for _, columns in sizes]
+        assert [1, 1, 3, 1] == scaled['Hi']
+
+    @pytest.mark.parametrize("scale", [0, 1 / 3, 2, 1 / 16])
+    def test_invalid_raises(self, scale):
+        """Test an invalid scale raises an exception."""
+        msg = r"Invalid 'scale' value .*, must be N/8 with N from 1 to 8"
+        with pytest.raises(ValueError, match=msg):
+            _scale_frame(jpgread(P1_RGB)._index.frame, scale)
+
+
+class TestGetSegments(object):
+    """Tests for jpeg_decoders._get_segments."""
+    def test_intervals(self):
+        """Test the restart intervals of a scan."""
+        scan = {
+            'Ns': 1, 'ENC@10': b'\x01', 'RST0@12': None, 'ENC@12': b'\x02',
+            'RST1@14': None, 'ENC@14': b'\x03',
+        }
+        assert [
+            (b'\x01', 0, 4), (b'\x02', 4, 4), (b'\x03', 8, 2)
+        ] == _get_segments(scan, 4, 10)
+        # Without restart intervals
+        assert [(b'\x01', 0, 10)] == _get_segments(scan, 0, 10)
+
+    def test_missing_raises(self):
+        """Test a missing restart interval raises an exception."""
+        scan = {'ENC@10': b'\x01', 'RST0@12': None, 'ENC@12': b'\x02'}
+        msg = r"The scan is missing entropy-coded data for one or more"
+        with pytest.raises(ValueError, match=msg):
+            _get_segments(scan, 4, 10)
+
+    def test_stuffed_bytes(self):
+        """Test ENC entries set to stuffed bytes decode the same."""
+        reference = decode_baseline(jpgread(P1_A1))
+        jpg = jpgread(P1_A1)
+        stuffed = False
+        for key in jpg.get_keys('SOS'):
+            scan = jpg.info[key][2]
+            for kk in [kk for kk in scan if kk.startswith('ENC')]:
+                scan[kk] = bytes(scan[kk])
+                stuffed |= b'\xff\x00' in scan[kk]
+
+        assert stuffed
+        assert np.array_equal(reference, decode_baseline(jpg))
+
+
+class TestDecodeBaseline(object):
+    """Tests for jpeg_decoders.decode_baseline."""
+    def test_greyscale(self):
+        """Test decoding a single component image."""
+        arr = decode_baseline(jpgread(P1_GREY))
+        assert (5, 4) == arr.shape
+        assert 'uint8' == arr.dtype
+        assert arr.flags.c_contiguous
+        diff = np.abs(arr.astype('int') - np.asarray(GREY_8))
+        assert 1 >= diff.max()
+
+    def test_multiple_components(self):
+        """Test decoding an image with three components."""
+        arr = decode_baseline(jpgread(P1_HUFF_SIMPLE))
+        assert (8, 16, 3) == arr.shape
+        assert 'uint8' == arr.dtype
+        assert [0, 128, 128] == arr[0, 0].tolist()
+        assert [255, 128, 128] == arr[7, 15].tolist()
+
+    @pytest.mark.parametrize("fpath,data", REFERENCE_DATA['p1'][2:])
+    def test_mapped(self, fpath, data):
+        """Test decoding a mapped JPEG gives the same coefficients."""
+        coefficients = [
+            cc['coefficients'] for cc in
+            _decode_coefficients(jpgread(fpath)).values()
+        ]
+        mapped = [
+            cc['coefficients'] for cc in
+            _decode_coefficients(jpgmap(fpath)).values()
+        ]
+        for arr, ref in zip(coefficients, mapped):
+            assert np.array_equal(arr, ref)
+
+    def test_restart_intervals(self):
+        """Test decoding the restart intervals of A1."""
+        jpg = jpgread(P1_A1)
+        scan = jpg.info[jpg.get_keys('SOS')[0]][2]
+        assert 20 == len([kk for kk in scan if kk.startswith('ENC')])
+        components = _decode_coefficients(jpg)
+        # Includes the MCU padding blocks
+        component = components[jpg._index.frame['Ci'][3]]
+        assert (36, 11, 64) == component['coefficients'].shape
+
+    def test_workers(self):
+        """Test decoding restart intervals in parallel."""
+        jpg = jpgread(P1_A1)
+        reference = _decode_coefficients(jpg)
+        components = _decode_coefficients(jpg, workers=2)
+        for component, ref in zip(components.values(), reference.values()):
+            assert np.array_equal(
+                ref['coefficients'], component['coefficients']
+            )
+
+    def test_workers_pool_reused(self):
+        """Test the process pool is reused by later decodes."""
+        jpg = jpgread(P1_A1)
+        _decode_coefficients(jpg, workers=2)
+        executor = _EXECUTORS[2]
+        _decode_coefficients(jpg, workers=2)
+        assert executor is _EXECUTORS[2]
+
+    def test_workers_pool_replaced(self):
+        """Test only the pool for the last number of workers is kept."""
+        jpg = jpgread(P1_A1)
+        _decode_coefficients(jpg, workers=2)
+        executor = _EXECUTORS[2]
+        _decode_coefficients(jpg, workers=3)
+        assert [3] == list(_EXECUTORS)
+        with pytest.raises(RuntimeError):
+            executor.submit(int)
+
+        _shutdown_executors()
+        assert {} == _EXECUTORS
+
+    def test_workers_no_restart(self):
+        """Test using workers with no restart intervals."""
+        jpg = jpgread(P1_RGB)
+        assert 'DRI' not in jpg._index
+        reference = decode_baseline(jpg)
+        assert np.array_equal(reference, decode_baseline(jpg, workers=2))
+
+    def test_release(self):
+        """Test releasing the encoded data of each scan once decoded."""
+        jpg = jpgread(P1_RGB)
+        reference = decode_baseline(jpgread(P1_RGB))
+        assert np.array_equal(reference, decode_baseline(jpg, release=True))
+        for key in jpg.get_keys('SOS'):
+            assert ['Ls', 'Ns', 'Csj'] == list(jpg.info[key][2])[:3]
+            assert not [kk for kk in jpg.info[key][2] if 'ENC' in kk]
+
+    def test_release_restarts(self):
+        """Test releasing keeps the RSTn entries."""
+        jpg = jpgread(P1_A1)
+        scan = jpg.info[jpg.get_keys('SOS')[0]][2]
+        _decode_coefficients(jpg, release=True)
+        assert not [kk for kk in scan if kk.startswith('ENC')]
+        assert 19 == len([kk for kk in scan if kk.startswith('RST')])
+
+    def test_subsampled(self):
+        """Test decoding subsampled components."""
+        arr = decode_baseline(jpgread(P1_A1))
+        assert (257, 255, 4) == arr.shape
+        assert 'uint8' == arr.dtype
+
+    @pytest.mark.parametrize("fpath", [P1_YBR_420, P1_YBR_422])
+    @pytest.mark.parametrize("method", ['fancy', 'nearest'])
+    def test_as_rgb(self, fpath, method):
+        """Test decoding subsampled YCbCr to RGB."""
+        arr = decode_baseline(jpgread(fpath), as_rgb=True, upsample=method)
+        assert (100, 100, 3) == arr.shape
+        for row, ref in SC_RGB.items():
+            diff = np.abs(arr[row, 50].astype('int') - ref)
+            assert 5 >= diff.max()
+
+    def test_as_rgb_skipped(self):
+        """Test the YCbCr planes are returned by default."""
+        jpg = jpgread(P1_YBR_420)
+        arr = decode_baseline(jpg)
+        # Red is Y 76, Cb 85, Cr 255
+        assert 3 >= np.abs(arr[5, 50].astype('int') - [76, 85, 255]).max()
+        rgb = decode_baseline(jpg, as_rgb=True)
+        assert np.array_equal(rgb, np.stack(ycbcr_to_rgb(
+            [arr[..., ii] for ii in range(3)]
+        ), axis=-1))
+
+    def test_as_rgb_raises(self):
+        """Test converting to RGB with the wrong number of components."""
+        msg = r"Unable to convert the image data to RGB as the JPEG has 1"
+        with pytest.raises(ValueError, match=msg):
+            decode_baseline(jpgread(P1_GREY), as_rgb=True)
+
+    def test_upsample_raises(self):
+        """Test an unknown upsampling method raises an exception."""
+        msg = r"Unknown upsampling method 'cubic'"
+        with pytest.raises(ValueError, match=msg):
+            decode_baseline(jpgread(P1_YBR_420), upsample='cubic')
+
+    def test_abbreviated_raises(self):
+        """Test decoding with no tables raises an exception."""
+        msg = r"The frame uses a quantisation table that hasn't been defined"
+        with pytest.raises(ValueError, match=msg):
+            decode_baseline(jpgread(P1_B2))
+
+    def test_truncated_raises(self):
+        """Test decoding truncated encoded data raises an exception."""
+        jpg = jpgread(P1_RGB)
+        scan = jpg.info[jpg.get_keys('SOS')[0]][2]
+        key = [kk for kk in scan if kk.startswith('ENC')][0]
+        scan[key] = scan[key][:len(scan[key]) // 2]
+        with pytest.raises(ValueError):
+            decode_baseline(jpg)
+
+    @pytest.mark.parametrize("scale", [1 / 2, 1 / 4, 1 / 8])
+    def test_scale(self, scale):
+        """Test scaled decoding is the averaged full size image."""
+        jpg = jpgread(P1_RGB)
+        full = decode_baseline(jpg).astype('float')
+        arr = decode_baseline(jpg, scale=scale)
+        size = int(100 * scale)
+        assert (-(-100 * scale // 1), ) * 2 + (3, ) == arr.shape
+        nn = int(1 / scale)
+        average = full[:size * nn, :size * nn].reshape(
+            size, nn, size, nn, 3
+        ).mean(axis=(1, 3))
+        assert 1 >= np.abs(arr[:size, :size] - average).max()
+
+    @pytest.mark.parametrize("fpath", [P1_YBR_420, P1_YBR_422])
+    @pytest.mark.parametrize("scale", [1 / 2, 1 / 4])
+    def test_scale_subsampled(self, fpath, scale):
+        """Test scaled decoding of subsampled components."""
+        arr = decode_baseline(jpgread(fpath), as_rgb=True, scale=scale)
+        size = int(100 * scale)
+        assert (size, size, 3) == arr.shape
+        # The bands are 10 rows high
+        for row, ref in SC_RGB.items():
+            pixel = arr[int(row * scale), size // 2].astype('int')
+            assert 5 >= np.abs(pixel - ref).max()
+
+        arr = decode_baseline(jpgread(fpath), scale=1 / 8)
+        assert (13, 13, 3) == arr.shape
+
+    def test_scale_greyscale(self):
+        """Test scaled decoding of a single component image."""
+        jpg = jpgread(P1_GREY)
+        assert (3, 2) == decode_baseline(jpg, scale=0.5).shape
+        arr = decode_baseline(jpg, scale=1 / 8)
+        assert (1, 1) == arr.shape
+        # Includes the padding in the block
+        assert 5 >= abs(int(arr[0, 0]) - np.mean(GREY_8))
+
+    def test_scale_out(self):
+        """Test scaled decoding to an existing array."""
+        jpg = jpgread(P1_YBR_420)
+        reference = decode_baseline(jpg, scale=0.25, planar=True)
+        out = np.zeros((3, 25, 25), dtype='uint8')
+        decode_baseline(jpg, scale=0.25, planar=True, out=out)
+        assert np.array_equal(reference, out)
+        with pytest.raises(ValueError, match=r"The shape of 'out'"):
+            decode_baseline(jpg, scale=0.5, out=out)
+
+    @pytest.mark.parametrize(
+        "fpath", [P1_A1, P1_GREY, P1_RGB, P1_YBR_420, P1_YBR_422]
+    )
+    @pytest.mark.parametrize("scale", [1, 1 / 2, 3 / 8])
+    def test_region(self, fpath, scale):
+        """Test decoding a region gives the same samples as the image."""
+        jpg = jpgread(fpath)
+        kwargs = {'scale' : scale, 'as_rgb' : jpg.samples == 3}
+        reference = decode_baseline(jpg, **kwargs)
+        rows, columns = reference.shape[:2]
+        regions = [
+            (0, 0, rows, columns),
+            (0, 0, 1, 1),
+            (rows - 1, columns - 1, 1, 1),
+            (rows // 3, columns // 4, rows // 2, columns // 3 + 1),
+            (1, columns // 2, rows - 1, columns - columns // 2),
+        ]
+        for y0, x0, height, width in regions:
+            arr = decode_baseline(
+                jpg, region=(y0, x0, height, width), **kwargs
+            )
+            assert np.array_equal(
+                reference[y0:y0 + height, x0:x0 + width], arr
+            )
+
+    def test_region_restart_intervals(self):
+        """Test intervals outside the region aren't entropy decoded."""
+        jpg = jpgread(P1_A1)
+        reference = decode_baseline(jpg)
+        # A1 has a restart interval every 5 MCUs, with 11 x 9 MCUs of
+        #   24 x 32 samples, so the region needs the first 2 MCU rows
+        scan = jpg.info[jpg.get_keys('SOS')[0]][2]
+        keys = [kk for kk in scan if kk.startswith('ENC')]
+        for key in keys[-10:]:
+            scan[key] = b'\x00'
+
+        arr = decode_baseline(jpg, region=(0, 0, 32, 255))
+        assert np.array_equal(reference[:32], arr)
+        with pytest.raises(ValueError):
+            decode_baseline(jpg)
+
+    def test_region_out(self):
+        """Test decoding a region to an existing array."""
+        jpg = jpgread(P1_YBR_420)
+        reference = decode_baseline(jpg, planar=True)
+        out = np.zeros((3, 20, 30), dtype='uint8')
+        decode_baseline(jpg, planar=True, out=out, region=(10, 20, 20, 30))
+        assert np.array_equal(reference[:, 10:30, 20:50], out)
+
+    @pytest.mark.parametrize(
+        "region",
+        [(0, 0, 0, 1), (-1, 0, 1, 1), (0, 0, 101, 1), (50, 50, 10, 51)]
+    )
+    def test_region_raises(self, region):
+        """Test a region outside the image raises an exception."""
+        msg = r"The region .* isn't within the 100 x 100 image"
+        with pytest.raises(ValueError, match=msg):
+            decode_baseline(jpgread(P1_RGB), region=region)
+
+    @pytest.mark.parametrize(
+        "fpath", [P1_A1, P1_GREY, P1_RGB, P1_YBR_420, P1_YBR_422]
+    )
+    @pytest.mark.parametrize("scale", [1, 1 / 2, 3 / 8])
+    def test_iter(self, fpath, scale):
+        """Test the bands of rows give the same samples as the image."""
+        jpg = jpgread(fpath)
+        kwargs = {'scale' : scale, 'as_rgb' : jpg.samples == 3}
+        reference = decode_baseline(jpg, **kwargs)
+        for band in [1, 2, 100]:
+            bands = list(iter_baseline(jpg, band=band, **kwargs))
+            assert np.array_equal(reference, np.concatenate(bands))
+
+    def test_iter_band_rows(self):
+        """Test the number of rows in each band."""
+        # 4:2:0 so each MCU row is 16 rows of the 100 row image
+        jpg = jpgread(P1_YBR_420)
+        rows = [arr.shape[0] for arr in iter_baseline(jpg)]
+        assert [16] * 6 + [4] == rows
+        rows = [arr.shape[0] for arr in iter_baseline(jpg, band=4)]
+        assert [64, 36] == rows
+        rows = [arr.shape[0] for arr in iter_baseline(jpg, scale=1 / 4)]
+        assert [4] * 6 + [1] == rows
+
+        jpg = jpgread(P1_RGB)
+        rows = [arr.shape[:2] for arr in iter_baseline(jpg, band=5)]
+        assert [(40, 100)] * 2 + [(20, 100)] == rows
+
+    def test_iter_upsample(self):
+        """Test the bands are upsampled the same as the image."""
+        jpg = jpgread(P1_YBR_422)
+        for method in ['fancy', 'nearest']:
+            reference = decode_baseline(jpg, upsample=method)
+            bands = list(iter_baseline(jpg, upsample=method))
+            assert np.array_equal(reference, np.concatenate(bands))
+
+    def test_iter_restart_intervals(self):
+        """Test restart intervals that span MCU rows."""
+        # A1 has a restart interval every 5 MCUs with 11 MCUs per row
+        jpg = jpgread(P1_A1)
+        reference = decode_baseline(jpg)
+        bands = iter_baseline(jpg, band=2)
+        assert np.array_equal(reference[:64], next(bands))
+
+        scan = jpg.info[jpg.get_keys('SOS')[0]][2]
+        keys = [kk for kk in scan if kk.startswith('ENC')]
+        for key in keys[-3:]:
+            del scan[key]
+
+        bands = iter_baseline(jpg, band=2)
+        assert np.array_equal(reference[:64], next(bands))
+        msg = r"The scan is missing entropy-coded data"
+        with pytest.raises(ValueError, match=msg):
+            list(bands)
+
+    @pytest.mark.parametrize("band", [0, -1, 1.5])
+    def test_iter_band_raises(self, band):
+        """Test an invalid band raises an exception."""
+        msg = r"Invalid 'band' value .*, must be a positive integer"
+        with pytest.raises(ValueError, match=msg):
+            next(iter_baseline(jpgread(P1_RGB), band=band))
+
+    def test_in_window(self):
+        """Test finding the restart intervals that overlap the MCUs."""
+        # 10 MCUs per row, MCU rows 2 to 3 and columns 4 to 5
+        rect = (2, 4, 4, 6)
+        assert not _in_window(0, 20, 10, rect)
+        assert _in_window(0, 25, 10, rect)
+        assert not _in_window(20, 4, 10, rect)
+        assert _in_window(20, 5, 10, rect)
+        assert not _in_window(26, 8, 10, rect)
+        assert _in_window(26, 9, 10, rect)
+        # Complete rows in between
+        assert _in_window(17, 30, 10, (2, 3, 9, 10))
+        assert not _in_window(40, 10, 10, rect)
+
+    def test_planes_to_image(self):
+        """Test combining the component planes."""
+        planes = [np.zeros((2, 3), dtype='uint8') + ii for ii in range(3)]
+        arr = _planes_to_image(planes)
+        assert (2, 3, 3) == arr.shape
+        assert [0, 1, 2] == arr[1, 2].tolist()
+        assert (2, 3) == _planes_to_image(planes[:1]).shape
+
+    def test_planes_to_image_planar(self):
+        """Test combining the component planes as planar."""
+        planes = [np.zeros((2, 3), dtype='uint8') + ii for ii in range(3)]
+        arr = _planes_to_image(planes, planar=True, dtype='float32')
+        assert (3, 2, 3) == arr.shape
+        assert 'float32' == arr.dtype
+        assert [0, 1, 2] == arr[:, 1, 2].tolist()
+
+    def test_planar(self):
+        """Test decoding to planar image data."""
+        jpg = jpgread(P1_RGB)
+        reference = decode_baseline(jpg)
+        arr = decode_baseline(jpg, planar=True)
+        assert (3, 100, 100) == arr.shape
+        assert arr.flags.c_contiguous
+        assert np.array_equal(reference, arr.transpose(1, 2, 0))
+        # Single component image data is unaffected
+        grey = decode_baseline(jpgread(P1_GREY), planar=True)
+        assert (5, 4) == grey.shape
+
+    def test_out(self):
+        """Test decoding to an existing array."""
+        jpg = jpgread(P1_RGB)
+        reference = decode_baseline(jpg)
+        volume = np.zeros((3, 100, 100, 3), dtype='uint16')
+        arr = decode_baseline(jpg, out=volume[1])
+        assert np.shares_memory(arr, volume)
+        assert np.array_equal(reference, volume[1])
+        assert 0 == volume[0].max() == volume[2].max()
+
+        # Non-contiguous
+        volume = np.zeros((100, 3, 100, 3), dtype='uint8')
+        decode_baseline(jpg, out=volume[:, 1])
+        assert np.array_equal(reference, volume[:, 1])
+
+    def test_out_buffer(self):
+        """Test decoding to a buffer."""
+        jpg = jpgread(P1_RGB)
+        reference = decode_baseline(jpg, planar=True)
+        buffer = bytearray(2 * 3 * 100 * 100)
+        arr = decode_baseline(jpg, planar=True, out=buffer, dtype='uint16')
+        assert 'uint16' == arr.dtype
+        assert np.array_equal(reference, arr)
+        assert np.array_equal(
+            reference, np.frombuffer(buffer, 'uint16').reshape(3, 100, 100)
+        )
+
+    def test_out_raises(self):
+        """Test decoding to an unsuitable output raises an exception."""
+        jpg = jpgread(P1_RGB)
+        msg = r"The shape of 'out', \(100, 100\), doesn't match"
+        with pytest.raises(ValueError, match=msg):
+            decode_baseline(jpg, out=np.zeros((100, 100), dtype='uint8'))
+
+        msg = r"The size of 'out', 100 bytes, doesn't match the size of"
+        with pytest.raises(ValueError, match=msg):
+            decode_baseline(jpg, out=bytearray(100))
+
+        msg = r"'out' must be writable"
+        with pytest.raises(ValueError, match=msg):
+            decode_baseline(jpg, out=bytes(30000))
+
+    @pytest.mark.parametrize(
+        "fpath,data", REFERENCE_DATA['p2'] + REFERENCE_DATA['p4']
+    )
+    def test_extended(self, fpath, data):
+        """Test decoding Process 2 and 4 JPEGs."""
+        jpg = jpgread(fpath)
+        arr = decode_baseline(jpg)
+        assert data[:2] == arr.shape[:2]
+        dtype = 'uint8' if data[3] == 8 else 'uint16'
+        assert dtype == arr.dtype
+        assert (1 << data[3]) > arr.max()
+
+    def test_extended_12(self):
+        """Test decoding 12-bit samples."""
+        arr = decode_baseline(jpgread(P4_GREY))
+        assert (5, 4) == arr.shape
+        assert 'uint16' == arr.dtype
+        assert 4094 <= arr[0, 0] <= 4095
+        assert 1 >= arr[1, 2]
+
+        # 16-bit quantisation tables and 4 DC and AC tables
+        jpg = jpgread(P4_E1)
+        dqt = jpg.info[jpg.get_keys('DQT')[0]][2]
+        assert [1, 1, 1, 1] == dqt['Pq']
+        assert 255 < max(max(table) for table in dqt['Qk'])
+        arr = decode_baseline(jpg)
+        assert (257, 255, 4) == arr.shape
+        assert 'uint16' == arr.dtype
+
+    def test_extended_12_out(self):
+        """Test decoding 12-bit samples to an existing output."""
+        jpg = jpgread(P4_GREY)
+        reference = decode_baseline(jpg)
+        arr = decode_baseline(jpg, dtype='int32')
+        assert 'int32' == arr.dtype
+        assert np.array_equal(reference, arr)
+
+        volume = np.zeros((2, 5, 4), dtype='uint16')
+        decode_baseline(jpg, out=volume[1])
+        assert np.array_equal(reference, volume[1])
+
+    def test_get_output(self):
+        """Test get_output()."""
+        out = np.zeros((2, 3), dtype='uint16')
+        assert out is get_output(out, (2, 3))
+        assert out is get_output(out, (2, 3), dtype='uint16')
+        msg = r"The dtype of 'out', uint16, doesn't match 'dtype', uint8"
+        with pytest.raises(ValueError, match=msg):
+            get_output(out, (2, 3), dtype='uint8')
+
+        arr = get_output(memoryview(bytearray(12)), (2, 3), dtype='uint16')
+        assert (2, 3) == arr.shape
+        assert 'uint16' == arr.dtype
+
+        msg = r"'out' must be a numpy ndarray or support the buffer protocol"
+        with pytest.raises(TypeError, match=msg):
+            get_output([0] * 6, (2, 3))
+
+
+def _predict_reference(samples, predictor, precision, interval_rows=None,
+                       restart_interval=None):
+    """Return the differences for `samples` using the Table H.1 predictors."""
+    rows, columns = samples.shape
+    interval = restart_interval or (interval_rows or rows) * columns
+    samples = samples.astype(np.int64)
+    differences = np.zeros_like(samples)
+    for row in range(rows):
+        # The columns where restart intervals start on the row
+        starts = [
+            ii - row * columns
+            for ii in range(row * columns, (row + 1) * columns)
+            if ii % interval == 0
+        ]
+        for col in range(columns):
+            if col in starts:
+                prediction = 1 << (precision - 1)
+            elif starts and col > starts[0]:
+                prediction = samples[row, col - 1]
+            elif col == 0:
+                prediction = samples[row - 1, col]
+            else:
+                ra = samples[row, col - 1]
+                rb = samples[row - 1, col]
+                rc = samples[row - 1, col - 1]
+                prediction = {
+                    1: ra,
+                    2: rb,
+                    3: rc,
+                    4: ra + rb - rc,
+                    5: ra + ((rb - rc) >> 1),
+                    6: rb + ((ra - rc) >> 1),
+                    7: (ra + rb) >> 1,
+                }[predictor]
+
+            differences[row, col] = (samples[row, col] - prediction) % 65536
+
+    return differences
+
+
+class TestDecodeLossless(object):
+    """Tests for lossless.decode_lossless."""
+    def test_decode(self):
+        """Test decoding a lossless RGB JPEG."""
+        arr = decode_lossless(jpgread(P14_RGB))
+        assert (100, 100, 3) == arr.shape
+        assert 'uint8' == arr.dtype
+        for row, rgb in SC_RGB.items():
+            assert rgb == arr[row, 50].tolist()
+
+    def test_decode_16(self):
+        """Test the dtype of 16-bit image data."""
+        jpg = jpgread(os.path.join(CPROCESS14, 'O2.JPG'))
+        arr = decode_lossless(jpg, upsample='nearest')
+        assert (257, 255, 4) == arr.shape
+        assert 'uint16' == arr.dtype
+        # D has the full number of rows and a third of the columns
+        ref = np.fromfile(os.path.join(CPROCESS14, 'D16.SRC'), '>u2')
+        assert np.array_equal(ref.reshape(257, 85), arr[:, ::3, 3])
+
+    @pytest.mark.parametrize("predictor", range(1, 8))
+    def test_reconstruct(self, predictor):
+        """Test reconstructing the samples with each predictor."""
+        rng = np.random.RandomState(predictor)
+        samples = rng.randint(0, 4096, size=(12, 9))
+        for interval_rows in (None, 1, 4, 5):
+            differences = _predict_reference(
+                samples, predictor, 12, interval_rows or 12
+            )
+            arr = _reconstruct(differences, predictor, 12, 0, interval_rows)
+            assert np.array_equal(samples, arr)
+
+    @pytest.mark.parametrize("predictor", range(1, 8))
+    def test_reconstruct_restarts(self, predictor):
+        """Test reconstructing intervals that start part way along a row."""
+        rng = np.random.RandomState(predictor)
+        samples = rng.randint(0, 4096, size=(12, 9))
+        for restart_interval in (4, 13, 20):
+            differences = _predict_reference(
+                samples, predictor, 12, restart_interval=restart_interval
+            )
+            restarts = np.divmod(np.arange(0, 108, restart_interval), 9)
+            arr = _reconstruct(differences, predictor, 12, restarts=restarts)
+            assert np.array_equal(samples, arr)
+
+    def test_reconstruct_point_transform(self):
+        """Test reconstructing the samples with a point transform."""
+        samples = np.arange(40).reshape(5, 8) * 3
+        differences = _predict_reference(samples, 7, 12 - 2, 5)
+        arr = _reconstruct(differences, 7, 12, point_transform=2)
+        assert np.array_equal(samples << 2, arr)
+
+    def test_decode_differences(self):
+        """Test decoding pairs of differences gives the same result."""
+        jpg = jpgread(P14_RGB)
+        frame = jpg._index.frame
+        info = jpg.info[jpg.get_keys('DHT')[0]][2]
+        bits, huffval = info['Li'][0], info['Vij'][0]
+        unit = (
+            (_get_huffman_table(bits, huffval, {}), )
+            + _get_difference_tables(bits, huffval, {})
+        )
+        scan = jpg.info[jpg.get_keys('SOS')[0]][2]
+        data = [scan[kk] for kk in scan if kk.startswith('ENC')][0]
+        data = _get_scan_data(data)
+        nr_mcus = frame['X'] * frame['Y']
+        # Only the same table for every sample uses pairs
+        pairs = _decode_differences(data, [unit] * 3, nr_mcus)
+        units = [unit, unit[:1] + unit[1:], unit[:2] + unit[2:]]
+        singles = _decode_differences(data, units, nr_mcus)
+        assert 3 * nr_mcus == len(pairs)
+        assert np.array_equal(pairs, singles)
+
+    def test_decode_lanes(self):
+        """Test decoding the differences in lanes gives the same result."""
+        jpg = jpgread(P14_RGB)
+        frame = jpg._index.frame
+        info = jpg.info[jpg.get_keys('DHT')[0]][2]
+        bits, huffval = info['Li'][0], info['Vij'][0]
+        unit = (
+            (_get_huffman_table(bits, huffval, {}), )
+            + _get_difference_tables(bits, huffval, {})
+        )
+        lanes = unit[3]
+        scan = jpg.info[jpg.get_keys('SOS')[0]][2]
+        data = [scan[kk] for kk in scan if kk.startswith('ENC')][0]
+        data = _get_scan_data(data)
+        nr_mcus = frame['X'] * frame['Y']
+        reference = _decode_differences(data, [unit] * 3, nr_mcus)
+        arr = _decode_lanes([(data, nr_mcus)], lanes, 3)
+        assert 'int32' == arr.dtype
+        assert np.array_equal(reference, arr)
+
+        # Multiple intervals, shorter than a lane and with unused samples
+        segments = [(data, nr_mcus), (data[:16], 2), (data, 1000)]
+        arr = _decode_lanes(segments, lanes, 3)
+        assert np.array_equal(
+            np.concatenate([reference, reference[:6], reference[:3000]]), arr
+        )
+
+        # Truncated data and invalid codes
+        assert _decode_lanes([(data[:-100], nr_mcus)], lanes, 3) is None
+        assert _decode_lanes([(b'\xFF' * 100, 10)], lanes, 3) is None
+        msg = r"Invalid Huffman code in the encoded data"
+        with pytest.raises(ValueError, match=msg):
+            _decode_differences(b'\xFF' * 100, [unit] * 3, 10)
+
+    def test_decode_restarts(self):
+        """Test decoding intervals that start part way along a row."""
+        arr = decode_lossless(jpgread(P14_RGB_RST))
+        reference = decode_lossless(jpgread(P14_RGB))
+        # The sample before each interval that starts part way along a row
+        #   is 128
+        rows, columns = np.divmod(np.arange(30, 10000, 30), 100)
+        rows, columns = rows[columns > 0], columns[columns > 0] - 1
+        reference[rows, columns] = 128
+        assert np.array_equal(reference, arr)
+
+    def test_region(self):
+        """Test decoding a region."""
+        jpg = jpgread(P14_RGB)
+        arr = decode_lossless(jpg, region=(10, 20, 30, 40))
+        assert np.array_equal(decode_lossless(jpg)[10:40, 20:60], arr)
+
+    def test_out(self):
+        """Test decoding to an output array."""
+        jpg = jpgread(P14_RGB)
+        out = np.zeros((3, 100, 100), dtype='uint16')
+        arr = decode_lossless(jpg, planar=True, out=out)
+        assert np.shares_memory(arr, out)
+        assert [255, 0, 0] == out[:, 5, 50].tolist()
+
+    def test_scale_raises(self):
+        """Test scaled decoding raises."""
+        msg = r"Scaled decoding isn't available for lossless JPEGs"
+        with pytest.raises(NotImplementedError, match=msg):
+            decode_lossless(jpgread(P14_RGB), scale=0.5)
+
+    def test_truncated_raises(self):
+        """Test decoding truncated entropy-coded data raises."""
+        jpg = jpgread(P14_RGB)
+        scan = jpg.info[jpg.get_keys('SOS')[0]][2]
+        key = [kk for kk in scan if kk.startswith('ENC')][0]
+        scan[key] = scan[key][:len(scan[key]) // 2]
+        msg = r"The encoded data ended before all the MCUs were decoded"
+        with pytest.raises(ValueError, match=msg):
+            decode_lossless(jpg)
+
+
+class TestDecodeProgressive(object):
+    """Tests for progressive.decode_progressive."""
+    @pytest.mark.parametrize("fpath,reference", PROGRESSIVE_PAIRS)
+    def test_coefficients(self, fpath, reference):
+        """Test the coefficients match the sequential JPEG."""
+        components = _decode_progressive_coefficients(jpgread(fpath))
+        references = _decode_coefficients(jpgread(reference))
+        for component, ref in zip(components.values(), references.values()):
+            assert 'int16' == component['coefficients'].dtype
+            assert np.array_equal(
+                ref['coefficients'], component['coefficients']
+            )
+            assert np.array_equal(ref['Qk'], component['Qk'])
+
+    @pytest.mark.parametrize("fpath,reference", PROGRESSIVE_PAIRS)
+    def test_decode(self, fpath, reference):
+        """Test decoding gives the same image data as the sequential JPEG."""
+        arr = decode_progressive(jpgread(fpath))
+        assert np.array_equal(decode_baseline(jpgread(reference)), arr)
+
+    def test_rgb(self):
+        """Test decoding to RGB."""
+        arr = decode_progressive(jpgread(P10_RGB), as_rgb=True)
+        for row, rgb in SC_RGB.items():
+            diff = np.abs(arr[row, 50].astype('int') - rgb)
+            assert 5 >= diff.max()
+
+    def test_scale_region(self):
+        """Test scaled and region decoding."""
+        jpg = jpgread(P10_RGB)
+        reference = jpgread(PROGRESSIVE_PAIRS[1][1])
+        arr = decode_progressive(jpg, scale=0.25)
+        assert (25, 25, 3) == arr.shape
+        assert np.array_equal(decode_baseline(reference, scale=0.25), arr)
+
+        arr = decode_progressive(jpg, region=(10, 20, 30, 40))
+        assert np.array_equal(decode_progressive(jpg)[10:40, 20:60], arr)
+
+    def test_out(self):
+        """Test decoding to an output array."""
+        jpg = jpgread(P10_RGB)
+        reference = decode_progressive(jpg, planar=True)
+        out = np.zeros((2, 3, 100, 100), dtype='uint8')
+        arr = decode_progressive(jpg, planar=True, out=out[1])
+        assert np.shares_memory(arr, out)
+        assert np.array_equal(reference, out[1])
+
+    def test_release(self):
+        """Test releasing the encoded data of each scan once decoded."""
+        jpg = jpgread(P10_RGB)
+        reference = decode_progressive(jpgread(P10_RGB))
+        assert np.array_equal(reference, decode_progressive(jpg, release=True))
+        for key in jpg.get_keys('SOS'):
+            assert not [kk for kk in jpg.info[key][2] if 'ENC' in kk]
+
+    def test_invalid_scan_raises(self):
+        """Test decoding invalid progression parameters raises."""
+        jpg = jpgread(P10_RGB)
+        scan = jpg.info[jpg.get_keys('SOS')[1]][2]
+        scan['Ss'], scan['Se'] = 5, 1
+        msg = r"The scan has invalid progression parameters: Ss 5, Se 1"
+        with pytest.raises(ValueError, match=msg):
+            decode_progressive(jpg)
+
+        jpg = jpgread(P10_RGB)
+        scan = jpg.info[jpg.get_keys('SOS')[0]][2]
+        scan['Ss'], scan['Se'] = 1, 5
+        msg = r"AC scans of progressive JPEGs must contain a single component"
+        with pytest.raises(ValueError, match=msg):
+            decode_progressive(jpg)
+
+    def test_truncated_raises(self):
+        """Test decoding truncated entropy-coded data raises."""
+        jpg = jpgread(P10_RGB)
+        scan = jpg.info[jpg.get_keys('SOS')[-1]][2]
+        key = [kk for kk in scan if kk.startswith('ENC')][0]
+        scan[key] = scan[key][:len(scan[key]) // 4]
+        msg = r"The encoded data ended before all the MCUs were decoded"
+        with pytest.raises(ValueError, match=msg):
+            decode_progressive(jpg)
+
+    def test_missing_interval_raises(self):
+        """Test decoding a scan with a missing restart interval raises."""
+        jpg = jpgread(P10_RGB_RST)
+        scan = jpg.info[jpg.get_keys('SOS')[0]][2]
+        del scan[[kk for kk in scan if kk.startswith('ENC')][-1]]
+        msg = r"The scan is missing entropy-coded data for one or more"
+        with pytest.raises(ValueError, match=msg):
+            decode_progressive(jpg)
+
+
+class TestIterProgressive(object):
+    """Tests for progressive.iter_progressive."""
+    @pytest.mark.parametrize("fpath", [P10_GREY, P10_RGB, P10_RGB_RST])
+    def test_iter(self, fpath):
+        """Test an image is yielded after each scan."""
+        jpg = jpgread(fpath)
+        images = list(iter_progressive(jpg))
+        assert len(jpg.get_keys('SOS')) == len(images)
+        assert np.array_equal(decode_progressive(jpg), images[-1])
+        # Each scan improves the image
+        reference = images[-1].astype('int')
+        errors = [np.abs(arr - reference).mean() for arr in images]
+        assert errors == sorted(errors, reverse=True)
+
+    def test_scans(self):
+        """Test yielding an image after a group of scans."""
+        jpg = jpgread(P10_RGB)
+        images = list(iter_progressive(jpg))
+        grouped = list(iter_progressive(jpg, scans=4))
+        assert 3 == len(grouped)
+        for arr, reference in zip(grouped, images[3::4] + images[-1:]):
+            assert np.array_equal(reference, arr)
+
+        assert 1 == len(list(iter_progressive(jpg, scans=20)))
+
+    def test_scale_rgb(self):
+        """Test yielding scaled RGB image data."""
+        jpg = jpgread(P10_RGB)
+        images = list(iter_progressive(jpg, as_rgb=True, scale=0.125))
+        assert all((13, 13, 3) == arr.shape for arr in images)
+        assert np.array_equal(
+            decode_progressive(jpg, as_rgb=True, scale=0.125), images[-1]
+        )
+
+    def test_component_not_decoded(self):
+        """Test components without any decoded scans are mid-range."""
+        jpg = jpgread(P10_RGB)
+        # Remove the DC first scan, so the next scan is component 1 only
+        del jpg.info[jpg.get_keys('SOS')[0]]
+        jpg._index = MarkerIndex(jpg.info)
+        arr = next(iter_progressive(jpg))
+        assert (arr[..., 1:] == 128).all()
+        assert not (arr[..., 0] == 128).all()
+
+    def test_incomplete(self):
+        """Test iterating over the complete scans of a partial JPEG."""
+        with open(P10_RGB_RST, 'rb') as fp:
+            data = fp.read()
+
+        images = list(iter_progressive(jpgparse(data)))
+        for length in [len(data) // 3, len(data) // 2, len(data) - 2]:
+            jpg = jpgparse(data[:length], incomplete=True)
+            nr_scans = len(jpg.get_keys('SOS'))
+            partial = list(iter_progressive(jpg))
+            assert 0 < nr_scans == len(partial)
+            assert np.array_equal(images[nr_scans - 1], partial[-1])
+
+    def test_no_scans(self):
+        """Test nothing is yielded if there are no complete scans."""
+        with open(P10_RGB, 'rb') as fp:
+            data = fp.read()
+
+        jpg = jpgparse(data[:data.index(b'\xff\xda') + 20], incomplete=True)
+        assert [] == jpg.get_keys('SOS')
+        assert [] == list(iter_progressive(jpg))
+
+    def test_scans_raises(self):
+        """Test an invalid number of scans raises."""
+        msg = r"Invalid 'scans' value 0, must be a positive integer"
+        with pytest.raises(ValueError, match=msg):
+            next(iter_progressive(jpgread(P10_RGB), scans=0))
+
+
+class TestDecodeArithmetic(object):
+    """Tests for decoding arithmetic coded JPEGs."""
+    @pytest.mark.parametrize("fpath,reference", ARITHMETIC_PAIRS)
+    def test_coefficients(self, fpath, reference):
+        """Test the coefficients match the Huffman coded JPEG."""
+        components = _decode_progressive_coefficients(jpgread(fpath))
+        references = _decode_coefficients(jpgread(reference))
+        for component, ref in zip(components.values(), references.values()):
+            assert np.array_equal(
+                ref['coefficients'], component['coefficients']
+            )
+
+    @pytest.mark.parametrize("fpath,reference", ARITHMETIC_PAIRS[:2])
+    def test_decode(self, fpath, reference):
+        """Test decoding gives the same image data as the Huffman JPEG."""
+        arr = decode_progressive(jpgread(fpath))
+        assert np.array_equal(decode_baseline(jpgread(reference)), arr)
+
+    def test_iter_progressive(self):
+        """Test the image after each scan matches the Huffman JPEG."""
+        images = list(iter_progressive(jpgread(P11_RGB)))
+        references = list(iter_progressive(jpgread(P10_RGB)))
+        assert 10 == len(images) == len(references)
+        for arr, reference in zip(images, references):
+            assert np.array_equal(reference, arr)
+
+    @pytest.mark.parametrize(
+        "fpath", [fpath for fpath, _ in REFERENCE_DATA['p15'][:2]]
+    )
+    def test_lossless(self, fpath):
+        """Test decoding lossless JPEGs."""
+        arr = decode_lossless(jpgread(fpath), upsample='nearest')
+        reference = jpgread(os.path.join(CPROCESS14, 'O1.JPG'))
+        assert np.array_equal(
+            decode_lossless(reference, upsample='nearest'), arr
+        )
+
+    def test_lossless_16(self):
+        """Test decoding a 16-bit lossless JPEG."""
+        jpg = jpgread(os.path.join(DPROCESS15, 'O2_arith_16.jpg'))
+        arr = decode_lossless(jpg)
+        assert 'uint16' == arr.dtype
+        planes = _decode_lossless_planes(
+            jpgread(os.path.join(CPROCESS14, 'O2.JPG'))
+        )
+        assert np.array_equal(planes[0], arr)
+
+    def test_lossless_rgb(self):
+        """Test decoding an interleaved lossless RGB JPEG."""
+        jpg = jpgread(os.path.join(DPROCESS15, 'SC_rgb_arith.jpg'))
+        arr = decode_lossless(jpg)
+        assert np.array_equal(decode_lossless(jpgread(P14_RGB)), arr)
+
+    def test_lossless_restarts(self):
+        """Test decoding intervals that start part way along a row."""
+        arr = decode_lossless(jpgread(P15_RGB_RST))
+        reference = decode_lossless(jpgread(P14_RGB))
+        rows, columns = np.divmod(np.arange(250, 10000, 250), 100)
+        rows, columns = rows[columns > 0], columns[columns > 0] - 1
+        reference[rows, columns] = 128
+        assert np.array_equal(reference, arr)
+
+    def test_conditioning_raises(self):
+        """Test invalid DC conditioning raises."""
+        jpg = jpgread(ARITHMETIC_PAIRS[1][0])
+        jpg.info[jpg.get_keys('DAC')[0]][2]['Cs'][0] = 0x25
+        msg = r"Invalid arithmetic coding conditioning for a DC or lossless"
+        with pytest.raises(ValueError, match=msg):
+            decode_progressive(jpg)
+
+    def test_missing_interval_raises(self):
+        """Test decoding a scan with a missing restart interval raises."""
+        jpg = jpgread(P11_RGB_RST)
+        scan = jpg.info[jpg.get_keys('SOS')[0]][2]
+        del scan[[kk for kk in scan if kk.startswith('ENC')][-1]]
+        msg = r"The scan is missing entropy-coded data for one or more"
+        with pytest.raises(ValueError, match=msg):
+            decode_progressive(jpg)
+
+    def test_magnitude(self):
+        """Test decoding the magnitude of a difference from its bins."""
+        def decoder(decisions):
+            decisions = iter(decisions)
+            bins = []
+
+            def decode(st, index):
+                bins.append(index)
+                return next(decisions)
+
+            return decode, bins
+
+        decode, bins = decoder([0])
+        assert (0, 0) == _decode_magnitude(decode, None, 3, 20)
+        assert [3] == bins
+        # Magnitude category 4, then the M bits 0 and 1
+        decode, bins = decoder([1, 1, 1, 0, 0, 1])
+        assert (4, 5) == _decode_magnitude(decode, None, 2, 100)
+        assert [2, 100, 101, 102, 116, 116] == bins
+
+    def test_magnitude_raises(self):
+        """Test an invalid magnitude category raises an exception."""
+        msg = r"Invalid difference in the encoded data"
+        with pytest.raises(ValueError, match=msg):
+            _decode_magnitude(lambda st, index: 1, None, 2, 20)
+
+
+class TestColour(object):
+    """Tests for the decoders.colour module."""
+    def test_upsample_nearest(self):
+        """Test upsampling by sample replication."""
+        plane = np.asarray([[0, 100], [200, 255]], dtype='uint8')
+        arr = upsample(plane, (4, 3), 1, 2, 2, 3, method='nearest')
+        assert (4, 3) == arr.shape
+        assert 'uint8' == arr.dtype
+        assert [0, 0, 100] == arr[0].tolist()
+        assert [0, 0, 100] == arr[1].tolist()
+        assert [200, 200, 255] == arr[3].tolist()
+
+    def test_upsample_fancy(self):
+        """Test upsampling by triangle interpolation."""
+        plane = np.asarray([[0, 100]], dtype='uint8')
+        # h2v1, the same as libjpeg
+        arr = upsample(plane, (1, 4), 1, 1, 1, 2)
+        assert [[0, 25, 75, 100]] == arr.tolist()
+        # h2v2
+        plane = np.asarray([[0, 160], [160, 0]], dtype='uint8')
+        arr = upsample(plane, (4, 4), 1, 2, 1, 2)
+        assert [0, 40, 120, 160] == arr[0].tolist()
+        assert [40, 60, 100, 120] == arr[1].tolist()
+        assert np.array_equal(arr, arr[::-1, ::-1].T)
+
+    def test_upsample_fancy_ratio(self):
+        """Test triangle interpolation with a non-integer ratio."""
+        plane = np.asarray([[0, 120, 240]], dtype='uint8')
+        arr = upsample(plane, (1, 4), 1, 1, 3, 4)
+        assert [[0, 75, 165, 240]] == arr.tolist()
+
+    def test_upsample_odd(self):
+        """Test upsampling to an odd size."""
+        plane = np.arange(9, dtype='uint8').reshape(3, 3)
+        for method, last in (('fancy', 7), ('nearest', 8)):
+            arr = upsample(plane, (5, 5), 1, 2, 1, 2, method=method)
+            assert (5, 5) == arr.shape
+            assert 0 == arr[0, 0]
+            assert last == arr[4, 4]
+
+    def test_ycbcr_to_rgb(self):
+        """Test converting YCbCr to RGB."""
+        ycbcr = np.asarray(
+            [[128, 128, 128], [76, 85, 255], [150, 44, 21], [255, 128, 128]],
+            dtype='uint8'
+        )
+        rgb = ycbcr_to_rgb([ycbcr[:, ii] for ii in range(3)])
+        assert all('uint8' == arr.dtype for arr in rgb)
+        rgb = np.stack(rgb, axis=-1)
+        assert [128, 128, 128] == rgb[0].tolist()
+        assert 1 >= np.abs(rgb[1].astype('int') - [254, 0, 0]).max()
+        assert 1 >= np.abs(rgb[2].astype('int') - [0, 255, 1]).max()
+        assert [255, 255, 255] == rgb[3].tolist()
+
+    def test_ycbcr_to_rgb_12(self):
+        """Test converting 12-bit YCbCr to RGB."""
+        planes = [np.asarray([4095], dtype='uint16') for ii in range(3)]
+        rgb = ycbcr_to_rgb(planes, precision=12)
+        assert [4095, 1929, 4095] == [int(arr[0]) for arr in rgb]
+
+    def test_ycbcr_to_rgb_16(self):
+        """Test converting 16-bit YCbCr to RGB doesn't overflow."""
+        planes = [
+            np.asarray([32768, 32768, 0], dtype='uint16'),
+            np.asarray([65535, 32768, 32768], dtype='uint16'),
+            np.asarray([32768, 65535, 32768], dtype='uint16'),
+        ]
+        rgb = ycbcr_to_rgb(planes, precision=16)
+        assert all('uint16' == arr.dtype for arr in rgb)
+        rgb = np.stack(rgb, axis=-1)
+        assert [32768, 21491, 65535] == rgb[0].tolist()
+        assert [65535, 9368, 32768] == rgb[1].tolist()
+        assert [0, 0, 0] == rgb[2].tolist()
+
+    def test_ycbcr_to_rgb_raises(self):
+        """Test converting with the wrong number of planes."""
+        msg = r"Conversion from YCbCr to RGB requires 3 components"
+        with pytest.raises(ValueError, match=msg):
+            ycbcr_to_rgb([np.zeros((2, 2), dtype='uint8')])
@@ -1,10 +1,20 @@
 """Tests for pydcmjpeg.fileio module."""
 
+from io import BytesIO
 import os
 
+import numpy as np
 import pytest
 
-from pydcmjpeg.fileio import jpgread
+from pydcmjpeg import fileio
+from pydcmjpeg.fileio import (
+    decode_frames, jpginfo, jpgmap, jpgparse, jpgread, parse_buffer,
+    parse_jpg, _find_scan_end, _split_scan
+)
+from pydcmjpeg.decoders.jpeg_decoders import _get_scan_data
+from pydcmjpeg.jpeg import JPEG
+
+from ._common import REFERENCE_DATA
 
 
 COMPL_DIR = os.path.abspath(
@@ -24,6 +34,19 @@ PROCESS01_DREF_B8  = os.path.join(C10918_PROCESS01, 'DREF_B8.DCT')
 PROCESS01_DREF_C8  = os.path.join(C10918_PROCESS01, 'DREF_C8.DCT')
 PROCESS01_DREF_D8  = os.path.join(C10918_PROCESS01, 'DREF_D8.DCT')
 
+D10918_PROCESS01 = os.path.abspath(
+    os.path.join(
+        os.path.dirname(__file__), '../', 'data', 'images', '10918',
+        'process_01'
+    )
+)
+# 8 x 16 x 3
+PROCESS01_HUFF = os.path.join(D10918_PROCESS01, 'huff_simple0.jpg')
+# 100 x 100 x 3
+PROCESS01_RGB = os.path.join(D10918_PROCESS01, 'SC_rgb_jpeg_dcmtk.jpg')
+# 5 x 4
+PROCESS01_GREY = os.path.join(D10918_PROCESS01, 'grey_8.jpg')
+
 
 class TestJPGRead(object):
     def setup(self):
@@ -42,5 +65,467 @@ class TestJPGRead(object):
         jpgread(PROCESS01_B2)
 
 
+class TestJPGMap(object):
+    """Tests for fileio.jpgmap."""
+    def test_map(self):
+        """Test mapping a file."""
+        jpg = jpgmap(PROCESS01_A1)
+        assert isinstance(jpg, JPEG)
+        assert 257 == jpg.rows
+        assert 255 == jpg.columns
+
+    def test_read_only(self):
+        """Test the file is mapped read-only."""
+        jpg = jpgmap(PROCESS01_A1)
+        with pytest.raises(TypeError):
+            jpg._fp[0] = 0
+
+    def test_scan_data_matches_read(self):
+        """Test the mapped scan data is the same as when read."""
+        jpg = jpgmap(PROCESS01_B2)
+        with open(PROCESS01_B2, 'rb') as fp:
+            info = parse_jpg(fp)
+
+        assert list(info.keys()) == list(jpg.info.keys())
+        for key in jpg.get_keys('SOS'):
+            scan = jpg.info[key][2]
+            assert list(info[key][2].keys()) == list(scan.keys())
+            for enc_key in [kk for kk in scan if 'ENC' in kk]:
+                view = scan[enc_key]
+                assert isinstance(view, memoryview)
+                assert info[key][2][enc_key] == view
+
+
+class TestJPGParse(object):
+    """Tests for fileio.jpgparse and fileio.parse_buffer."""
+    @pytest.mark.parametrize(
+        "fpath", [fpath for fpath, _ in REFERENCE_DATA['p1']]
+    )
+    def test_matches_parse_jpg(self, fpath):
+        """Test parsing a buffer is the same as parsing the file."""
+        with open(fpath, 'rb') as fp:
+            data = fp.read()
+            fp.seek(0)
+            info = parse_jpg(fp)
+
+        for buf in [data, bytearray(data), memoryview(data)]:
+            assert info == parse_buffer(buf)
+
+    def test_no_copy(self):
+        """Test the scan data is a view when not copying."""
+        with open(PROCESS01_B2, 'rb') as fp:
+            data = fp.read()
+            fp.seek(0)
+            info = parse_jpg(fp)
+
+        jpg = jpgparse(data, copy=False)
+        assert isinstance(jpg, JPEG)
+        assert data is jpg._fp
+        for key in jpg.get_keys('SOS'):
+            scan = jpg.info[key][2]
+            for enc_key in [kk for kk in scan if 'ENC' in kk]:
+                assert isinstance(scan[enc_key], memoryview)
+                assert scan[enc_key].obj is data
+                assert info[key][2][enc_key] == scan[enc_key]
+
+    def test_copy(self):
+        """Test the scan data is a view of a single copy of the buffer."""
+        with open(PROCESS01_B2, 'rb') as fp:
+            buf = bytearray(fp.read())
+
+        jpg = jpgparse(buf)
+        scan = jpg.info[jpg.get_keys('SOS')[0]][2]
+        views = [scan[kk] for kk in scan if kk.startswith('ENC')]
+        assert len({id(view.obj) for view in views}) == 1
+        assert views[0].obj is not buf
+        # The byte stuffing is left in place until decoded
+        assert [view for view in views if b'\xff\x00' in bytes(view)]
+        data = bytes(views[0])
+        buf[:] = bytes(len(buf))
+        assert data == views[0]
+
+    def test_decode(self):
+        """Test decoding the parsed JPEG."""
+        with open(PROCESS01_RGB, 'rb') as fp:
+            data = fp.read()
+
+        arr = jpgparse(data).decode()
+        assert np.array_equal(jpgread(PROCESS01_RGB).decode(), arr)
+        assert np.array_equal(arr, jpgparse(data, copy=False).decode())
+
+    def test_fill_bytes(self):
+        """Test fill bytes before markers."""
+        with open(PROCESS01_GREY, 'rb') as fp:
+            data = fp.read()
+
+        # Fill bytes before SOI and the first marker after SOI
+        info = parse_buffer(b'\xff\xff' + data[:2] + b'\xff\xff' + data[2:])
+        keys = list(info.keys())
+        assert 'SOI@2' == keys[0]
+        assert 2 == info[keys[0]][1]
+        assert 2 == info[keys[1]][1]
+        assert keys[1].endswith('@6')
+
+    def test_not_jpeg_raises(self):
+        """Test parsing data that isn't a JPEG raises an exception."""
+        with pytest.raises(ValueError, match=r"File is not JPEG"):
+            parse_buffer(b'\x00\xff\xd8')
+
+        with pytest.raises(ValueError, match=r"File is not JPEG"):
+            parse_buffer(b'')
+
+        with pytest.raises(ValueError, match=r"No SOI or SOC marker found"):
+            parse_buffer(b'\xff\xd9')
+
+    def test_truncated_raises(self):
+        """Test parsing truncated data raises an exception."""
+        with open(PROCESS01_GREY, 'rb') as fp:
+            data = fp.read()
+
+        msg = r"before the end of the APP0 marker segment at offset 2"
+        with pytest.raises(ValueError, match=msg):
+            parse_buffer(data[:10])
+
+        with pytest.raises(ValueError, match=msg):
+            parse_buffer(data[:5])
+
+        msg = r"The end of the file was reached before the end of the scan"
+        with pytest.raises(ValueError, match=msg):
+            parse_buffer(data[:-2])
+
+        msg = r"The end of the data was reached before the EOI marker"
+        with pytest.raises(ValueError, match=msg):
+            parse_buffer(data[:2])
+
+
+    def test_incomplete(self):
+        """Test parsing the start of a JPEG."""
+        fpath = REFERENCE_DATA['p10'][3][0]
+        with open(fpath, 'rb') as fp:
+            data = fp.read()
+
+        info = parse_buffer(data)
+        scans = [kk for kk in info if kk.startswith('SOS')]
+        assert info == parse_buffer(data, incomplete=True)
+
+        # Ends within the third scan, after a restart marker
+        offset = int(scans[2].split('@')[1])
+        rst = [kk for kk in info[scans[2]][2] if kk.startswith('RST')]
+        end = int(rst[0].split('@')[1]) + 2
+        partial = parse_buffer(data[:end], incomplete=True)
+        assert list(info)[:list(info).index(scans[2])] == list(partial)
+        for length in [offset, offset + 1, offset + 4, end]:
+            assert partial == parse_buffer(data[:length], incomplete=True)
+
+        # Ends within the SOS marker segment of the third scan
+        partial = parse_buffer(data[:offset + 2], incomplete=True)
+        assert scans[:2] == [kk for kk in partial if kk.startswith('SOS')]
+
+        jpg = jpgparse(data[:end], incomplete=True)
+        assert 2 == len(jpg.get_keys('SOS'))
+        assert 'EOI' not in jpg.markers
+
+    def test_incomplete_no_frame_raises(self):
+        """Test parsing the start of a JPEG before the frame header."""
+        with open(PROCESS01_A1, 'rb') as fp:
+            data = fp.read()
+
+        info = parse_buffer(data, headers_only=True)
+        sof = [kk for kk in info if kk.startswith('SOF')][0]
+        offset = int(sof.split('@')[1])
+        msg = r"Unable to parse the JPEG as no frame header has been received"
+        for length in [1, 2, offset, offset + 4]:
+            with pytest.raises(ValueError, match=msg):
+                jpgparse(data[:length], incomplete=True)
+
+        jpg = jpgparse(data[:offset + 2 + info[sof][2]['Lf']], incomplete=True)
+        assert (257, 255) == (jpg.rows, jpg.columns)
+
+
+class TestJPGInfo(object):
+    """Tests for fileio.jpginfo and parsing only the headers."""
+    @pytest.mark.parametrize("fpath,data", REFERENCE_DATA['p1'])
+    def test_properties(self, fpath, data):
+        """Test the properties match a full parse."""
+        jpg = jpginfo(fpath)
+        assert not jpg.is_parsed
+        assert 'SOS' == jpg.markers[-1]
+        assert 1 == len(jpg.get_keys('SOS'))
+        assert data == (jpg.rows, jpg.columns, jpg.samples, jpg.precision)
+        assert jpgread(fpath).uid == jpg.uid
+
+    def test_matches_buffer(self):
+        """Test parsing the headers of a file and a buffer is the same."""
+        with open(PROCESS01_A1, 'rb') as fp:
+            data = fp.read()
+            fp.seek(0)
+            info = parse_jpg(fp, headers_only=True)
+            # Positioned at the start of the scan data
+            key = list(info.keys())[-1]
+            assert key.startswith('SOS')
+            offset = int(key.split('@')[1]) + 2 + info[key][2]['Ls']
+            assert offset == fp.tell()
+
+        assert info == parse_buffer(data, headers_only=True)
+        full = parse_jpg(BytesIO(data))
+        assert list(info.keys()) == list(full.keys())[:len(info)]
+
+    def test_header_chunks(self, monkeypatch):
+        """Test the headers are parsed when read in small chunks."""
+        monkeypatch.setattr(fileio, 'HEADER_CHUNK_SIZE', 1)
+        with open(PROCESS01_A1, 'rb') as fp:
+            data = fp.read()
+
+        fp = BytesIO(data)
+        info = parse_jpg(fp, headers_only=True)
+        assert info == parse_buffer(data, headers_only=True)
+        key = list(info.keys())[-1]
+        assert int(key.split('@')[1]) + 2 + info[key][2]['Ls'] == fp.tell()
+
+    def test_header_chunks_resume(self, monkeypatch):
+        """Test each chunk is parsed from the last complete segment."""
+        monkeypatch.setattr(fileio, 'HEADER_CHUNK_SIZE', 1)
+        name, description, handler = fileio.MARKERS[0xFFDB]
+        calls = []
+
+        def _handler(data):
+            calls.append(len(data))
+            return handler(data)
+
+        monkeypatch.setitem(
+            fileio.MARKERS, 0xFFDB, (name, description, _handler)
+        )
+        with open(PROCESS01_A1, 'rb') as fp:
+            data = fp.read()
+
+        info = parse_jpg(BytesIO(data), headers_only=True)
+        nr_dqt = len([kk for kk in info if kk.startswith('DQT')])
+        assert nr_dqt > 0
+        # Each DQT segment is only parsed once
+        assert nr_dqt == len(calls)
+
+    def test_headers_truncated_raises(self):
+        """Test an exception is raised if there's no scan header."""
+        with open(PROCESS01_A1, 'rb') as fp:
+            data = fp.read()
+
+        msg = r"The end of the data was reached before the end of the COM"
+        with pytest.raises(ValueError, match=msg):
+            parse_jpg(BytesIO(data[:20]), headers_only=True)
+
+    def test_scan_data_not_read(self):
+        """Test the scan data isn't needed to parse the headers."""
+        with open(PROCESS01_GREY, 'rb') as fp:
+            data = fp.read()
+
+        jpg = jpgparse(data[:-4], headers_only=True)
+        assert (5, 4) == (jpg.rows, jpg.columns)
+        assert not [kk for kk in jpg.info[jpg.get_keys('SOS')[0]][2]
+                    if kk.startswith('ENC')]
+
+    def test_decode(self):
+        """Test decoding parses the entire JPEG."""
+        jpg = jpginfo(PROCESS01_RGB)
+        arr = jpg.decode()
+        assert jpg.is_parsed
+        assert 'EOI' == jpg.markers[-1]
+        assert jpgread(PROCESS01_RGB).info == jpg.info
+        assert np.array_equal(jpgread(PROCESS01_RGB).decode(), arr)
+
+        with open(PROCESS01_RGB, 'rb') as fp:
+            data = fp.read()
+
+        for copy in [True, False]:
+            jpg = jpgparse(data, copy=copy, headers_only=True)
+            assert not jpg.is_parsed
+            assert np.array_equal(arr, jpg.decode())
+            assert jpg.is_parsed
+
+    def test_jpeg2000(self):
+        """Test parsing the headers of a JPEG 2000 codestream."""
+        fpath = os.path.join(
+            COMPL_DIR, '15444', 'J2KP4files', 'codestreams_profile0',
+            'p0_01.j2k'
+        )
+        with open(fpath, 'rb') as fp:
+            data = fp.read()
+            fp.seek(0)
+            info = parse_jpg(fp, headers_only=True)
+
+        assert 'SOD' == list(info.keys())[-1].split('@')[0]
+        assert info == parse_buffer(data, headers_only=True)
+
+
+class TestScanData(object):
+    """Tests for fileio._find_scan_end and fileio._split_scan."""
+    def test_stuffing(self):
+        """Test that stuffed 0xFF 0x00 bytes are kept in the view."""
+        data = b'\x00' * 10 + b'\x01\xFF\x00\x02\xFF\x00\xFF\xD9'
+        end, restarts, _ = _find_scan_end(data, 10)
+        assert 16 == end
+        assert [] == restarts
+        entries = _split_scan(memoryview(data), 10, end, restarts)
+        assert [('ENC@8', b'\x01\xFF\x00\x02\xFF\x00')] == entries
+        assert isinstance(entries[0][1], memoryview)
+        assert b'\x01\xFF\x02\xFF' == _get_scan_data(entries[0][1])
+        # The stuffing is removed whatever the type of the entry
+        for data in [bytes(entries[0][1]), bytearray(entries[0][1])]:
+            assert b'\x01\xFF\x02\xFF' == _get_scan_data(data)
+
+    def test_restart_markers(self):
+        """Test that RSTn markers split the encoded data."""
+        data = b'\x01\x02\xFF\xD0\x03\xFF\xFF\xD1\xFF\xD2\x04\xFF\xD9'
+        end, restarts, _ = _find_scan_end(data, 0)
+        assert 11 == end
+        assert [(2, 2), (5, 6), (8, 8)] == restarts
+        assert [
+            ('ENC@-2', b'\x01\x02'),
+            ('RST0@2', None),
+            ('ENC@2', b'\x03'),
+            ('RST1@6', None),
+            ('ENC@6', b''),
+            ('RST2@8', None),
+            ('ENC@8', b'\x04'),
+        ] == _split_scan(data, 0, end, restarts)
+
+    def test_fill_bytes(self):
+        """Test the end is the start of the fill bytes."""
+        data = b'\x01\x02\xFF\xFF\xFF\xD9'
+        end, restarts, _ = _find_scan_end(data, 0)
+        assert 2 == end
+        assert [('ENC@-2', b'\x01\x02')] == _split_scan(data, 0, end, restarts)
+
+    def test_partial_marker(self):
+        """Test searching resumes from a marker split by the end of data."""
+        data = b'\x01\xFF\x00\xFF\xFF'
+        assert (None, [], 3) == _find_scan_end(data, 0)
+        data += b'\xD3\x02\xFF'
+        end, restarts, pos = _find_scan_end(data, 3)
+        assert (None, [(3, 4)], 7) == (end, restarts, pos)
+        data += b'\x00\xFF\xFF\xD9'
+        end, _restarts, _ = _find_scan_end(data, pos)
+        assert 9 == end
+        assert [
+            ('ENC@-2', b'\x01\xFF\x00'),
+            ('RST3@4', None),
+            ('ENC@4', b'\x02\xFF\x00'),
+        ] == _split_scan(data, 0, end, restarts + _restarts)
+
+    def test_jpegls_stuffing(self):
+        """Test that JPEG-LS bit stuffing is left in place."""
+        data = b'\x01\xFF\x7F\x02\xFF\x80'
+        end, restarts, _ = _find_scan_end(data, 0, 'JPEG-LS')
+        assert 4 == end
+        assert [('ENC@-2', b'\x01\xFF\x7F\x02')] == (
+            _split_scan(data, 0, end, restarts)
+        )
+
+    def test_no_marker_raises(self):
+        """Test that reaching the end of the data raises an exception."""
+        msg = r"The end of the file was reached before the end of the scan"
+        data = (
+            b'\xFF\xD8\xFF\xDA\x00\x08\x01\x01\x00\x00\x3F\x00'
+            b'\x01\x02\xFF\x00'
+        )
+        with pytest.raises(ValueError, match=msg):
+            parse_jpg(BytesIO(data))
+
+
+class TestDecodeFrames(object):
+    """Tests for fileio.decode_frames."""
+    def setup_method(self):
+        """Setup the test datasets."""
+        with open(PROCESS01_RGB, 'rb') as f:
+            self.rgb = f.read()
+
+        with open(PROCESS01_HUFF, 'rb') as f:
+            self.huff = f.read()
+
+        self.reference = jpgread(PROCESS01_RGB).decode()
+
+    def test_decode(self):
+        """Test decoding multiple frames."""
+        frames = [self.rgb, bytearray(self.rgb), memoryview(self.rgb)]
+        arr = decode_frames(frames)
+        assert (3, 100, 100, 3) == arr.shape
+        assert 'uint8' == arr.dtype
+        for frame in arr:
+            assert np.array_equal(self.reference, frame)
+
+    def test_generator(self):
+        """Test decoding frames from a generator."""
+        arr = decode_frames(self.rgb for ii in range(2))
+        assert (2, 100, 100, 3) == arr.shape
+
+    def test_single_component(self):
+        """Test decoding single component frames."""
+        with open(PROCESS01_GREY, 'rb') as f:
+            grey = f.read()
+
+        arr = decode_frames([grey, grey])
+        assert (2, 5, 4) == arr.shape
+        assert np.array_equal(arr[0], arr[1])
+
+    def test_out(self):
+        """Test decoding into an existing array."""
+        out = np.zeros((4, 100, 100, 3), dtype='uint16')
+        arr = decode_frames([self.rgb] * 2, out=out[1:3])
+        assert arr.base is out
+        assert not out[0].any()
+        assert not out[3].any()
+        assert np.array_equal(self.reference, out[1])
+        assert np.array_equal(self.reference, out[2])
+
+    def test_out_shape_raises(self):
+        """Test an exception is raised if `out` has the wrong shape."""
+        out = np.zeros((3, 100, 100, 3), dtype='uint8')
+        msg = (
+            r"The shape of 'out' is \(3, 100, 100, 3\) but the decoded "
+            r"frames require \(2, 100, 100, 3\)"
+        )
+        with pytest.raises(ValueError, match=msg):
+            decode_frames([self.rgb] * 2, out=out)
+
+    def test_out_dtype_raises(self):
+        """Test an exception is raised if `out` has the wrong dtype."""
+        out = np.zeros((2, 100, 100, 3), dtype='int8')
+        msg = r"Unable to write decoded frames with dtype 'uint8'"
+        with pytest.raises(ValueError, match=msg):
+            decode_frames([self.rgb] * 2, out=out)
+
+    def test_mismatched_frames_raises(self):
+        """Test an exception is raised if the frames differ in shape."""
+        msg = (
+            r"Frame 1 has shape \(8, 16, 3\) which doesn't match the first "
+            r"frame's shape of \(100, 100, 3\)"
+        )
+        with pytest.raises(ValueError, match=msg):
+            decode_frames([self.rgb, self.huff])
+
+    def test_no_frames_raises(self):
+        """Test an exception is raised if there are no frames."""
+        with pytest.raises(ValueError, match=r"No frames to decode"):
+            decode_frames([])
+
+    def test_workers(self):
+        """Test decoding the frames in parallel."""
+        arr = decode_frames([self.rgb] * 5, workers=2)
+        assert (5, 100, 100, 3) == arr.shape
+        for frame in arr:
+            assert np.array_equal(self.reference, frame)
+
+    def test_tables_reused(self):
+        """Test the decoding tables are built once."""
+        tables = {}
+        fileio._decode_frame(self.rgb, tables)
+        cached = dict(tables)
+        # 2 DQT and 4 DHT
+        assert 6 == len(cached)
+        fileio._decode_frame(self.rgb, tables)
+        assert cached.keys() == tables.keys()
+        for key, table in cached.items():
+            assert tables[key] is table
+
+
 class TestJPEGWrite(object):
     pass
@@ -0,0 +1,177 @@
+"""Tests for the pydcmjpeg.huffman module."""
+
+import pytest
+
+from pydcmjpeg.huffman import (
+    BitReader, HuffmanTable, get_huffman_table, _get_huffman, LOOKAHEAD
+)
+
+
+# Table K.3: luminance DC differences
+DC_BITS = [0, 1, 5, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0]
+DC_HUFFVAL = [
+    None, (0, ), (1, 2, 3, 4, 5), (6, ), (7, ), (8, ), (9, ), (10, ), (11, ),
+    None, None, None, None, None, None, None
+]
+DC_CODES = {
+    0 : '00', 1 : '010', 2 : '011', 3 : '100', 4 : '101', 5 : '110',
+    6 : '1110', 7 : '11110', 8 : '111110', 9 : '1111110', 10 : '11111110',
+    11 : '111111110',
+}
+
+# A table with codes of every length from 1 to 16
+LONG_BITS = [1] * 16
+LONG_HUFFVAL = {ii : (ii, ) for ii in range(1, 17)}
+
+
+def to_bytes(bits):
+    """Return the str of 0s and 1s `bits` as bytes, padded with 1s."""
+    bits += '1' * (-len(bits) % 8)
+    return bytes(int(bits[ii:ii + 8], 2) for ii in range(0, len(bits), 8))
+
+
+class TestHuffmanTable(object):
+    """Tests for huffman.HuffmanTable."""
+    def test_dc_luminance(self):
+        """Test the table generated for Table K.3."""
+        table = HuffmanTable(DC_BITS, DC_HUFFVAL)
+        assert list(range(12)) == table.huffval
+        assert [2, 3, 3, 3, 3, 3, 4, 5, 6, 7, 8, 9] == table.huffsize
+        for value, code in DC_CODES.items():
+            assert int(code, 2) == table.huffcode[value]
+
+        assert -1 == table.maxcode[1]
+        assert 0 == table.maxcode[2]
+        assert 6 == table.maxcode[3]
+        assert 2 == table.mincode[3]
+        assert 1 == table.valptr[3]
+
+    def test_lookup(self):
+        """Test the lookahead table."""
+        table = HuffmanTable(DC_BITS, DC_HUFFVAL)
+        assert (1 << LOOKAHEAD) == len(table.lookup)
+        for value, code in DC_CODES.items():
+            start = int(code, 2) << (LOOKAHEAD - len(code))
+            end = start + (1 << (LOOKAHEAD - len(code)))
+            for entry in table.lookup[start:end]:
+                assert len(code) == entry >> 8
+                assert value == entry & 0xFF
+
+        # The all 1s code is reserved
+        assert 0 == table.lookup[-1]
+
+    def test_dict_huffval(self):
+        """Test using a dict for the Huffman values."""
+        table = HuffmanTable(LONG_BITS, LONG_HUFFVAL)
+        assert list(range(1, 17)) == table.huffval
+        assert list(range(1, 17)) == table.huffsize
+
+    def test_invalid_bits_raises(self):
+        """Test an invalid BITS list raises an exception."""
+        with pytest.raises(ValueError, match=r"BITS must contain 16 values"):
+            HuffmanTable([1] * 15, LONG_HUFFVAL)
+
+    def test_mismatched_values_raises(self):
+        """Test a mismatch between BITS and the values raises."""
+        huffval = list(DC_HUFFVAL)
+        huffval[2] = (1, 2, 3, 4)
+        msg = r"The number of Huffman values doesn't match BITS"
+        with pytest.raises(ValueError, match=msg):
+            HuffmanTable(DC_BITS, huffval)
+
+    def test_too_many_codes_raises(self):
+        """Test a table with too many codes raises an exception."""
+        bits = [3] + [0] * 15
+        huffval = {1 : (0, 1, 2)}
+        msg = r"Invalid Huffman table, too many codes"
+        with pytest.raises(ValueError, match=msg):
+            HuffmanTable(bits, huffval)
+
+    def test_get_huffman_table(self):
+        """Test get_huffman_table()."""
+        table = get_huffman_table(DC_BITS, DC_HUFFVAL)
+        assert isinstance(table, HuffmanTable)
+        msg = r"Unknown method 'heapq' for building a Huffman table"
+        with pytest.raises(ValueError, match=msg):
+            get_huffman_table(DC_BITS, DC_HUFFVAL, method='heapq')
+
+    def test_get_huffman(self):
+        """Test _get_huffman()."""
+        tables = _get_huffman({
+            0 : {0 : (DC_BITS, DC_HUFFVAL)},
+            1 : {0 : (LONG_BITS, LONG_HUFFVAL), 1 : (DC_BITS, DC_HUFFVAL)},
+        })
+        assert [0, 1] == sorted(tables.keys())
+        assert [0] == list(tables[0].keys())
+        assert [0, 1] == sorted(tables[1].keys())
+        assert list(range(1, 17)) == tables[1][0].huffval
+
+
+class TestBitReader(object):
+    """Tests for huffman.BitReader."""
+    def test_decode(self):
+        """Test decoding short codes."""
+        values = [0, 11, 3, 6, 10, 1, 0, 5, 9, 2, 7, 8, 4]
+        data = to_bytes(''.join(DC_CODES[vv] for vv in values))
+        reader = BitReader(data)
+        table = HuffmanTable(DC_BITS, DC_HUFFVAL)
+        assert values == [reader.decode(table) for vv in values]
+        assert not reader.is_exhausted
+
+    def test_decode_long(self):
+        """Test decoding codes longer than the lookahead."""
+        table = HuffmanTable(LONG_BITS, LONG_HUFFVAL)
+        # Each code of length ii is (ii - 1) 1s followed by a 0
+        values = [16, 1, 10, 9, 15, 2, 12, 16]
+        codes = ['1' * (vv - 1) + '0' for vv in values]
+        reader = BitReader(to_bytes(''.join(codes)))
+        assert values == [reader.decode(table) for vv in values]
+
+    def test_decode_invalid_raises(self):
+        """Test decoding an invalid code raises an exception."""
+        table = HuffmanTable(DC_BITS, DC_HUFFVAL)
+        reader = BitReader(b'\xff\xff\xff')
+        msg = r"Invalid Huffman code in the encoded data"
+        with pytest.raises(ValueError, match=msg):
+            reader.decode(table)
+
+    def test_read_bits(self):
+        """Test reading bits."""
+        reader = BitReader(b'\xA5\x0F\xF0\x12\x34\x56')
+        assert 1 == reader.read_bit()
+        assert 0 == reader.read_bit()
+        assert 0b100101 == reader.read_bits(6)
+        assert 0 == reader.read_bits(0)
+        assert 0x0FF0 == reader.read_bits(16)
+        assert 0x123456 == reader.read_bits(24)
+        assert not reader.is_exhausted
+
+    def test_read_past_end(self):
+        """Test reading past the end of the data returns 0s."""
+        reader = BitReader(b'\xFF')
+        assert 0xFF == reader.read_bits(8)
+        assert not reader.is_exhausted
+        assert 0 == reader.read_bits(16)
+        assert reader.is_exhausted
+        for ii in range(10):
+            assert 0 == reader.read_bits(24)
+
+    @pytest.mark.parametrize(
+        'bits, length, value',
+        [
+            ('', 0, 0),
+            ('0', 1, -1),
+            ('1', 1, 1),
+            ('00', 2, -3),
+            ('01', 2, -2),
+            ('10', 2, 2),
+            ('11', 2, 3),
+            ('0000000000', 10, -1023),
+            ('1000000000', 10, 512),
+            ('0' * 15, 15, -32767),
+        ]
+    )
+    def test_receive_extend(self, bits, length, value):
+        """Test RECEIVE and EXTEND."""
+        reader = BitReader(to_bytes(bits) if bits else b'')
+        assert value == reader.receive_extend(length)
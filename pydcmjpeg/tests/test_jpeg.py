@@ -1,8 +1,10 @@
 """Tests for the jpeg.JPEG class."""
 
+import numpy as np
 import pytest
 
-from pydcmjpeg import jpgread
+from pydcmjpeg import jpgparse, jpgread
+from pydcmjpeg.cache import ARRAY_CACHE
 
 from ._common import REFERENCE_DATA
 
@@ -16,11 +18,13 @@ class TestJPEG(object):
         assert jpg.is_process1
         assert not jpg.is_process2
         assert not jpg.is_process4
-        #assert not jpg.is_process14
+        assert not jpg.is_process14
         assert not jpg.is_process14_sv1
 
         assert jpg.precision == 8
         assert jpg.is_baseline
+        assert jpg.is_huffman
+        assert not jpg.is_arithmetic
         assert not jpg.is_lossless
         assert jpg.is_non_hierarchical
         assert not jpg.is_hierarchical
@@ -39,7 +43,7 @@ class TestJPEG(object):
         assert not jpg.is_process1
         assert jpg.is_process2
         assert not jpg.is_process4
-        #assert not jpg.is_process14
+        assert not jpg.is_process14
         assert not jpg.is_process14_sv1
 
         assert jpg.precision == 8
@@ -55,6 +59,31 @@ class TestJPEG(object):
             assert data[2] == jpg.samples
             assert data[3] == jpg.precision
 
+    @pytest.mark.parametrize(
+        "fpath,data", REFERENCE_DATA['p3'] + REFERENCE_DATA['p5']
+    )
+    def test_process3_5(self, fpath, data):
+        """Test that the right process type is returned."""
+        jpg = jpgread(fpath)
+        assert not jpg.is_process1
+        assert not jpg.is_process2
+        assert not jpg.is_process4
+        assert jpg.is_process3 == (data[3] == 8)
+        assert jpg.is_process5 == (data[3] == 12)
+
+        assert jpg.is_extended
+        assert jpg.is_arithmetic
+        assert not jpg.is_huffman
+        assert not jpg.is_progressive
+        assert not jpg.is_lossless
+        assert jpg.is_non_hierarchical
+        assert jpg.is_decodable
+
+        assert data[0] == jpg.rows
+        assert data[1] == jpg.columns
+        assert data[2] == jpg.samples
+        assert data[3] == jpg.precision
+
     @pytest.mark.parametrize("fpath,data", REFERENCE_DATA['p4'])
     def test_process4(self, fpath, data):
         """Test that the right process type is returned."""
@@ -62,7 +91,7 @@ class TestJPEG(object):
         assert not jpg.is_process1
         assert not jpg.is_process2
         assert jpg.is_process4
-        #assert not jpg.is_process14
+        assert not jpg.is_process14
         assert not jpg.is_process14_sv1
 
         assert jpg.precision == 12
@@ -78,9 +107,67 @@ class TestJPEG(object):
             assert data[2] == jpg.samples
             assert data[3] == jpg.precision
 
+    @pytest.mark.parametrize("fpath,data", REFERENCE_DATA['p10'])
+    def test_process10(self, fpath, data):
+        """Test that the right process type is returned."""
+        jpg = jpgread(fpath)
+        assert not jpg.is_process1
+        assert not jpg.is_process2
+        assert not jpg.is_process4
+        assert not jpg.is_process14
+        assert not jpg.is_process14_sv1
+
+        assert jpg.precision == 8
+        assert jpg.is_progressive
+        assert not jpg.is_baseline
+        assert not jpg.is_lossless
+        assert jpg.is_non_hierarchical
+        assert jpg.is_decodable
+
+        if data:
+            assert data[0] == jpg.rows
+            assert data[1] == jpg.columns
+            assert data[2] == jpg.samples
+            assert data[3] == jpg.precision
+
+    @pytest.mark.parametrize(
+        "fpath,data", REFERENCE_DATA['p11'] + REFERENCE_DATA['p13']
+    )
+    def test_process11_13(self, fpath, data):
+        """Test that the right process type is returned."""
+        jpg = jpgread(fpath)
+        assert not jpg.is_process3
+        assert not jpg.is_process5
+        assert not jpg.is_process15
+
+        assert jpg.is_progressive
+        assert jpg.is_arithmetic
+        assert not jpg.is_huffman
+        assert not jpg.is_lossless
+        assert jpg.is_non_hierarchical
+        assert jpg.is_decodable
+
+        assert data[0] == jpg.rows
+        assert data[1] == jpg.columns
+        assert data[2] == jpg.samples
+        assert data[3] == jpg.precision
+
     @pytest.mark.parametrize("fpath,data", REFERENCE_DATA['p14'])
     def test_process14(self, fpath, data):
         """Test that the right process type is returned."""
+        jpg = jpgread(fpath)
+        assert not jpg.is_process1
+        assert not jpg.is_process2
+        assert not jpg.is_process4
+        assert jpg.is_process14
+        assert not jpg.is_process14_sv1
+
+        assert not jpg.is_extended
+        assert jpg.is_lossless
+        assert jpg.is_non_hierarchical
+        assert not jpg.is_hierarchical
+        assert jpg.uid == '1.2.840.10008.1.2.4.57'
+
         if data:
             assert data[0] == jpg.rows
             assert data[1] == jpg.columns
@@ -94,7 +181,7 @@ class TestJPEG(object):
         assert not jpg.is_process1
         assert not jpg.is_process2
         assert not jpg.is_process4
-        #assert not jpg.is_process14
+        assert jpg.is_process14
         assert jpg.is_process14_sv1
 
         #assert jpg.precision == 12
@@ -110,6 +197,25 @@ class TestJPEG(object):
             assert data[2] == jpg.samples
             assert data[3] == jpg.precision
 
+    @pytest.mark.parametrize("fpath,data", REFERENCE_DATA['p15'])
+    def test_process15(self, fpath, data):
+        """Test that the right process type is returned."""
+        jpg = jpgread(fpath)
+        assert not jpg.is_process14
+        assert not jpg.is_process14_sv1
+        assert jpg.is_process15
+
+        assert jpg.is_lossless
+        assert jpg.is_arithmetic
+        assert not jpg.is_huffman
+        assert jpg.is_non_hierarchical
+        assert jpg.is_decodable
+
+        assert data[0] == jpg.rows
+        assert data[1] == jpg.columns
+        assert data[2] == jpg.samples
+        assert data[3] == jpg.precision
+
     def test_get_keys(self):
         """Test JPEG.get_keys."""
         jpg = jpgread(REFERENCE_DATA['p1'][1][0])
@@ -121,7 +227,7 @@ class TestJPEG(object):
 
 class TestJPEGDecode(object):
     """Tests for JPEG.decode()."""
-    def setup(self):
+    def setup_method(self):
         """Setup the test datasets."""
         self.p1a = REFERENCE_DATA['p1'][0][0]
         self.p1d = REFERENCE_DATA['p1'][4][0]
@@ -130,5 +236,276 @@ class TestJPEGDecode(object):
         """Decode a process 1 JPG."""
         jpg = jpgread(self.p1d)
         arr = jpg.to_array
-        #assert (8, 16, 3) == arr.shape
-        #assert 'uint8' == arr.dtype
+        assert (8, 16, 3) == arr.shape
+        assert 'uint8' == arr.dtype
+
+    def test_decode_workers(self):
+        """Test decoding with multiple workers."""
+        jpg = jpgread(self.p1d)
+        arr = jpg.decode(workers=2)
+        assert (8, 16, 3) == arr.shape
+        assert 'uint8' == arr.dtype
+        assert (arr == jpg.decode()).all()
+
+    def test_release(self):
+        """Test releasing the scan data when decoding."""
+        jpg = jpgread(self.p1d)
+        arr = jpg.decode(release=True)
+        assert not jpg.is_parsed
+        scan = jpg.info[jpg.get_keys('SOS')[0]][2]
+        assert not [kk for kk in scan if kk.startswith('ENC')]
+
+        # Decoding again parses the file again
+        jpg.clear_cache()
+        assert (arr == jpg.decode()).all()
+        assert jpg.is_parsed
+
+    def test_release_no_parser_raises(self):
+        """Test decoding released data without a parser raises."""
+        jpg = jpgread(self.p1d)
+        jpg._parser = None
+        jpg.decode(release=True)
+        jpg.clear_cache()
+        msg = r"its entropy-coded data has been released or was never parsed"
+        with pytest.raises(ValueError, match=msg):
+            jpg.decode()
+
+    @pytest.mark.parametrize(
+        "fpath,data", REFERENCE_DATA['p2'] + REFERENCE_DATA['p4']
+    )
+    def test_decode_process2_4(self, fpath, data):
+        """Decode process 2 and 4 JPGs."""
+        jpg = jpgread(fpath)
+        assert jpg.is_decodable
+        arr = jpg.decode()
+        assert data[:2] == arr.shape[:2]
+        assert ('uint8' if data[3] == 8 else 'uint16') == arr.dtype
+
+    def test_decode_process10(self):
+        """Decode a process 10 JPG."""
+        jpg = jpgread(REFERENCE_DATA['p10'][0][0])
+        arr = jpg.decode()
+        assert (480, 640, 3) == arr.shape
+        assert 'uint8' == arr.dtype
+
+    @pytest.mark.parametrize(
+        "fpath,data",
+        REFERENCE_DATA['p3'] + REFERENCE_DATA['p5'] + REFERENCE_DATA['p11']
+        + REFERENCE_DATA['p13'] + REFERENCE_DATA['p15']
+    )
+    def test_decode_arithmetic(self, fpath, data):
+        """Decode arithmetic coded JPGs."""
+        arr = jpgread(fpath).decode(upsample='nearest')
+        assert data[:2] == arr.shape[:2]
+        assert ('uint8' if data[3] == 8 else 'uint16') == arr.dtype
+
+    def test_decode_process14(self):
+        """Decode a process 14 JPG."""
+        jpg = jpgread(REFERENCE_DATA['p14'][0][0])
+        arr = jpg.decode()
+        assert (257, 255, 4) == arr.shape
+        assert 'uint16' == arr.dtype
+
+    def test_iter_rows(self):
+        """Test decoding in bands of rows."""
+        jpg = jpgread(self.p1d)
+        bands = list(jpg.iter_rows())
+        assert [(8, 16, 3)] == [arr.shape for arr in bands]
+        assert (bands[0] == jpg.decode()).all()
+
+    def test_iter_rows_process4(self):
+        """Test decoding a process 4 JPEG in bands of rows."""
+        jpg = jpgread(REFERENCE_DATA['p4'][2][0])
+        bands = list(jpg.iter_rows(band=4))
+        assert 'uint16' == bands[0].dtype
+        assert np.array_equal(jpg.decode(), np.concatenate(bands))
+
+    def test_iter_rows_raises(self):
+        """Test decoding a lossless or progressive JPEG in bands raises."""
+        jpg = jpgread(REFERENCE_DATA['p14sv1'][1][0])
+        msg = r"Decoding in bands is only supported for Process 1, 2 and 4"
+        with pytest.raises(NotImplementedError, match=msg):
+            jpg.iter_rows()
+
+        jpg = jpgread(REFERENCE_DATA['p10'][1][0])
+        with pytest.raises(NotImplementedError, match=msg):
+            jpg.iter_rows()
+
+    @pytest.mark.parametrize(
+        "kwargs, msg",
+        [
+            ({'band': 0}, r"Invalid 'band' value 0, must be a positive"),
+            ({'as_rgb': True}, r"Unable to convert the image data to RGB"),
+            ({'scale': 3}, r"Invalid 'scale' value"),
+            ({'upsample': 'cubic'}, r"Unknown upsampling method 'cubic'"),
+        ]
+    )
+    def test_iter_rows_invalid_raises(self, kwargs, msg):
+        """Test invalid parameters raise when iter_rows() is called."""
+        jpg = jpgread(REFERENCE_DATA['p1'][3][0])
+        with pytest.raises(ValueError, match=msg):
+            jpg.iter_rows(**kwargs)
+
+    def test_iter_progressive(self):
+        """Test decoding a progressive JPEG after each scan."""
+        jpg = jpgread(REFERENCE_DATA['p10'][1][0])
+        images = list(jpg.iter_progressive(scans=2))
+        assert 3 == len(images)
+        assert all((37, 53) == arr.shape for arr in images)
+        assert np.array_equal(jpg.decode(), images[-1])
+
+    def test_iter_progressive_arithmetic(self):
+        """Test decoding an arithmetic coded progressive JPEG."""
+        jpg = jpgread(REFERENCE_DATA['p11'][1][0])
+        images = list(jpg.iter_progressive())
+        assert len(jpg.get_keys('SOS')) == len(images)
+        assert np.array_equal(jpg.decode(), images[-1])
+
+    def test_iter_progressive_incomplete(self):
+        """Test decoding the complete scans of a partial JPEG."""
+        with open(REFERENCE_DATA['p10'][2][0], 'rb') as fp:
+            data = fp.read()
+
+        jpg = jpgparse(data[:len(data) // 2], incomplete=True)
+        assert not jpg.is_parsed
+        images = list(jpg.iter_progressive())
+        assert len(jpg.get_keys('SOS')) == len(images)
+        assert np.array_equal(jpg.decode(), images[-1])
+
+    def test_iter_progressive_raises(self):
+        """Test decoding a non-progressive JPEG after each scan raises."""
+        jpg = jpgread(self.p1d)
+        msg = r"Progressive decoding is only supported for progressive DCT"
+        with pytest.raises(NotImplementedError, match=msg):
+            jpg.iter_progressive()
+
+    @pytest.mark.parametrize(
+        "kwargs, msg",
+        [
+            ({'scans': 0}, r"Invalid 'scans' value 0, must be a positive"),
+            ({'as_rgb': True}, r"Unable to convert the image data to RGB"),
+            ({'scale': 3}, r"Invalid 'scale' value"),
+            ({'upsample': 'cubic'}, r"Unknown upsampling method 'cubic'"),
+        ]
+    )
+    def test_iter_progressive_invalid_raises(self, kwargs, msg):
+        """Test invalid parameters raise when the method is called."""
+        jpg = jpgread(REFERENCE_DATA['p10'][1][0])
+        with pytest.raises(ValueError, match=msg):
+            jpg.iter_progressive(**kwargs)
+
+
+class TestJPEGCache(object):
+    """Tests for caching the decoded image data."""
+    def setup_method(self):
+        """Setup the test datasets."""
+        self.fpath = REFERENCE_DATA['p1'][4][0]
+
+    def teardown_method(self):
+        """Disable the process-wide cache."""
+        ARRAY_CACHE.clear()
+        ARRAY_CACHE.resize(0)
+
+    def test_to_array(self):
+        """Test to_array returns a copy of the cached image data."""
+        jpg = jpgread(self.fpath)
+        arr = jpg.to_array
+        assert arr.flags.writeable
+        assert arr is not jpg.to_array
+        assert np.array_equal(arr, jpg.to_array)
+        assert not np.shares_memory(arr, jpg.decode(readonly=True))
+
+    def test_clear_cache(self):
+        """Test clearing the cache."""
+        jpg = jpgread(self.fpath)
+        arr = jpg.decode(readonly=True)
+        jpg.clear_cache()
+        other = jpg.decode(readonly=True)
+        assert arr is not other
+        assert (arr == other).all()
+
+    def test_readonly(self):
+        """Test returning the read-only cached image data."""
+        jpg = jpgread(self.fpath)
+        arr = jpg.decode(readonly=True)
+        assert not arr.flags.writeable
+        with pytest.raises(ValueError):
+            arr[0, 0] = 0
+
+        assert arr is jpg.decode(readonly=True)
+        copy = jpg.decode()
+        assert copy.flags.writeable
+        assert not np.shares_memory(arr, copy)
+
+    def test_edit_result(self):
+        """Test editing the returned image data doesn't change the cache."""
+        jpg = jpgread(self.fpath)
+        arr = jpg.decode()
+        reference = arr.copy()
+        arr[...] = 1
+        assert np.array_equal(reference, jpg.decode())
+        assert np.array_equal(reference, jpg.decode(readonly=True))
+
+    def test_parameters(self):
+        """Test the decoding parameters are part of the cache key."""
+        jpg = jpgread(self.fpath)
+        arr = jpg.decode()
+        rgb = jpg.decode(as_rgb=True, readonly=True)
+        assert [0, 128, 128] == arr[0, 0].tolist()
+        assert [0, 0, 0] == rgb[0, 0].tolist()
+        assert rgb is jpg.decode(as_rgb=True, readonly=True)
+        assert not np.shares_memory(arr, jpg.decode(readonly=True))
+        assert (4, 8, 3) == jpg.decode(scale=0.5).shape
+        region = jpg.decode(region=(1, 2, 3, 4), readonly=True)
+        assert np.array_equal(arr[1:4, 2:6], region)
+        assert region is jpg.decode(region=[1, 2, 3, 4], readonly=True)
+
+    def test_out(self):
+        """Test the image data written to `out` isn't cached."""
+        jpg = jpgread(self.fpath)
+        out = np.zeros((8, 16, 3), dtype='uint8')
+        assert out is jpg.decode(out=out)
+        assert jpg._cache is None
+        arr = jpg.decode()
+        assert np.array_equal(arr, out)
+
+        # Uses the cached image data
+        other = np.zeros((3, 8, 16), dtype='float32')
+        jpg.decode(planar=True)
+        assert other is jpg.decode(planar=True, out=other)
+        assert np.array_equal(arr, other.transpose(1, 2, 0))
+        buffer = bytearray(8 * 16 * 3)
+        jpg.decode(out=buffer)
+        assert buffer == arr.tobytes()
+
+    def test_process_cache(self):
+        """Test the process-wide cache."""
+        ARRAY_CACHE.resize(1024**2)
+        jpg = jpgread(self.fpath)
+        arr = jpg.decode(readonly=True)
+        assert not arr.flags.writeable
+        assert arr.nbytes == ARRAY_CACHE.size
+        # Editing a copy doesn't change the shared array
+        jpg.decode()[...] = 1
+        assert not np.array_equal(arr, np.ones_like(arr))
+
+        # A different JPEG object with the same source
+        assert arr is jpgread(self.fpath).decode(readonly=True)
+        with open(self.fpath, 'rb') as fp:
+            data = fp.read()
+
+        # A buffer is a different source
+        other = jpgparse(data).decode(readonly=True)
+        assert arr is not other
+        assert other is jpgparse(bytearray(data)).decode(readonly=True)
+        assert 2 == len(ARRAY_CACHE)
+
+        jpg.clear_cache()
+        assert 1 == len(ARRAY_CACHE)
+        assert arr is not jpgread(self.fpath).decode(readonly=True)
+
+    def test_process_cache_disabled(self):
+        """Test the process-wide cache isn't used by default."""
+        arr = jpgread(self.fpath).decode()
+        assert 0 == len(ARRAY_CACHE)
+        assert arr is not jpgread(self.fpath).decode()
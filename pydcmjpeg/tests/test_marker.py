@@ -0,0 +1,68 @@
+"""Tests for the pydcmjpeg.marker module."""
+
+from collections import OrderedDict
+
+import pytest
+
+from pydcmjpeg.marker import MarkerIndex, MarkerSegment
+
+
+INFO = OrderedDict()
+INFO['SOI@0'] = (0xFFD8, 0, {})
+INFO['APP1@2'] = (0xFFE1, 0, {'Lp' : 4, 'Ap' : b'\x00\x00'})
+INFO['SOF0@8'] = (0xFFC0, 0, {'X' : 10, 'Y' : 12})
+INFO['APP10@20'] = (0xFFEA, 0, {'Lp' : 2, 'Ap' : b''})
+INFO['SOS@24'] = [0xFFDA, 0, {'Ls' : 8}]
+INFO['SOS@40'] = [0xFFDA, 0, {'Ls' : 8}]
+INFO['EOI@60'] = (0xFFD9, 0, {})
+
+
+class TestMarkerIndex(object):
+    """Tests for marker.MarkerIndex."""
+    def test_keys_ordered(self):
+        """Test the keys are ordered by offset."""
+        info = OrderedDict(reversed(list(INFO.items())))
+        index = MarkerIndex(info)
+        assert list(INFO.keys()) == index.keys
+        assert [
+            'SOI', 'APP1', 'SOF0', 'APP10', 'SOS', 'SOS', 'EOI'
+        ] == index.markers
+        assert 7 == len(index)
+
+    def test_contains(self):
+        """Test checking if a marker is present."""
+        index = MarkerIndex(INFO)
+        assert 'SOF0' in index
+        assert 'APP1' in index
+        assert 'SOF' not in index
+        assert 'APP' not in index
+
+    def test_frame(self):
+        """Test the frame header is available."""
+        assert {'X' : 10, 'Y' : 12} == MarkerIndex(INFO).frame
+        info = OrderedDict([(kk, vv) for kk, vv in INFO.items() if kk[0] != 'S'])
+        assert MarkerIndex(info).frame is None
+
+    def test_get_keys(self):
+        """Test getting the keys for a partial marker name."""
+        index = MarkerIndex(INFO)
+        assert ['SOS@24', 'SOS@40'] == index.get_keys('SOS')
+        assert ['APP1@2', 'APP10@20'] == index.get_keys('APP1')
+        assert ['APP10@20'] == index.get_keys('APP10')
+        assert [] == index.get_keys('XXX')
+        # Cached results can't be modified
+        index.get_keys('SOS').append('SOS@80')
+        assert ['SOS@24', 'SOS@40'] == index.get_keys('SOS')
+
+    def test_offsets(self):
+        """Test getting the offsets for a marker name."""
+        index = MarkerIndex(INFO)
+        assert [24, 40] == index.offsets('SOS')
+        assert [] == index.offsets('SOS0')
+
+    def test_segments(self):
+        """Test the segments are ordered by offset."""
+        segments = MarkerIndex(INFO).segments
+        assert all([isinstance(ss, MarkerSegment) for ss in segments])
+        assert [0, 2, 8, 20, 24, 40, 60] == [ss.offset for ss in segments]
+        assert ['SOI', 'APP1', 'SOF0'] == [ss.name for ss in segments[:3]]
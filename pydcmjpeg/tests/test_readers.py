@@ -0,0 +1,90 @@
+"""Tests for the pydcmjpeg.readers module."""
+
+from struct import pack
+
+import pytest
+
+from pydcmjpeg.readers import DHT, DQT, SOF, SOS
+
+
+class TestDQT(object):
+    """Tests for readers.DQT."""
+    def test_8bit(self):
+        """Test reading an 8-bit table."""
+        data = pack('>HB', 67, 0x01) + bytes(range(64))
+        info = DQT(data)
+        assert 67 == info['Lq']
+        assert [0] == info['Pq']
+        assert [1] == info['Tq']
+        assert [list(range(64))] == info['Qk']
+
+    def test_16bit(self):
+        """Test reading a 16-bit table."""
+        table = [ii * 1000 for ii in range(64)]
+        data = pack('>HB64H', 131, 0x12, *table)
+        info = DQT(data)
+        assert [1] == info['Pq']
+        assert [2] == info['Tq']
+        assert [table] == info['Qk']
+
+    def test_multiple(self):
+        """Test reading multiple tables from a memoryview."""
+        data = (
+            pack('>HB', 196, 0x00) + b'\x01' * 64
+            + pack('>B64H', 0x11, *([2] * 64))
+        )
+        info = DQT(memoryview(data))
+        assert [0, 1] == info['Pq']
+        assert [0, 1] == info['Tq']
+        assert [[1] * 64, [2] * 64] == info['Qk']
+
+
+class TestDHT(object):
+    """Tests for readers.DHT."""
+    def test_read(self):
+        """Test reading a single table."""
+        bits = [0, 2, 1] + [0] * 13
+        data = pack('>HB16B', 22, 0x10, *bits) + b'\x01\x02\x03'
+        info = DHT(memoryview(data))
+        assert 22 == info['Lh']
+        assert [1] == info['Tc']
+        assert [0] == info['Th']
+        assert [tuple(bits)] == info['Li']
+        assert (None, (1, 2), (3, )) == tuple(info['Vij'][0][:3])
+        assert all(vv is None for vv in info['Vij'][0][3:])
+
+
+class TestSOF(object):
+    """Tests for readers.SOF."""
+    def test_read(self):
+        """Test reading the frame header."""
+        data = pack('>HBHHB', 17, 8, 480, 640, 3) + bytes([
+            1, 0x22, 0,
+            2, 0x11, 1,
+            3, 0x12, 1,
+        ])
+        info = SOF(data)
+        assert 8 == info['P']
+        assert 480 == info['Y']
+        assert 640 == info['X']
+        assert 3 == info['Nf']
+        assert [1, 2, 3] == info['Ci']
+        assert [2, 1, 1] == info['Hi']
+        assert [2, 1, 2] == info['Vi']
+        assert [0, 1, 1] == info['Tqi']
+
+
+class TestSOS(object):
+    """Tests for readers.SOS."""
+    @pytest.mark.parametrize('jpg', ['JPEG', 'JPEG-LS'])
+    def test_read(self, jpg):
+        """Test reading the scan header."""
+        data = pack('>HB', 10, 2) + bytes([1, 0x01, 2, 0x12, 0, 63, 0x21])
+        info = SOS(data, jpg=jpg)
+        assert 10 == info['Ls']
+        assert [1, 2] == info['Csj']
+        if jpg == 'JPEG':
+            assert [0, 1] == info['Tdj']
+            assert [1, 2] == info['Taj']
+        else:
+            assert [1, 0x12] == info['Tmj']
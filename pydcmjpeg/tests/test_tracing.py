@@ -0,0 +1,122 @@
+"""Tests for the pydcmjpeg.tracing module."""
+
+import logging
+import os
+
+import pytest
+
+from pydcmjpeg import tracing
+from pydcmjpeg.fileio import jpgparse, jpgread, parse_buffer, parse_jpg
+
+from ._common import DPROCESS01
+
+
+P1_RGB = os.path.join(DPROCESS01, 'SC_rgb_jpeg_dcmtk.jpg')
+
+
+class TestTrace(object):
+    """Tests for tracing."""
+    def setup_method(self):
+        """Setup the tests."""
+        self.events = []
+        with open(P1_RGB, 'rb') as fp:
+            self.data = fp.read()
+
+    def teardown_method(self):
+        """Teardown the tests."""
+        tracing.disable_trace()
+
+    def hook(self, event, fields):
+        """Collect the trace events."""
+        self.events.append((event, fields))
+
+    def test_disabled_by_default(self):
+        """Test tracing is disabled by default."""
+        assert tracing.TRACE is False
+        tracing.trace('marker', name='SOI')
+        assert [] == self.events
+
+    def test_enable_disable(self):
+        """Test enabling and disabling tracing."""
+        tracing.enable_trace(self.hook)
+        assert tracing.TRACE is True
+        tracing.trace('test', value=1)
+        assert [('test', {'value' : 1})] == self.events
+
+        tracing.disable_trace()
+        assert tracing.TRACE is False
+        parse_buffer(self.data)
+        assert 1 == len(self.events)
+
+    def test_parse_events(self):
+        """Test the events when parsing."""
+        info = parse_buffer(self.data)
+        tracing.enable_trace(self.hook)
+        parse_buffer(self.data)
+
+        markers = [ff for ee, ff in self.events if ee == 'marker']
+        assert list(info.keys()) == [
+            '{}@{}'.format(ff['name'], ff['offset']) for ff in markers
+        ]
+        assert [info[kk][1] for kk in info] == [ff['fill'] for ff in markers]
+        assert 0 == markers[0]['length']
+        dqt = [ff for ff in markers if ff['name'] == 'DQT'][0]
+        assert 67 == dqt['length']
+
+        scan = [ff for ee, ff in self.events if ee == 'scan_data']
+        assert 1 == len(scan)
+        assert 1 == scan[0]['segments']
+
+        event, fields = self.events[-1]
+        assert 'parse' == event
+        assert len(info) == fields['markers']
+        assert fields['elapsed'] >= 0
+
+    def test_parse_jpg_events(self):
+        """Test parse_jpg() creates the same events as parse_buffer()."""
+        tracing.enable_trace(self.hook)
+        parse_buffer(self.data)
+        events = self.events
+        self.events = []
+        with open(P1_RGB, 'rb') as fp:
+            parse_jpg(fp)
+
+        assert len(events) == len(self.events)
+        for (ref, ref_fields), (event, fields) in zip(events, self.events):
+            ref_fields.pop('elapsed', None)
+            fields.pop('elapsed', None)
+            assert ref == event
+            assert ref_fields == fields
+
+    def test_decode_events(self):
+        """Test the events when decoding."""
+        jpg = jpgread(P1_RGB)
+        tracing.enable_trace(self.hook)
+        jpg.decode()
+        assert [
+            'decode_scan', 'idct', 'idct', 'idct', 'decode'
+        ] == [ee for ee, ff in self.events]
+        assert jpg.get_keys('SOS')[0] == self.events[0][1]['key']
+        assert 3 == self.events[0][1]['components']
+        # 100 x 100 is 13 x 13 blocks
+        assert 169 == self.events[1][1]['blocks']
+
+    def test_log(self, caplog):
+        """Test the default hook logs the events."""
+        tracing.enable_trace()
+        with caplog.at_level(logging.DEBUG, logger='pdcmjpeg'):
+            jpgparse(self.data)
+
+        records = [rr for rr in caplog.records if hasattr(rr, 'event')]
+        assert 'marker' == records[0].event
+        assert 'SOI' == records[0].fields['name']
+        assert 'marker: name=SOI, offset=0' in records[0].getMessage()
+        assert 'parse' == records[-1].event
+
+    def test_log_disabled_level(self, caplog):
+        """Test nothing is logged if DEBUG isn't enabled."""
+        tracing.enable_trace()
+        with caplog.at_level(logging.WARNING, logger='pdcmjpeg'):
+            jpgparse(self.data)
+
+        assert not [rr for rr in caplog.records if hasattr(rr, 'event')]
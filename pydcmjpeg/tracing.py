@@ -0,0 +1,120 @@
+"""Tracing of the parsing and decoding of JPEG files.
+
+Tracing is disabled by default. When disabled the only cost is a single
+check of a boolean per marker segment or scan, the trace events themselves
+are never created. When enabled each event is passed to a hook function,
+by default one that logs the event with ``LOGGER`` at the DEBUG level.
+
+Events
+------
+marker
+    A marker has been parsed, with fields `name`, `offset`, `fill` (the
+    number of fill bytes before the marker) and `length` (the length of
+    the marker segment, 0 for markers without a segment).
+scan_data
+    The entropy-coded data of a scan has been located, with fields
+    `offset`, `length` (the total length of the data, including any
+    RSTn markers) and `segments` (the number of ENC entries).
+parse
+    Parsing has finished, with fields `markers` and `elapsed` (seconds).
+decode_scan
+    A scan has been entropy decoded, with fields `key` (the 'SOS@offset'
+    key), `components` and `elapsed` (seconds).
+idct
+    The coefficients of a component have been transformed, with fields
+    `component`, `blocks` and `elapsed` (seconds).
+predict
+    The samples of a lossless component have been reconstructed from their
+    differences, with fields `predictor`, `samples` and `elapsed`
+    (seconds).
+upsample
+    The subsampled components have been upsampled, with fields `method`
+    and `elapsed` (seconds).
+colour
+    The components have been converted from YCbCr to RGB, with field
+    `elapsed` (seconds).
+decode
+    Decoding has finished, with fields `process` and `elapsed` (seconds).
+
+Examples
+--------
+
+Log the trace events
+
+>>> import logging
+>>> from pydcmjpeg import tracing
+>>> logging.basicConfig(level=logging.DEBUG)
+>>> tracing.enable_trace()
+
+Collect the trace events
+
+>>> events = []
+>>> tracing.enable_trace(lambda event, fields: events.append((event, fields)))
+>>> tracing.disable_trace()
+"""
+
+import logging
+
+
+LOGGER = logging.getLogger('pdcmjpeg')
+
+# Checked before creating a trace event, don't change directly, use
+#   enable_trace() and disable_trace() instead
+TRACE = False
+
+_HOOK = None
+
+
+def disable_trace():
+    """Disable tracing."""
+    global TRACE, _HOOK
+    TRACE = False
+    _HOOK = None
+
+
+def enable_trace(hook=None):
+    """Enable tracing.
+
+    Parameters
+    ----------
+    hook : callable, optional
+        The function to call with each trace event, as ``hook(event,
+        fields)`` where `event` is the name of the event as str and `fields`
+        is a dict containing the event's fields. If not used then the events
+        will be logged with ``LOGGER`` at the DEBUG level.
+    """
+    global TRACE, _HOOK
+    _HOOK = hook or _log_event
+    TRACE = True
+
+
+def trace(event, **fields):
+    """Pass a trace event to the current hook.
+
+    Should only be called after checking that ``TRACE`` is True.
+
+    Parameters
+    ----------
+    event : str
+        The name of the event.
+    **fields
+        The event's fields.
+    """
+    hook = _HOOK
+    if hook is not None:
+        hook(event, fields)
+
+
+def _log_event(event, fields):
+    """Log the trace `event` and its `fields` at the DEBUG level.
+
+    The event and fields are also available to logging handlers as the
+    `event` and `fields` attributes of the log record.
+    """
+    if LOGGER.isEnabledFor(logging.DEBUG):
+        LOGGER.debug(
+            "%s: %s",
+            event,
+            ', '.join('{}={}'.format(kk, vv) for kk, vv in fields.items()),
+            extra={'event' : event, 'fields' : fields},
+        )